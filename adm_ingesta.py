@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Ingesta de archivos ADM regionales
+Cada región entrega su propio archivo (pb_2025_01_cca_77293_DIR_NOROESTE, ..._DIR_CENTRO, ...);
+se leen en paralelo, se valida que todos sean del mismo periodo y se combinan en un solo
+conjunto sin pólizas repetidas entre regiones.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from cache_adm import cache_adm, huella_archivo
+from cotejamiento_core import PATRON_ADM, periodo_desde_adm
+
+EXTENSIONES_ADM = ('.csv', '.xlsx', '.xls')
+
+# Encabezados aceptados para el número de póliza, ya normalizados (minúsculas, sin separadores)
+COLUMNAS_POLIZA = ('numpoliza', 'numeropoliza', 'nopoliza', 'poliza', 'polizanum')
+
+# Procesos para leer archivos en paralelo
+PROCESOS_INGESTA = int(os.environ.get('BONOS_PROCESOS_INGESTA', str(os.cpu_count() or 1)))
+
+class ErrorIngestaADM(Exception):
+    """Archivos ADM que no se pueden combinar (formato de nombre, periodos distintos, lectura)"""
+
+class IngestaADM:
+    """Resultado de combinar los archivos ADM de un periodo"""
+
+    def __init__(self, year: str, month: str, archivos: List[str], datos: pd.DataFrame,
+                 filas_por_region: Dict[str, int], duplicados: int, columna_poliza: Optional[str]):
+        self.year = year
+        self.month = month
+        self.archivos = archivos
+        self.datos = datos
+        self.filas_por_region = filas_por_region
+        self.duplicados = duplicados
+        self.columna_poliza = columna_poliza
+
+    @property
+    def periodo(self) -> str:
+        return f"{self.year}{self.month}"
+
+    @property
+    def regiones(self) -> List[str]:
+        return list(self.filas_por_region)
+
+def region_desde_adm(nombre_archivo: str) -> str:
+    """Región del archivo: lo que sigue a _DIR_ sin extensión (NOROESTE, CENTRO, ...)"""
+    base = os.path.splitext(os.path.basename(nombre_archivo))[0]
+    return base.split('_DIR_', 1)[1] if '_DIR_' in base else base
+
+def archivos_adm(rutas: List[str]) -> List[str]:
+    """
+    Expande carpetas a los archivos ADM que contienen (por nombre) y deja los archivos
+    sueltos tal cual; sin repetidos y ordenados por nombre para que el resultado sea estable
+    """
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for nombre in os.listdir(ruta):
+                if nombre.lower().endswith(EXTENSIONES_ADM) and PATRON_ADM.match(nombre):
+                    archivos.append(os.path.join(ruta, nombre))
+        else:
+            archivos.append(ruta)
+    return sorted(set(archivos), key=lambda r: (os.path.basename(r), r))
+
+def validar_periodo(archivos: List[str]) -> Tuple[str, str]:
+    """Retorna (año, mes) común a todos los archivos; ErrorIngestaADM si alguno no coincide"""
+    if not archivos:
+        raise ErrorIngestaADM("No se encontraron archivos ADM")
+
+    periodos: Dict[Tuple[str, str], List[str]] = {}
+    for ruta in archivos:
+        nombre = os.path.basename(ruta)
+        year, month = periodo_desde_adm(nombre)
+        if not year or not month:
+            raise ErrorIngestaADM(f"El archivo no tiene el formato esperado "
+                                  f"(pb_YYYY_MM_cca_xxxxx_DIR_xxxxx): {nombre}")
+        periodos.setdefault((year, month), []).append(nombre)
+
+    if len(periodos) > 1:
+        detalle = "\n".join(f"{y}/{m}: {', '.join(nombres)}" for (y, m), nombres in sorted(periodos.items()))
+        raise ErrorIngestaADM(f"Los archivos ADM son de periodos distintos:\n{detalle}")
+    return next(iter(periodos))
+
+def _parsear_adm(ruta: str) -> pd.DataFrame:
+    """Lee el archivo como texto (sin convertir pólizas a número)"""
+    if ruta.lower().endswith('.csv'):
+        try:
+            df = pd.read_csv(ruta, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        except UnicodeDecodeError:
+            df = pd.read_csv(ruta, dtype=str, keep_default_na=False, encoding='latin-1')
+    else:
+        df = pd.read_excel(ruta, dtype=str).fillna('')
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def leer_adm(ruta: str) -> pd.DataFrame:
+    """
+    Lee un archivo ADM y agrega su región. La lectura se guarda en cache_adm por el
+    SHA-256 del contenido; la región sale siempre del nombre actual del archivo.
+    """
+    huella = huella_archivo(ruta) if cache_adm.activa else None
+    df = cache_adm.leer(huella) if huella else None
+    if df is None:
+        df = _parsear_adm(ruta)
+        if huella:
+            cache_adm.guardar(huella, df)
+    df['region'] = region_desde_adm(ruta)
+    return df
+
+def columna_poliza(df: pd.DataFrame) -> Optional[str]:
+    """Columna con el número de póliza según COLUMNAS_POLIZA; None si no hay ninguna"""
+    normalizadas = {re.sub(r'[^a-z0-9]', '', c.lower().replace('ó', 'o')): c for c in df.columns}
+    for candidata in COLUMNAS_POLIZA:
+        if candidata in normalizadas:
+            return normalizadas[candidata]
+    return None
+
+def _leer_todos(archivos: List[str], procesos: int,
+                progreso: Optional[Callable[[int, int, str], None]]) -> Dict[str, pd.DataFrame]:
+    """Lee cada archivo (en paralelo con procesos > 1); progreso(leídos, total, nombre)"""
+    total = len(archivos)
+    leidos: Dict[str, pd.DataFrame] = {}
+
+    if procesos <= 1 or total == 1:
+        for ruta in archivos:
+            leidos[ruta] = leer_adm(ruta)
+            if progreso:
+                progreso(len(leidos), total, os.path.basename(ruta))
+        return leidos
+
+    with ProcessPoolExecutor(max_workers=min(procesos, total)) as executor:
+        futuros = {executor.submit(leer_adm, ruta): ruta for ruta in archivos}
+        for futuro in as_completed(futuros):
+            ruta = futuros[futuro]
+            try:
+                leidos[ruta] = futuro.result()
+            except Exception as e:
+                for pendiente in futuros:
+                    pendiente.cancel()
+                raise ErrorIngestaADM(f"No se pudo leer {os.path.basename(ruta)}: {e}") from e
+            if progreso:
+                progreso(len(leidos), total, os.path.basename(ruta))
+    return leidos
+
+def ingerir_adm(rutas: List[str], procesos: int = PROCESOS_INGESTA,
+                progreso: Optional[Callable[[int, int, str], None]] = None) -> IngestaADM:
+    """
+    Combina los archivos ADM (o carpetas) de un periodo en un solo DataFrame.
+    El periodo se valida antes de leer nada. Las pólizas que ya aparecieron en un archivo
+    anterior (en orden de nombre) se descartan; dentro de un mismo archivo se conservan todas.
+    Sin columna de póliza reconocible solo se descartan filas idénticas.
+    """
+    archivos = archivos_adm(rutas)
+    year, month = validar_periodo(archivos)
+
+    try:
+        leidos = _leer_todos(archivos, procesos, progreso)
+    except ErrorIngestaADM:
+        raise
+    except Exception as e:
+        raise ErrorIngestaADM(f"No se pudieron leer los archivos ADM: {e}") from e
+
+    # Una sola pasada de desalojo, desde el proceso principal
+    cache_adm.desalojar()
+
+    marcos = [leidos[ruta] for ruta in archivos]
+    columna = columna_poliza(marcos[0])
+    if columna and not all(columna in df.columns for df in marcos):
+        columna = None
+
+    vistas = set()
+    combinados = []
+    filas_por_region: Dict[str, int] = {}
+    duplicados = 0
+    for ruta, df in zip(archivos, marcos):
+        if columna:
+            polizas = df[columna].str.strip()
+            repetidas = polizas.isin(vistas) & (polizas != '')
+            vistas.update(polizas[polizas != ''])
+            duplicados += int(repetidas.sum())
+            df = df[~repetidas]
+        combinados.append(df)
+        region = region_desde_adm(ruta)
+        filas_por_region[region] = filas_por_region.get(region, 0) + len(df)
+
+    datos = pd.concat(combinados, ignore_index=True)
+    if not columna:
+        sin_region = [c for c in datos.columns if c != 'region']
+        antes = len(datos)
+        datos = datos.drop_duplicates(subset=sin_region, keep='first').reset_index(drop=True)
+        duplicados = antes - len(datos)
+        conteo = datos['region'].value_counts()
+        filas_por_region = {region: int(conteo.get(region, 0)) for region in filas_por_region}
+
+    print(f"[ADM] {year}/{month}: {len(archivos)} archivo(s), {len(datos):,} filas, "
+          f"{duplicados:,} pólizas repetidas descartadas")
+    return IngestaADM(year, month, [os.path.basename(r) for r in archivos], datos,
+                      filas_por_region, duplicados, columna)
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Almacén en SQLite para cotejamientos que no caben cómodos en memoria
+Las filas procesadas se insertan por lotes en una base temporal indexada; el filtro,
+el orden, la paginación y los conteos se resuelven con SQL y en memoria solo queda
+la página visible. Las resegmentaciones se cruzan dentro de la base (ATTACH).
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from datos_cotejamiento import MARCA_ABSOLUTO, clave_fila, valor_numerico
+
+# Cargas con más filas que esto usan el almacén en lugar de listas en memoria
+UMBRAL_FILAS_SQLITE = int(os.environ.get('BONOS_UMBRAL_SQLITE', '200000'))
+
+# Filas por executemany durante la carga y por lectura al recorrer una vista completa
+LOTE_SQLITE = 10000
+
+# Caché de páginas de SQLite por conexión (KiB, valor negativo según la convención de SQLite)
+CACHE_SQLITE_KIB = 65536
+
+# Columnas de la tabla sin valor propio (se pintan según el estado de la fila)
+COLUMNAS_SIN_VALOR = ('Aclaración', 'Resegmentación')
+
+# Separador de la clave y del texto de búsqueda; no aparece en los datos de la API
+SEPARADOR = '\x1f'
+
+# Un solo codificador reutilizado: json.dumps crea uno nuevo en cada llamada con argumentos
+_a_json = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+# Nombres únicos para las tablas de instantánea
+_contador_instantaneas = itertools.count(1)
+
+def _normalizar(texto) -> str:
+    return str(texto or '').strip().upper()
+
+def _texto_clave(clave: Tuple[str, str, str]) -> str:
+    return SEPARADOR.join(clave)
+
+def _eliminar_archivo(ruta: str):
+    for sufijo in ('', '-journal'):
+        try:
+            os.remove(ruta + sufijo)
+        except OSError:
+            pass
+
+class AlmacenCotejamiento:
+    """
+    Filas de cotejamiento en una base SQLite temporal.
+    Cada columna ordenable se guarda dos veces: como número (valor_numerico) y como texto
+    casefold, para ordenar con las mismas reglas que OrdenadorColumnas. La vista activa
+    (filtro + orden) se materializa en la tabla 'vista' con una posición consecutiva,
+    así cada página es un rango de posiciones y no un OFFSET.
+    """
+
+    def __init__(self, columnas: List[str], db_resegmentaciones: Optional[str] = "resegmentaciones.db"):
+        self.columnas = list(columnas)
+        self.ordenables = [c for c in self.columnas if c not in COLUMNAS_SIN_VALOR]
+        self.total_filas = 0
+        self.total_vista = 0
+        self.polizas_con_pagos = 0
+        self._numericas = {}  # columna -> bool, calculado al primer orden
+        self._lock = threading.RLock()
+
+        descriptor, self.ruta = tempfile.mkstemp(prefix='cotejamiento_', suffix='.db')
+        os.close(descriptor)
+        # El archivo se borra aunque el almacén no se cierre explícitamente
+        self._finalizador = weakref.finalize(self, _eliminar_archivo, self.ruta)
+
+        # La exportación lee desde su propio hilo; el lock serializa el uso de la conexión
+        self.conn = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('PRAGMA temp_store=FILE')
+        self.conn.execute(f'PRAGMA cache_size=-{CACHE_SQLITE_KIB}')
+        self._crear_tablas()
+
+        self.resegmentaciones_adjuntas = False
+        if db_resegmentaciones and os.path.exists(db_resegmentaciones):
+            try:
+                self.conn.execute('ATTACH DATABASE ? AS reseg', (os.path.abspath(db_resegmentaciones),))
+                self.resegmentaciones_adjuntas = True
+            except sqlite3.Error as e:
+                print(f"[ALMACEN] ⚠️ No se pudo adjuntar {db_resegmentaciones}: {e}")
+
+    def _crear_tablas(self):
+        orden = ''.join(f', n{i} REAL, t{i} TEXT' for i in range(len(self.ordenables)))
+        self.conn.executescript(f'''
+            CREATE TABLE filas (
+                id INTEGER PRIMARY KEY,
+                clave TEXT NOT NULL,
+                poliza_n TEXT NOT NULL,
+                agente_n TEXT NOT NULL,
+                subramo_n TEXT NOT NULL,
+                texto TEXT NOT NULL,
+                datos TEXT NOT NULL{orden}
+            );
+            CREATE TABLE vista (
+                pos INTEGER PRIMARY KEY,
+                fila_id INTEGER NOT NULL
+            );
+            CREATE TABLE polizas (
+                clave TEXT PRIMARY KEY,
+                num_poliza TEXT NOT NULL,
+                pagos TEXT NOT NULL
+            );
+            CREATE TABLE pagos (
+                id_pago TEXT PRIMARY KEY,
+                clave TEXT NOT NULL,
+                posicion INTEGER NOT NULL        -- índice del pago en polizas.pagos
+            );
+            CREATE TABLE reseg_activas (
+                id INTEGER,
+                agente_n TEXT,
+                subramo_n TEXT,
+                poliza_n TEXT,
+                nuevo_n TEXT,
+                pago_id TEXT,
+                tipo_resegmentacion TEXT,
+                estado TEXT,
+                fecha_resegmentacion TEXT,
+                fecha_primer_pago TEXT
+            );
+            CREATE INDEX idx_reseg_clave ON reseg_activas(poliza_n, agente_n, subramo_n);
+            CREATE INDEX idx_reseg_nuevo ON reseg_activas(nuevo_n);
+            CREATE INDEX idx_reseg_pago ON reseg_activas(pago_id);
+            CREATE TABLE claves_filtro (clave TEXT PRIMARY KEY) WITHOUT ROWID;
+        ''')
+
+    # ------------------------------------------------------------------ carga
+
+    def _registro(self, row_data: Dict) -> tuple:
+        agente, subramo, num_poliza = clave_fila(row_data)
+        texto = SEPARADOR.join(str(row_data.get(c, '')).lower() for c in self.columnas)
+        registro = [_texto_clave((agente, subramo, num_poliza)), _normalizar(num_poliza),
+                    _normalizar(agente), _normalizar(subramo), texto,
+                    _a_json(row_data)]
+        for columna in self.ordenables:
+            valor = row_data.get(columna, '')
+            vacio = valor in ('', None)
+            registro.append(None if vacio else valor_numerico(valor))
+            registro.append('' if vacio else str(valor).casefold())
+        return tuple(registro)
+
+    def cargar(self, filas: Iterable[Dict], detalle: Optional[List[Dict]] = None) -> int:
+        """
+        Inserta las filas (en el orden recibido) y, si se da, el índice de pagos del detalle.
+        Los índices se crean al final: construirlos una vez es más barato que mantenerlos fila a fila.
+        """
+        marcadores = ', '.join('?' * (7 + 2 * len(self.ordenables)))
+        columnas = 'clave, poliza_n, agente_n, subramo_n, texto, datos' + ''.join(
+            f', n{i}, t{i}' for i in range(len(self.ordenables)))
+        sql = f'INSERT INTO filas (id, {columnas}) VALUES ({marcadores})'
+
+        with self._lock:
+            self.conn.execute('BEGIN')
+            lote = []
+            total = 0
+            for row_data in filas:
+                total += 1
+                lote.append((total,) + self._registro(row_data))
+                if len(lote) >= LOTE_SQLITE:
+                    self.conn.executemany(sql, lote)
+                    lote = []
+            if lote:
+                self.conn.executemany(sql, lote)
+            if detalle:
+                self._cargar_pagos(detalle)
+            self.conn.execute('CREATE INDEX idx_filas_poliza ON filas(poliza_n)')
+            self.conn.execute('CREATE INDEX idx_filas_clave ON filas(clave)')
+            self.conn.execute('CREATE INDEX idx_pagos_clave ON pagos(clave)')
+            self.conn.execute('COMMIT')
+            self.total_filas = total
+
+        self.filtrar()
+        print(f"[ALMACEN] {total:,} filas y {self.polizas_con_pagos:,} pólizas con pagos en {self.ruta}")
+        return total
+
+    def _cargar_pagos(self, detalle: List[Dict]):
+        """Mismo recorrido que IndicePagos.construir; ante claves o idPago repetidos gana el primero"""
+        polizas = []
+        pagos = []
+        for agente_item in detalle:
+            agente = str(agente_item.get('agente', ''))
+            for subramo_data in agente_item.get('subramos', []):
+                subramo = str(subramo_data.get('subramo', ''))
+                for poliza in subramo_data.get('polizas', []):
+                    num_poliza = str(poliza.get('numPoliza', ''))
+                    prima_proyectada = poliza.get('primaProyectada', {})
+                    detalle_pagos = prima_proyectada.get('detallePagos', []) if isinstance(prima_proyectada, dict) else []
+
+                    clave = _texto_clave((agente, subramo, num_poliza))
+                    polizas.append((clave, num_poliza, _a_json(detalle_pagos)))
+                    for posicion, pago in enumerate(detalle_pagos):
+                        if pago.get('idPago', ''):
+                            pagos.append((str(pago['idPago']), clave, posicion))
+
+                    if len(polizas) >= LOTE_SQLITE or len(pagos) >= LOTE_SQLITE:
+                        self._insertar_pagos(polizas, pagos)
+                        polizas, pagos = [], []
+        self._insertar_pagos(polizas, pagos)
+        self.conn.execute('CREATE INDEX idx_polizas_numero ON polizas(num_poliza)')
+        self.polizas_con_pagos = self.conn.execute('SELECT COUNT(*) FROM polizas').fetchone()[0]
+
+    def _insertar_pagos(self, polizas: List[tuple], pagos: List[tuple]):
+        self.conn.executemany('INSERT OR IGNORE INTO polizas (clave, num_poliza, pagos) VALUES (?, ?, ?)', polizas)
+        self.conn.executemany('INSERT OR IGNORE INTO pagos (id_pago, clave, posicion) VALUES (?, ?, ?)', pagos)
+
+    # ------------------------------------------------------- filtro y orden
+
+    def _es_numerica(self, columna: str) -> bool:
+        """Misma regla que OrdenadorColumnas: la columna tiene algún valor numérico"""
+        if columna not in self._numericas:
+            i = self.ordenables.index(columna)
+            self._numericas[columna] = self.conn.execute(
+                f"SELECT EXISTS (SELECT 1 FROM filas WHERE n{i} IS NOT NULL)").fetchone()[0] == 1
+        return self._numericas[columna]
+
+    def _orden_sql(self, criterios: Sequence[Tuple[str, bool]]) -> str:
+        """ORDER BY equivalente a OrdenadorColumnas.ordenar (vacíos al final en ambas direcciones, estable por id)"""
+        partes = []
+        for columna, descendente in criterios:
+            absoluto = columna.startswith(MARCA_ABSOLUTO) and columna.endswith(MARCA_ABSOLUTO) and len(columna) > 2
+            nombre = columna[1:-1] if absoluto else columna
+            if nombre not in self.ordenables:
+                continue
+            i = self.ordenables.index(nombre)
+            direccion = ' DESC' if descendente else ''
+            if self._es_numerica(nombre):
+                expresion = f'ABS(n{i})' if absoluto else f'n{i}'
+                partes.append(f'{expresion} IS NULL, {expresion}{direccion}')
+            else:
+                partes.append(f"t{i} = '', t{i}{direccion}")
+        partes.append('id')
+        return ', '.join(partes)
+
+    def filtrar(self, busqueda: str = '', claves: Optional[Iterable[Tuple[str, str, str]]] = None,
+                criterios: Sequence[Tuple[str, bool]] = ()) -> int:
+        """
+        Recalcula la vista con la búsqueda (subcadena en cualquier columna, sin distinguir
+        mayúsculas), un conjunto opcional de claves y el orden. Retorna el total de la vista.
+        """
+        condiciones = []
+        parametros = []
+        busqueda = (busqueda or '').lower()
+        if busqueda:
+            condiciones.append('instr(texto, ?) > 0')
+            parametros.append(busqueda)
+
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.execute('DELETE FROM claves_filtro')
+            if claves is not None:
+                self.conn.executemany('INSERT OR IGNORE INTO claves_filtro (clave) VALUES (?)',
+                                      ((_texto_clave(tuple(str(p) for p in c)),) for c in claves))
+                condiciones.append('clave IN (SELECT clave FROM claves_filtro)')
+
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+            self.conn.execute('DELETE FROM vista')
+            self.conn.execute(f'INSERT INTO vista (pos, fila_id) '
+                              f'SELECT ROW_NUMBER() OVER (ORDER BY {self._orden_sql(criterios)}), id '
+                              f'FROM filas {where}', parametros)
+            self.conn.execute('COMMIT')
+            self.total_vista = self.conn.execute('SELECT COUNT(*) FROM vista').fetchone()[0]
+        return self.total_vista
+
+    # ---------------------------------------------------------- lectura
+
+    def leer(self, inicio: int, cantidad: int, tabla: str = 'vista') -> List[Dict]:
+        """Filas [inicio, inicio + cantidad) de una vista ('filas' = orden de carga)"""
+        if cantidad <= 0:
+            return []
+        with self._lock:
+            cursor = self.conn.execute(f'SELECT f.datos FROM {self._rango(tabla)}', (inicio, cantidad))
+            return [json.loads(datos) for (datos,) in cursor.fetchall()]
+
+    @staticmethod
+    def _rango(tabla: str) -> str:
+        """FROM ... LIMIT de un rango de posiciones: por llave (pos > ?), nunca con OFFSET"""
+        if tabla == 'filas':
+            return 'filas f WHERE f.id > ? ORDER BY f.id LIMIT ?'
+        return f'{tabla} v JOIN filas f ON f.id = v.fila_id WHERE v.pos > ? ORDER BY v.pos LIMIT ?'
+
+    def vista(self) -> 'VistaAlmacen':
+        """Secuencia perezosa sobre la vista activa (cambia con cada filtrar)"""
+        return VistaAlmacen(self, 'vista', lambda: self.total_vista)
+
+    def todas(self) -> 'VistaAlmacen':
+        """Secuencia perezosa sobre todas las filas en el orden de carga"""
+        return VistaAlmacen(self, 'filas', lambda: self.total_filas)
+
+    def instantanea(self, origen: str = 'vista') -> 'VistaAlmacen':
+        """Copia fija de una vista, p. ej. para exportar mientras la tabla sigue filtrándose"""
+        seleccion = 'id, id FROM filas' if origen == 'filas' else f'pos, fila_id FROM {origen}'
+        with self._lock:
+            tabla = f'vista_{next(_contador_instantaneas)}'
+            self.conn.execute(f'CREATE TABLE {tabla} (pos INTEGER PRIMARY KEY, fila_id INTEGER NOT NULL)')
+            self.conn.execute(f'INSERT INTO {tabla} (pos, fila_id) SELECT {seleccion}')
+            total = self.conn.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+        return VistaAlmacen(self, tabla, lambda: total)
+
+    # -------------------------------------------------- resegmentaciones
+
+    def refrescar_resegmentaciones(self) -> int:
+        """Copia las resegmentaciones activas (pocas) con sus claves normalizadas para cruzarlas por índice"""
+        if not self.resegmentaciones_adjuntas:
+            return 0
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.execute('DELETE FROM reseg_activas')
+            self.conn.execute('''
+                INSERT INTO reseg_activas
+                SELECT id, UPPER(TRIM(agente)), UPPER(TRIM(subramo)), UPPER(TRIM(num_poliza)),
+                       NULLIF(UPPER(TRIM(COALESCE(num_poliza_nuevo_negocio, ''))), ''), NULLIF(pago_id, ''),
+                       tipo_resegmentacion, estado, fecha_resegmentacion, fecha_primer_pago
+                FROM reseg.resegmentaciones
+                WHERE UPPER(TRIM(estado)) = 'ACTIVO'
+            ''')
+            self.conn.execute('COMMIT')
+            return self.conn.execute('SELECT COUNT(*) FROM reseg_activas').fetchone()[0]
+
+    def resegmentaciones_pagina(self, inicio: int, cantidad: int, tabla: str = 'vista') -> Dict[Tuple[str, str, str], Optional[Dict]]:
+        """
+        Resegmentación activa de cada fila de la página con las reglas de IndiceResegmentaciones:
+        clave exacta normalizada, número de póliza o de nuevo negocio y por último idPago.
+        Sin pagos cargados la regla de idPago no se puede evaluar aquí: solo se devuelven
+        las filas encontradas y el resto queda para la verificación por fila.
+        """
+        if not self.resegmentaciones_adjuntas:
+            return {}
+        self.refrescar_resegmentaciones()
+        with self._lock:
+            filas = self.conn.execute(f'''
+                SELECT f.clave, COALESCE(
+                    (SELECT r.id FROM reseg_activas r
+                     WHERE r.poliza_n = f.poliza_n AND r.agente_n = f.agente_n AND r.subramo_n = f.subramo_n
+                     ORDER BY r.fecha_resegmentacion DESC LIMIT 1),
+                    (SELECT r.id FROM reseg_activas r
+                     WHERE r.poliza_n = f.poliza_n OR r.nuevo_n = f.poliza_n
+                     ORDER BY r.fecha_resegmentacion DESC LIMIT 1),
+                    (SELECT r.id FROM pagos p JOIN reseg_activas r ON r.pago_id = p.id_pago
+                     WHERE p.clave = f.clave LIMIT 1)
+                ) AS reseg_id
+                FROM {self._rango(tabla)}
+            ''', (inicio, cantidad)).fetchall()
+            ids = [reseg_id for _, reseg_id in filas if reseg_id is not None]
+            datos = {}
+            if ids:
+                cursor = self.conn.execute(
+                    f"SELECT id, tipo_resegmentacion, estado, fecha_resegmentacion, fecha_primer_pago "
+                    f"FROM reseg_activas WHERE id IN ({', '.join('?' * len(ids))})", ids)
+                columnas = [d[0] for d in cursor.description]
+                datos = {row[0]: dict(zip(columnas, row)) for row in cursor.fetchall()}
+
+        completo = self.polizas_con_pagos > 0
+        return {tuple(clave.split(SEPARADOR)): datos.get(reseg_id) for clave, reseg_id in filas
+                if completo or reseg_id is not None}
+
+    def contar_resegmentadas(self) -> int:
+        """Filas de la vista activa con alguna resegmentación activa, calculado en la base"""
+        if not self.resegmentaciones_adjuntas:
+            return 0
+        self.refrescar_resegmentaciones()
+        with self._lock:
+            return self.conn.execute('''
+                SELECT COUNT(*) FROM vista WHERE fila_id IN (
+                    SELECT f.id FROM filas f WHERE f.poliza_n IN (SELECT poliza_n FROM reseg_activas)
+                    UNION
+                    SELECT f.id FROM filas f WHERE f.poliza_n IN (SELECT nuevo_n FROM reseg_activas)
+                    UNION
+                    SELECT f.id FROM pagos p JOIN filas f ON f.clave = p.clave
+                    WHERE p.id_pago IN (SELECT pago_id FROM reseg_activas)
+                )
+            ''').fetchone()[0]
+
+    # ------------------------------------------------------ agregados
+
+    def sumar(self, columna: str) -> float:
+        """Suma numérica de una columna sobre la vista activa"""
+        if columna not in self.ordenables:
+            return 0.0
+        i = self.ordenables.index(columna)
+        with self._lock:
+            total = self.conn.execute(f'SELECT SUM(f.n{i}) FROM vista v JOIN filas f ON f.id = v.fila_id').fetchone()[0]
+        return float(total or 0)
+
+    def cerrar(self):
+        """Cierra la conexión y borra el archivo temporal"""
+        with self._lock:
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+        self._finalizador()
+
+class VistaAlmacen(Sequence):
+    """
+    Secuencia de solo lectura sobre una vista del almacén: len(), índices y rebanadas
+    leen de SQLite, así el código que trabaja con listas (paginación, exportación por
+    bloques, selección) funciona sin materializar todas las filas.
+    """
+
+    def __init__(self, almacen: AlmacenCotejamiento, tabla: str, total):
+        self.almacen = almacen
+        self.tabla = tabla
+        self._total = total
+
+    def __len__(self) -> int:
+        return self._total()
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio, fin, paso = indice.indices(len(self))
+            if paso != 1:
+                return [self[i] for i in range(inicio, fin, paso)]
+            return self.almacen.leer(inicio, fin - inicio, self.tabla)
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        return self.almacen.leer(indice, 1, self.tabla)[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for inicio in range(0, len(self), LOTE_SQLITE):
+            yield from self.almacen.leer(inicio, LOTE_SQLITE, self.tabla)
+
+    def instantanea(self) -> 'VistaAlmacen':
+        return self.almacen.instantanea(self.tabla)
+
+    def resegmentaciones(self, inicio: int, cantidad: int) -> Dict[Tuple[str, str, str], Optional[Dict]]:
+        """Resegmentaciones de las filas [inicio, inicio + cantidad) de esta vista"""
+        return self.almacen.resegmentaciones_pagina(inicio, cantidad, self.tabla)
+
+class IndicePagosAlmacen:
+    """Misma interfaz que IndicePagos, leyendo los pagos del almacén"""
+
+    def __init__(self, almacen: AlmacenCotejamiento):
+        self.almacen = almacen
+
+    def _consultar(self, sql: str, parametros: tuple):
+        with self.almacen._lock:
+            return self.almacen.conn.execute(sql, parametros).fetchone()
+
+    def pagos_de(self, agente: str, subramo: str, num_poliza: str) -> List[Dict]:
+        """Retorna los detalles de pagos de una póliza exacta"""
+        fila = self._consultar('SELECT pagos FROM polizas WHERE clave = ?',
+                               (_texto_clave((str(agente), str(subramo), str(num_poliza))),))
+        return json.loads(fila[0]) if fila else []
+
+    def pagos_de_poliza(self, num_poliza: str) -> List[Dict]:
+        """Retorna los detalles de pagos de la primera póliza con ese número"""
+        fila = self._consultar('SELECT pagos FROM polizas WHERE num_poliza = ? ORDER BY rowid LIMIT 1',
+                               (str(num_poliza),))
+        return json.loads(fila[0]) if fila else []
+
+    def poliza_de_pago(self, pago_id: str) -> Optional[Dict]:
+        """Retorna la póliza que contiene un idPago"""
+        fila = self._consultar('SELECT p.clave, p.posicion, z.pagos FROM pagos p JOIN polizas z ON z.clave = p.clave '
+                               'WHERE p.id_pago = ?', (str(pago_id),))
+        if not fila:
+            return None
+        agente, subramo, num_poliza = fila[0].split(SEPARADOR)
+        return {
+            'agente': agente,
+            'subramo': subramo,
+            'num_poliza': num_poliza,
+            'pago_details': json.loads(fila[2])[fila[1]]
+        }
+
+    def __len__(self):
+        return self.almacen.polizas_con_pagos
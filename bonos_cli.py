@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Línea de comandos para cotejamiento sin interfaz gráfica
+
+Ejemplos:
+    python bonos_cli.py cotejar --periodo 2025-04 --out reporte.xlsx
+    python bonos_cli.py cotejar --adm pb_2025_04_cca_77293_DIR_NOROESTE.csv --out reporte.xlsx
+    python bonos_cli.py cotejar --periodo 2025-01 2025-02 2025-03 --procesos 3 --out reporte.xlsx
+    python bonos_cli.py cotejar --desde-sesion abril.bonos --out reporte.csv
+
+Las credenciales se toman de --usuario/--password o de BONOS_API_USUARIO/BONOS_API_PASSWORD
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from resiliencia_api import cliente_api
+from cotejamiento_core import (URL_LOGIN, URL_COMPARACION, iniciar_sesion, consultar_periodo, extraer_comparacion,
+                               cotejar_periodo, normalizar_periodo, periodo_desde_adm)
+
+def ruta_salida(salida: str, periodo: str, varios: bool) -> str:
+    """Con varios periodos agrega el periodo al nombre: reporte.xlsx -> reporte_2025-04.xlsx"""
+    if not varios:
+        return salida
+    base, extension = os.path.splitext(salida)
+    return f"{base}_{periodo[:7]}{extension or '.xlsx'}"
+
+def _cotejar_en_proceso(periodo: str, salida: str, token: str, url: str, incluir_pagos: bool,
+                        db_path: str, guardar_historial: bool) -> Dict:
+    """Trabajo de un proceso: consultar, cotejar y (opcional) registrar en el historial"""
+    data = consultar_periodo(url, token, periodo)
+    resultado = cotejar_periodo(periodo, salida, data=data, incluir_pagos=incluir_pagos, db_path=db_path)
+    if guardar_historial:
+        from historial_cotejamiento import HistorialCotejamiento
+        resumen, detalle = extraer_comparacion(data)
+        HistorialCotejamiento().registrar_periodo(resultado['periodo'], resumen, detalle)
+    # Cada proceso tiene su propio cliente: sus métricas viajan con el resultado
+    resultado['metricas_api'] = cliente_api.metricas.resumen()
+    return resultado
+
+def _imprimir_resultado(resultado: Dict):
+    tiempos = ", ".join(f"{etapa} {segundos:.2f}s" for etapa, segundos in resultado['tiempos'].items())
+    print(f"[CLI] ✅ {resultado['periodo']}: {resultado['filas']:,} pólizas, "
+          f"{resultado['resegmentadas']:,} resegmentadas -> {', '.join(resultado['archivos'])}")
+    print(f"[CLI]    Tiempos: {tiempos}")
+    if resultado.get('metricas_api'):
+        print(f"[CLI]    API: {resultado['metricas_api']}")
+
+def periodos_solicitados(args) -> List[str]:
+    """Periodos de --periodo y/o del nombre de los archivos --adm"""
+    periodos = [normalizar_periodo(p) for p in (args.periodo or [])]
+    for archivo in args.adm or []:
+        year, month = periodo_desde_adm(os.path.basename(archivo))
+        if not year:
+            raise ValueError(f"El archivo ADM no tiene el formato pb_YYYY_MM_cca_xxxxx_DIR_xxxxx: {archivo}")
+        periodos.append(f"{year}-{month}-01")
+    # Sin duplicados, conservando el orden
+    return list(dict.fromkeys(periodos))
+
+def comando_cotejar(args) -> int:
+    inicio = time.perf_counter()
+
+    # Sin API: reutilizar una sesión guardada desde la interfaz
+    if args.desde_sesion:
+        from sesion_cotejamiento import abrir_sesion
+        sesion = abrir_sesion(args.desde_sesion)
+        if sesion is None:
+            return 1
+        data = {'data': [{'resumenComparacion': sesion.resumen, 'detalleComparacion': sesion.detalle}]}
+        resultado = cotejar_periodo(sesion.periodo, args.out, data=data,
+                                    incluir_pagos=args.incluir_pagos, db_path=args.db)
+        _imprimir_resultado(resultado)
+        return 0
+
+    try:
+        periodos = periodos_solicitados(args)
+    except ValueError as e:
+        print(f"[CLI] ❌ {e}")
+        return 2
+    if not periodos:
+        print("[CLI] ❌ Indique --periodo, --adm o --desde-sesion")
+        return 2
+
+    usuario = args.usuario or os.environ.get('BONOS_API_USUARIO', '')
+    password = args.password or os.environ.get('BONOS_API_PASSWORD', '')
+    if not usuario or not password:
+        print("[CLI] ❌ Faltan credenciales: use --usuario/--password o BONOS_API_USUARIO/BONOS_API_PASSWORD")
+        return 2
+
+    try:
+        token = iniciar_sesion(args.login_url, usuario, password)['token']
+        print(f"[CLI] 🔐 Sesión API iniciada ({time.perf_counter() - inicio:.2f}s)")
+    except Exception as e:
+        print(f"[CLI] ❌ Error en login: {e}")
+        return 1
+
+    varios = len(periodos) > 1
+    errores = 0
+    tareas = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(args.procesos, len(periodos)))) as executor:
+        for periodo in periodos:
+            futuro = executor.submit(_cotejar_en_proceso, periodo, ruta_salida(args.out, periodo, varios),
+                                     token, args.url, args.incluir_pagos, args.db, args.historial)
+            tareas[futuro] = periodo
+
+        for futuro in as_completed(tareas):
+            try:
+                _imprimir_resultado(futuro.result())
+            except Exception as e:
+                errores += 1
+                print(f"[CLI] ❌ {tareas[futuro]}: {e}")
+
+    print(f"[CLI] Terminado en {time.perf_counter() - inicio:.2f}s ({len(periodos) - errores}/{len(periodos)} periodos)")
+    return 1 if errores else 0
+
+def comando_historial(args) -> int:
+    from historial_cotejamiento import HistorialCotejamiento
+    historial = HistorialCotejamiento(args.db_historial)
+
+    if args.consulta == 'periodos':
+        resultado = historial.obtener_periodos()
+    elif args.consulta == 'consecutivas':
+        resultado = historial.polizas_diferencia_consecutiva(args.limite, args.meses)
+    else:
+        if not args.agente:
+            print("[CLI] ❌ La consulta 'tendencia' requiere --agente")
+            return 2
+        resultado = historial.tendencia_agente(args.agente)
+
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return 0
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bonos", description="Herramientas de cotejamiento de bonos sin interfaz gráfica")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    cotejar = subparsers.add_parser('cotejar', help="Consultar periodos y exportar el reporte de cotejamiento")
+    cotejar.add_argument('--periodo', nargs='+', help="Periodo(s) YYYY-MM")
+    cotejar.add_argument('--adm', nargs='+', help="Archivo(s) ADM; el periodo se toma del nombre")
+    cotejar.add_argument('--desde-sesion', help="Usar una sesión .bonos guardada en lugar de la API")
+    cotejar.add_argument('--out', required=True, help="Archivo de salida .xlsx o .csv")
+    cotejar.add_argument('--incluir-pagos', action='store_true', help="Incluir el detalle de pagos")
+    cotejar.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                         help="Periodos a procesar en paralelo (procesos)")
+    cotejar.add_argument('--historial', action='store_true', help="Registrar cada periodo en el historial local")
+    cotejar.add_argument('--usuario', help="Correo de la cuenta API")
+    cotejar.add_argument('--password', help="Contraseña de la cuenta API")
+    cotejar.add_argument('--login-url', default=URL_LOGIN)
+    cotejar.add_argument('--url', default=URL_COMPARACION)
+    cotejar.add_argument('--db', default="resegmentaciones.db", help="Base de datos de resegmentaciones")
+    cotejar.set_defaults(funcion=comando_cotejar)
+
+    historial = subparsers.add_parser('historial', help="Consultas sobre el historial local de periodos")
+    historial.add_argument('consulta', choices=['periodos', 'consecutivas', 'tendencia'])
+    historial.add_argument('--limite', type=float, default=50.0, help="Diferencia absoluta mínima (consecutivas)")
+    historial.add_argument('--meses', type=int, default=3, help="Meses consecutivos (consecutivas)")
+    historial.add_argument('--agente', help="Agente (tendencia)")
+    historial.add_argument('--db-historial', default="historial_cotejamiento.db")
+    historial.set_defaults(funcion=comando_historial)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = crear_parser().parse_args(argv)
+    return args.funcion(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,12 @@ import subprocess
 import sys
 import platform
 import os
+import time
+import statistics
 from pathlib import Path
 
+from build_perfil import VARIABLE_MEDICION_ARRANQUE, ruta_ejecutable_onedir
+
 def detect_os():
     """Detecta el sistema operativo actual"""
     sistema = platform.system()
@@ -70,6 +74,49 @@ def build_for_windows_wine():
         print(f"❌ Error al ejecutar build_windows_wine.py: {e}")
         return False
 
+def medir_latencia_arranque(ejecutable, repeticiones=3, timeout=120):
+    """
+    Mide el tiempo desde que se lanza el ejecutable hasta que la ventana queda lista.
+    La app cierra sola cuando detecta la variable de entorno de medición (ver main.py).
+    """
+    ejecutable = Path(ejecutable)
+    if not ejecutable.exists():
+        print(f"⚠️ No se encontró el ejecutable para medir arranque: {ejecutable}")
+        return None
+    
+    entorno = os.environ.copy()
+    entorno[VARIABLE_MEDICION_ARRANQUE] = "1"
+    
+    tiempos = []
+    for intento in range(1, repeticiones + 1):
+        inicio = time.perf_counter()
+        try:
+            subprocess.run([str(ejecutable)], env=entorno, timeout=timeout,
+                           capture_output=True, check=True)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Arranque {intento}: el ejecutable no cerró en {timeout}s")
+            continue
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"⚠️ Arranque {intento}: error al ejecutar ({e})")
+            continue
+        transcurrido = time.perf_counter() - inicio
+        tiempos.append(transcurrido)
+        # El primer arranque es en frío (caché de disco vacía), los siguientes en caliente
+        tipo = "frío" if intento == 1 else "caliente"
+        print(f"⏱️  Arranque {intento} ({tipo}): {transcurrido:.2f}s")
+    
+    if not tiempos:
+        return None
+    
+    resultado = {
+        'frio': tiempos[0],
+        'minimo': min(tiempos),
+        'mediana': statistics.median(tiempos),
+    }
+    print(f"⏱️  Latencia de arranque - frío: {resultado['frio']:.2f}s, "
+          f"mínimo: {resultado['minimo']:.2f}s, mediana: {resultado['mediana']:.2f}s")
+    return resultado
+
 def show_instructions():
     """Muestra instrucciones de uso"""
     print("\n📋 INSTRUCCIONES DE USO:")
@@ -82,7 +129,7 @@ def show_instructions():
     print("2. Para Windows:")
     print("   • Ejecuta: python build_windows.py")
     print("   • O ejecuta: python build_all.py")
-    print("   • Resultado: dist/HerramientasBonos.exe")
+    print("   • Resultado: dist/HerramientasBonos/HerramientasBonos.exe")
     print()
     print("3. Para Windows desde macOS (usando Wine):")
     print("   • Ejecuta: python3 build_windows_wine.py")
@@ -94,10 +141,12 @@ def show_instructions():
     print("   • Incluye todas las dependencias necesarias")
     print("   • No requiere Python en el sistema destino")
     print("   • Interfaz gráfica sin consola")
+    print("   • Modo one-dir: sin extracción a carpeta temporal en cada arranque")
+    print("   • Usa --sin-medicion para omitir la medición de latencia de arranque")
     print()
     print("5. Distribución:")
     print("   • macOS: Comprime la carpeta .app")
-    print("   • Windows: Comparte el archivo .exe")
+    print("   • Windows: Comprime la carpeta dist/HerramientasBonos")
     print("   • Ambos son ejecutables independientes")
 
 def main():
@@ -127,10 +176,15 @@ def main():
             if app_path.exists():
                 print(f"📁 Ejecutable: {app_path.absolute()}")
         else:
-            exe_path = Path("dist/HerramientasBonos.exe")
+            exe_path = Path(ruta_ejecutable_onedir("Windows"))
             if exe_path.exists():
                 print(f"📁 Ejecutable: {exe_path.absolute()}")
         
+        # Medir latencia de arranque del build recién generado
+        if "--sin-medicion" not in sys.argv:
+            print("\n⏱️  Midiendo latencia de arranque...")
+            medir_latencia_arranque(ruta_ejecutable_onedir(platform.system()))
+        
         print("\n✅ El ejecutable está listo para usar y distribuir")
     else:
         print("\n❌ La construcción falló")
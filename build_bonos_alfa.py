@@ -11,6 +11,11 @@ import os
 from pathlib import Path
 import shutil
 
+from build_perfil import (NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones,
+                          formatear_lista_spec, ruta_ejecutable_onedir)
+
+NOMBRE_BONOS_ALFA = "bonosAlfa"
+
 def verificar_pyinstaller():
     """Verifica e instala PyInstaller si es necesario"""
     try:
@@ -28,19 +33,14 @@ def verificar_pyinstaller():
             return False
 
 def detectar_qt():
-    """Detecta el framework Qt disponible"""
+    """Verifica PySide6: el perfil de empaquetado (build_perfil) excluye los demás bindings"""
     try:
-        import PyQt6
-        print("✅ Detectado PyQt6")
-        return "PyQt6"
+        import PySide6
+        print("✅ Detectado PySide6")
+        return "PySide6"
     except ImportError:
-        try:
-            import PySide6
-            print("✅ Detectado PySide6")
-            return "PySide6"
-        except ImportError:
-            print("❌ No se encontró PyQt6 ni PySide6")
-            return None
+        print("❌ No se encontró PySide6")
+        return None
 
 def crear_spec_bonos_alfa():
     """Crea el archivo .spec personalizado para bonosAlfa"""
@@ -49,6 +49,7 @@ def crear_spec_bonos_alfa():
     if not qt_framework:
         return False
     
+    exclusiones = formatear_lista_spec(obtener_exclusiones() + ['django', 'flask'])
     spec_content = f'''# -*- mode: python ; coding: utf-8 -*-
 # Archivo de configuración para bonosAlfa
 
@@ -75,6 +76,7 @@ a = Analysis(
         'requests',
         'pandas',
         'openpyxl',
+        'xlrd',
         'xlsxwriter',
         'json',
         'csv',
@@ -88,45 +90,28 @@ a = Analysis(
     hooksconfig={{}},
     runtime_hooks=[],
     excludes=[
-        'matplotlib',
-        'scipy',
-        'numpy.distutils',
-        'tkinter',
-        'unittest',
-        'test',
-        'pydoc_data',
-        'PyQt5' if QT_FRAMEWORK != 'PyQt5' else '',
-        'PySide2' if QT_FRAMEWORK != 'PySide2' else '',
-        'PyQt6' if QT_FRAMEWORK != 'PyQt6' else '',
-        'PySide6' if QT_FRAMEWORK != 'PySide6' else '',
-        'nicegui',
-        'fastapi',
-        'uvicorn',
-        'django',
-        'flask',
+{exclusiones}
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize={NIVEL_OPTIMIZACION_BYTECODE},
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# Modo one-dir: los binarios quedan junto al ejecutable y no se extraen a un temporal
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='bonosAlfa',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -135,11 +120,22 @@ exe = EXE(
     entitlements_file=None,
 )
 
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,  # UPX obliga a descomprimir las librerías Qt en cada arranque
+    upx_exclude=[],
+    name='bonosAlfa',
+)
+
 # Para macOS, crear bundle .app
 import sys
 if sys.platform == 'darwin':
     app = BUNDLE(
-        exe,
+        coll,
         name='bonosAlfa.app',
         icon='assets/img/logo.png' if os.path.exists('assets/img/logo.png') else None,
         bundle_identifier='com.rinorisk.bonos.alfa',
@@ -199,29 +195,27 @@ def construir_bonos_alfa():
     try:
         resultado = subprocess.run(comando, check=True, capture_output=True, text=True)
         
-        # Verificar que se creó el ejecutable
+        # Verificar que se creó el ejecutable (modo one-dir)
+        ejecutable = Path(ruta_ejecutable_onedir(sistema, NOMBRE_BONOS_ALFA))
         if sistema == "Darwin":  # macOS
             ejecutable_app = Path("dist/bonosAlfa.app")
-            ejecutable_bin = Path("dist/bonosAlfa")
             
             if ejecutable_app.exists():
                 print(f"✅ ¡bonosAlfa.app creado exitosamente!")
                 print(f"📁 Ubicación: {ejecutable_app.absolute()}")
                 return True
-            elif ejecutable_bin.exists():
+            elif ejecutable.exists():
                 print(f"✅ ¡bonosAlfa creado exitosamente!")
-                print(f"📁 Ubicación: {ejecutable_bin.absolute()}")
+                print(f"📁 Ubicación: {ejecutable.absolute()}")
                 return True
         
         elif sistema == "Windows":
-            ejecutable = Path("dist/bonosAlfa.exe")
             if ejecutable.exists():
                 print(f"✅ ¡bonosAlfa.exe creado exitosamente!")
                 print(f"📁 Ubicación: {ejecutable.absolute()}")
                 return True
         
         else:  # Linux
-            ejecutable = Path("dist/bonosAlfa")
             if ejecutable.exists():
                 print(f"✅ ¡bonosAlfa creado exitosamente!")
                 print(f"📁 Ubicación: {ejecutable.absolute()}")
@@ -321,17 +315,17 @@ def mostrar_instrucciones_instalacion():
     
     elif sistema == "Windows":
         print("🪟 Windows:")
-        print("   1. Busca el archivo bonosAlfa.exe en la carpeta dist\\")
-        print("   2. Copia bonosAlfa.exe donde desees instalarlo")
+        print("   1. Busca la carpeta bonosAlfa en dist\\")
+        print("   2. Copia la carpeta completa donde desees instalarla (bonosAlfa.exe va junto a sus DLL)")
         print("   3. Crea un acceso directo en el Escritorio si quieres")
         print("   4. Ejecuta con doble clic")
     
     else:  # Linux
         print("🐧 Linux:")
-        print("   1. Busca el archivo bonosAlfa en la carpeta dist/")
-        print("   2. Copia a /usr/local/bin/ para instalación global:")
-        print("      sudo cp dist/bonosAlfa /usr/local/bin/")
-        print("   3. O ejecuta directamente: ./dist/bonosAlfa")
+        print("   1. Busca la carpeta bonosAlfa en dist/")
+        print("   2. Copia la carpeta a /opt/ para instalación global:")
+        print("      sudo cp -r dist/bonosAlfa /opt/ && sudo ln -sf /opt/bonosAlfa/bonosAlfa /usr/local/bin/bonosAlfa")
+        print("   3. O ejecuta directamente: ./dist/bonosAlfa/bonosAlfa")
     
     print("\n✅ El ejecutable incluye todas las dependencias necesarias")
     print("✅ No requiere instalación de Python en el sistema destino")
@@ -347,9 +341,7 @@ def main():
     
     # Verificar framework Qt
     if not detectar_qt():
-        print("❌ Instala PyQt6 o PySide6:")
-        print("   pip install PyQt6")
-        print("   o")
+        print("❌ Instala PySide6:")
         print("   pip install PySide6")
         sys.exit(1)
     
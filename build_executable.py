@@ -10,6 +10,13 @@ import platform
 import os
 from pathlib import Path
 
+from build_perfil import (NOMBRE_EJECUTABLE, NIVEL_OPTIMIZACION_BYTECODE,
+                          obtener_exclusiones, formatear_lista_spec,
+                          ruta_ejecutable_onedir)
+
+# Modo legado de un solo archivo: se extrae completo a un temporal en cada arranque
+MODO_ONEFILE = "--onefile" in sys.argv
+
 def install_pyinstaller():
     """Instala PyInstaller si no está disponible"""
     try:
@@ -27,16 +34,16 @@ def install_pyinstaller():
             return False
 
 def detect_qt_framework():
-    """Detecta qué framework Qt está disponible"""
+    """Detecta qué framework Qt está disponible (PySide6 primero, igual que main.py)"""
     try:
-        import PyQt6
-        print("✅ Detectado PyQt6")
-        return "PyQt6"
+        import PySide6
+        print("✅ Detectado PySide6")
+        return "PySide6"
     except ImportError:
         try:
-            import PySide6
-            print("✅ Detectado PySide6")
-            return "PySide6"
+            import PyQt6
+            print("✅ Detectado PyQt6")
+            return "PyQt6"
         except ImportError:
             print("❌ No se encontró PyQt6 ni PySide6")
             return None
@@ -73,12 +80,14 @@ def build_executable():
     # Comando base de PyInstaller
     comando = [
         "pyinstaller",
-        "--onefile",                           # Un solo archivo ejecutable
+        "--onefile" if MODO_ONEFILE else "--onedir",   # One-dir evita desempaquetar en cada arranque
         "--windowed",                          # Sin consola (GUI)
-        "--name=HerramientasBonos",            # Nombre del ejecutable
+        f"--name={NOMBRE_EJECUTABLE}",         # Nombre del ejecutable
+        f"--optimize={NIVEL_OPTIMIZACION_BYTECODE}",  # Bytecode congelado optimizado
         "--clean",                             # Limpiar cache anterior
         "--noconfirm",                         # No pedir confirmación
     ]
+    print(f"📦 Perfil de empaquetado: {'onefile' if MODO_ONEFILE else 'onedir'}")
     
     # Agregar datos
     comando.extend(data_files)
@@ -101,21 +110,11 @@ def build_executable():
     for import_name in hidden_imports:
         comando.extend(["--hidden-import", import_name])
     
-    # Excluir módulos innecesarios para reducir tamaño
-    exclude_modules = [
-        "matplotlib",
-        "scipy",
-        "numpy.distutils",
-        "tkinter",
-        "unittest",
-        "test",
-        "pydoc_data",
-        "PyQt5",
-        "PySide2",
-        "nicegui",  # Excluir NiceGUI explícitamente
-        "fastapi",
-        "uvicorn"
-    ]
+    # Excluir módulos innecesarios para reducir tamaño (incluye el binding Qt no usado)
+    exclude_modules = [m for m in obtener_exclusiones() if m != qt_framework]
+    otro_binding = "PyQt6" if qt_framework == "PySide6" else "PySide6"
+    if otro_binding not in exclude_modules:
+        exclude_modules.append(otro_binding)
     
     for module in exclude_modules:
         comando.extend(["--exclude-module", module])
@@ -149,17 +148,21 @@ def build_executable():
         resultado = subprocess.run(comando, check=True, capture_output=True, text=True)
         
         # Mostrar ubicación del ejecutable
-        if sistema == "Windows":
-            ejecutable = "dist/HerramientasBonos.exe"
+        if MODO_ONEFILE:
+            ejecutable = f"dist/{NOMBRE_EJECUTABLE}.exe" if sistema == "Windows" else f"dist/{NOMBRE_EJECUTABLE}"
         else:
-            ejecutable = "dist/HerramientasBonos"
+            ejecutable = ruta_ejecutable_onedir(sistema)
             
         if Path(ejecutable).exists():
             print(f"✅ ¡Ejecutable creado exitosamente!")
             print(f"📁 Ubicación: {os.path.abspath(ejecutable)}")
             
-            # Mostrar tamaño del archivo
-            size_mb = Path(ejecutable).stat().st_size / (1024 * 1024)
+            # Mostrar tamaño del archivo o de la carpeta completa
+            if MODO_ONEFILE:
+                size_mb = Path(ejecutable).stat().st_size / (1024 * 1024)
+            else:
+                carpeta = Path("dist") / (f"{NOMBRE_EJECUTABLE}.app" if sistema == "Darwin" else NOMBRE_EJECUTABLE)
+                size_mb = sum(f.stat().st_size for f in carpeta.rglob('*') if f.is_file()) / (1024 * 1024)
             print(f"📊 Tamaño: {size_mb:.1f} MB")
             
             return True
@@ -241,6 +244,7 @@ def test_dependencies():
 
 def create_spec_file():
     """Crea un archivo .spec personalizado para mayor control"""
+    exclusiones = formatear_lista_spec(obtener_exclusiones())
     spec_content = f'''# -*- mode: python ; coding: utf-8 -*-
 
 block_cipher = None
@@ -248,14 +252,10 @@ block_cipher = None
 # Detectar framework Qt
 qt_framework = None
 try:
-    import PyQt6
-    qt_framework = "PyQt6"
+    import PySide6
+    qt_framework = "PySide6"
 except ImportError:
-    try:
-        import PySide6
-        qt_framework = "PySide6"
-    except ImportError:
-        raise ImportError("No se encontró PyQt6 ni PySide6")
+    raise ImportError("El perfil one-dir empaqueta solo PySide6")
 
 print(f"Usando {{qt_framework}}")
 
@@ -284,41 +284,28 @@ a = Analysis(
     hooksconfig={{}},
     runtime_hooks=[],
     excludes=[
-        'matplotlib',
-        'scipy',
-        'numpy.distutils',
-        'tkinter',
-        'unittest',
-        'test',
-        'pydoc_data',
-        'PyQt5',
-        'PySide2',
-        'nicegui',
-        'fastapi',
-        'uvicorn',
+{exclusiones}
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize={NIVEL_OPTIMIZACION_BYTECODE},
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# Modo one-dir: los binarios van en COLLECT y no se extraen en cada arranque
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='HerramientasBonos',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,  # Sin ventana de consola
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -327,11 +314,22 @@ exe = EXE(
     entitlements_file=None,
 )
 
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,  # UPX obliga a descomprimir las DLL de Qt en cada arranque
+    upx_exclude=[],
+    name='HerramientasBonos',
+)
+
 # Para macOS, crear también el bundle .app
 import sys
 if sys.platform == 'darwin':
     app = BUNDLE(
-        exe,
+        coll,
         name='HerramientasBonos.app',
         icon=None,
         bundle_identifier='com.rinorisk.herramientasbonos',
@@ -10,6 +10,9 @@ import platform
 import os
 from pathlib import Path
 
+from build_perfil import (NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones,
+                          formatear_lista_spec)
+
 def install_dependencies():
     """Instala las dependencias necesarias"""
     print("🔧 Instalando dependencias...")
@@ -51,6 +54,7 @@ def install_dependencies():
 
 def create_spec_file():
     """Crea un archivo .spec optimizado para macOS"""
+    exclusiones = formatear_lista_spec(obtener_exclusiones())
     spec_content = '''# -*- mode: python ; coding: utf-8 -*-
 
 block_cipher = None
@@ -82,6 +86,7 @@ a = Analysis(
         'pandas.io.excel',
         'numpy',
         'openpyxl',
+        'xlrd',
         'xlsxwriter',
         'json',
         'csv',
@@ -99,24 +104,13 @@ a = Analysis(
     hooksconfig={},
     runtime_hooks=[],
     excludes=[
-        'PyQt6',
-        'PyQt5',
-        'PySide2',
-        'matplotlib',
-        'scipy',
-        'tkinter',
-        'unittest',
-        'test',
-        'pydoc_data',
-        'nicegui',
-        'fastapi',
-        'uvicorn',
-        'rapidfuzz',
+''' + exclusiones + '''
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=''' + str(NIVEL_OPTIMIZACION_BYTECODE) + ''',
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
@@ -130,7 +124,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -145,7 +139,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,  # UPX obliga a descomprimir las librerías Qt en cada arranque
     upx_exclude=[],
     name='HerramientasBonos',
 )
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Perfil de empaquetado compartido por los scripts de construcción
+Define el modo one-dir, las exclusiones de Qt/pandas y la medición de arranque
+"""
+
+import os
+
+# La app define la variable en tiempo de ejecución; se reexporta para build_all.py
+from medicion_arranque import VARIABLE_MEDICION_ARRANQUE
+
+# Nombre del ejecutable generado por todos los scripts
+NOMBRE_EJECUTABLE = "HerramientasBonos"
+
+# Nivel de optimización del bytecode congelado (1 = sin asserts; 2 rompe docstrings de pandas)
+NIVEL_OPTIMIZACION_BYTECODE = 1
+
+# Solo se empaqueta PySide6: requirements.txt trae también PyQt6 y duplicaba el bundle
+BINDINGS_QT_EXCLUIDOS = [
+    'PyQt6',
+    'PyQt5',
+    'PySide2',
+]
+
+# Módulos Qt que la aplicación nunca importa (solo QtCore, QtGui, QtWidgets y QtNetwork)
+MODULOS_QT_NO_USADOS = [
+    'PySide6.Qt3DAnimation',
+    'PySide6.Qt3DCore',
+    'PySide6.Qt3DExtras',
+    'PySide6.Qt3DInput',
+    'PySide6.Qt3DLogic',
+    'PySide6.Qt3DRender',
+    'PySide6.QtBluetooth',
+    'PySide6.QtCharts',
+    'PySide6.QtConcurrent',
+    'PySide6.QtDataVisualization',
+    'PySide6.QtDesigner',
+    'PySide6.QtGraphs',
+    'PySide6.QtHelp',
+    'PySide6.QtHttpServer',
+    'PySide6.QtLocation',
+    'PySide6.QtMultimedia',
+    'PySide6.QtMultimediaWidgets',
+    'PySide6.QtNfc',
+    'PySide6.QtOpenGLWidgets',
+    'PySide6.QtPdf',
+    'PySide6.QtPdfWidgets',
+    'PySide6.QtPositioning',
+    'PySide6.QtQml',
+    'PySide6.QtQuick',
+    'PySide6.QtQuick3D',
+    'PySide6.QtQuickControls2',
+    'PySide6.QtQuickWidgets',
+    'PySide6.QtRemoteObjects',
+    'PySide6.QtScxml',
+    'PySide6.QtSensors',
+    'PySide6.QtSerialBus',
+    'PySide6.QtSerialPort',
+    'PySide6.QtSpatialAudio',
+    'PySide6.QtSql',
+    'PySide6.QtStateMachine',
+    'PySide6.QtTest',
+    'PySide6.QtTextToSpeech',
+    'PySide6.QtUiTools',
+    'PySide6.QtWebChannel',
+    'PySide6.QtWebEngineCore',
+    'PySide6.QtWebEngineQuick',
+    'PySide6.QtWebEngineWidgets',
+    'PySide6.QtWebSockets',
+    'PySide6.QtXml',
+]
+
+# Submódulos de pandas/numpy y paquetes opcionales que el hook de pandas arrastra
+MODULOS_PANDAS_NO_USADOS = [
+    'pandas.tests',
+    'pandas.conftest',
+    'pandas.io.formats.style',
+    'pandas.io.clipboard',
+    'numpy.tests',
+    'numpy.f2py',
+    'numpy.distutils',
+    'pyarrow',
+    'sqlalchemy',
+    'tables',
+    'jinja2',
+    'IPython',
+    'pytest',
+]
+
+# Exclusiones genéricas que ya usaban los scripts de construcción
+MODULOS_GENERALES_EXCLUIDOS = [
+    'matplotlib',
+    'scipy',
+    'tkinter',
+    'unittest',
+    'test',
+    'pydoc_data',
+    'nicegui',
+    'fastapi',
+    'uvicorn',
+    'rapidfuzz',
+]
+
+def obtener_exclusiones():
+    """Retorna la lista completa de módulos a excluir del bundle"""
+    return (BINDINGS_QT_EXCLUIDOS + MODULOS_QT_NO_USADOS +
+            MODULOS_PANDAS_NO_USADOS + MODULOS_GENERALES_EXCLUIDOS)
+
+def formatear_lista_spec(modulos, sangria=8):
+    """Formatea una lista de módulos para insertarla en un archivo .spec"""
+    espacios = ' ' * sangria
+    return '\n'.join(f"{espacios}'{modulo}'," for modulo in modulos)
+
+def ruta_ejecutable_onedir(sistema, nombre=NOMBRE_EJECUTABLE):
+    """Retorna la ruta del ejecutable generado en modo one-dir según el sistema"""
+    if sistema == "Darwin":
+        return os.path.join("dist", f"{nombre}.app", "Contents", "MacOS", nombre)
+    if sistema == "Windows":
+        return os.path.join("dist", nombre, f"{nombre}.exe")
+    return os.path.join("dist", nombre, nombre)
@@ -10,6 +10,9 @@ import platform
 import os
 from pathlib import Path
 
+from build_perfil import (NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones,
+                          formatear_lista_spec, ruta_ejecutable_onedir)
+
 def install_dependencies():
     """Instala las dependencias necesarias"""
     print("[INSTALL] Instalando dependencias...")
@@ -78,6 +81,7 @@ def create_spec_file():
     
     # Crear la lista de datos como string
     datas_str = ',\n        '.join([f"('{file_path}', '{dest}')" for file_path, dest in datas_files])
+    exclusiones = formatear_lista_spec(obtener_exclusiones())
     
     spec_content = '''# -*- mode: python ; coding: utf-8 -*-
 
@@ -104,6 +108,7 @@ a = Analysis(
         'pandas.io.excel',
         'numpy',
         'openpyxl',
+        'xlrd',
         'xlsxwriter',
         'json',
         'csv',
@@ -127,42 +132,28 @@ a = Analysis(
     hooksconfig={},
     runtime_hooks=[],
     excludes=[
-        'PyQt6',
-        'PyQt5',
-        'PySide2',
-        'matplotlib',
-        'scipy',
-        'tkinter',
-        'unittest',
-        'test',
-        'pydoc_data',
-        'nicegui',
-        'fastapi',
-        'uvicorn',
-        'rapidfuzz',
+''' + exclusiones + '''
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=''' + str(NIVEL_OPTIMIZACION_BYTECODE) + ''',
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# Modo one-dir: los binarios quedan junto al .exe y no se extraen a un temporal
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='HerramientasBonos',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,  # Sin ventana de consola
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -170,6 +161,17 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,  # UPX obliga a descomprimir las DLL de Qt en cada arranque
+    upx_exclude=[],
+    name='HerramientasBonos',
+)
 '''
     
     with open("herramientas_bonos_windows.spec", "w", encoding="utf-8") as f:
@@ -201,14 +203,14 @@ def build_executable():
             "--noconfirm"
         ], check=True, capture_output=True, text=True)
         
-        # Verificar que se creó el .exe
-        exe_path = Path("dist/HerramientasBonos.exe")
+        # Verificar que se creó el .exe dentro de la carpeta one-dir
+        exe_path = Path(ruta_ejecutable_onedir("Windows"))
         if exe_path.exists():
             print(f"[OK] ¡Ejecutable creado exitosamente!")
             print(f"[INFO] Ubicación: {exe_path.absolute()}")
             
-            # Mostrar tamaño
-            size_mb = exe_path.stat().st_size / (1024 * 1024)
+            # Mostrar tamaño de la carpeta completa
+            size_mb = sum(f.stat().st_size for f in exe_path.parent.rglob('*') if f.is_file()) / (1024 * 1024)
             print(f"[INFO] Tamaño: {size_mb:.1f} MB")
             
             return True
@@ -245,9 +247,9 @@ def main():
     if build_executable():
         print("\n[SUCCESS] ¡Proceso completado exitosamente!")
         print("\n[INFO] Instrucciones:")
-        print("   • El ejecutable está en: dist/HerramientasBonos.exe")
+        print("   • El ejecutable está en: dist/HerramientasBonos/HerramientasBonos.exe")
         print("   • Puedes ejecutarlo haciendo doble clic")
-        print("   • Para distribuir, comparte el archivo .exe")
+        print("   • Para distribuir, comprime la carpeta dist/HerramientasBonos completa")
         print("   • No requiere instalación de Python en el sistema destino")
     else:
         print("\n[ERROR] El proceso falló")
@@ -11,6 +11,9 @@ import os
 from pathlib import Path
 import shutil
 
+from build_perfil import (NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones,
+                          formatear_lista_spec, ruta_ejecutable_onedir)
+
 def check_wine():
     """Verifica si Wine está instalado"""
     try:
@@ -81,7 +84,9 @@ def install_dependencies_wine():
         "requests",
         "pandas",
         "openpyxl",
-        "xlsxwriter"
+        "xlrd",
+        "xlsxwriter",
+        "keyring"
     ]
     
     for dep in dependencies:
@@ -104,6 +109,7 @@ def create_windows_spec():
     """Crea el archivo .spec para Windows"""
     print("📝 Creando archivo .spec para Windows...")
     
+    exclusiones = formatear_lista_spec(obtener_exclusiones())
     spec_content = '''# -*- mode: python ; coding: utf-8 -*-
 
 block_cipher = None
@@ -135,6 +141,7 @@ a = Analysis(
         'pandas.io.excel',
         'numpy',
         'openpyxl',
+        'xlrd',
         'xlsxwriter',
         'json',
         'csv',
@@ -158,42 +165,28 @@ a = Analysis(
     hooksconfig={},
     runtime_hooks=[],
     excludes=[
-        'PyQt6',
-        'PyQt5',
-        'PySide2',
-        'matplotlib',
-        'scipy',
-        'tkinter',
-        'unittest',
-        'test',
-        'pydoc_data',
-        'nicegui',
-        'fastapi',
-        'uvicorn',
-        'rapidfuzz',
+''' + exclusiones + '''
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=''' + str(NIVEL_OPTIMIZACION_BYTECODE) + ''',
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# Modo one-dir: los binarios quedan junto al .exe y no se extraen a un temporal
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='HerramientasBonos',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -201,6 +194,17 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,  # UPX obliga a descomprimir las DLL de Qt en cada arranque
+    upx_exclude=[],
+    name='HerramientasBonos',
+)
 '''
     
     with open("herramientas_bonos_windows_wine.spec", "w", encoding="utf-8") as f:
@@ -233,13 +237,13 @@ def build_windows_exe():
         ], check=True, timeout=1800)  # 30 minutos de timeout
         
         # Verificar que se creó el .exe
-        exe_path = Path("dist/HerramientasBonos.exe")
+        exe_path = Path(ruta_ejecutable_onedir("Windows"))
         if exe_path.exists():
             print(f"✅ ¡Ejecutable de Windows creado exitosamente!")
             print(f"📁 Ubicación: {exe_path.absolute()}")
             
-            # Mostrar tamaño
-            size_mb = exe_path.stat().st_size / (1024 * 1024)
+            # Mostrar tamaño de la carpeta completa (one-dir)
+            size_mb = sum(f.stat().st_size for f in exe_path.parent.rglob("*") if f.is_file()) / (1024 * 1024)
             print(f"📊 Tamaño: {size_mb:.1f} MB")
             
             return True
@@ -260,7 +264,7 @@ def test_windows_exe():
     """Prueba el ejecutable de Windows usando Wine"""
     print("🧪 Probando ejecutable de Windows...")
     
-    exe_path = Path("dist/HerramientasBonos.exe")
+    exe_path = Path(ruta_ejecutable_onedir("Windows"))
     if not exe_path.exists():
         print("❌ No se encontró el ejecutable para probar")
         return False
@@ -324,9 +328,9 @@ def main():
         test_windows_exe()
         
         print("\n📋 Instrucciones:")
-        print("   • El ejecutable está en: dist/HerramientasBonos.exe")
+        print(f"   • El ejecutable está en: {ruta_ejecutable_onedir('Windows')}")
         print("   • Es compatible con Windows 10/11")
-        print("   • Para distribuir, comparte el archivo .exe")
+        print("   • Para distribuir, comparte la carpeta dist/HerramientasBonos completa")
         print("   • No requiere Python en el sistema destino")
         print("\n💡 Consejo: Puedes probar el .exe en Wine antes de distribuirlo")
     else:
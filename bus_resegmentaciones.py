@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Bus de notificaciones de cambios en resegmentaciones
+La base de datos publica qué póliza cambió y cada vista actualiza solo esas filas
+"""
+
+import threading
+import weakref
+from typing import Callable, Dict
+
+# Acciones publicadas
+ACCION_GUARDADA = 'GUARDADA'
+ACCION_REVERTIDA = 'REVERTIDA'
+
+def evento_resegmentacion(accion: str, agente: str = '', subramo: str = '', num_poliza: str = '',
+                          pago_id: str = '', num_poliza_nuevo_negocio: str = '') -> Dict:
+    """Construye el evento con todo lo que sirve para ubicar las filas afectadas"""
+    return {
+        'accion': accion,
+        'agente': str(agente or ''),
+        'subramo': str(subramo or ''),
+        'num_poliza': str(num_poliza or ''),
+        'pago_id': str(pago_id or ''),
+        'num_poliza_nuevo_negocio': str(num_poliza_nuevo_negocio or ''),
+    }
+
+class BusResegmentaciones:
+    """Publicador/suscriptor simple, sin dependencia de Qt"""
+
+    def __init__(self):
+        self._suscriptores = []
+        self._lock = threading.Lock()
+
+    def suscribir(self, callback: Callable[[Dict], None]):
+        """
+        Registra un callback que recibe cada evento.
+        Los métodos se guardan con referencia débil para no mantener vivos widgets cerrados.
+        """
+        referencia = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else (lambda: callback)
+        with self._lock:
+            self._suscriptores.append(referencia)
+
+    def desuscribir(self, callback: Callable[[Dict], None]):
+        with self._lock:
+            self._suscriptores = [r for r in self._suscriptores if r() is not None and r() != callback]
+
+    def publicar(self, evento: Dict):
+        """Entrega el evento a los suscriptores vivos en el hilo que publica"""
+        with self._lock:
+            self._suscriptores = [r for r in self._suscriptores if r() is not None]
+            callbacks = [r() for r in self._suscriptores]
+
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(evento)
+            except Exception as e:
+                print(f"[BUS] ❌ Error notificando cambio de resegmentación: {e}")
+
+# Instancia global del bus
+bus_resegmentaciones = BusResegmentaciones()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Caché de archivos ADM ya leídos
+Cada archivo se identifica por el SHA-256 de su contenido, así que el mismo ADM con otro
+nombre (o en otra carpeta) reutiliza la lectura. Cada entrada es una carpeta con un .npy
+por columna (texto de ancho fijo); al pasar del límite de tamaño se eliminan las entradas
+usadas hace más tiempo.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+DIRECTORIO_CACHE = os.environ.get(
+    'BONOS_CACHE_ADM', os.path.join(os.path.expanduser("~"), ".herramientas_bonos", "cache_adm"))
+
+# Tamaño máximo de la caché; 0 la desactiva
+LIMITE_CACHE_MB = int(os.environ.get('BONOS_CACHE_ADM_MB', '1024'))
+
+# Cambiar si cambia la forma de leer los ADM: las entradas anteriores dejan de usarse
+VERSION_CACHE = 1
+
+ARCHIVO_META = "columnas.json"
+
+BLOQUE_HASH = 1024 * 1024
+
+def huella_archivo(ruta: str) -> str:
+    """SHA-256 del contenido del archivo"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE_HASH), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+class CacheADM:
+    """Lecturas de ADM por huella de contenido, con desalojo por uso menos reciente"""
+
+    def __init__(self, directorio: str = DIRECTORIO_CACHE, limite_mb: int = LIMITE_CACHE_MB):
+        self.directorio = directorio
+        self.limite_bytes = limite_mb * 1024 * 1024
+
+    @property
+    def activa(self) -> bool:
+        return self.limite_bytes > 0
+
+    def _entrada(self, huella: str) -> str:
+        return os.path.join(self.directorio, f"v{VERSION_CACHE}_{huella}")
+
+    def leer(self, huella: str) -> Optional[pd.DataFrame]:
+        """
+        DataFrame guardado para la huella, o None si no está en caché.
+        Los .npy se abren mapeados y las columnas que no son texto quedan sobre el mapeo sin
+        copiarse; las de texto (todas las de un ADM) se convierten a str de Python, que es lo
+        que espera el resto del código, leyendo directo del mapeo sin una copia intermedia.
+        """
+        if not self.activa:
+            return None
+        entrada = self._entrada(huella)
+        meta = os.path.join(entrada, ARCHIVO_META)
+        try:
+            with open(meta, 'r', encoding='utf-8') as archivo:
+                columnas = json.load(archivo)['columnas']
+            datos = {columna: np.load(os.path.join(entrada, f"c{i}.npy"), mmap_mode='r', allow_pickle=False)
+                     for i, columna in enumerate(columnas)}
+            # Marca de uso para el desalojo
+            os.utime(meta)
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.isdir(entrada):
+                print(f"[CACHE_ADM] ⚠️ Entrada dañada {huella[:12]}, se vuelve a leer: {e}")
+                shutil.rmtree(entrada, ignore_errors=True)
+            return None
+        return pd.DataFrame({columna: valores.astype(object) if valores.dtype.kind == 'U' else valores
+                             for columna, valores in datos.items()}, columns=columnas, copy=False)
+
+    def guardar(self, huella: str, df: pd.DataFrame) -> bool:
+        """Guarda el DataFrame (columnas de texto); retorna False si no se pudo"""
+        if not self.activa:
+            return False
+        entrada = self._entrada(huella)
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            # Se escribe en una carpeta temporal y se renombra: nunca queda una entrada a medias
+            temporal = tempfile.mkdtemp(prefix=".tmp_", dir=self.directorio)
+            for i, columna in enumerate(df.columns):
+                np.save(os.path.join(temporal, f"c{i}.npy"), df[columna].to_numpy(dtype=str), allow_pickle=False)
+            with open(os.path.join(temporal, ARCHIVO_META), 'w', encoding='utf-8') as archivo:
+                json.dump({'columnas': [str(c) for c in df.columns], 'filas': len(df)}, archivo, ensure_ascii=False)
+            try:
+                os.rename(temporal, entrada)
+            except OSError:
+                # Otro proceso guardó la misma huella primero
+                shutil.rmtree(temporal, ignore_errors=True)
+            return True
+        except OSError as e:
+            print(f"[CACHE_ADM] ⚠️ No se pudo guardar {huella[:12]}: {e}")
+            return False
+
+    def desalojar(self) -> int:
+        """Elimina las entradas menos usadas hasta quedar bajo el límite; retorna cuántas"""
+        if not os.path.isdir(self.directorio):
+            return 0
+        entradas = []
+        total = 0
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if not os.path.isdir(ruta):
+                continue
+            try:
+                tamano = sum(e.stat().st_size for e in os.scandir(ruta))
+                uso = os.path.getmtime(os.path.join(ruta, ARCHIVO_META))
+            except OSError:
+                # Temporal de una escritura en curso (reciente) o interrumpida
+                try:
+                    if nombre.startswith('.tmp_') and time.time() - os.path.getmtime(ruta) < 3600:
+                        continue
+                except OSError:
+                    continue
+                shutil.rmtree(ruta, ignore_errors=True)
+                continue
+            entradas.append((uso, tamano, ruta))
+            total += tamano
+
+        eliminadas = 0
+        for uso, tamano, ruta in sorted(entradas):
+            if total <= self.limite_bytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tamano
+            eliminadas += 1
+        if eliminadas:
+            print(f"[CACHE_ADM] {eliminadas} entrada(s) desalojadas; caché en {total / 1048576:.1f} MB")
+        return eliminadas
+
+# Instancia global de la caché
+cache_adm = CacheADM()
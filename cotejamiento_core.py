@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Núcleo del cotejamiento sin dependencias de Qt
+Login, consulta de periodo, aplanado de la tabla, anotación de resegmentaciones y exportación;
+lo usan tanto la interfaz como la línea de comandos (bonos_cli.py)
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from almacen_sqlite import UMBRAL_FILAS_SQLITE
+from datos_cotejamiento import IndicePagos, clave_fila, valor_numerico
+from exportador import exportar_filas
+from resiliencia_api import cliente_api
+
+URL_LOGIN = "https://condicionesrino.com/api/core/auth/login"
+URL_COMPARACION = "https://condicionesrino.com/api/comparacion-adm"
+URL_AJUSTE = "https://condicionesrino.com/api/ajuste-manual"
+
+# Ajustador por defecto cuando no hay usuario local
+AJUSTADOR_DEFECTO = 'desarrollo-general@rinorisk.com'
+
+# Columnas de la tabla de cotejamiento (Aclaración solo existe en la interfaz)
+COLUMNAS_TABLA = [
+    'Agente', 'Subramo', 'Núm. Póliza', 'Prima ADM', 'Total Prima',
+    'Cantidad Pagos', 'Detalles Pagos', 'Diferencia', 'Resegmentación', 'Aclaración'
+]
+
+# Formato del nombre de archivo ADM: pb_YYYY_MM_cca_xxxxx_DIR_xxxxx
+PATRON_ADM = re.compile(r'pb_(\d{4})_(\d{2})_cca_.*_DIR_.*')
+
+class ErrorAPI(Exception):
+    """Error de comunicación o respuesta inválida de la API (codigo: status HTTP si lo hubo)"""
+
+    def __init__(self, mensaje: str, codigo: Optional[int] = None):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+def iniciar_sesion(url: str, usuario: str, password: str, timeout: int = 10) -> Dict:
+    """Realiza login en la API y retorna la respuesta completa (incluye 'token')"""
+    response = cliente_api.peticion('login', 'POST', url, json={
+        'correo': usuario,
+        'password': password
+    }, timeout=timeout)
+
+    if response.status_code != 200:
+        raise ErrorAPI(f"Login falló: {response.status_code}", response.status_code)
+
+    result = response.json()
+    if not result.get('token'):
+        raise ErrorAPI("Token no encontrado en respuesta")
+    return result
+
+def consultar_periodo(url: str, token: str, periodo: str, timeout: int = 30) -> Dict:
+    """Obtiene la comparación ADM de un periodo 'YYYY-MM-01'"""
+    headers = {
+        'x-token': token,
+        'Content-Type': 'application/json'
+    }
+    response = cliente_api.peticion('comparacion-adm', 'GET', f"{url}?periodo[]={periodo}", headers=headers, timeout=timeout)
+
+    if response.status_code != 200:
+        raise ErrorAPI(f"Consulta falló: {response.status_code}", response.status_code)
+    return response.json()
+
+def peticion_ajuste(tipo: str, objetivo: str, fecha: str, motivo: str,
+                    ajustador: str = AJUSTADOR_DEFECTO) -> Tuple[str, Dict]:
+    """
+    URL y cuerpo del ajuste manual.
+    tipo 'PRIMA': objetivo es el pago_id; 'NUEVO_NEGOCIO': objetivo es el número de póliza.
+    """
+    if tipo == 'PRIMA':
+        return f"{URL_AJUSTE}/prima-pagada/{objetivo}", {
+            "ajuste": {
+                "fechaPago": fecha
+            },
+            "motivoAjuste": f"{motivo} - pagoId: {objetivo}",
+            "nombreAjustador": ajustador
+        }
+    if tipo == 'NUEVO_NEGOCIO':
+        return f"{URL_AJUSTE}/nuevo-negocio/{objetivo}", {
+            "ajuste": {
+                "fechaPrimerPago": fecha
+            },
+            "motivoAjuste": f"{motivo}",
+            "nombreAjustador": ajustador
+        }
+    raise ValueError(f"Tipo de ajuste no reconocido: {tipo}")
+
+def enviar_ajuste(url: str, cuerpo: Dict, token: str, clave_idempotencia: str = '', timeout: int = 30):
+    """POST de un ajuste manual; la clave de idempotencia viaja en el header Idempotency-Key"""
+    headers = {
+        'x-token': token,
+        'Content-Type': 'application/json'
+    }
+    if clave_idempotencia:
+        headers['Idempotency-Key'] = clave_idempotencia
+    return cliente_api.peticion('ajuste-manual', 'POST', url, headers=headers, json=cuerpo, timeout=timeout)
+
+def periodo_desde_adm(nombre_archivo: str) -> Tuple[Optional[str], Optional[str]]:
+    """Extrae (año, mes) del nombre de un archivo ADM; (None, None) si no tiene el formato esperado"""
+    match = PATRON_ADM.match(nombre_archivo)
+    if not match:
+        print(f"[DEBUG] Patrón no coincide para: {nombre_archivo}")
+        return None, None
+
+    year, month = match.group(1), match.group(2)
+    if not 1 <= int(month) <= 12:
+        print(f"[DEBUG] Mes inválido: {month}")
+        return None, None
+    return year, month
+
+def normalizar_periodo(periodo: str) -> str:
+    """Acepta 'YYYY-MM' o 'YYYY-MM-DD' y retorna 'YYYY-MM-01'"""
+    match = re.match(r'^(\d{4})-(\d{1,2})(?:-\d{1,2})?$', periodo.strip())
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"Periodo inválido: {periodo} (se espera YYYY-MM)")
+    return f"{match.group(1)}-{int(match.group(2)):02d}-01"
+
+def extraer_comparacion(data: Dict) -> Tuple[Dict, List[Dict]]:
+    """Retorna (resumenComparacion, detalleComparacion) de la respuesta de la API"""
+    data_list = data.get('data', [])
+    if not data_list:
+        raise ValueError("No se encontraron datos en la respuesta")
+    primer_registro = data_list[0]
+    return primer_registro.get('resumenComparacion', {}), primer_registro.get('detalleComparacion', [])
+
+# Campos de cada fila aplanada, en el orden de la respuesta de la API
+CAMPOS_FILA = ('agente', 'subramo', 'numPoliza', 'primaADM', 'totalPrima', 'cantidadPagos', 'detallePagos', 'diferencia')
+
+# Nombre en la tabla de cada campo de CAMPOS_FILA
+COLUMNA_DE_CAMPO = dict(zip(CAMPOS_FILA, ('Agente', 'Subramo', 'Núm. Póliza', 'Prima ADM', 'Total Prima',
+                                          'Cantidad Pagos', 'Detalles Pagos', 'Diferencia')))
+
+# Pólizas a partir de las cuales el formateo se reparte entre procesos
+UMBRAL_APLANADO_PARALELO = int(os.environ.get('BONOS_UMBRAL_APLANADO', '100000'))
+
+# Procesos para aplanar detalles grandes
+PROCESOS_APLANADO = int(os.environ.get('BONOS_PROCESOS_APLANADO', str(os.cpu_count() or 1)))
+
+# Fragmentos por proceso: más de uno equilibra agentes con carteras de tamaños muy distintos
+FRAGMENTOS_POR_PROCESO = 4
+
+def _reducir_agente(agente_item: Dict) -> Tuple:
+    """Solo los valores escalares que usa la tabla: (agente, [(subramo, [(póliza, ...)])])"""
+    subramos = []
+    for subramo_data in agente_item.get('subramos', []):
+        polizas = []
+        for poliza in subramo_data.get('polizas', []):
+            prima_proyectada = poliza.get('primaProyectada', {})
+            if isinstance(prima_proyectada, dict):
+                total_prima = prima_proyectada.get('totalPrima', 0)
+                cantidad_pagos = prima_proyectada.get('cantidadPagos', 0)
+                num_pagos = len(prima_proyectada.get('detallePagos', []))
+            else:
+                total_prima, cantidad_pagos, num_pagos = 0, 0, 0
+            polizas.append((poliza.get('numPoliza', 'N/A'), poliza.get('primaADM', 0), total_prima,
+                            cantidad_pagos, num_pagos, poliza.get('diferencia', 0)))
+        subramos.append((subramo_data.get('subramo', 'N/A'), polizas))
+    return agente_item.get('agente', 'N/A'), subramos
+
+def _aplanar_fragmento(agentes: List[Tuple]) -> Tuple[List[Tuple], np.ndarray]:
+    """
+    Formatea un fragmento de agentes reducidos (ver _reducir_agente).
+    Retorna una tupla por fila (valores en el orden de CAMPOS_FILA) y un arreglo con la
+    diferencia absoluta de cada fila para ordenar; sin las llaves de cada dict, el
+    resultado viaja entre procesos en una fracción del tamaño.
+    """
+    filas = []
+    orden = []
+
+    for agente_id, subramos in agentes:
+        for subramo_nombre, polizas in subramos:
+            for num_poliza, prima_adm, total_prima, cantidad_pagos, num_pagos, diferencia in polizas:
+                # Formatear valores
+                try:
+                    prima_adm_formatted = f"${float(prima_adm):,.2f}" if prima_adm != "N/A" and prima_adm is not None else "N/A"
+                except (ValueError, TypeError):
+                    prima_adm_formatted = "N/A"
+
+                try:
+                    total_prima_formatted = f"${float(total_prima):,.2f}" if total_prima else "$0.00"
+                except (ValueError, TypeError):
+                    total_prima_formatted = "$0.00"
+
+                try:
+                    diferencia_formatted = f"${float(diferencia):+,.2f}" if diferencia else "$0.00"
+                except (ValueError, TypeError):
+                    diferencia_formatted = "$0.00"
+
+                filas.append((agente_id, subramo_nombre, num_poliza, prima_adm_formatted, total_prima_formatted,
+                              cantidad_pagos, num_pagos, diferencia_formatted))  # num_pagos: número de detalles de pago
+                orden.append(abs(valor_numerico(diferencia_formatted) or 0.0))
+
+    return filas, np.array(orden, dtype=np.float64)
+
+def _fragmentar(agentes: List[Tuple], partes: int) -> List[List[Tuple]]:
+    """Corta la lista de agentes en tramos contiguos con un número parecido de pólizas"""
+    pesos = np.cumsum([sum(len(polizas) for _, polizas in subramos) for _, subramos in agentes])
+    if not len(pesos) or partes <= 1:
+        return [agentes]
+    cortes = np.searchsorted(pesos, pesos[-1] * np.arange(1, partes) / partes, side='right')
+    limites = [0] + sorted(set(int(c) for c in cortes if 0 < c < len(agentes))) + [len(agentes)]
+    return [agentes[a:b] for a, b in zip(limites, limites[1:])]
+
+def contar_polizas(detalle: List[Dict]) -> int:
+    return sum(len(subramo_data.get('polizas', [])) for agente_item in detalle
+               for subramo_data in agente_item.get('subramos', []))
+
+def _valores_detalle(detalle: List[Dict], procesos: int = 1,
+                     mientras: Optional[Callable[[], object]] = None) -> Tuple[List[Tuple], object]:
+    """
+    Filas aplanadas (tuplas en el orden de CAMPOS_FILA) de todo el detalle, ordenadas por
+    diferencia absoluta descendente.
+    Con procesos > 1 y al menos UMBRAL_APLANADO_PARALELO pólizas, los agentes se reparten
+    en fragmentos contiguos entre procesos. 'mientras' se ejecuta en este proceso mientras
+    los demás formatean; retorna (filas, resultado de mientras).
+    """
+    agentes = [_reducir_agente(agente_item) for agente_item in detalle]
+    extra = None
+
+    if procesos > 1 and contar_polizas(detalle) >= UMBRAL_APLANADO_PARALELO:
+        fragmentos = _fragmentar(agentes, procesos * FRAGMENTOS_POR_PROCESO)
+        with ProcessPoolExecutor(max_workers=min(procesos, len(fragmentos))) as executor:
+            futuros = [executor.submit(_aplanar_fragmento, fragmento) for fragmento in fragmentos]
+            del agentes
+            extra = mientras() if mientras else None
+            resultados = [futuro.result() for futuro in futuros]
+    else:
+        resultados = [_aplanar_fragmento(agentes)]
+        extra = mientras() if mientras else None
+
+    # Unir en el orden de los fragmentos: el orden estable conserva el de la API entre empates
+    filas = [fila for parcial, _ in resultados for fila in parcial]
+    orden = np.argsort(-np.concatenate([o for _, o in resultados]), kind='stable')
+    return [filas[i] for i in orden.tolist()], extra
+
+def aplanar_detalle(detalle: List[Dict], procesos: int = 1) -> List[Dict]:
+    """Aplana detalleComparacion a una fila por póliza, ordenada por diferencia absoluta"""
+    valores, _ = _valores_detalle(detalle, procesos)
+    return [dict(zip(CAMPOS_FILA, fila)) for fila in valores]
+
+def _filas_tabla(valores: List[Tuple]) -> List[Dict]:
+    # La columna Resegmentación se llena según la base de datos de resegmentaciones
+    nombres = [COLUMNA_DE_CAMPO[c] for c in CAMPOS_FILA] + ['Resegmentación']
+    return [dict(zip(nombres, fila + ('',))) for fila in valores]
+
+def filas_tabla(detalle: List[Dict], procesos: int = 1) -> List[Dict]:
+    """Filas con los nombres de columna de la tabla de cotejamiento"""
+    valores, _ = _valores_detalle(detalle, procesos)
+    return _filas_tabla(valores)
+
+def filas_e_indice(detalle: List[Dict], procesos: int = PROCESOS_APLANADO,
+                   indice: Optional[bool] = None) -> Tuple[List[Dict], Optional[IndicePagos]]:
+    """
+    Filas de la tabla e índice de pagos del detalle.
+    El índice guarda referencias a los pagos del detalle, así que se construye en este
+    proceso, en paralelo con el formateo de las filas en los demás.
+    Con indice=None solo se construye si las filas se quedan en memoria: arriba de
+    UMBRAL_FILAS_SQLITE la tabla lee los pagos del almacén y el índice sería descartado.
+    Sin índice se retorna None en su lugar.
+    """
+    if indice is None:
+        indice = contar_polizas(detalle) <= UMBRAL_FILAS_SQLITE
+    valores, indice_pagos = _valores_detalle(detalle, procesos, (lambda: IndicePagos(detalle)) if indice else None)
+    return _filas_tabla(valores), indice_pagos
+
+def _normalizar(texto) -> str:
+    return str(texto or '').strip().upper()
+
+class IndiceResegmentaciones:
+    """
+    Resegmentaciones activas indexadas en memoria con una sola lectura de la base de datos.
+    Aplica las mismas reglas que la verificación de la tabla: clave exacta (sin distinguir
+    mayúsculas/espacios), número de póliza o de nuevo negocio, y por último idPago.
+    """
+
+    def __init__(self, resegmentaciones: List[Dict]):
+        self.por_clave = {}
+        self.por_poliza = {}
+        self.por_pago = {}
+        for reseg in resegmentaciones:
+            if _normalizar(reseg.get('estado', 'ACTIVO')) != 'ACTIVO':
+                continue
+            clave = (_normalizar(reseg.get('agente')), _normalizar(reseg.get('subramo')), _normalizar(reseg.get('num_poliza')))
+            self.por_clave.setdefault(clave, reseg)
+            for poliza in (reseg.get('num_poliza'), reseg.get('num_poliza_nuevo_negocio')):
+                if _normalizar(poliza):
+                    self.por_poliza.setdefault(_normalizar(poliza), reseg)
+            if reseg.get('pago_id'):
+                self.por_pago.setdefault(str(reseg['pago_id']), reseg)
+
+    @classmethod
+    def desde_db(cls, db) -> 'IndiceResegmentaciones':
+        return cls(db.obtener_todas_resegmentaciones())
+
+    def buscar(self, agente: str, subramo: str, num_poliza: str, pagos: List[Dict]) -> Optional[Dict]:
+        reseg = self.por_clave.get((_normalizar(agente), _normalizar(subramo), _normalizar(num_poliza)))
+        if reseg:
+            return reseg
+        reseg = self.por_poliza.get(_normalizar(num_poliza))
+        if reseg:
+            return reseg
+        for pago in pagos:
+            reseg = self.por_pago.get(str(pago.get('idPago', '')))
+            if reseg:
+                return reseg
+        return None
+
+def texto_resegmentacion(reseg: Optional[Dict]) -> str:
+    """Valor de la columna Resegmentación para reportes"""
+    if not reseg:
+        return ''
+    return reseg.get('fecha_primer_pago') or 'Resegmentada'
+
+def anotar_resegmentaciones(filas: List[Dict], indice_pagos: IndicePagos, indice_reseg: IndiceResegmentaciones) -> int:
+    """Llena la columna Resegmentación de cada fila; retorna cuántas están resegmentadas"""
+    anotadas = 0
+    for row_data in filas:
+        agente, subramo, num_poliza = clave_fila(row_data)
+        reseg = indice_reseg.buscar(agente, subramo, num_poliza, indice_pagos.pagos_de(agente, subramo, num_poliza))
+        row_data['Resegmentación'] = texto_resegmentacion(reseg)
+        if reseg:
+            anotadas += 1
+    return anotadas
+
+def cotejar_periodo(periodo: str, salida: str, token: Optional[str] = None, data: Optional[Dict] = None,
+                    url: str = URL_COMPARACION, incluir_pagos: bool = False,
+                    db_path: str = "resegmentaciones.db",
+                    progreso: Optional[Callable[[str], None]] = None) -> Dict:
+    """
+    Pipeline completo de un periodo: consulta (o datos ya obtenidos), aplanado,
+    anotación de resegmentaciones y exportación. Retorna un resumen con tiempos por etapa.
+    """
+    from resegmentacion_db import ResegmentacionDB
+
+    avisar = progreso or (lambda mensaje: None)
+    tiempos = {}
+    periodo = normalizar_periodo(periodo)
+
+    inicio = time.perf_counter()
+    if data is None:
+        if not token:
+            raise ErrorAPI("Se requiere token para consultar la API")
+        avisar(f"Consultando {periodo}...")
+        data = consultar_periodo(url, token, periodo)
+    tiempos['consulta'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resumen, detalle = extraer_comparacion(data)
+    filas, indice_pagos = filas_e_indice(detalle, procesos=1, indice=True)
+    tiempos['aplanado'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resegmentadas = anotar_resegmentaciones(filas, indice_pagos, IndiceResegmentaciones.desde_db(ResegmentacionDB(db_path)))
+    tiempos['resegmentaciones'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    avisar(f"Exportando {len(filas):,} registros a {salida}...")
+    resultado = exportar_filas(salida, filas, COLUMNAS_TABLA, indice_pagos=indice_pagos, incluir_pagos=incluir_pagos)
+    tiempos['exportacion'] = time.perf_counter() - inicio
+
+    return {
+        'periodo': periodo,
+        'filas': len(filas),
+        'resegmentadas': resegmentadas,
+        'pagos': resultado['pagos'],
+        'archivos': resultado['archivos'],
+        'resumen': resumen,
+        'tiempos': tiempos,
+    }
@@ -149,6 +149,11 @@ cat > "bonosAlfa.spec" << EOF
 # -*- mode: python ; coding: utf-8 -*-
 # Configuración específica para bonosAlfa
 
+# Perfil de empaquetado compartido (one-dir, exclusiones de Qt/pandas): build_perfil.py
+import sys
+sys.path.insert(0, SPECPATH)
+from build_perfil import NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones
+
 block_cipher = None
 
 # Framework Qt detectado: $QT_FRAMEWORK
@@ -226,44 +231,27 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-         excludes=[
-         'tkinter',
-         'matplotlib',
-         'scipy',
-         'IPython',
-         'notebook',
-         'pytest',
-         'sphinx',
-         'django',
-         'flask',
-         'nicegui',
-         'fastapi',
-         'PyQt6',
-         'PyQt5',
-         'PySide2',
-     ],
+    excludes=obtener_exclusiones() + ['notebook', 'sphinx', 'django', 'flask'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=NIVEL_OPTIMIZACION_BYTECODE,
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# Modo one-dir: los binarios quedan junto al ejecutable y no se extraen a un temporal
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='$APP_NAME',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -272,9 +260,20 @@ exe = EXE(
     entitlements_file=None,
 )
 
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,  # UPX obliga a descomprimir las librerías Qt en cada arranque
+    upx_exclude=[],
+    name='$APP_NAME',
+)
+
 # Crear bundle .app para macOS
 app = BUNDLE(
-    exe,
+    coll,
     name='$APP_NAME.app',
     icon='assets/img/bonos_alfa.icns',
     bundle_identifier='com.rinorisk.bonos.alfa',
@@ -311,7 +310,7 @@ fi
 echo "✅ bonosAlfa.app construido exitosamente"
 
 # Verificar que el ejecutable binario también existe
-if [[ -f "dist/$APP_NAME" ]]; then
+if [[ -f "dist/$APP_NAME/$APP_NAME" ]]; then
     echo "✅ Ejecutable binario bonosAlfa también disponible"
 fi
 
@@ -368,9 +367,9 @@ if [[ -d "dist/$APP_NAME.app" ]]; then
     echo "📱 Aplicación macOS: dist/$APP_NAME.app ($APP_SIZE)"
 fi
 
-if [[ -f "dist/$APP_NAME" ]]; then
-    BIN_SIZE=$(du -h "dist/$APP_NAME" | cut -f1)
-    echo "⚙️ Ejecutable binario: dist/$APP_NAME ($BIN_SIZE)"
+if [[ -f "dist/$APP_NAME/$APP_NAME" ]]; then
+    BIN_SIZE=$(du -sh "dist/$APP_NAME" | cut -f1)
+    echo "⚙️ Ejecutable binario: dist/$APP_NAME/$APP_NAME ($BIN_SIZE)"
 fi
 
 echo ""
@@ -382,8 +381,8 @@ echo "   2. Arrastra bonosAlfa.app a Applications"
 echo "   3. Ejecuta desde Launchpad"
 echo ""
 echo "🔧 Para usar el ejecutable directo:"
-echo "   • Ejecuta: ./dist/$APP_NAME"
-echo "   • O copia a /usr/local/bin/ para acceso global"
+echo "   • Ejecuta: ./dist/$APP_NAME/$APP_NAME"
+echo "   • La carpeta dist/$APP_NAME se copia completa (el ejecutable va junto a sus librerías)"
 echo ""
 echo "✅ Dependencias incluidas:"
 echo "   • $QT_FRAMEWORK (UI framework)"
@@ -52,6 +52,10 @@ cat > "bonosAlfa_corregido.spec" << 'EOF'
 import sys
 import os
 
+# Perfil de empaquetado compartido (one-dir, exclusiones de Qt/pandas): build_perfil.py
+sys.path.insert(0, SPECPATH)
+from build_perfil import NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones
+
 block_cipher = None
 
 # Lista COMPLETA de imports ocultos para bonosAlfa
@@ -189,29 +193,12 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[
-        'tkinter',
-        'matplotlib',
-        'scipy',
-        'IPython',
-        'notebook',
-        'pytest',
-        'sphinx',
-        'django',
-        'flask',
-        'nicegui',
-        'fastapi',
-        'PyQt6',
-        'PyQt5',
-        'PySide2',
-        'test',
-        'unittest',
-        'distutils',
-    ],
+    excludes=obtener_exclusiones() + ['notebook', 'sphinx', 'django', 'flask', 'distutils'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=NIVEL_OPTIMIZACION_BYTECODE,
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
@@ -226,7 +213,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     console=False,  # Sin consola para GUI
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -242,7 +229,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,  # UPX obliga a descomprimir las librerías Qt en cada arranque
     upx_exclude=[],
     name='bonosAlfa',
 )
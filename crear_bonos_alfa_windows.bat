@@ -62,6 +62,13 @@ echo 🏗️ Creando configuración para Windows...
 echo # -*- mode: python ; coding: utf-8 -*-
 echo # Configuración para bonosAlfa Windows
 echo.
+echo import os
+echo import sys
+echo.
+echo # Perfil de empaquetado compartido ^(one-dir, exclusiones de Qt/pandas^): build_perfil.py
+echo sys.path.insert^(0, SPECPATH^)
+echo from build_perfil import NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones
+echo.
 echo block_cipher = None
 echo.
 echo # Lista completa de imports ocultos
@@ -121,17 +128,12 @@ echo     ],
 echo     hiddenimports=hidden_imports,
 echo     hookspath=[],
 echo     runtime_hooks=[],
-echo     excludes=[
-echo         'tkinter',
-echo         'matplotlib',
-echo         'PyQt6',
-echo         'PyQt5',
-echo         'PySide2',
-echo     ],
+echo     excludes=obtener_exclusiones^(^),
 echo     win_no_prefer_redirects=False,
 echo     win_private_assemblies=False,
 echo     cipher=block_cipher,
 echo     noarchive=False,
+echo     optimize=NIVEL_OPTIMIZACION_BYTECODE,
 echo ^)
 echo.
 echo pyz = PYZ^(a.pure, a.zipped_data, cipher=block_cipher^)
@@ -139,21 +141,28 @@ echo.
 echo exe = EXE^(
 echo     pyz,
 echo     a.scripts,
-echo     a.binaries,
-echo     a.zipfiles,
-echo     a.datas,
 echo     [],
+echo     exclude_binaries=True,
 echo     name='bonosAlfa',
 echo     debug=False,
 echo     bootloader_ignore_signals=False,
 echo     strip=False,
-echo     upx=True,
-echo     upx_exclude=[],
-echo     runtime_tmpdir=None,
+echo     upx=False,
 echo     console=False,
 echo     disable_windowed_traceback=False,
 echo     icon='assets\\img\\logo.ico' if os.path.exists^('assets\\img\\logo.ico'^) else None,
 echo ^)
+echo.
+echo # One-dir: sin descompresión a una carpeta temporal en cada arranque
+echo coll = COLLECT^(
+echo     exe,
+echo     a.binaries,
+echo     a.zipfiles,
+echo     a.datas,
+echo     strip=False,
+echo     upx=False,
+echo     name='bonosAlfa',
+echo ^)
 ) > bonosAlfa_windows.spec
 
 REM Construir el ejecutable
@@ -161,19 +170,19 @@ echo 🔨 Construyendo bonosAlfa.exe...
 pyinstaller --clean --noconfirm bonosAlfa_windows.spec
 
 REM Verificar resultado
-if exist "dist\bonosAlfa.exe" (
+if exist "dist\bonosAlfa\bonosAlfa.exe" (
     echo ✅ ¡bonosAlfa.exe creado exitosamente!
-    echo 📁 Ubicación: dist\bonosAlfa.exe
+    echo 📁 Ubicación: dist\bonosAlfa\bonosAlfa.exe
     
-    REM Mostrar tamaño
-    for %%I in ("dist\bonosAlfa.exe") do echo 📊 Tamaño: %%~zI bytes
+    REM Mostrar tamaño del ejecutable ^(las librerías van en la misma carpeta^)
+    for %%I in ("dist\bonosAlfa\bonosAlfa.exe") do echo 📊 Tamaño: %%~zI bytes
     
     echo.
     echo 📋 INSTRUCCIONES DE USO:
     echo ========================================
     echo 🪟 Para usar en Windows:
-    echo    1. Ejecuta dist\bonosAlfa.exe
-    echo    2. Copia el archivo donde desees
+    echo    1. Ejecuta dist\bonosAlfa\bonosAlfa.exe
+    echo    2. Copia la carpeta dist\bonosAlfa completa donde desees
     echo    3. Crea acceso directo si quieres
     echo.
     echo ✅ Dependencias incluidas:
@@ -66,6 +66,11 @@ $specContent = @"
 # Configuración para bonosAlfa Windows
 
 import os
+import sys
+
+# Perfil de empaquetado compartido (one-dir, exclusiones de Qt/pandas): build_perfil.py
+sys.path.insert(0, SPECPATH)
+from build_perfil import NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones
 
 block_cipher = None
 
@@ -173,23 +178,12 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[
-        'tkinter',
-        'matplotlib',
-        'scipy',
-        'IPython',
-        'notebook',
-        'pytest',
-        'PyQt6',
-        'PyQt5',
-        'PySide2',
-        'unittest',
-        'test',
-    ],
+    excludes=obtener_exclusiones() + ['notebook'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=NIVEL_OPTIMIZACION_BYTECODE,
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
@@ -197,17 +191,13 @@ pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='bonosAlfa',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -216,6 +206,17 @@ exe = EXE(
     entitlements_file=None,
     icon='assets/img/logo.ico' if os.path.exists('assets/img/logo.ico') else None,
 )
+
+# One-dir: sin descompresión a una carpeta temporal en cada arranque
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    name='bonosAlfa',
+)
 "@
 
 $specContent | Out-File -FilePath "bonosAlfa_windows.spec" -Encoding UTF8
@@ -225,11 +226,11 @@ Write-Host "🔨 Construyendo bonosAlfa.exe..." -ForegroundColor Yellow
 try {
     pyinstaller --clean --noconfirm "bonosAlfa_windows.spec"
     
-    if (Test-Path "dist\bonosAlfa.exe") {
+    if (Test-Path "dist\bonosAlfa\bonosAlfa.exe") {
         Write-Host "✅ ¡bonosAlfa.exe creado exitosamente!" -ForegroundColor Green
         
-        $exePath = Get-Item "dist\bonosAlfa.exe"
-        $sizeInMB = [math]::Round($exePath.Length / 1MB, 1)
+        $exePath = Get-Item "dist\bonosAlfa\bonosAlfa.exe"
+        $sizeInMB = [math]::Round((Get-ChildItem "dist\bonosAlfa" -Recurse -File | Measure-Object -Property Length -Sum).Sum / 1MB, 1)
         
         Write-Host "📁 Ubicación: $($exePath.FullName)" -ForegroundColor Cyan
         Write-Host "📊 Tamaño: $sizeInMB MB" -ForegroundColor Cyan
@@ -238,8 +239,8 @@ try {
         Write-Host "📋 INSTRUCCIONES DE USO:" -ForegroundColor Yellow
         Write-Host "========================================" -ForegroundColor Yellow
         Write-Host "🪟 Para usar en Windows:" -ForegroundColor White
-        Write-Host "   1. Ejecuta dist\bonosAlfa.exe" -ForegroundColor Gray
-        Write-Host "   2. Copia el archivo donde desees" -ForegroundColor Gray
+        Write-Host "   1. Ejecuta dist\bonosAlfa\bonosAlfa.exe" -ForegroundColor Gray
+        Write-Host "   2. Copia la carpeta dist\bonosAlfa completa donde desees" -ForegroundColor Gray
         Write-Host "   3. Crea acceso directo si quieres" -ForegroundColor Gray
         Write-Host ""
         Write-Host "✅ Dependencias incluidas:" -ForegroundColor Green
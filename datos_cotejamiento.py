@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Capa de datos del cotejamiento, independiente de Qt
+Índices sobre el detalle de la API para no recorrerlo completo en cada búsqueda
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Columnas que identifican una fila de la tabla de cotejamiento
+COLUMNAS_CLAVE = ('Agente', 'Subramo', 'Núm. Póliza')
+
+# Prefijo/sufijo para ordenar una columna numérica por valor absoluto, p. ej. "|Diferencia|"
+MARCA_ABSOLUTO = '|'
+
+# Rango de los valores vacíos o no numéricos: van al final en ambas direcciones
+RANGO_VACIO = -1
+
+def clave_fila(row_data: Dict) -> Tuple[str, str, str]:
+    """Retorna la clave (agente, subramo, núm. póliza) de una fila de la tabla"""
+    return (str(row_data.get('Agente', '')),
+            str(row_data.get('Subramo', '')),
+            str(row_data.get('Núm. Póliza', '')))
+
+def valor_numerico(valor) -> Optional[float]:
+    """Convierte textos de moneda como "$+1,234.50" a float; None si no es numérico"""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    try:
+        return float(str(valor).replace('$', '').replace(',', '').replace('+', ''))
+    except (ValueError, TypeError):
+        return None
+
+class SeleccionAclaracion:
+    """Filas marcadas para aclaración, guardadas por clave para que sobrevivan a paginación y filtros"""
+
+    def __init__(self):
+        self.claves = set()
+
+    def alternar(self, clave: Tuple[str, str, str], marcada: bool):
+        """Marca o desmarca una fila"""
+        if marcada:
+            self.claves.add(clave)
+        else:
+            self.claves.discard(clave)
+
+    def contiene(self, clave: Tuple[str, str, str]) -> bool:
+        return clave in self.claves
+
+    def seleccionar_filas(self, filas: Iterable[Dict], condicion: Optional[Callable[[Dict], bool]] = None) -> int:
+        """Marca las filas que cumplen la condición (todas si no hay condición); retorna cuántas se agregaron"""
+        antes = len(self.claves)
+        self.claves.update(clave_fila(row_data) for row_data in filas
+                           if condicion is None or condicion(row_data))
+        return len(self.claves) - antes
+
+    def conservar(self, filas: Iterable[Dict]):
+        """Descarta las claves que ya no existen en los datos cargados"""
+        self.claves.intersection_update(clave_fila(row_data) for row_data in filas)
+
+    def filas_seleccionadas(self, filas: Iterable[Dict]) -> List[Dict]:
+        """Retorna las filas marcadas respetando el orden recibido"""
+        return [row_data for row_data in filas if clave_fila(row_data) in self.claves]
+
+    def limpiar(self):
+        self.claves.clear()
+
+    def __len__(self):
+        return len(self.claves)
+
+def diferencia_mayor_a(limite: float) -> Callable[[Dict], bool]:
+    """Condición para filas cuya diferencia absoluta supera el límite"""
+    def condicion(row_data: Dict) -> bool:
+        diferencia = valor_numerico(row_data.get('Diferencia', ''))
+        return diferencia is not None and abs(diferencia) > limite
+    return condicion
+
+class IndicePagos:
+    """Índice de detallePagos por póliza y por idPago construido una sola vez por consulta"""
+
+    def __init__(self, detalle: Optional[List[Dict]] = None):
+        self.pagos_por_clave = {}   # (agente, subramo, numPoliza) -> detallePagos
+        self.clave_por_poliza = {}  # numPoliza -> primera clave encontrada
+        self.clave_por_pago = {}    # idPago -> (clave, pago)
+        if detalle:
+            self.construir(detalle)
+
+    def construir(self, detalle: List[Dict]):
+        """Recorre el detalle de la API una sola vez y llena los índices"""
+        self.pagos_por_clave.clear()
+        self.clave_por_poliza.clear()
+        self.clave_por_pago.clear()
+
+        for agente_item in detalle:
+            agente = str(agente_item.get('agente', ''))
+            for subramo_data in agente_item.get('subramos', []):
+                subramo = str(subramo_data.get('subramo', ''))
+                for poliza in subramo_data.get('polizas', []):
+                    num_poliza = str(poliza.get('numPoliza', ''))
+                    prima_proyectada = poliza.get('primaProyectada', {})
+                    pagos = prima_proyectada.get('detallePagos', []) if isinstance(prima_proyectada, dict) else []
+
+                    clave = (agente, subramo, num_poliza)
+                    self.pagos_por_clave[clave] = pagos
+                    self.clave_por_poliza.setdefault(num_poliza, clave)
+
+                    for pago in pagos:
+                        pago_id = pago.get('idPago', '')
+                        if pago_id:
+                            self.clave_por_pago.setdefault(str(pago_id), (clave, pago))
+
+    def pagos_de(self, agente: str, subramo: str, num_poliza: str) -> List[Dict]:
+        """Retorna los detalles de pagos de una póliza exacta"""
+        return self.pagos_por_clave.get((str(agente), str(subramo), str(num_poliza)), [])
+
+    def pagos_de_poliza(self, num_poliza: str) -> List[Dict]:
+        """Retorna los detalles de pagos de la primera póliza con ese número"""
+        clave = self.clave_por_poliza.get(str(num_poliza))
+        return self.pagos_por_clave.get(clave, []) if clave else []
+
+    def poliza_de_pago(self, pago_id: str) -> Optional[Dict]:
+        """Retorna la póliza que contiene un idPago"""
+        encontrado = self.clave_por_pago.get(str(pago_id))
+        if not encontrado:
+            return None
+        (agente, subramo, num_poliza), pago = encontrado
+        return {
+            'agente': agente,
+            'subramo': subramo,
+            'num_poliza': num_poliza,
+            'pago_details': pago
+        }
+
+    def __len__(self):
+        return len(self.pagos_por_clave)
+
+# Tipos de cambio entre dos consultas del mismo periodo
+CAMBIO_AGREGADA = 'agregada'
+CAMBIO_MODIFICADA = 'modificada'
+CAMBIO_ELIMINADA = 'eliminada'
+
+def _iterar_polizas(detalle: List[Dict]) -> Iterable[Tuple[Tuple[str, str, str], Dict]]:
+    """Recorre detalleComparacion entregando (clave, póliza)"""
+    for agente_item in detalle:
+        agente = str(agente_item.get('agente', ''))
+        for subramo_data in agente_item.get('subramos', []):
+            subramo = str(subramo_data.get('subramo', ''))
+            for poliza in subramo_data.get('polizas', []):
+                yield (agente, subramo, str(poliza.get('numPoliza', ''))), poliza
+
+def _valores_comparables(poliza: Dict) -> Dict:
+    """Campos de una póliza que se comparan entre consultas"""
+    prima_proyectada = poliza.get('primaProyectada', {})
+    if not isinstance(prima_proyectada, dict):
+        prima_proyectada = {}
+    return {
+        'primaADM': poliza.get('primaADM'),
+        'totalPrima': prima_proyectada.get('totalPrima'),
+        'cantidadPagos': prima_proyectada.get('cantidadPagos'),
+        'diferencia': poliza.get('diferencia'),
+    }
+
+def _ids_pagos(poliza: Dict) -> List[str]:
+    prima_proyectada = poliza.get('primaProyectada', {})
+    pagos = prima_proyectada.get('detallePagos', []) if isinstance(prima_proyectada, dict) else []
+    return [str(pago.get('idPago', '')) for pago in pagos or [] if pago.get('idPago', '')]
+
+class DiferenciasDetalle:
+    """Resultado de comparar dos detalleComparacion del mismo periodo"""
+
+    def __init__(self):
+        self.agregadas = {}    # clave -> póliza nueva
+        self.eliminadas = {}   # clave -> póliza anterior
+        self.modificadas = {}  # clave -> {'campos': {campo: (antes, después)}, 'pagos_nuevos': [...], 'pagos_eliminados': [...]}
+
+    def tipo_cambio(self, clave: Tuple[str, str, str]) -> Optional[str]:
+        if clave in self.modificadas:
+            return CAMBIO_MODIFICADA
+        if clave in self.agregadas:
+            return CAMBIO_AGREGADA
+        if clave in self.eliminadas:
+            return CAMBIO_ELIMINADA
+        return None
+
+    def cambios_por_clave(self) -> Dict[Tuple[str, str, str], str]:
+        """Clave -> tipo de cambio para las filas que siguen en la tabla (agregadas y modificadas)"""
+        cambios = {clave: CAMBIO_AGREGADA for clave in self.agregadas}
+        cambios.update((clave, CAMBIO_MODIFICADA) for clave in self.modificadas)
+        return cambios
+
+    def descripcion(self, clave: Tuple[str, str, str]) -> str:
+        """Texto breve del cambio de una fila, para tooltips"""
+        tipo = self.tipo_cambio(clave)
+        if tipo == CAMBIO_AGREGADA:
+            return "Póliza nueva en esta consulta"
+        if tipo == CAMBIO_ELIMINADA:
+            return "Póliza eliminada en esta consulta"
+        if tipo != CAMBIO_MODIFICADA:
+            return ""
+        cambio = self.modificadas[clave]
+        lineas = [f"{campo}: {antes} → {despues}" for campo, (antes, despues) in cambio['campos'].items()]
+        if cambio['pagos_nuevos']:
+            lineas.append(f"Pagos nuevos: {', '.join(cambio['pagos_nuevos'])}")
+        if cambio['pagos_eliminados']:
+            lineas.append(f"Pagos eliminados: {', '.join(cambio['pagos_eliminados'])}")
+        return "\n".join(lineas)
+
+    def __len__(self):
+        return len(self.agregadas) + len(self.eliminadas) + len(self.modificadas)
+
+def comparar_detalles(anterior: List[Dict], nuevo: List[Dict]) -> DiferenciasDetalle:
+    """
+    Compara dos consultas por clave (agente, subramo, numPoliza) en tiempo lineal:
+    un recorrido para indexar la anterior y otro para comparar la nueva contra ese índice
+    """
+    diferencias = DiferenciasDetalle()
+    previas = dict(_iterar_polizas(anterior))
+
+    for clave, poliza in _iterar_polizas(nuevo):
+        previa = previas.pop(clave, None)
+        if previa is None:
+            diferencias.agregadas[clave] = poliza
+            continue
+
+        antes = _valores_comparables(previa)
+        despues = _valores_comparables(poliza)
+        campos = {campo: (antes[campo], despues[campo]) for campo in antes
+                  if antes[campo] != despues[campo]}
+
+        ids_antes = _ids_pagos(previa)
+        ids_despues = _ids_pagos(poliza)
+        pagos_nuevos = pagos_eliminados = []
+        if ids_antes != ids_despues:
+            conjunto_antes = set(ids_antes)
+            conjunto_despues = set(ids_despues)
+            pagos_nuevos = [i for i in ids_despues if i not in conjunto_antes]
+            pagos_eliminados = [i for i in ids_antes if i not in conjunto_despues]
+
+        if campos or pagos_nuevos or pagos_eliminados:
+            diferencias.modificadas[clave] = {
+                'campos': campos,
+                'pagos_nuevos': pagos_nuevos,
+                'pagos_eliminados': pagos_eliminados
+            }
+
+    # Lo que quedó sin emparejar ya no viene en la consulta nueva
+    diferencias.eliminadas = previas
+    return diferencias
+
+class OrdenadorColumnas:
+    """
+    Ordenamiento multicolumna sobre los datos cargados.
+    Cada columna se convierte una sola vez a un arreglo de rangos enteros (numérico si tiene
+    algún valor numérico, texto por clave de comparación casefold en otro caso) y se cachea;
+    ordenar es componer esos rangos con np.lexsort, que es estable.
+    """
+
+    def __init__(self, filas: Optional[List[Dict]] = None):
+        self.filas = []
+        self.posiciones = {}  # id(fila) -> índice en self.filas
+        self.rangos = {}      # columna -> np.ndarray de rangos
+        self.criterios = []   # [(columna, descendente)] en orden de prioridad
+        if filas is not None:
+            self.cargar(filas)
+
+    def cargar(self, filas: List[Dict]):
+        """Registra el conjunto de datos e invalida los rangos cacheados"""
+        self.filas = filas
+        self.posiciones = {id(row_data): idx for idx, row_data in enumerate(filas)}
+        self.rangos.clear()
+
+    @staticmethod
+    def nombre_absoluto(columna: str) -> str:
+        return f"{MARCA_ABSOLUTO}{columna}{MARCA_ABSOLUTO}"
+
+    def _rangos_columna(self, columna: str) -> np.ndarray:
+        """Calcula (o reutiliza) los rangos densos de una columna"""
+        if columna in self.rangos:
+            return self.rangos[columna]
+
+        absoluto = columna.startswith(MARCA_ABSOLUTO) and columna.endswith(MARCA_ABSOLUTO) and len(columna) > 2
+        nombre = columna[1:-1] if absoluto else columna
+        valores = [row_data.get(nombre, '') for row_data in self.filas]
+
+        # Columna numérica si tiene algún valor numérico; vacíos y "N/A" quedan como NaN
+        numericos = [valor_numerico(v) if v not in ('', None) else None for v in valores]
+        arreglo = np.array([np.nan if v is None else v for v in numericos], dtype=np.float64)
+        vacios = np.isnan(arreglo)
+        if not vacios.all():
+            if absoluto:
+                arreglo = np.abs(arreglo)
+            _, rangos = np.unique(arreglo[~vacios], return_inverse=True)
+        else:
+            vacios = np.array([v in ('', None) for v in valores], dtype=bool)
+            arreglo = np.array([str(v).casefold() for v in valores], dtype=str)
+            _, rangos = np.unique(arreglo[~vacios], return_inverse=True)
+
+        completos = np.full(len(valores), RANGO_VACIO, dtype=np.int64)
+        completos[~vacios] = rangos.reshape(-1)
+        self.rangos[columna] = completos
+        return completos
+        return rangos
+
+    def establecer_criterio(self, columna: str, agregar: bool = False) -> List[Tuple[str, bool]]:
+        """
+        Define el criterio de orden al hacer clic en una columna.
+        Sin agregar: la columna pasa a ser el único criterio (alternando dirección si ya lo era).
+        Con agregar: se añade como criterio secundario o alterna su dirección si ya estaba.
+        """
+        existentes = {c: i for i, (c, _) in enumerate(self.criterios)}
+        if agregar:
+            if columna in existentes:
+                idx = existentes[columna]
+                self.criterios[idx] = (columna, not self.criterios[idx][1])
+            else:
+                self.criterios.append((columna, False))
+        else:
+            if len(self.criterios) == 1 and columna in existentes:
+                self.criterios = [(columna, not self.criterios[0][1])]
+            else:
+                self.criterios = [(columna, False)]
+        return self.criterios
+
+    def limpiar_criterios(self):
+        self.criterios = []
+
+    def ordenar(self, filas: List[Dict], criterios: Optional[List[Tuple[str, bool]]] = None) -> List[Dict]:
+        """Retorna las filas (subconjunto de las cargadas) ordenadas por los criterios"""
+        criterios = self.criterios if criterios is None else criterios
+        if not criterios or not filas:
+            return filas
+
+        indices = np.fromiter((self.posiciones[id(row_data)] for row_data in filas),
+                              dtype=np.int64, count=len(filas))
+
+        # np.lexsort usa la última llave como primaria; descendente = rango negado.
+        # Los vacíos toman una llave mayor que cualquier rango para quedar al final siempre
+        llaves = []
+        for columna, descendente in reversed(criterios):
+            rangos = self._rangos_columna(columna)[indices]
+            llave = -rangos if descendente else rangos.copy()
+            llave[rangos == RANGO_VACIO] = len(self.filas)
+            llaves.append(llave)
+        orden = np.lexsort(llaves)
+
+        return [self.filas[i] for i in indices[orden]]
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Exportador por bloques de la tabla de cotejamiento a CSV o XLSX
+Escribe fila por fila sin construir un DataFrame completo en memoria
+"""
+
+import csv
+import json
+import os
+from typing import Callable, Dict, List, Optional, Sequence
+
+from datos_cotejamiento import COLUMNAS_CLAVE, IndicePagos, clave_fila
+
+# Filas que se escriben entre cada reporte de progreso / revisión de cancelación
+TAMANO_BLOQUE = 1000
+
+# Columnas que son controles de la interfaz y no datos
+COLUMNAS_NO_EXPORTABLES = ('Aclaración',)
+
+class ExportacionCancelada(Exception):
+    """Se lanza cuando el usuario cancela la exportación en curso"""
+
+def columnas_exportables(columnas: List[str]) -> List[str]:
+    """Quita de la lista las columnas que solo existen en la interfaz"""
+    return [c for c in columnas if c not in COLUMNAS_NO_EXPORTABLES]
+
+def ruta_pagos_csv(ruta: str) -> str:
+    """Ruta del CSV complementario con el detalle de pagos"""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}_pagos{extension or '.csv'}"
+
+def _valor_celda(valor):
+    """Convierte valores anidados a texto para que quepan en una celda"""
+    if valor is None:
+        return ''
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+def _columnas_pagos(filas: Sequence[Dict], indice_pagos: IndicePagos) -> List[str]:
+    """Reúne los nombres de campo de detallePagos de las filas a exportar (solo nombres, sin copiar datos)"""
+    campos = {}
+    for row_data in filas:
+        for pago in indice_pagos.pagos_de(*clave_fila(row_data)):
+            for campo in pago.keys():
+                campos.setdefault(campo, None)
+    return list(COLUMNAS_CLAVE) + [c for c in campos if c not in COLUMNAS_CLAVE]
+
+def _iterar_bloques(filas: Sequence[Dict], tamano_bloque: int):
+    """Genera rebanadas consecutivas de la secuencia de filas"""
+    for inicio in range(0, len(filas), tamano_bloque):
+        yield filas[inicio:inicio + tamano_bloque]
+
+def exportar_filas(ruta: str, filas: Sequence[Dict], columnas: List[str],
+                   indice_pagos: Optional[IndicePagos] = None, incluir_pagos: bool = False,
+                   progreso: Optional[Callable[[int, int], None]] = None,
+                   cancelado: Optional[Callable[[], bool]] = None,
+                   tamano_bloque: int = TAMANO_BLOQUE) -> Dict:
+    """
+    Exporta las filas en el orden recibido al formato indicado por la extensión.
+    Retorna un resumen con el número de filas y pagos escritos y los archivos generados.
+    """
+    columnas = columnas_exportables(columnas)
+    incluir_pagos = bool(incluir_pagos and indice_pagos is not None)
+
+    es_xlsx = ruta.lower().endswith('.xlsx')
+    exportar = _exportar_xlsx if es_xlsx else _exportar_csv
+
+    try:
+        return exportar(ruta, filas, columnas, indice_pagos, incluir_pagos,
+                        progreso, cancelado, tamano_bloque)
+    except ExportacionCancelada:
+        # No dejar archivos a medias en disco
+        parciales = [ruta] if es_xlsx or not incluir_pagos else [ruta, ruta_pagos_csv(ruta)]
+        for parcial in parciales:
+            try:
+                os.remove(parcial)
+            except OSError:
+                pass
+        raise
+
+def _exportar_csv(ruta, filas, columnas, indice_pagos, incluir_pagos, progreso, cancelado, tamano_bloque):
+    """Escribe el CSV principal y, si se pide, un CSV de pagos en paralelo"""
+    total = len(filas)
+    escritas = 0
+    pagos_escritos = 0
+    archivos = [ruta]
+
+    columnas_pagos = _columnas_pagos(filas, indice_pagos) if incluir_pagos else []
+    campos_pago = columnas_pagos[len(COLUMNAS_CLAVE):]
+    archivo_pagos = open(ruta_pagos_csv(ruta), 'w', newline='', encoding='utf-8-sig') if incluir_pagos else None
+
+    try:
+        with open(ruta, 'w', newline='', encoding='utf-8-sig') as archivo:
+            writer = csv.writer(archivo)
+            writer.writerow(columnas)
+
+            writer_pagos = None
+            if archivo_pagos:
+                archivos.append(archivo_pagos.name)
+                writer_pagos = csv.writer(archivo_pagos)
+                writer_pagos.writerow(columnas_pagos)
+
+            for bloque in _iterar_bloques(filas, tamano_bloque):
+                if cancelado and cancelado():
+                    raise ExportacionCancelada()
+
+                writer.writerows([_valor_celda(row_data.get(c, '')) for c in columnas] for row_data in bloque)
+
+                if writer_pagos:
+                    for row_data in bloque:
+                        clave = clave_fila(row_data)
+                        for pago in indice_pagos.pagos_de(*clave):
+                            writer_pagos.writerow(list(clave) + [_valor_celda(pago.get(c, '')) for c in campos_pago])
+                            pagos_escritos += 1
+
+                escritas += len(bloque)
+                if progreso:
+                    progreso(escritas, total)
+    finally:
+        if archivo_pagos:
+            archivo_pagos.close()
+
+    return {'filas': escritas, 'pagos': pagos_escritos, 'archivos': archivos}
+
+def _exportar_xlsx(ruta, filas, columnas, indice_pagos, incluir_pagos, progreso, cancelado, tamano_bloque):
+    """Escribe el XLSX en modo constant_memory: cada fila se vuelca a disco al pasar a la siguiente"""
+    import xlsxwriter
+
+    total = len(filas)
+    escritas = 0
+    pagos_escritos = 0
+
+    workbook = xlsxwriter.Workbook(ruta, {'constant_memory': True})
+    try:
+        formato_header = workbook.add_format({'bold': True, 'bg_color': '#f3f4f6'})
+
+        hoja = workbook.add_worksheet('Cotejamiento')
+        hoja.write_row(0, 0, columnas, formato_header)
+
+        hoja_pagos = None
+        campos_pago = []
+        fila_pagos = 1
+        if incluir_pagos:
+            columnas_pagos = _columnas_pagos(filas, indice_pagos)
+            hoja_pagos = workbook.add_worksheet('Detalle Pagos')
+            hoja_pagos.write_row(0, 0, columnas_pagos, formato_header)
+            campos_pago = columnas_pagos[len(COLUMNAS_CLAVE):]
+
+        for bloque in _iterar_bloques(filas, tamano_bloque):
+            if cancelado and cancelado():
+                raise ExportacionCancelada()
+
+            for row_data in bloque:
+                escritas += 1
+                hoja.write_row(escritas, 0, [_valor_celda(row_data.get(c, '')) for c in columnas])
+
+                if hoja_pagos:
+                    clave = clave_fila(row_data)
+                    for pago in indice_pagos.pagos_de(*clave):
+                        hoja_pagos.write_row(fila_pagos, 0, list(clave) + [_valor_celda(pago.get(c, '')) for c in campos_pago])
+                        fila_pagos += 1
+                        pagos_escritos += 1
+
+            if progreso:
+                progreso(escritas, total)
+    finally:
+        workbook.close()
+
+    return {'filas': escritas, 'pagos': pagos_escritos, 'archivos': [ruta]}
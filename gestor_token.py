@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Gestor del token de la API
+Reutiliza al iniciar un token todavía vigente (según su claim 'exp'), lo renueva en segundo
+plano antes de que expire y reintenta una vez las peticiones que respondan 401
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from cotejamiento_core import ErrorAPI, iniciar_sesion
+
+try:
+    import keyring
+    KEYRING_DISPONIBLE = True
+except ImportError:
+    KEYRING_DISPONIBLE = False
+
+SERVICIO_KEYRING = "herramientas_bonos"
+CUENTA_KEYRING = "token_api"
+
+# Respaldo cuando no hay keyring del sistema: archivo solo legible por el usuario
+ARCHIVO_CACHE = os.path.join(os.path.expanduser("~"), ".herramientas_bonos", "token_api.json")
+
+# Segundos antes de 'exp' en que el token deja de considerarse vigente y se renueva
+MARGEN_RENOVACION = 300
+
+def decodificar_jwt(token: str) -> Dict:
+    """Decodifica el payload de un JWT sin verificar la firma"""
+    try:
+        # Los JWT tienen 3 partes separadas por puntos: header.payload.signature
+        parts = (token or '').split('.')
+        if len(parts) != 3:
+            return {}
+
+        # Agregar padding si es necesario
+        payload = parts[1]
+        padding = 4 - len(payload) % 4
+        if padding != 4:
+            payload += '=' * padding
+
+        return json.loads(base64.urlsafe_b64decode(payload).decode('utf-8'))
+
+    except Exception as e:
+        print(f"[DEBUG] Error decodificando JWT: {e}")
+        return {}
+
+def expiracion_token(token: str) -> Optional[float]:
+    """Timestamp de expiración del token; None si no trae claim 'exp'"""
+    exp = decodificar_jwt(token).get('exp')
+    try:
+        return float(exp) if exp is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def token_vigente(token: str, margen: float = MARGEN_RENOVACION) -> bool:
+    """El token existe y le quedan más de `margen` segundos de vida"""
+    exp = expiracion_token(token)
+    return bool(token) and exp is not None and exp - margen > time.time()
+
+class GestorToken:
+    """Token compartido por la interfaz y los workers, con caché persistente y renovación proactiva"""
+
+    def __init__(self, archivo_cache: str = ARCHIVO_CACHE, margen: float = MARGEN_RENOVACION):
+        self.archivo_cache = archivo_cache
+        self.margen = margen
+        self.url = ''
+        self.usuario = ''
+        self.password = ''
+        self.token = None
+        self.respuesta = {}
+        self._lock = threading.Lock()
+        self._temporizador = None
+        self._suscriptores = []
+
+    def configurar(self, url: str, usuario: str, password: str):
+        """Credenciales con las que se renueva el token"""
+        self.url = url
+        self.usuario = usuario
+        self.password = password
+
+    @property
+    def configurado(self) -> bool:
+        return bool(self.url and self.usuario and self.password)
+
+    def suscribir(self, callback: Callable[[Dict], None]):
+        """Registra un callback que recibe {'token', 'result'} cada vez que el token se renueva"""
+        self._suscriptores.append(callback)
+
+    # ------------------------------------------------------------------
+    # Caché persistente
+    # ------------------------------------------------------------------
+
+    def _leer_cache(self) -> Optional[str]:
+        if KEYRING_DISPONIBLE:
+            try:
+                return keyring.get_password(SERVICIO_KEYRING, CUENTA_KEYRING)
+            except Exception as e:
+                print(f"[TOKEN] ⚠️ Keyring no disponible, se usa archivo local: {e}")
+        try:
+            with open(self.archivo_cache, 'r', encoding='utf-8') as archivo:
+                return archivo.read()
+        except FileNotFoundError:
+            return None
+
+    def _escribir_cache(self, contenido: str):
+        if KEYRING_DISPONIBLE:
+            try:
+                keyring.set_password(SERVICIO_KEYRING, CUENTA_KEYRING, contenido)
+                return
+            except Exception as e:
+                print(f"[TOKEN] ⚠️ Keyring no disponible, se usa archivo local: {e}")
+        os.makedirs(os.path.dirname(self.archivo_cache), exist_ok=True)
+        # Crear con permisos 600 desde el inicio para no exponer el token
+        descriptor = os.open(self.archivo_cache, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+            archivo.write(contenido)
+
+    def guardar_cache(self) -> bool:
+        """Persiste el token actual junto con el usuario al que pertenece"""
+        try:
+            self._escribir_cache(json.dumps({
+                'usuario': self.usuario,
+                'url': self.url,
+                'token': self.token,
+                'result': self.respuesta,
+            }, ensure_ascii=False))
+            return True
+        except Exception as e:
+            print(f"[TOKEN] ❌ Error guardando token en caché: {e}")
+            return False
+
+    def cargar_cache(self) -> Optional[Dict]:
+        """
+        Retorna {'token', 'result'} si hay un token en caché del mismo usuario y todavía vigente.
+        Al aceptarlo programa su renovación.
+        """
+        try:
+            contenido = self._leer_cache()
+            if not contenido:
+                return None
+            datos = json.loads(contenido)
+        except Exception as e:
+            print(f"[TOKEN] ⚠️ Caché de token ilegible: {e}")
+            return None
+
+        if self.usuario and datos.get('usuario') != self.usuario:
+            print("[TOKEN] Token en caché pertenece a otro usuario, se ignora")
+            return None
+        if not token_vigente(datos.get('token'), self.margen):
+            print("[TOKEN] Token en caché expirado o sin 'exp'")
+            return None
+
+        with self._lock:
+            self.token = datos['token']
+            self.respuesta = datos.get('result', {})
+        self._programar_renovacion()
+        restante = int(expiracion_token(self.token) - time.time())
+        print(f"[TOKEN] ✅ Token reutilizado desde caché (expira en {restante // 60} min)")
+        return {'token': self.token, 'result': self.respuesta}
+
+    def limpiar_cache(self):
+        try:
+            if KEYRING_DISPONIBLE:
+                keyring.delete_password(SERVICIO_KEYRING, CUENTA_KEYRING)
+        except Exception:
+            pass
+        try:
+            os.remove(self.archivo_cache)
+        except FileNotFoundError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Login y renovación
+    # ------------------------------------------------------------------
+
+    def iniciar_sesion(self) -> Dict:
+        """Login completo; guarda el token, programa su renovación y notifica a los suscriptores"""
+        if not self.configurado:
+            raise ErrorAPI("Credenciales API no configuradas")
+
+        with self._lock:
+            result = iniciar_sesion(self.url, self.usuario, self.password)
+            self.token = result['token']
+            self.respuesta = result
+
+        self.guardar_cache()
+        self._programar_renovacion()
+        datos = {'token': self.token, 'result': self.respuesta}
+        for callback in list(self._suscriptores):
+            try:
+                callback(datos)
+            except Exception as e:
+                print(f"[TOKEN] ❌ Error notificando token renovado: {e}")
+        return datos
+
+    def obtener_token(self, forzar: bool = False) -> Optional[str]:
+        """Token vigente; hace login si no lo hay, si está por expirar o si se fuerza"""
+        if not forzar and token_vigente(self.token, self.margen):
+            return self.token
+        # Tokens sin 'exp' no se pueden evaluar: se usan hasta que la API responda 401
+        if not forzar and self.token and expiracion_token(self.token) is None:
+            return self.token
+        if not self.configurado:
+            return self.token
+        return self.iniciar_sesion()['token']
+
+    def _programar_renovacion(self):
+        """Programa un login en segundo plano `margen` segundos antes de 'exp'"""
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+        exp = expiracion_token(self.token)
+        if exp is None or not self.configurado:
+            return
+
+        # Mínimo 30s: evita renovar en bucle si la API emite tokens más cortos que el margen
+        espera = max(exp - self.margen - time.time(), 30)
+        self._temporizador = threading.Timer(espera, self._renovar)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+        print(f"[TOKEN] Renovación programada en {int(espera)}s")
+
+    def _renovar(self):
+        try:
+            self.iniciar_sesion()
+            print("[TOKEN] 🔄 Token renovado en segundo plano")
+        except Exception as e:
+            # Reintentar en un minuto; mientras tanto el 401 se cubre con ejecutar_con_reintento
+            print(f"[TOKEN] ❌ Error renovando token: {e}")
+            self._temporizador = threading.Timer(60, self._renovar)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def detener(self):
+        """Cancela la renovación programada (al cerrar la aplicación)"""
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def ejecutar_con_reintento(self, funcion: Callable[[str], object], token: Optional[str] = None):
+        """
+        Ejecuta funcion(token). Si responde 401 (status_code o ErrorAPI.codigo),
+        renueva el token y reintenta una sola vez con el nuevo.
+        """
+        # El gestor tiene el token más reciente; el recibido solo sirve si aún no hubo login aquí
+        token = self.token or token
+
+        try:
+            resultado = funcion(token)
+        except ErrorAPI as e:
+            if e.codigo != 401 or not self.configurado:
+                raise
+            return funcion(self._token_tras_401(token))
+
+        if getattr(resultado, 'status_code', None) == 401 and self.configurado:
+            return funcion(self._token_tras_401(token))
+        return resultado
+
+    def _token_tras_401(self, token_rechazado: str) -> str:
+        """Si otro hilo ya renovó el token se usa ese; si no, se fuerza el login"""
+        print("[TOKEN] 401 recibido, renovando token y reintentando...")
+        if self.token and self.token != token_rechazado:
+            return self.token
+        return self.obtener_token(forzar=True)
+
+# Instancia global del gestor de token
+gestor_token = GestorToken()
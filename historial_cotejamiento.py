@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Historial local de cotejamientos por periodo
+Cada consulta a la API se agrega a SQLite para poder comparar periodos sin volver a consultarla
+"""
+
+import sqlite3
+import json
+from datetime import datetime
+from typing import List, Dict, Optional, Iterator, Tuple
+
+from datos_cotejamiento import valor_numerico
+
+def indice_mes(periodo: str) -> int:
+    """Convierte 'YYYY-MM-DD' en un número de mes consecutivo (año * 12 + mes)"""
+    return int(periodo[:4]) * 12 + int(periodo[5:7])
+
+def _numero(valor) -> float:
+    numero = valor_numerico(valor)
+    return numero if numero is not None else 0.0
+
+def _filas_detalle(periodo: str, mes: int, detalle: List[Dict]) -> Iterator[Tuple]:
+    """Aplana detalleComparacion en filas (periodo, mes, agente, subramo, póliza, montos...)"""
+    for agente_item in detalle:
+        agente = str(agente_item.get('agente', ''))
+        for subramo_data in agente_item.get('subramos', []):
+            subramo = str(subramo_data.get('subramo', ''))
+            for poliza in subramo_data.get('polizas', []):
+                prima_proyectada = poliza.get('primaProyectada', {})
+                if not isinstance(prima_proyectada, dict):
+                    prima_proyectada = {}
+                yield (
+                    periodo, mes, agente, subramo, str(poliza.get('numPoliza', '')),
+                    _numero(poliza.get('primaADM', 0)),
+                    _numero(prima_proyectada.get('totalPrima', 0)),
+                    _numero(poliza.get('diferencia', 0)),
+                    int(_numero(prima_proyectada.get('cantidadPagos', 0))),
+                    len(prima_proyectada.get('detallePagos', []) or [])
+                )
+
+class HistorialCotejamiento:
+    """Almacén SQLite de resultados de cotejamiento por periodo, agente, subramo y póliza"""
+
+    def __init__(self, db_path: str = "historial_cotejamiento.db"):
+        """Inicializa la conexión a la base de datos"""
+        self.db_path = db_path
+        self.init_database()
+
+    def _conectar(self) -> sqlite3.Connection:
+        # Timeout amplio: el registro de un periodo puede estar escribiendo en otro hilo
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def init_database(self):
+        """Crea las tablas e índices del historial"""
+        try:
+            with self._conectar() as conn:
+                cursor = conn.cursor()
+
+                # Un registro por periodo consultado con el resumen de la API
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS periodos (
+                        periodo TEXT PRIMARY KEY,        -- 'YYYY-MM-01'
+                        mes INTEGER NOT NULL,            -- año * 12 + mes, para buscar meses consecutivos
+                        fecha_consulta DATETIME NOT NULL,
+                        cantidad_polizas INTEGER NOT NULL,
+                        resumen TEXT                     -- JSON de resumenComparacion
+                    )
+                ''')
+
+                # Una fila por póliza y periodo
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS polizas_periodo (
+                        periodo TEXT NOT NULL,
+                        mes INTEGER NOT NULL,
+                        agente TEXT NOT NULL,
+                        subramo TEXT NOT NULL,
+                        num_poliza TEXT NOT NULL,
+                        prima_adm REAL NOT NULL,
+                        total_prima REAL NOT NULL,
+                        diferencia REAL NOT NULL,
+                        cantidad_pagos INTEGER NOT NULL,
+                        detalle_pagos INTEGER NOT NULL,
+                        PRIMARY KEY (periodo, agente, subramo, num_poliza)
+                    ) WITHOUT ROWID
+                ''')
+
+                # Totales por agente y periodo, calculados al registrar el periodo
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS agentes_periodo (
+                        periodo TEXT NOT NULL,
+                        mes INTEGER NOT NULL,
+                        agente TEXT NOT NULL,
+                        polizas INTEGER NOT NULL,
+                        total_prima_adm REAL NOT NULL,
+                        total_prima_proyectada REAL NOT NULL,
+                        total_prima_diferencia REAL NOT NULL,
+                        PRIMARY KEY (agente, periodo)
+                    ) WITHOUT ROWID
+                ''')
+
+                # Historial de una póliza a través de los periodos
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_hist_poliza
+                    ON polizas_periodo(agente, subramo, num_poliza, mes)
+                ''')
+
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_hist_num_poliza
+                    ON polizas_periodo(num_poliza)
+                ''')
+
+                # Filtrar por diferencia sin recorrer toda la tabla
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_hist_diferencia
+                    ON polizas_periodo(ABS(diferencia))
+                ''')
+
+                conn.commit()
+                print("[DEBUG] Historial de cotejamiento inicializado correctamente")
+
+        except Exception as e:
+            print(f"[ERROR] Error inicializando historial de cotejamiento: {str(e)}")
+            raise
+
+    def registrar_periodo(self, periodo: str, resumen: Dict, detalle: List[Dict]) -> int:
+        """
+        Agrega (o reemplaza) un periodo completo en una sola transacción
+
+        Returns:
+            int: número de pólizas registradas, -1 si hubo error
+        """
+        try:
+            mes = indice_mes(periodo)
+            with self._conectar() as conn:
+                cursor = conn.cursor()
+
+                # Volver a consultar un periodo reemplaza sus datos anteriores
+                cursor.execute('DELETE FROM polizas_periodo WHERE periodo = ?', (periodo,))
+                cursor.execute('DELETE FROM agentes_periodo WHERE periodo = ?', (periodo,))
+
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO polizas_periodo
+                    (periodo, mes, agente, subramo, num_poliza, prima_adm, total_prima,
+                     diferencia, cantidad_pagos, detalle_pagos)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', _filas_detalle(periodo, mes, detalle))
+
+                cursor.execute('''
+                    INSERT INTO agentes_periodo
+                    (periodo, mes, agente, polizas, total_prima_adm, total_prima_proyectada, total_prima_diferencia)
+                    SELECT periodo, mes, agente, COUNT(*), SUM(prima_adm), SUM(total_prima), SUM(diferencia)
+                    FROM polizas_periodo
+                    WHERE periodo = ?
+                    GROUP BY agente
+                ''', (periodo,))
+
+                cursor.execute('SELECT COUNT(*) FROM polizas_periodo WHERE periodo = ?', (periodo,))
+                cantidad = cursor.fetchone()[0]
+
+                cursor.execute('''
+                    INSERT OR REPLACE INTO periodos (periodo, mes, fecha_consulta, cantidad_polizas, resumen)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (periodo, mes, datetime.now().isoformat(), cantidad, json.dumps(resumen or {})))
+
+                conn.commit()
+                print(f"[DEBUG] Periodo {periodo} registrado en historial: {cantidad} pólizas")
+                return cantidad
+
+        except Exception as e:
+            print(f"[ERROR] Error registrando periodo {periodo} en historial: {str(e)}")
+            return -1
+
+    def obtener_periodos(self) -> List[Dict]:
+        """Lista los periodos registrados, del más reciente al más antiguo"""
+        try:
+            with self._conectar() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT periodo, fecha_consulta, cantidad_polizas, resumen
+                    FROM periodos
+                    ORDER BY mes DESC
+                ''')
+                periodos = []
+                for row in cursor.fetchall():
+                    periodo = dict(row)
+                    periodo['resumen'] = json.loads(periodo['resumen'] or '{}')
+                    periodos.append(periodo)
+                return periodos
+
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo periodos del historial: {str(e)}")
+            return []
+
+    def polizas_diferencia_consecutiva(self, limite: float = 50.0, meses: int = 3) -> List[Dict]:
+        """
+        Pólizas con |diferencia| > limite durante al menos `meses` periodos consecutivos
+
+        Returns:
+            Lista de rachas con agente, subramo, num_poliza, periodo inicial/final,
+            número de meses y diferencia acumulada
+        """
+        try:
+            with self._conectar() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+
+                # Islas de meses consecutivos: mes - ROW_NUMBER() es constante dentro de cada racha
+                cursor.execute('''
+                    WITH excedidas AS (
+                        SELECT agente, subramo, num_poliza, periodo, mes, diferencia,
+                               mes - ROW_NUMBER() OVER (
+                                   PARTITION BY agente, subramo, num_poliza ORDER BY mes
+                               ) AS racha
+                        FROM polizas_periodo
+                        WHERE ABS(diferencia) > ?
+                    )
+                    SELECT agente, subramo, num_poliza,
+                           MIN(periodo) AS periodo_inicio,
+                           MAX(periodo) AS periodo_fin,
+                           COUNT(*) AS meses,
+                           SUM(diferencia) AS diferencia_acumulada
+                    FROM excedidas
+                    GROUP BY agente, subramo, num_poliza, racha
+                    HAVING COUNT(*) >= ?
+                    ORDER BY meses DESC, ABS(diferencia_acumulada) DESC
+                ''', (limite, meses))
+
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"[ERROR] Error consultando diferencias consecutivas: {str(e)}")
+            return []
+
+    def tendencia_agente(self, agente: str) -> List[Dict]:
+        """Totales de un agente por periodo (incluye totalPrimaDiferencia), en orden cronológico"""
+        try:
+            with self._conectar() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT periodo, polizas, total_prima_adm, total_prima_proyectada, total_prima_diferencia
+                    FROM agentes_periodo
+                    WHERE agente = ?
+                    ORDER BY mes
+                ''', (str(agente),))
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo tendencia del agente {agente}: {str(e)}")
+            return []
+
+    def historial_poliza(self, num_poliza: str, agente: Optional[str] = None,
+                         subramo: Optional[str] = None) -> List[Dict]:
+        """Valores de una póliza en cada periodo registrado"""
+        try:
+            with self._conectar() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+
+                if agente is not None and subramo is not None:
+                    cursor.execute('''
+                        SELECT * FROM polizas_periodo
+                        WHERE agente = ? AND subramo = ? AND num_poliza = ?
+                        ORDER BY mes
+                    ''', (str(agente), str(subramo), str(num_poliza)))
+                else:
+                    cursor.execute('''
+                        SELECT * FROM polizas_periodo
+                        WHERE num_poliza = ?
+                        ORDER BY mes, agente, subramo
+                    ''', (str(num_poliza),))
+
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo historial de la póliza {num_poliza}: {str(e)}")
+            return []
+
+    def eliminar_periodo(self, periodo: str) -> bool:
+        """Elimina un periodo completo del historial"""
+        try:
+            with self._conectar() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM polizas_periodo WHERE periodo = ?', (periodo,))
+                cursor.execute('DELETE FROM agentes_periodo WHERE periodo = ?', (periodo,))
+                cursor.execute('DELETE FROM periodos WHERE periodo = ?', (periodo,))
+                conn.commit()
+                return cursor.rowcount > 0
+
+        except Exception as e:
+            print(f"[ERROR] Error eliminando periodo {periodo}: {str(e)}")
+            return False
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Vista de historial de resegmentaciones
+Listado paginado con filtros por tipo, estado, usuario y fechas, buscador de texto completo
+(motivo, usuario y respuesta de la API) con resultados por relevancia, reversión masiva y,
+para la resegmentación seleccionada, su historial de eventos
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
+                                 QTableWidget, QTableWidgetItem, QHeaderView, QSplitter,
+                                 QGroupBox, QAbstractItemView, QComboBox, QCheckBox,
+                                 QDateEdit, QPushButton, QMessageBox)
+    from PySide6.QtCore import Qt, Signal as pyqtSignal, QTimer, QDate
+except ImportError:
+    try:
+        from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
+                                   QTableWidget, QTableWidgetItem, QHeaderView, QSplitter,
+                                   QGroupBox, QAbstractItemView, QComboBox, QCheckBox,
+                                   QDateEdit, QPushButton, QMessageBox)
+        from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QDate
+    except ImportError:
+        print("❌ Error: No se encontró PyQt6 ni PySide6")
+        exit(1)
+
+from resegmentacion_db import ResegmentacionDB
+from resegmentacion_details_dialog import ResegmentacionDetailsDialog
+from bus_resegmentaciones import bus_resegmentaciones
+
+# Espera tras la última tecla antes de buscar (ms)
+ESPERA_BUSQUEDA_MS = 250
+
+# Filas por página del listado
+FILAS_POR_PAGINA = 100
+
+# (encabezado, campo) de la tabla de resultados
+COLUMNAS_RESULTADOS = [
+    ("Fecha", 'fecha_resegmentacion'),
+    ("Tipo", 'tipo_resegmentacion'),
+    ("Agente", 'agente'),
+    ("Subramo", 'subramo'),
+    ("Póliza", 'num_poliza'),
+    ("Estado", 'estado'),
+    ("Usuario", 'usuario_responsable'),
+    ("Motivo", 'motivo_resegmentacion'),
+    ("Coincidencia", 'coincidencia'),
+]
+
+COLUMNAS_EVENTOS = ["Fecha", "Acción", "Tipo", "Usuario", "Motivo"]
+
+class HistorialResegmentacionesWidget(QWidget):
+    """Buscador de resegmentaciones y sus eventos (aplicaciones y reversiones)"""
+    resegmentacion_cambiada = pyqtSignal(dict)
+
+    def __init__(self, db: Optional[ResegmentacionDB] = None, parent=None):
+        super().__init__(parent)
+        self.db = db or ResegmentacionDB()
+        self.resultados: List[Dict] = []
+        self.usuario_local = None
+        # Paginación por llave: (fecha, id) con que empieza cada página visitada; None = primera
+        self.inicios_pagina: List[Optional[Tuple[str, int]]] = [None]
+        self.hay_siguiente = False
+
+        # Buscar al dejar de escribir, no en cada tecla
+        self.temporizador_busqueda = QTimer(self)
+        self.temporizador_busqueda.setSingleShot(True)
+        self.temporizador_busqueda.setInterval(ESPERA_BUSQUEDA_MS)
+        self.temporizador_busqueda.timeout.connect(self.buscar)
+
+        # Recargar la página actual cuando cambian resegmentaciones (sin volver a la primera)
+        self.temporizador_recarga = QTimer(self)
+        self.temporizador_recarga.setSingleShot(True)
+        self.temporizador_recarga.setInterval(ESPERA_BUSQUEDA_MS)
+        self.temporizador_recarga.timeout.connect(self.cargar_pagina)
+
+        self.setup_ui()
+
+        # Los cambios pueden publicarse desde un worker: pasar por una señal al hilo de la interfaz.
+        # Una reversión masiva publica un evento por registro: se recarga una sola vez al final
+        self.resegmentacion_cambiada.connect(lambda evento: self.temporizador_recarga.start())
+        bus_resegmentaciones.suscribir(self.on_evento_resegmentacion)
+
+        self.buscar()
+
+    def setup_ui(self):
+        """Configura la interfaz de la vista"""
+        layout = QVBoxLayout()
+
+        # Buscador
+        busqueda_layout = QHBoxLayout()
+        busqueda_layout.addWidget(QLabel("🔍 Buscar:"))
+        self.busqueda_input = QLineEdit()
+        self.busqueda_input.setPlaceholderText("Motivo, usuario o texto de la respuesta de la API...")
+        self.busqueda_input.setClearButtonEnabled(True)
+        self.busqueda_input.textChanged.connect(lambda _: self.temporizador_busqueda.start())
+        self.busqueda_input.returnPressed.connect(self.buscar)
+        busqueda_layout.addWidget(self.busqueda_input)
+        layout.addLayout(busqueda_layout)
+
+        # Filtros
+        filtros_layout = QHBoxLayout()
+        filtros_layout.addWidget(QLabel("Tipo:"))
+        self.tipo_combo = QComboBox()
+        self.tipo_combo.addItem("Todos", '')
+        self.tipo_combo.addItem("Prima", 'PRIMA')
+        self.tipo_combo.addItem("Nuevo negocio", 'NUEVO_NEGOCIO')
+        self.tipo_combo.currentIndexChanged.connect(lambda _: self.buscar())
+        filtros_layout.addWidget(self.tipo_combo)
+
+        filtros_layout.addWidget(QLabel("Estado:"))
+        self.estado_combo = QComboBox()
+        self.estado_combo.addItem("Todos", '')
+        self.estado_combo.addItem("Activo", 'ACTIVO')
+        self.estado_combo.addItem("Revertido", 'REVERTIDO')
+        self.estado_combo.currentIndexChanged.connect(lambda _: self.buscar())
+        filtros_layout.addWidget(self.estado_combo)
+
+        filtros_layout.addWidget(QLabel("Usuario:"))
+        self.usuario_input = QLineEdit()
+        self.usuario_input.setPlaceholderText("correo...")
+        self.usuario_input.textChanged.connect(lambda _: self.temporizador_busqueda.start())
+        filtros_layout.addWidget(self.usuario_input)
+
+        self.fechas_check = QCheckBox("Desde")
+        self.fechas_check.toggled.connect(lambda _: self.buscar())
+        filtros_layout.addWidget(self.fechas_check)
+        self.desde_input = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.desde_input.setCalendarPopup(True)
+        self.desde_input.setDisplayFormat("yyyy-MM-dd")
+        self.desde_input.dateChanged.connect(lambda _: self.fechas_check.isChecked() and self.buscar())
+        filtros_layout.addWidget(self.desde_input)
+        filtros_layout.addWidget(QLabel("hasta"))
+        self.hasta_input = QDateEdit(QDate.currentDate())
+        self.hasta_input.setCalendarPopup(True)
+        self.hasta_input.setDisplayFormat("yyyy-MM-dd")
+        self.hasta_input.dateChanged.connect(lambda _: self.fechas_check.isChecked() and self.buscar())
+        filtros_layout.addWidget(self.hasta_input)
+        filtros_layout.addStretch()
+        layout.addLayout(filtros_layout)
+
+        self.info_label = QLabel("")
+        self.info_label.setStyleSheet("color: #6b7280; font-style: italic;")
+        layout.addWidget(self.info_label)
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+
+        # Resultados
+        self.resultados_table = QTableWidget(0, len(COLUMNAS_RESULTADOS))
+        self.resultados_table.setHorizontalHeaderLabels([encabezado for encabezado, _ in COLUMNAS_RESULTADOS])
+        self.resultados_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.resultados_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.resultados_table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.resultados_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.resultados_table.horizontalHeader().setStretchLastSection(True)
+        self.resultados_table.itemSelectionChanged.connect(self.mostrar_eventos)
+        self.resultados_table.cellDoubleClicked.connect(self.abrir_detalle)
+
+        resultados_widget = QWidget()
+        resultados_layout = QVBoxLayout(resultados_widget)
+        resultados_layout.setContentsMargins(0, 0, 0, 0)
+        resultados_layout.addWidget(self.resultados_table)
+
+        # Paginación y acciones
+        acciones_layout = QHBoxLayout()
+        self.anterior_btn = QPushButton("⬅️ Anterior")
+        self.anterior_btn.clicked.connect(self.pagina_anterior)
+        self.siguiente_btn = QPushButton("Siguiente ➡️")
+        self.siguiente_btn.clicked.connect(self.pagina_siguiente)
+        self.pagina_label = QLabel("")
+        self.revertir_btn = QPushButton("🔄 Revertir seleccionadas")
+        self.revertir_btn.clicked.connect(self.revertir_seleccionadas)
+        self.revertir_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #dc2626;
+                color: white;
+                padding: 6px 14px;
+                font-weight: 600;
+                border: none;
+                border-radius: 6px;
+            }
+            QPushButton:hover {
+                background-color: #b91c1c;
+            }
+            QPushButton:disabled {
+                background-color: #9ca3af;
+            }
+        """)
+        acciones_layout.addWidget(self.anterior_btn)
+        acciones_layout.addWidget(self.pagina_label)
+        acciones_layout.addWidget(self.siguiente_btn)
+        acciones_layout.addStretch()
+        acciones_layout.addWidget(self.revertir_btn)
+        resultados_layout.addLayout(acciones_layout)
+        splitter.addWidget(resultados_widget)
+
+        # Eventos de la resegmentación seleccionada
+        eventos_group = QGroupBox("Historial de la póliza seleccionada")
+        eventos_layout = QVBoxLayout()
+        self.eventos_table = QTableWidget(0, len(COLUMNAS_EVENTOS))
+        self.eventos_table.setHorizontalHeaderLabels(COLUMNAS_EVENTOS)
+        self.eventos_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.eventos_table.horizontalHeader().setStretchLastSection(True)
+        eventos_layout.addWidget(self.eventos_table)
+        eventos_group.setLayout(eventos_layout)
+        splitter.addWidget(eventos_group)
+
+        splitter.setSizes([400, 200])
+        layout.addWidget(splitter)
+        self.setLayout(layout)
+
+    def set_usuario_local(self, usuario_info):
+        """Usuario que queda registrado al revertir desde el detalle"""
+        self.usuario_local = usuario_info
+
+    def email_ajustador(self) -> str:
+        """Correo del usuario local, usado como identificador del ajustador"""
+        if self.usuario_local:
+            return self.usuario_local.get('email', '')
+        return ''
+
+    def on_evento_resegmentacion(self, evento: Dict):
+        """Recibe el evento del bus y lo pasa al hilo de la interfaz"""
+        self.resegmentacion_cambiada.emit(evento)
+
+    def filtros(self) -> Dict:
+        """Filtros actuales en el formato de ResegmentacionDB.listar_resegmentaciones"""
+        filtros = {
+            'tipo': self.tipo_combo.currentData(),
+            'estado': self.estado_combo.currentData(),
+            'usuario': self.usuario_input.text().strip(),
+        }
+        if self.fechas_check.isChecked():
+            filtros['desde'] = self.desde_input.date().toString("yyyy-MM-dd")
+            filtros['hasta'] = self.hasta_input.date().toString("yyyy-MM-dd")
+        return filtros
+
+    def buscar(self):
+        """Nueva búsqueda o listado con el texto y filtros actuales, desde la primera página"""
+        self.inicios_pagina = [None]
+        self.cargar_pagina()
+
+    def pagina_siguiente(self):
+        if self.hay_siguiente and self.resultados:
+            ultima = self.resultados[-1]
+            self.inicios_pagina.append((ultima['fecha_resegmentacion'], ultima['id']))
+            self.cargar_pagina()
+
+    def pagina_anterior(self):
+        if len(self.inicios_pagina) > 1:
+            self.inicios_pagina.pop()
+            self.cargar_pagina()
+
+    def cargar_pagina(self):
+        """
+        Con texto: resultados por relevancia (una sola página). Sin texto: página del listado
+        que empieza en inicios_pagina[-1]
+        """
+        texto = self.busqueda_input.text().strip()
+        inicio = time.perf_counter()
+        if texto:
+            self.resultados = self.db.buscar_resegmentaciones(texto, self.filtros())
+            self.hay_siguiente = False
+        else:
+            # Una fila extra indica si existe página siguiente
+            self.resultados = self.db.listar_resegmentaciones(self.filtros(), self.inicios_pagina[-1],
+                                                              FILAS_POR_PAGINA + 1)
+            self.hay_siguiente = len(self.resultados) > FILAS_POR_PAGINA
+            self.resultados = self.resultados[:FILAS_POR_PAGINA]
+        milisegundos = (time.perf_counter() - inicio) * 1000
+
+        self.resultados_table.setRowCount(len(self.resultados))
+        for row_idx, resultado in enumerate(self.resultados):
+            for col_idx, (_, campo) in enumerate(COLUMNAS_RESULTADOS):
+                valor = str(resultado.get(campo) or '')
+                if campo == 'fecha_resegmentacion':
+                    valor = valor[:16].replace('T', ' ')
+                item = QTableWidgetItem(valor)
+                if campo in ('motivo_resegmentacion', 'coincidencia'):
+                    item.setToolTip(valor)
+                self.resultados_table.setItem(row_idx, col_idx, item)
+        self.resultados_table.resizeColumnsToContents()
+        self.eventos_table.setRowCount(0)
+
+        self.anterior_btn.setEnabled(len(self.inicios_pagina) > 1)
+        self.siguiente_btn.setEnabled(self.hay_siguiente)
+        self.pagina_label.setText("" if texto else f"Página {len(self.inicios_pagina)}")
+        if texto:
+            self.info_label.setText(f"{len(self.resultados)} resultado(s) para \"{texto}\" en {milisegundos:.0f} ms")
+        else:
+            self.info_label.setText(f"{len(self.resultados)} resegmentación(es) en {milisegundos:.0f} ms")
+
+    def resultados_seleccionados(self) -> List[Dict]:
+        filas = sorted(index.row() for index in self.resultados_table.selectionModel().selectedRows())
+        return [self.resultados[fila] for fila in filas if fila < len(self.resultados)]
+
+    def revertir_seleccionadas(self):
+        """Revierte las resegmentaciones activas seleccionadas en una sola transacción"""
+        activas = [r for r in self.resultados_seleccionados() if r.get('estado') == 'ACTIVO']
+        if not activas:
+            QMessageBox.information(self, "Revertir", "Seleccione al menos una resegmentación activa.")
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Confirmar Reversión",
+            f"¿Está seguro de que desea revertir {len(activas)} resegmentación(es)?\n\n"
+            "Todas se marcarán como revertidas en una sola operación.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        revertidas = self.db.revertir_resegmentaciones([r['id'] for r in activas], self.email_ajustador())
+        if revertidas < 0:
+            QMessageBox.critical(self, "Error", "No se pudieron revertir las resegmentaciones. Intente nuevamente.")
+            return
+        QMessageBox.information(self, "Reversión Exitosa", f"{revertidas} resegmentación(es) revertida(s).")
+        self.cargar_pagina()
+
+    def resultado_seleccionado(self) -> Optional[Dict]:
+        seleccionados = self.resultados_seleccionados()
+        return seleccionados[0] if seleccionados else None
+
+    def mostrar_eventos(self):
+        """Carga los eventos (aplicaciones y reversiones) de la póliza seleccionada"""
+        resultado = self.resultado_seleccionado()
+        if resultado is None:
+            self.eventos_table.setRowCount(0)
+            return
+
+        eventos = self.db.obtener_historial(resultado['agente'], resultado['subramo'], resultado['num_poliza'])
+        self.eventos_table.setRowCount(len(eventos))
+        for row_idx, evento in enumerate(reversed(eventos)):
+            valores = [
+                str(evento.get('fecha_evento') or '')[:16].replace('T', ' '),
+                evento.get('accion') or '',
+                evento.get('tipo_resegmentacion') or 'Todos',
+                evento.get('usuario') or '',
+                evento['datos'].get('motivo_resegmentacion', ''),
+            ]
+            for col_idx, valor in enumerate(valores):
+                self.eventos_table.setItem(row_idx, col_idx, QTableWidgetItem(str(valor)))
+        self.eventos_table.resizeColumnsToContents()
+
+    def abrir_detalle(self, row: int, column: int):
+        """Abre el detalle completo (con datos originales y respuesta de la API)"""
+        if row >= len(self.resultados):
+            return
+        dialog = ResegmentacionDetailsDialog(self.resultados[row], self, self.db, self.email_ajustador())
+        dialog.exec()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Envío de ajustes manuales a través del journal de resegmentaciones
+Cada ajuste queda registrado antes de enviarse y se marca según la respuesta;
+al iniciar, los que quedaron a medias se reconcilian con su misma clave de idempotencia.
+Los ajustes a un mismo objetivo se resuelven en orden: uno nuevo no se envía mientras
+uno anterior siga con resultado desconocido
+"""
+
+import json
+from typing import Dict, Optional
+
+import requests
+
+from cotejamiento_core import enviar_ajuste
+from gestor_token import gestor_token
+from resegmentacion_db import ResegmentacionDB, AJUSTE_PENDIENTE, AJUSTE_ENVIADO
+
+# Respuestas que no dicen nada del ajuste (sesión o servidor): el ajuste sigue pendiente
+ESTADOS_SIN_RESOLUCION = (401, 403, 429)
+
+class AjusteAnteriorPendiente(Exception):
+    """Un ajuste anterior al mismo objetivo sigue sin resolverse; el nuevo queda PENDIENTE"""
+
+def _resolver_anteriores(db: ResegmentacionDB, entrada: Dict, token: Optional[str]):
+    """
+    Resuelve los ajustes al mismo objetivo registrados antes que entrada: los PENDIENTE se
+    reenvían con su propia clave y los que la API aplicó se guardan, para que ninguno se
+    pierda si el nuevo falla. AjusteAnteriorPendiente si alguno sigue sin resultado.
+    """
+    for anterior in db.ajustes_pendientes(entrada['tipo'], entrada['objetivo']):
+        if anterior['clave'] == entrada['clave'] or anterior['fecha_creacion'] > entrada['fecha_creacion']:
+            break
+        if anterior['estado'] == AJUSTE_PENDIENTE:
+            _enviar(db, anterior, token)
+            anterior = db.obtener_ajuste(anterior['clave']) or anterior
+        if anterior['estado'] == AJUSTE_ENVIADO and db.completar_ajuste(anterior['clave']):
+            continue
+        if anterior['estado'] == AJUSTE_PENDIENTE:
+            raise AjusteAnteriorPendiente(
+                f"El ajuste anterior {anterior['clave']} a {anterior['objetivo']} sigue sin resolverse; "
+                f"se reintentará antes que este")
+
+def enviar_ajuste_registrado(db: ResegmentacionDB, entrada: Dict, token: Optional[str] = None) -> requests.Response:
+    """
+    Envía el ajuste registrado en el journal y actualiza su estado:
+    200 -> ENVIADO, rechazo 4xx -> FALLIDO. Un 5xx, un timeout o una caída dejan el
+    ajuste PENDIENTE: no se sabe si se aplicó y se reconciliará con la misma clave.
+    Antes se resuelven los ajustes anteriores al mismo objetivo (ver _resolver_anteriores).
+    """
+    _resolver_anteriores(db, entrada, token)
+    return _enviar(db, entrada, token)
+
+def _enviar(db: ResegmentacionDB, entrada: Dict, token: Optional[str]) -> requests.Response:
+    response = gestor_token.ejecutar_con_reintento(
+        lambda t: enviar_ajuste(entrada['url'], json.loads(entrada['cuerpo']), t, entrada['clave']),
+        token
+    )
+
+    if response.status_code == 200:
+        try:
+            respuesta_api = response.json()
+        except ValueError:
+            respuesta_api = {'texto': response.text}
+        db.marcar_ajuste_enviado(entrada['clave'], respuesta_api)
+    elif 400 <= response.status_code < 500 and response.status_code not in ESTADOS_SIN_RESOLUCION:
+        db.marcar_ajuste_fallido(entrada['clave'], f"Error {response.status_code}: {response.text}")
+    return response
+
+def reconciliar_ajustes(db: Optional[ResegmentacionDB] = None, token: Optional[str] = None) -> Dict[str, int]:
+    """
+    Resuelve los ajustes que quedaron a medias:
+    - ENVIADO: la API ya lo aplicó, solo falta guardarlo localmente (sin red)
+    - PENDIENTE: se reenvía con la misma clave de idempotencia (requiere token)
+
+    Returns:
+        Conteo de completados, fallidos y aún pendientes
+    """
+    db = db or ResegmentacionDB()
+    resultado = {'completados': 0, 'fallidos': 0, 'pendientes': 0}
+    # Objetivos con un ajuste aún sin resultado: los posteriores esperan a la siguiente reconciliación
+    bloqueados = set()
+
+    for entrada in db.ajustes_pendientes():
+        objetivo = (entrada['tipo'], entrada['objetivo'])
+        if entrada['estado'] == AJUSTE_PENDIENTE:
+            if not (token or gestor_token.token) or objetivo in bloqueados:
+                bloqueados.add(objetivo)
+                resultado['pendientes'] += 1
+                continue
+            try:
+                response = enviar_ajuste_registrado(db, entrada, token)
+            except (requests.exceptions.RequestException, AjusteAnteriorPendiente) as e:
+                print(f"[JOURNAL] ⚠️ Ajuste {entrada['clave']} sigue pendiente: {e}")
+                bloqueados.add(objetivo)
+                resultado['pendientes'] += 1
+                continue
+            entrada = db.obtener_ajuste(entrada['clave']) or entrada
+            if entrada['estado'] != AJUSTE_ENVIADO:
+                print(f"[JOURNAL] Ajuste {entrada['clave']}: HTTP {response.status_code} ({entrada['estado']})")
+                if entrada['estado'] == AJUSTE_PENDIENTE:
+                    bloqueados.add(objetivo)
+                resultado['fallidos' if entrada['estado'] != AJUSTE_PENDIENTE else 'pendientes'] += 1
+                continue
+
+        if db.completar_ajuste(entrada['clave']):
+            resultado['completados'] += 1
+        else:
+            resultado['pendientes'] += 1
+
+    if any(resultado.values()):
+        print(f"[JOURNAL] Reconciliación: {resultado}")
+    return resultado
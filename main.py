@@ -3,10 +3,17 @@
 Versión corregida de main.py que importa principal.py de manera segura
 """
 
+import multiprocessing
 import sys
 import os
+import time
 from pathlib import Path
 
+from medicion_arranque import VARIABLE_MEDICION_ARRANQUE
+
+# Marca de tiempo lo más temprana posible para medir la latencia de arranque
+INICIO_PROCESO = time.perf_counter()
+
 # Configuración específica para macOS para solucionar problemas con plugins Qt
 if sys.platform == 'darwin':  # macOS
     # Asegurar que las variables de entorno estén configuradas correctamente
@@ -609,6 +616,13 @@ def main():
         
         print("✅ Aplicación iniciada exitosamente")
         
+        # Modo medición de arranque (usado por build_all.py): cerrar en cuanto el loop procese la ventana
+        if os.environ.get(VARIABLE_MEDICION_ARRANQUE):
+            def terminar_medicion():
+                print(f"[ARRANQUE] Ventana lista en {time.perf_counter() - INICIO_PROCESO:.3f}s")
+                app.quit()
+            QTimer.singleShot(0, terminar_medicion)
+        
         # Ejecutar aplicación
         sys.exit(app.exec())
         
@@ -619,4 +633,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # En el ejecutable de Windows los procesos del aplanado paralelo arrancan desde aquí
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""
+Medición de la latencia de arranque
+Con la variable de entorno definida, main.py cierra la app en cuanto la ventana está lista;
+build_all.py la define al medir el ejecutable construido
+"""
+
+# Variable de entorno que hace que la app cierre en cuanto la ventana está lista
+VARIABLE_MEDICION_ARRANQUE = "BONOS_MEDIR_ARRANQUE"
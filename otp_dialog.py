@@ -26,6 +26,7 @@ class OTPDialog(QDialog):
     """Diálogo para validación OTP"""
     
     otp_validated = pyqtSignal()  # Señal emitida cuando el OTP es válido
+    otp_sent = pyqtSignal(bool, str)  # Resultado del envío en segundo plano (éxito, mensaje)
     
     def __init__(self, parent=None, email="sofia@rinorisk.com"):
         super().__init__(parent)
@@ -35,6 +36,9 @@ class OTPDialog(QDialog):
         self.setup_ui()
         self.setup_styles()
         
+        # El callback del enviador corre en otro hilo; la señal lo entrega en el hilo de la interfaz
+        self.otp_sent.connect(self.on_otp_sent)
+        
     def setup_ui(self):
         """Configura la interfaz del diálogo OTP minimalista"""
         self.setWindowTitle("Verificación OTP")
@@ -226,9 +230,21 @@ class OTPDialog(QDialog):
         self.request_otp_btn.setText("Enviando...")
         self.countdown_label.setText("📧 Enviando código al correo...")
         
-        # Solicitar OTP del servicio
-        success, message = otp_service.request_otp(self.email)
-        
+        # Solicitar OTP del servicio sin bloquear la interfaz
+        encolado = otp_service.request_otp_async(self.email, self._emitir_resultado_envio)
+        if not encolado:
+            self.on_otp_sent(False, "Hay demasiados correos pendientes. Intenta en unos segundos.")
+    
+    def _emitir_resultado_envio(self, success: bool, message: str):
+        """Callback del hilo de envío: reenvía el resultado como señal Qt"""
+        try:
+            self.otp_sent.emit(success, message)
+        except RuntimeError:
+            # El diálogo ya fue cerrado y destruido
+            pass
+    
+    def on_otp_sent(self, success: bool, message: str):
+        """Actualiza el diálogo cuando termina el envío del código"""
         if success:
             # Habilitar campos de entrada
             self.otp_input.setEnabled(True)
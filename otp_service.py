@@ -8,23 +8,157 @@ import smtplib
 import random
 import string
 import json
+import queue
+import threading
+import time
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pathlib import Path
 
+# Máximo de correos pendientes en la cola del enviador
+TAMANO_COLA_CORREOS = 20
+
+# Intentos por correo antes de darlo por fallido, y espera base entre intentos (se duplica)
+INTENTOS_ENVIO = 3
+ESPERA_REINTENTO = 1.0
+
+# Segundos sin correos tras los cuales se cierra la sesión SMTP
+TIEMPO_INACTIVIDAD = 120
+
+# Segundos desde el último uso a partir de los cuales se verifica la sesión con NOOP
+VERIFICAR_SESION_DESPUES = 30
+
+class EnviadorCorreos:
+    """
+    Envía correos desde un hilo en segundo plano reutilizando una sola sesión SMTP autenticada.
+    Los envíos se encolan en una cola acotada y cada uno notifica su resultado por callback.
+    """
+    
+    def __init__(self, email_config: dict):
+        self.email_config = email_config
+        self.cola = queue.Queue(maxsize=TAMANO_COLA_CORREOS)
+        self.conexion = None
+        self.ultimo_uso = 0.0
+        self.hilo = None
+        self.lock = threading.Lock()
+        
+    def encolar(self, mensaje, callback=None) -> bool:
+        """Agrega un mensaje a la cola; retorna False si la cola está llena"""
+        self._asegurar_hilo()
+        try:
+            self.cola.put_nowait((mensaje, callback))
+            return True
+        except queue.Full:
+            print("[OTP] ⚠️ Cola de correos llena, se rechaza el envío")
+            return False
+    
+    def enviar_sincrono(self, mensaje, timeout: float = 60) -> tuple[bool, str]:
+        """Encola un mensaje y espera su resultado (para usos fuera de la interfaz)"""
+        terminado = threading.Event()
+        resultado = {}
+        
+        def al_terminar(success, message):
+            resultado['valor'] = (success, message)
+            terminado.set()
+        
+        if not self.encolar(mensaje, al_terminar):
+            return False, "Hay demasiados correos pendientes. Intenta en unos segundos."
+        if not terminado.wait(timeout):
+            return False, "Tiempo de espera agotado enviando el correo"
+        return resultado['valor']
+    
+    def _asegurar_hilo(self):
+        """Inicia el hilo de envío la primera vez que se necesita"""
+        with self.lock:
+            if self.hilo is None or not self.hilo.is_alive():
+                self.hilo = threading.Thread(target=self._procesar_cola, name="EnviadorCorreosOTP", daemon=True)
+                self.hilo.start()
+    
+    def _procesar_cola(self):
+        """Bucle del hilo: toma mensajes de la cola y cierra la sesión tras un periodo inactivo"""
+        while True:
+            try:
+                mensaje, callback = self.cola.get(timeout=TIEMPO_INACTIVIDAD)
+            except queue.Empty:
+                self._cerrar_conexion()
+                continue
+            
+            success, message = self._enviar_con_reintentos(mensaje)
+            if callback:
+                try:
+                    callback(success, message)
+                except Exception as e:
+                    print(f"[OTP] ⚠️ Error en callback de envío: {e}")
+            self.cola.task_done()
+    
+    def _enviar_con_reintentos(self, mensaje) -> tuple[bool, str]:
+        """Envía por la sesión persistente, reconectando y reintentando con espera creciente"""
+        ultimo_error = None
+        for intento in range(1, INTENTOS_ENVIO + 1):
+            try:
+                conexion = self._obtener_conexion()
+                conexion.send_message(mensaje)
+                self.ultimo_uso = time.monotonic()
+                return True, f"Correo enviado a {mensaje['To']}"
+            except (smtplib.SMTPException, OSError) as e:
+                ultimo_error = e
+                print(f"[OTP] ❌ Error SMTP (intento {intento}/{INTENTOS_ENVIO}): {e}")
+                # La sesión pudo quedar inválida: descartarla para reconectar en el siguiente intento
+                self._cerrar_conexion()
+                if intento < INTENTOS_ENVIO:
+                    time.sleep(ESPERA_REINTENTO * (2 ** (intento - 1)))
+        return False, str(ultimo_error)
+    
+    def _obtener_conexion(self):
+        """Retorna la sesión SMTP abierta, verificándola con NOOP si lleva tiempo sin usarse"""
+        if self.conexion is not None:
+            if time.monotonic() - self.ultimo_uso < VERIFICAR_SESION_DESPUES:
+                return self.conexion
+            try:
+                codigo, _ = self.conexion.noop()
+                if codigo == 250:
+                    return self.conexion
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._cerrar_conexion()
+        
+        config = self.email_config
+        print(f"[OTP] 🔌 Abriendo sesión SMTP con {config['smtp_server']}:{config['smtp_port']}")
+        conexion = smtplib.SMTP(config['smtp_server'], config['smtp_port'], timeout=config.get('timeout', 20))
+        if config.get('use_tls', True):
+            conexion.starttls()
+        if config.get('username'):
+            conexion.login(config['username'], config['password'])
+        self.conexion = conexion
+        self.ultimo_uso = time.monotonic()
+        return conexion
+    
+    def _cerrar_conexion(self):
+        """Cierra la sesión SMTP si existe"""
+        if self.conexion is None:
+            return
+        try:
+            self.conexion.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self.conexion = None
+        print("[OTP] 🔌 Sesión SMTP cerrada")
+
 class OTPService:
     """Servicio para manejar códigos OTP"""
     
-    def __init__(self):
+    def __init__(self, email_config: dict = None):
         self.otp_storage = {}  # Almacenamiento temporal de códigos OTP
-        self.email_config = {
+        self.email_config = email_config or {
             'smtp_server': 'smtp.gmail.com',
             'smtp_port': 587,
+            'use_tls': True,
             'username': 'desarrollo@rinorisk.com',  # Tu correo de Google Workspace
             'password': 'zezc hsgb azft jzct',  # Contraseña de aplicación de Google
             'from_email': 'desarrollo@rinorisk.com'
         }
+        self.enviador = EnviadorCorreos(self.email_config)
         
     def generate_otp(self, email: str) -> str:
         """Genera un código OTP de 6 dígitos para el email especificado"""
@@ -44,70 +178,72 @@ class OTPService:
         print(f"[OTP] Código generado para {email}: {otp_code} (expira en 5 minutos)")
         return otp_code
     
-    def send_otp_email(self, email: str, otp_code: str) -> tuple[bool, str]:
-        """Envía el código OTP por correo electrónico"""
-        try:
-            # Crear mensaje
-            msg = MIMEMultipart()
-            msg['From'] = self.email_config['from_email']
-            msg['To'] = email
-            msg['Subject'] = "🔐 Código de Verificación OTP - Herramientas Bonos"
-            
-            # Cuerpo del correo en HTML
-            html_body = f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                    <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px;">
-                        <h2 style="color: #1e40af; text-align: center;">🔐 Código de Verificación OTP</h2>
+    def construir_mensaje(self, email: str, otp_code: str) -> MIMEMultipart:
+        """Construye el correo HTML con el código OTP"""
+        # Crear mensaje
+        msg = MIMEMultipart()
+        msg['From'] = self.email_config['from_email']
+        msg['To'] = email
+        msg['Subject'] = "🔐 Código de Verificación OTP - Herramientas Bonos"
+        
+        # Cuerpo del correo en HTML
+        html_body = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px;">
+                    <h2 style="color: #1e40af; text-align: center;">🔐 Código de Verificación OTP</h2>
+                    
+                    <div style="background-color: white; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                        <p>Hola,</p>
+                        <p>Has solicitado un código de verificación para acceder a las funciones de resegmentación en <strong>Herramientas Bonos</strong>.</p>
                         
-                        <div style="background-color: white; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                            <p>Hola,</p>
-                            <p>Has solicitado un código de verificación para acceder a las funciones de resegmentación en <strong>Herramientas Bonos</strong>.</p>
-                            
-                            <div style="text-align: center; margin: 30px 0;">
-                                <div style="display: inline-block; background-color: #1e40af; color: white; padding: 15px 30px; border-radius: 8px; font-size: 24px; font-weight: bold; letter-spacing: 3px;">
-                                    {otp_code}
-                                </div>
+                        <div style="text-align: center; margin: 30px 0;">
+                            <div style="display: inline-block; background-color: #1e40af; color: white; padding: 15px 30px; border-radius: 8px; font-size: 24px; font-weight: bold; letter-spacing: 3px;">
+                                {otp_code}
                             </div>
-                            
-                            <p><strong>⏰ Este código expira en 5 minutos.</strong></p>
-                            <p>Si no solicitaste este código, puedes ignorar este correo de forma segura.</p>
                         </div>
                         
-                        <div style="text-align: center; color: #6b7280; font-size: 12px; margin-top: 20px;">
-                            <p>Herramientas Bonos - Sistema de Administración</p>
-                            <p>RinoRisk © {datetime.now().year}</p>
-                        </div>
+                        <p><strong>⏰ Este código expira en 5 minutos.</strong></p>
+                        <p>Si no solicitaste este código, puedes ignorar este correo de forma segura.</p>
                     </div>
-                </body>
-            </html>
-            """
-            
-            msg.attach(MIMEText(html_body, 'html'))
+                    
+                    <div style="text-align: center; color: #6b7280; font-size: 12px; margin-top: 20px;">
+                        <p>Herramientas Bonos - Sistema de Administración</p>
+                        <p>RinoRisk © {datetime.now().year}</p>
+                    </div>
+                </div>
+            </body>
+        </html>
+        """
+        
+        msg.attach(MIMEText(html_body, 'html'))
+        return msg
+    
+    def send_otp_email(self, email: str, otp_code: str) -> tuple[bool, str]:
+        """Envía el código OTP por correo electrónico (espera el resultado del enviador en segundo plano)"""
+        try:
+            msg = self.construir_mensaje(email, otp_code)
             
-            # Enviar correo real usando Gmail SMTP
             print(f"[OTP] 📧 Enviando correo real a {email}")
             print(f"[OTP] 📋 Código OTP: {otp_code}")
             print(f"[OTP] ⏰ Expira en: 5 minutos")
             
-            try:
-                server = smtplib.SMTP(self.email_config['smtp_server'], self.email_config['smtp_port'])
-                server.starttls()
-                server.login(self.email_config['username'], self.email_config['password'])
-                server.send_message(msg)
-                server.quit()
-                print(f"[OTP] ✅ Correo enviado exitosamente a {email}")
-                return True, f"Código OTP enviado exitosamente a {email}"
-            except Exception as smtp_error:
-                print(f"[OTP] ❌ Error SMTP: {smtp_error}")
-                # Si falla el envío, seguir con simulación para pruebas
-                print(f"[OTP] 📧 Fallback: Simulando envío de correo a {email}")
-                return True, f"Código OTP generado (simulación por error SMTP): {otp_code}"
+            success, message = self.enviador.enviar_sincrono(msg)
+            return self._resultado_envio(email, otp_code, success, message)
             
         except Exception as e:
             print(f"[OTP] ❌ Error enviando correo: {e}")
             return False, f"Error enviando correo: {str(e)}"
     
+    def _resultado_envio(self, email: str, otp_code: str, success: bool, message: str) -> tuple[bool, str]:
+        """Traduce el resultado del enviador al mensaje para el usuario"""
+        if success:
+            print(f"[OTP] ✅ Correo enviado exitosamente a {email}")
+            return True, f"Código OTP enviado exitosamente a {email}"
+        # Si falla el envío, seguir con simulación para pruebas
+        print(f"[OTP] 📧 Fallback: Simulando envío de correo a {email} ({message})")
+        return True, f"Código OTP generado (simulación por error SMTP): {otp_code}"
+    
     def verify_otp(self, email: str, input_code: str) -> tuple[bool, str]:
         """Verifica si el código OTP es válido"""
         if email not in self.otp_storage:
@@ -160,5 +296,29 @@ class OTPService:
         else:
             return False, message
 
+    def request_otp_async(self, email: str, callback) -> bool:
+        """
+        Solicita un nuevo código OTP sin bloquear: el correo se envía en segundo plano
+        y callback(success, message) se llama desde el hilo del enviador al terminar.
+        Retorna False si el envío no pudo encolarse.
+        """
+        self.cleanup_expired_codes()
+        otp_code = self.generate_otp(email)
+        
+        try:
+            msg = self.construir_mensaje(email, otp_code)
+        except Exception as e:
+            print(f"[OTP] ❌ Error construyendo correo: {e}")
+            return False
+        
+        def al_terminar(success, message):
+            success, message = self._resultado_envio(email, otp_code, success, message)
+            if success:
+                message = f"Código OTP enviado a {email}. Revisa tu bandeja de entrada."
+            callback(success, message)
+        
+        print(f"[OTP] 📧 Encolando correo para {email}")
+        return self.enviador.encolar(msg, al_terminar)
+
 # Instancia global del servicio OTP
 otp_service = OTPService() 
\ No newline at end of file
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Planificador central de tareas en segundo plano
+Todas las operaciones largas de la interfaz (login, consultas, precargas, sincronización)
+pasan por aquí: cada tipo de tarea tiene prioridad y endpoint; la cola entrega primero lo
+interactivo y respeta un máximo de tareas simultáneas por endpoint. La cancelación es
+cooperativa: la tarea la revisa con verificar()/reportar() y, si termina de todos modos,
+su resultado se descarta.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from typing import Callable, Dict, List, Optional
+
+# Importar Qt con compatibilidad PySide6/PyQt6
+try:
+    from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                                   QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+    from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal as pyqtSignal
+except ImportError:
+    from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                                 QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+    from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+# Prioridades: búsqueda interactiva > consulta masiva > precarga
+PRIORIDAD_INTERACTIVA = 30
+PRIORIDAD_MASIVA = 20
+PRIORIDAD_PRECARGA = 10
+
+# Hilos del pool y tareas simultáneas por endpoint
+MAX_HILOS = int(os.environ.get('BONOS_MAX_HILOS', '4'))
+LIMITES_ENDPOINT = {
+    'login': 1,
+    'comparacion-adm': int(os.environ.get('BONOS_MAX_CONSULTAS', '2')),
+    'ajustes': 1,
+    'sync': 1,
+    'local': 2,
+}
+
+# Milisegundos que se espera a las tareas en curso al cerrar la aplicación
+ESPERA_CIERRE_MS = int(os.environ.get('BONOS_ESPERA_CIERRE_MS', '5000'))
+
+# Tareas terminadas que se conservan para el monitor
+HISTORIAL_TAREAS = 100
+
+# Estados
+EN_COLA = 'EN_COLA'
+EN_CURSO = 'EN_CURSO'
+COMPLETADA = 'COMPLETADA'
+FALLIDA = 'FALLIDA'
+CANCELADA = 'CANCELADA'
+
+# reemplaza: una tarea nueva del mismo tipo cancela las anteriores (p. ej. otra consulta de periodo)
+TipoTarea = namedtuple('TipoTarea', ['prioridad', 'endpoint', 'reemplaza'])
+
+TIPOS_TAREA = {
+    'login': TipoTarea(PRIORIDAD_INTERACTIVA, 'login', True),
+    'ingesta_adm': TipoTarea(PRIORIDAD_INTERACTIVA, 'local', True),
+    'consulta_periodo': TipoTarea(PRIORIDAD_MASIVA, 'comparacion-adm', True),
+    'journal': TipoTarea(PRIORIDAD_MASIVA, 'ajustes', False),
+    'precarga': TipoTarea(PRIORIDAD_PRECARGA, 'comparacion-adm', False),
+    'sync': TipoTarea(PRIORIDAD_PRECARGA, 'sync', False),
+}
+
+_ids = itertools.count(1)
+
+class TareaCancelada(Exception):
+    """La tarea se canceló; la lanza verificar() para cortar el trabajo en curso"""
+
+class Tarea(QObject):
+    """
+    Una unidad de trabajo: funcion(tarea) corre en el pool. Las señales llegan al hilo
+    de la interfaz; solo una de completada/error/cancelada se emite, y después terminada.
+    """
+
+    progreso = pyqtSignal(int, str)
+    completada = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelada = pyqtSignal()
+    terminada = pyqtSignal()
+
+    def __init__(self, planificador: 'PlanificadorTareas', tipo: str, funcion: Callable[['Tarea'], object],
+                 nombre: str, prioridad: int, endpoint: str):
+        super().__init__()
+        self.id = next(_ids)
+        self.tipo = tipo
+        self.funcion = funcion
+        self.nombre = nombre or tipo
+        self.prioridad = prioridad
+        self.endpoint = endpoint
+        self.estado = EN_COLA
+        self.mensaje = ''
+        self.creada = time.time()
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+        self._planificador = planificador
+        self._cancelar = threading.Event()
+
+    @property
+    def cancelacion_solicitada(self) -> bool:
+        return self._cancelar.is_set()
+
+    @property
+    def activa(self) -> bool:
+        return self.estado in (EN_COLA, EN_CURSO)
+
+    @property
+    def duracion(self) -> float:
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.time()) - self.inicio
+
+    def cancelar(self):
+        self._planificador.cancelar(self)
+
+    def verificar(self):
+        """Lanza TareaCancelada si se pidió cancelar; llamarla entre pasos largos"""
+        if self._cancelar.is_set():
+            raise TareaCancelada()
+
+    def reportar(self, porcentaje: int, mensaje: str):
+        """Emite progreso (y revisa la cancelación)"""
+        self.verificar()
+        self.mensaje = mensaje
+        self.progreso.emit(porcentaje, mensaje)
+
+class _Ejecutor(QRunnable):
+    def __init__(self, planificador: 'PlanificadorTareas', tarea: Tarea):
+        super().__init__()
+        self.planificador = planificador
+        self.tarea = tarea
+
+    def run(self):
+        self.planificador._ejecutar(self.tarea)
+
+class PlanificadorTareas(QObject):
+    """
+    Cola con prioridad sobre un QThreadPool. Las tareas esperan en la cola propia (no en la
+    del pool) hasta que hay hilo libre y cupo en su endpoint, así una precarga encolada
+    nunca retrasa a una consulta interactiva que llega después.
+    """
+
+    tareas_actualizadas = pyqtSignal()
+
+    def __init__(self, max_hilos: int = MAX_HILOS, limites: Optional[Dict[str, int]] = None):
+        super().__init__()
+        self.max_hilos = max_hilos
+        self.limites = dict(LIMITES_ENDPOINT if limites is None else limites)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_hilos)
+        self._lock = threading.RLock()
+        self._cola: List = []  # heap de (-prioridad, id, tarea)
+        self._en_curso: Dict[int, Tarea] = {}
+        self._por_endpoint: Counter = Counter()
+        self._ejecutores: Dict[int, _Ejecutor] = {}
+        self.historial = deque(maxlen=HISTORIAL_TAREAS)
+
+    def enviar(self, tipo: str, funcion: Callable[[Tarea], object], nombre: str = '',
+               prioridad: Optional[int] = None) -> Tarea:
+        """
+        Encola funcion(tarea) como tarea del tipo dado. El despacho ocurre en la siguiente
+        vuelta del ciclo de eventos, así que basta conectar las señales de la tarea retornada.
+        """
+        config = TIPOS_TAREA[tipo]
+        tarea = Tarea(self, tipo, funcion, nombre, config.prioridad if prioridad is None else prioridad,
+                      config.endpoint)
+        with self._lock:
+            heapq.heappush(self._cola, (-tarea.prioridad, tarea.id, tarea))
+            self.historial.append(tarea)
+
+        # Al cancelar las anteriores la nueva ya está activa: quien atienda 'cancelada' lo distingue
+        if config.reemplaza:
+            for anterior in self.activas(tipo):
+                if anterior is not tarea:
+                    print(f"[TAREAS] Cancelando {anterior.tipo} #{anterior.id} ({anterior.nombre}): reemplazada")
+                    self.cancelar(anterior)
+        self.tareas_actualizadas.emit()
+        QTimer.singleShot(0, self._despachar)
+        return tarea
+
+    def activas(self, tipo: Optional[str] = None) -> List[Tarea]:
+        """Tareas en cola o en curso (de un tipo, si se indica)"""
+        with self._lock:
+            tareas = [t for _, _, t in self._cola] + list(self._en_curso.values())
+        return [t for t in tareas if t.activa and (tipo is None or t.tipo == tipo)]
+
+    def cancelar(self, tarea: Tarea):
+        """En cola: se retira de inmediato. En curso: se marca y la tarea lo nota al verificar"""
+        tarea._cancelar.set()
+        with self._lock:
+            en_cola = tarea.estado == EN_COLA and any(t is tarea for _, _, t in self._cola)
+            if en_cola:
+                self._cola = [item for item in self._cola if item[2] is not tarea]
+                heapq.heapify(self._cola)
+                tarea.estado = CANCELADA
+                tarea.fin = time.time()
+        if en_cola:
+            tarea.cancelada.emit()
+            tarea.terminada.emit()
+        self.tareas_actualizadas.emit()
+
+    def cancelar_todas(self):
+        for tarea in self.activas():
+            self.cancelar(tarea)
+
+    def esperar(self, milisegundos: int = -1) -> bool:
+        """Espera a que terminen las tareas en curso (al cerrar la aplicación)"""
+        return self.pool.waitForDone(milisegundos)
+
+    def _despachar(self):
+        """Inicia las tareas de mayor prioridad que tengan hilo libre y cupo en su endpoint"""
+        with self._lock:
+            esperando = []
+            while self._cola and len(self._en_curso) < self.max_hilos:
+                item = heapq.heappop(self._cola)
+                tarea = item[2]
+                if self._por_endpoint[tarea.endpoint] >= self.limites.get(tarea.endpoint, 1):
+                    esperando.append(item)
+                    continue
+                self._en_curso[tarea.id] = tarea
+                self._por_endpoint[tarea.endpoint] += 1
+                ejecutor = _Ejecutor(self, tarea)
+                self._ejecutores[tarea.id] = ejecutor
+                self.pool.start(ejecutor, tarea.prioridad)
+            for item in esperando:
+                heapq.heappush(self._cola, item)
+
+    def _ejecutar(self, tarea: Tarea):
+        """Corre en un hilo del pool"""
+        tarea.estado = EN_CURSO
+        tarea.inicio = time.time()
+        self.tareas_actualizadas.emit()
+        try:
+            tarea.verificar()
+            resultado = tarea.funcion(tarea)
+            tarea.verificar()
+        except Exception as e:
+            # Una tarea cancelada puede fallar de cualquier forma al cortarse: cuenta como cancelada
+            if isinstance(e, TareaCancelada) or tarea.cancelacion_solicitada:
+                tarea.estado = CANCELADA
+                tarea.cancelada.emit()
+            else:
+                print(f"[TAREAS] ❌ {tarea.tipo} #{tarea.id} ({tarea.nombre}): {e}")
+                tarea.estado = FALLIDA
+                tarea.mensaje = str(e)
+                tarea.error.emit(str(e))
+        else:
+            tarea.estado = COMPLETADA
+            tarea.completada.emit(resultado)
+        finally:
+            tarea.fin = time.time()
+            with self._lock:
+                self._en_curso.pop(tarea.id, None)
+                self._ejecutores.pop(tarea.id, None)
+                self._por_endpoint[tarea.endpoint] -= 1
+            tarea.terminada.emit()
+            self.tareas_actualizadas.emit()
+            self._despachar()
+
+class MonitorTareasWidget(QWidget):
+    """Panel con las tareas en curso, en cola y recientes; permite cancelar las activas"""
+
+    COLUMNAS = ["#", "Tipo", "Descripción", "Prioridad", "Endpoint", "Estado", "Duración", "Detalle"]
+
+    def __init__(self, planificador: PlanificadorTareas, parent=None):
+        super().__init__(parent)
+        self.planificador = planificador
+
+        layout = QVBoxLayout(self)
+        self.resumen_label = QLabel()
+        layout.addWidget(self.resumen_label)
+
+        self.tabla = QTableWidget(0, len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tabla.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tabla.verticalHeader().setVisible(False)
+        self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.tabla.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.tabla)
+
+        botones = QHBoxLayout()
+        self.cancelar_btn = QPushButton("⛔ Cancelar seleccionadas")
+        self.cancelar_btn.clicked.connect(self.cancelar_seleccionadas)
+        botones.addStretch()
+        botones.addWidget(self.cancelar_btn)
+        layout.addLayout(botones)
+
+        self._tareas: List[Tarea] = []
+        planificador.tareas_actualizadas.connect(self.refrescar)
+        # Las duraciones de las tareas en curso avanzan aunque no haya eventos
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refrescar)
+        self.timer.start(1000)
+        self.refrescar()
+
+    def refrescar(self):
+        if not self.isVisible() and self._tareas:
+            return
+        # Activas primero (por prioridad), luego las terminadas más recientes
+        tareas = list(self.planificador.historial)
+        tareas.sort(key=lambda t: (not t.activa, -t.prioridad if t.activa else -t.id))
+        self._tareas = tareas
+
+        self.tabla.setRowCount(len(tareas))
+        for fila, tarea in enumerate(tareas):
+            estado = tarea.estado
+            if estado == EN_CURSO and tarea.cancelacion_solicitada:
+                estado = "CANCELANDO"
+            valores = [str(tarea.id), tarea.tipo, tarea.nombre, str(tarea.prioridad), tarea.endpoint,
+                       estado, f"{tarea.duracion:.1f}s" if tarea.inicio else "", tarea.mensaje]
+            for columna, valor in enumerate(valores):
+                self.tabla.setItem(fila, columna, QTableWidgetItem(valor))
+
+        activas = sum(1 for t in tareas if t.activa)
+        en_curso = sum(1 for t in tareas if t.estado == EN_CURSO)
+        self.resumen_label.setText(f"{en_curso} en curso, {activas - en_curso} en cola, "
+                                   f"máximo {self.planificador.max_hilos} simultáneas")
+
+    def cancelar_seleccionadas(self):
+        filas = {indice.row() for indice in self.tabla.selectedIndexes()}
+        for fila in filas:
+            if fila < len(self._tareas) and self._tareas[fila].activa:
+                self._tareas[fila].cancelar()
+
+# Instancia global del planificador
+planificador = PlanificadorTareas()
@@ -7,10 +7,8 @@ Aplicación con tabs para Cotejamiento y Resegmentación
 import sys
 import os
 import json
-import csv
 import io
 import tempfile
-import base64
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, List, Any
@@ -24,8 +22,8 @@ try:
                                  QLineEdit, QTextEdit, QGroupBox, QGridLayout,
                                  QSplitter, QComboBox, QSpinBox, QCheckBox,
                                  QApplication, QProgressDialog, QDialog, QDialogButtonBox,
-                                 QSizePolicy)
-    from PySide6.QtCore import Qt, Signal as pyqtSignal, QThread, QTimer, QSize, QRect
+                                 QSizePolicy, QMenu)
+    from PySide6.QtCore import Qt, Signal as pyqtSignal, QThread, QTimer, QSize, QRect, QFileSystemWatcher
     from PySide6.QtGui import QFont, QPixmap, QIcon, QColor, QPainter, QBrush
     QT_VARIANT = "PySide6"
 except ImportError:
@@ -36,15 +34,31 @@ except ImportError:
                                 QLineEdit, QTextEdit, QGroupBox, QGridLayout,
                                 QSplitter, QComboBox, QSpinBox, QCheckBox,
                                 QApplication, QProgressDialog, QDialog, QDialogButtonBox,
-                                QSizePolicy)
-    from PyQt6.QtCore import Qt, pyqtSignal, QThread, QTimer, QSize, QRect
+                                QSizePolicy, QMenu)
+    from PyQt6.QtCore import Qt, pyqtSignal, QThread, QTimer, QSize, QRect, QFileSystemWatcher
     from PyQt6.QtGui import QFont, QPixmap, QIcon, QColor, QPainter, QBrush
     QT_VARIANT = "PyQt6"
 
 import requests
-import pandas as pd
-from resegmentacion_db import ResegmentacionDB
+from resegmentacion_db import ResegmentacionDB, AJUSTE_ENVIADO, COLUMNAS_ESTADO
 from resegmentacion_details_dialog import ResegmentacionDetailsDialog
+from historial_resegmentaciones import HistorialResegmentacionesWidget
+from datos_cotejamiento import (IndicePagos, SeleccionAclaracion, OrdenadorColumnas, DiferenciasDetalle,
+                                CAMBIO_AGREGADA, comparar_detalles,
+                                clave_fila, diferencia_mayor_a)
+from almacen_sqlite import AlmacenCotejamiento, IndicePagosAlmacen, VistaAlmacen, UMBRAL_FILAS_SQLITE
+from exportador import exportar_filas, ExportacionCancelada
+from adm_ingesta import IngestaADM, ErrorIngestaADM, archivos_adm, validar_periodo, ingerir_adm
+from vigilante_adm import VigilanteADM, precarga_vigente, INTERVALO_VIGILANTE
+from planificador_tareas import planificador, Tarea, MonitorTareasWidget, ESPERA_CIERRE_MS
+from sesion_cotejamiento import guardar_sesion, abrir_sesion, EXTENSION_SESION
+from historial_cotejamiento import HistorialCotejamiento
+from bus_resegmentaciones import bus_resegmentaciones
+from gestor_token import gestor_token, decodificar_jwt
+from journal_ajustes import AjusteAnteriorPendiente, enviar_ajuste_registrado, reconciliar_ajustes
+from sync_resegmentaciones import SincronizadorResegmentaciones, backend_desde_destino, INTERVALO_SYNC
+from cotejamiento_core import (consultar_periodo, peticion_ajuste, enviar_ajuste, aplanar_detalle,
+                               filas_e_indice, COLUMNAS_TABLA, PROCESOS_APLANADO, AJUSTADOR_DEFECTO)
 
 def get_terminal_style():
     """Retorna el estilo CSS para terminal profesional estilo CIA"""
@@ -80,72 +94,82 @@ def get_terminal_style():
         }
     """
 
-class APIWorker(QThread):
-    """Worker thread para operaciones de API"""
-    data_received = pyqtSignal(dict)
-    error_occurred = pyqtSignal(str)
+def tarea_login(tarea: Tarea, url: str, username: str, password: str) -> Dict:
+    """Login API; el gestor guarda el token en caché y programa su renovación"""
+    tarea.reportar(25, "Conectando con API...")
+    gestor_token.configurar(url, username, password)
+    datos = gestor_token.iniciar_sesion()
+    tarea.reportar(100, "Login exitoso")
+    return datos
+
+def tarea_consulta_periodo(tarea: Tarea, url: str, token: str, periodo: str) -> Dict:
+    """Obtiene la comparación ADM del periodo"""
+    tarea.reportar(30, "Consultando datos...")
+    # Con token expirado (401) se renueva y se reintenta una vez
+    data = gestor_token.ejecutar_con_reintento(lambda t: consultar_periodo(url, t, periodo), token)
+    tarea.reportar(100, "Datos obtenidos exitosamente")
+    return data
+
+class ExportWorker(QThread):
+    """Worker thread para exportar la tabla completa por bloques"""
     progress_updated = pyqtSignal(int, str)
+    export_completed = pyqtSignal(dict)
+    error_occurred = pyqtSignal(str)
     
-    def __init__(self, operation_type: str, **kwargs):
+    def __init__(self, ruta: str, filas: List[Dict], columnas: List[str],
+                 indice_pagos: Optional[IndicePagos] = None, incluir_pagos: bool = False):
         super().__init__()
-        self.operation_type = operation_type
-        self.kwargs = kwargs
+        self.ruta = ruta
+        self.filas = filas
+        self.columnas = columnas
+        self.indice_pagos = indice_pagos
+        self.incluir_pagos = incluir_pagos
+        self._cancelado = False
+        
+    def cancelar(self):
+        """Solicita detener la exportación al terminar el bloque actual"""
+        self._cancelado = True
         
     def run(self):
-        """Ejecuta la operación de API en background"""
+        """Ejecuta la exportación en background"""
         try:
-            if self.operation_type == "login":
-                self.perform_login()
-            elif self.operation_type == "fetch_data":
-                self.perform_data_fetch()
-            else:
-                self.error_occurred.emit(f"Operación no reconocida: {self.operation_type}")
+            resultado = exportar_filas(
+                self.ruta, self.filas, self.columnas,
+                indice_pagos=self.indice_pagos,
+                incluir_pagos=self.incluir_pagos,
+                progreso=self.reportar_progreso,
+                cancelado=lambda: self._cancelado
+            )
+            self.export_completed.emit(resultado)
+        except ExportacionCancelada:
+            self.error_occurred.emit("Exportación cancelada")
         except Exception as e:
-            self.error_occurred.emit(f"Error en {self.operation_type}: {str(e)}")
-            
-    def perform_login(self):
-        """Realiza login API"""
-        url = self.kwargs.get('url', '')
-        username = self.kwargs.get('username', '')
-        password = self.kwargs.get('password', '')
-        
-        self.progress_updated.emit(25, "Conectando con API...")
-        
-        response = requests.post(url, json={
-            'correo': username,
-            'password': password
-        }, timeout=10)
-        
-        self.progress_updated.emit(75, "Procesando respuesta...")
-        
-        if response.status_code == 200:
-            result = response.json()
-            token = result.get('token')
-            if token:
-                self.progress_updated.emit(100, "Login exitoso")
-                self.data_received.emit({'token': token, 'result': result})
-            else:
-                self.error_occurred.emit("Token no encontrado en respuesta")
-        else:
-            self.error_occurred.emit(f"Login falló: {response.status_code}")
+            self.error_occurred.emit(f"Error al exportar: {str(e)}")
             
-    def perform_data_fetch(self):
-        """Obtiene datos de la API"""
-        url = self.kwargs.get('url', '')
-        headers = self.kwargs.get('headers', {})
-        
-        self.progress_updated.emit(30, "Consultando datos...")
-        
-        response = requests.get(url, headers=headers, timeout=30)
-        
-        self.progress_updated.emit(80, "Procesando datos...")
+    def reportar_progreso(self, escritas: int, total: int):
+        """Convierte filas escritas a porcentaje para la barra de progreso"""
+        porcentaje = int(escritas * 100 / total) if total else 100
+        self.progress_updated.emit(porcentaje, f"Exportando {escritas:,} de {total:,} registros...")
+
+class HistorialWorker(QThread):
+    """Worker thread para agregar un periodo consultado al historial local"""
+    registro_completado = pyqtSignal(str, int)
+    error_occurred = pyqtSignal(str)
+    
+    def __init__(self, historial: HistorialCotejamiento, periodo: str, resumen: Dict, detalle: List[Dict]):
+        super().__init__()
+        self.historial = historial
+        self.periodo = periodo
+        self.resumen = resumen
+        self.detalle = detalle
         
-        if response.status_code == 200:
-            data = response.json()
-            self.progress_updated.emit(100, "Datos obtenidos exitosamente")
-            self.data_received.emit(data)
+    def run(self):
+        """Registra el periodo en background"""
+        cantidad = self.historial.registrar_periodo(self.periodo, self.resumen, self.detalle)
+        if cantidad < 0:
+            self.error_occurred.emit(f"No se pudo registrar el periodo {self.periodo} en el historial")
         else:
-            self.error_occurred.emit(f"Consulta falló: {response.status_code}")
+            self.registro_completado.emit(self.periodo, cantidad)
 
 class PaymentDetailsDialog(QDialog):
     """Diálogo para mostrar detalles de pagos"""
@@ -374,11 +398,24 @@ class StatCardWidget(QFrame):
 class DataTableWidget(QWidget):
     """Widget de tabla de datos con funcionalidades avanzadas"""
     
+    # Puente del bus de resegmentaciones (que puede publicar desde cualquier hilo) al hilo de la interfaz
+    resegmentacion_cambiada = pyqtSignal(dict)
+    
     def __init__(self):
         super().__init__()
         self.current_data = []
         self.original_data = []  # Para almacenar datos originales con detalles de pagos
         self.filtered_data = []  # Para datos filtrados por búsqueda
+        self.indice_pagos = IndicePagos()  # Índice de detallePagos por póliza e idPago
+        self.seleccion_aclaracion = SeleccionAclaracion()  # Claves de filas marcadas para aclaración
+        self.claves_pagina = []  # Clave de cada fila mostrada en la página actual
+        self.ordenador = OrdenadorColumnas()  # Rangos por columna cacheados para ordenar
+        self.diferencias = None  # Cambios respecto a la consulta anterior del mismo periodo
+        self.cambios = {}  # Clave -> tipo de cambio de las filas visibles en la tabla
+        self.almacen = None  # AlmacenCotejamiento cuando la carga supera UMBRAL_FILAS_SQLITE
+        self.reseg_pagina = None  # Resegmentaciones de la página cruzadas en el almacén
+        self.usuario_local = None  # Usuario que queda registrado al revertir desde el detalle
+        self.export_worker = None
         
         # Variables de paginación
         self.page_size = 100  # Registros por página
@@ -388,9 +425,14 @@ class DataTableWidget(QWidget):
         
         # Base de datos de resegmentaciones
         self.resegmentacion_db = ResegmentacionDB()
+        self.filas_pagina = []  # Filas mostradas en la página actual
         
         self.setup_ui()
         
+        # Repintar solo las filas afectadas cuando se guarda o revierte una resegmentación
+        self.resegmentacion_cambiada.connect(self.actualizar_filas_resegmentacion)
+        bus_resegmentaciones.suscribir(self.on_evento_resegmentacion)
+        
     def setup_ui(self):
         """Configura la interfaz de la tabla"""
         layout = QVBoxLayout()
@@ -430,7 +472,7 @@ class DataTableWidget(QWidget):
 
         
         # Botón exportar - más grande para personas mayores
-        export_btn = QPushButton("📊 Exportar CSV")
+        export_btn = QPushButton("📊 Exportar")
         export_btn.clicked.connect(self.export_to_csv)
         export_btn.setMinimumSize(140, 40)  # Botón más conservador
         export_btn.setStyleSheet("""
@@ -476,15 +518,47 @@ class DataTableWidget(QWidget):
             }
         """)
         
+        # Menú de selección masiva para aclaración
+        seleccion_btn = QPushButton("☑️ Seleccionar")
+        seleccion_btn.setMinimumSize(140, 40)
+        seleccion_menu = QMenu(seleccion_btn)
+        seleccion_menu.addAction("Todos los registros filtrados", self.seleccionar_filtrados_aclaracion)
+        seleccion_menu.addAction("Diferencia mayor a $50", self.seleccionar_diferencia_aclaracion)
+        seleccion_menu.addSeparator()
+        seleccion_menu.addAction("Quitar selección", self.limpiar_seleccion_aclaracion)
+        seleccion_btn.setMenu(seleccion_menu)
+        seleccion_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 14px;
+                font-weight: 600;
+                padding: 8px 16px;
+                border-radius: 6px;
+                background-color: #6b7280;
+                color: white;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #4b5563;
+            }
+        """)
+        
+        # Filtro de cambios respecto a la consulta anterior - visible solo si hubo re-consulta
+        self.solo_cambios_check = QCheckBox("Solo cambios")
+        self.solo_cambios_check.setToolTip("Mostrar solo pólizas nuevas o modificadas desde la consulta anterior")
+        self.solo_cambios_check.setVisible(False)
+        self.solo_cambios_check.toggled.connect(self.filter_table)
+        
         # Info de registros
         self.info_label = QLabel("0 registros")
         
         toolbar.addWidget(search_label)
         toolbar.addWidget(self.search_input)
         toolbar.addWidget(clear_filters_btn)
+        toolbar.addWidget(self.solo_cambios_check)
         toolbar.addStretch()
         toolbar.addWidget(self.info_label)
         toolbar.addWidget(export_btn)
+        toolbar.addWidget(seleccion_btn)
         toolbar.addWidget(self.aclaracion_btn)
         
         layout.addLayout(toolbar)
@@ -493,13 +567,17 @@ class DataTableWidget(QWidget):
         self.table = QTableWidget()
         self.table.setAlternatingRowColors(True)
         self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        # Habilitar ordenamiento pero manejar manualmente para preservar todos los datos
-        self.table.setSortingEnabled(True)
+        # Ordenamiento manual sobre todos los datos: el de Qt solo reordenaría la página visible
+        self.table.setSortingEnabled(False)
         
         # Configurar header
         header = self.table.horizontalHeader()
         header.setStretchLastSection(True)
         header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        header.setToolTip("Clic: ordenar · Shift+clic: agregar criterio · Ctrl+clic: ordenar por valor absoluto")
         
         # Conectar señal de ordenamiento personalizado
         header.sectionClicked.connect(self.handle_column_sort)
@@ -703,8 +781,11 @@ class DataTableWidget(QWidget):
             del converted_data
         gc.collect()
     
-    def load_data_simple(self, data: List[Dict], columns: List[str], original_data: List[Dict]):
-        """Carga datos en la tabla de forma simple sin mapeo con paginación - Optimizado para memoria"""
+    def load_data_simple(self, data: List[Dict], columns: List[str], original_data: List[Dict], indice_pagos=None):
+        """
+        Carga datos en la tabla de forma simple sin mapeo con paginación - Optimizado para memoria
+        indice_pagos permite reutilizar un índice ya construido (p. ej. el de una sesión guardada)
+        """
         import gc
         
         # Liberar datos anteriores explícitamente
@@ -724,11 +805,13 @@ class DataTableWidget(QWidget):
         if not isinstance(original_data, list):
             original_data = []
             
-        # Guardar todos los datos - COPIAR para evitar modificaciones accidentales
-        self.current_data = data.copy() if data else []
-        self.original_data = original_data.copy() if original_data else []
-        self.filtered_data = data.copy() if data else []  # Copiar en lugar de referenciar
         self.columns = columns.copy() if columns else []
+        self.guardar_filas(data, original_data, indice_pagos)
+        self.limpiar_cambios()
+        
+        # Conservar la selección de aclaración solo para filas que siguen existiendo
+        self.seleccion_aclaracion.conservar(self.current_data)
+        self.check_aclaracion_buttons()
         
         print(f"[DEBUG] Datos guardados - current_data: {len(self.current_data)}, original_data: {len(self.original_data)}")
         
@@ -745,6 +828,48 @@ class DataTableWidget(QWidget):
         # Mostrar solo los datos de la página actual
         self.display_current_page()
         
+    def guardar_filas(self, data: List[Dict], original_data: List[Dict], indice_pagos=None):
+        """
+        Guarda las filas de la tabla y reaplica el orden activo. Hasta UMBRAL_FILAS_SQLITE filas
+        se copian a listas; arriba de eso van a un almacén SQLite temporal y current_data,
+        filtered_data y el índice de pagos pasan a ser vistas que solo leen lo que se pide.
+        """
+        self.cerrar_almacen()
+        
+        if len(data) > UMBRAL_FILAS_SQLITE:
+            self.almacen = AlmacenCotejamiento(self.columns, self.resegmentacion_db.db_path)
+            self.almacen.cargar(data, original_data)
+            if self.ordenador.criterios:
+                self.almacen.filtrar(criterios=self.ordenador.criterios)
+            self.current_data = self.almacen.todas()
+            self.filtered_data = self.almacen.vista()
+            self.original_data = []  # El detalle de pagos queda en el almacén
+            # Con el detalle a la mano, los pagos se leen del almacén (y el cruce por idPago se hace en SQL)
+            self.indice_pagos = IndicePagosAlmacen(self.almacen) if original_data or indice_pagos is None else indice_pagos
+            self.ordenador.cargar([])  # El orden se resuelve en SQL; no cachear rangos
+            return
+        
+        # Guardar todos los datos - COPIAR para evitar modificaciones accidentales
+        self.current_data = data.copy() if data else []
+        self.original_data = original_data.copy() if original_data else []
+        self.filtered_data = data.copy() if data else []  # Copiar en lugar de referenciar
+        self.indice_pagos = indice_pagos if indice_pagos is not None else IndicePagos(self.original_data)
+        
+        # Nuevo conjunto de datos: invalidar rangos cacheados y reaplicar el orden activo
+        self.ordenador.cargar(self.current_data)
+        if self.ordenador.criterios:
+            self.filtered_data = self.ordenador.ordenar(self.filtered_data)
+    
+    def cerrar_almacen(self):
+        """Libera el almacén SQLite de la carga anterior, si lo hay"""
+        if self.almacen is None:
+            return
+        # Una exportación en curso lee de su instantánea: el archivo se borra cuando la suelte
+        if not (self.export_worker and self.export_worker.isRunning()):
+            self.almacen.cerrar()
+        self.almacen = None
+        self.reseg_pagina = None
+        
     def cleanup_memory(self):
         """Función auxiliar para limpiar memoria explícitamente"""
         import gc
@@ -833,6 +958,7 @@ class DataTableWidget(QWidget):
             
         # Calcular rango de datos para la página actual - usar slicing eficiente
         if hasattr(self, 'page_size_combo') and self.page_size_combo.currentText() == "Todos":
+            start_idx = 0
             page_data = data_to_show
         else:
             start_idx = (self.current_page - 1) * self.page_size
@@ -849,125 +975,15 @@ class DataTableWidget(QWidget):
         # Configurar headers
         self.table.setHorizontalHeaderLabels(self.columns)
         
+        # Con almacén, las resegmentaciones de la página se cruzan en la base con una sola consulta
+        self.reseg_pagina = (data_to_show.resegmentaciones(start_idx, len(page_data))
+                             if isinstance(data_to_show, VistaAlmacen) else None)
+        
         # Llenar datos
+        self.claves_pagina = [clave_fila(row_data) for row_data in page_data]
+        self.filas_pagina = page_data
         for row_idx, row_data in enumerate(page_data):
-            # Verificar si esta fila tiene resegmentación
-            agente = row_data.get('Agente', '')
-            subramo = row_data.get('Subramo', '')
-            num_poliza = row_data.get('Núm. Póliza', '')
-            
-            # Verificación simple y directa: buscar en la base de datos
-            tiene_resegmentacion = False
-            fecha_resegmentacion = None
-            fecha_primer_pago_resegmentado = None
-            
-            # Verificación de resegmentación - DINÁMICA Y EN TIEMPO REAL
-            reseg_data = self.verificar_resegmentacion_dinamica(agente, subramo, num_poliza)
-            if reseg_data:
-                tiene_resegmentacion = True
-                fecha_resegmentacion = reseg_data.get('fecha_resegmentacion', '')
-                fecha_primer_pago_resegmentado = reseg_data.get('fecha_primer_pago', '')
-                tipo_resegmentacion = reseg_data.get('tipo_resegmentacion', '')
-                print(f"[DEBUG] ✅ RESEGMENTACIÓN ENCONTRADA para {num_poliza} - Tipo: {tipo_resegmentacion}")
-            else:
-                tiene_resegmentacion = False
-            
-
-            
-            for col_idx, column in enumerate(self.columns):
-                if column == 'Aclaración':
-                    # Crear checkbox para la columna Aclaración
-                    checkbox = QCheckBox()
-                    checkbox.setChecked(row_data.get(column, False))
-                    checkbox.stateChanged.connect(self.check_aclaracion_buttons)
-                    
-                    # Centrar el checkbox
-                    widget = QWidget()
-                    layout = QHBoxLayout(widget)
-                    layout.addWidget(checkbox)
-                    layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    layout.setContentsMargins(0, 0, 0, 0)
-                    
-                    self.table.setCellWidget(row_idx, col_idx, widget)
-                
-                elif column == 'Resegmentación':
-                    # Columna de resegmentación
-                    if tiene_resegmentacion:
-                        try:
-                            # Mostrar la fecha del primer pago resegmentado (más relevante para el usuario)
-                            if fecha_primer_pago_resegmentado:
-                                from datetime import datetime
-                                # Intentar parsear diferentes formatos de fecha
-                                fecha_display = fecha_primer_pago_resegmentado
-                                try:
-                                    # Si es formato ISO
-                                    if 'T' in fecha_primer_pago_resegmentado:
-                                        dt = datetime.fromisoformat(fecha_primer_pago_resegmentado.replace('Z', '+00:00'))
-                                        fecha_display = dt.strftime("%d/%m/%Y")
-                                    # Si ya está en formato DD/MM/YYYY o similar
-                                    elif '/' in fecha_primer_pago_resegmentado or '-' in fecha_primer_pago_resegmentado:
-                                        fecha_display = fecha_primer_pago_resegmentado
-                                except:
-                                    fecha_display = fecha_primer_pago_resegmentado
-                                
-                                item = QTableWidgetItem(f"📅 {fecha_display}")
-                                item.setToolTip(f"Primer pago resegmentado: {fecha_display}\nHaz clic para ver detalles de resegmentación")
-                            else:
-                                item = QTableWidgetItem("✅ Resegmentada")
-                                item.setToolTip("Haz clic para ver detalles de resegmentación")
-                            
-                            item.setBackground(QColor(80, 80, 80))  # Gris oscuro para resegmentadas
-                            item.setForeground(QColor(255, 255, 255))  # Texto blanco
-                        except Exception as e:
-                            print(f"[ERROR] Error formateando fecha resegmentación: {e}")
-                            item = QTableWidgetItem("✅ Resegmentada")
-                            item.setBackground(QColor(80, 80, 80))
-                            item.setForeground(QColor(255, 255, 255))
-                    else:
-                        item = QTableWidgetItem("")
-                    
-                    self.table.setItem(row_idx, col_idx, item)
-                
-                else:
-                    value = row_data.get(column, '')
-                    item = QTableWidgetItem(str(value))
-                    
-                    # Aplicar sombreado base si la fila tiene resegmentación
-                    if tiene_resegmentacion:
-                        item.setBackground(QColor(64, 64, 64))  # Gris oscuro para toda la fila
-                        item.setForeground(QColor(255, 255, 255))  # Texto blanco
-                        print(f"[DEBUG] 🎨 APLICANDO gris oscuro a {num_poliza} columna {column}")
-                    
-                    # Colorear celdas especiales (pueden sobrescribir el color base)
-                    if 'diferencia' in column.lower():
-                        try:
-                            # Extraer valor numérico de strings como "$-123.45"
-                            numeric_value = float(str(value).replace('$', '').replace(',', '').replace('+', ''))
-                            if numeric_value > 0:
-                                if tiene_resegmentacion:
-                                    item.setBackground(QColor(34, 139, 34))  # Verde oscuro para resegmentadas
-                                    item.setForeground(QColor(255, 255, 255))  # Texto blanco
-                                else:
-                                    item.setBackground(QColor(220, 252, 231))  # Verde claro para normales
-                            elif numeric_value < 0:
-                                if tiene_resegmentacion:
-                                    item.setBackground(QColor(139, 34, 34))  # Rojo oscuro para resegmentadas
-                                    item.setForeground(QColor(255, 255, 255))  # Texto blanco
-                                else:
-                                    item.setBackground(QColor(254, 226, 226))  # Rojo claro para normales
-                        except (ValueError, TypeError):
-                            pass
-                    
-                    # Hacer clickeable la columna Detalles Pagos si tiene pagos
-                    elif column == 'Detalles Pagos' and value and str(value).isdigit() and int(value) > 0:
-                        if tiene_resegmentacion:
-                            item.setBackground(QColor(30, 144, 255))  # Azul oscuro para resegmentadas
-                            item.setForeground(QColor(255, 255, 255))  # Texto blanco
-                        else:
-                            item.setBackground(QColor(173, 216, 230))  # Azul claro para normales
-                        item.setToolTip("Haz clic para ver detalles de pagos")
-                            
-                    self.table.setItem(row_idx, col_idx, item)
+            self.pintar_fila(row_idx, row_data)
         
         # Ajustar columnas
         self.table.resizeColumnsToContents()
@@ -983,6 +999,149 @@ class DataTableWidget(QWidget):
             del data_to_show
         gc.collect()
         
+    def pintar_fila(self, row_idx: int, row_data: Dict, con_controles: bool = True):
+        """
+        Llena y colorea una fila de la tabla según su estado de resegmentación.
+        Con con_controles=False no recrea el checkbox de Aclaración (repintado de una sola fila).
+        """
+        # Verificar si esta fila tiene resegmentación
+        agente = row_data.get('Agente', '')
+        subramo = row_data.get('Subramo', '')
+        num_poliza = row_data.get('Núm. Póliza', '')
+        
+        # Verificación simple y directa: buscar en la base de datos
+        tiene_resegmentacion = False
+        fecha_primer_pago_resegmentado = None
+        
+        # Verificación de resegmentación - DINÁMICA Y EN TIEMPO REAL
+        # (al pintar la página completa con almacén, la del cruce en SQL si lo resolvió)
+        clave = self.claves_pagina[row_idx]
+        if con_controles and self.reseg_pagina is not None and clave in self.reseg_pagina:
+            reseg_data = self.reseg_pagina[clave]
+        else:
+            reseg_data = self.verificar_resegmentacion_dinamica(agente, subramo, num_poliza)
+        if reseg_data:
+            tiene_resegmentacion = True
+            fecha_primer_pago_resegmentado = reseg_data.get('fecha_primer_pago', '')
+            tipo_resegmentacion = reseg_data.get('tipo_resegmentacion', '')
+            print(f"[DEBUG] ✅ RESEGMENTACIÓN ENCONTRADA para {num_poliza} - Tipo: {tipo_resegmentacion}")
+        else:
+            tiene_resegmentacion = False
+        
+        for col_idx, column in enumerate(self.columns):
+            if column == 'Aclaración':
+                if not con_controles:
+                    continue  # El checkbox existente no depende de la resegmentación
+                
+                # Crear checkbox para la columna Aclaración
+                checkbox = QCheckBox()
+                clave = self.claves_pagina[row_idx]
+                checkbox.setChecked(self.seleccion_aclaracion.contiene(clave))
+                # La selección vive en el modelo para que sobreviva al cambio de página
+                checkbox.toggled.connect(lambda checked, clave=clave: self.marcar_aclaracion(clave, checked))
+                
+                # Centrar el checkbox
+                widget = QWidget()
+                layout = QHBoxLayout(widget)
+                layout.addWidget(checkbox)
+                layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                layout.setContentsMargins(0, 0, 0, 0)
+                
+                self.table.setCellWidget(row_idx, col_idx, widget)
+            
+            elif column == 'Resegmentación':
+                # Columna de resegmentación
+                if tiene_resegmentacion:
+                    try:
+                        # Mostrar la fecha del primer pago resegmentado (más relevante para el usuario)
+                        if fecha_primer_pago_resegmentado:
+                            from datetime import datetime
+                            # Intentar parsear diferentes formatos de fecha
+                            fecha_display = fecha_primer_pago_resegmentado
+                            try:
+                                # Si es formato ISO
+                                if 'T' in fecha_primer_pago_resegmentado:
+                                    dt = datetime.fromisoformat(fecha_primer_pago_resegmentado.replace('Z', '+00:00'))
+                                    fecha_display = dt.strftime("%d/%m/%Y")
+                                # Si ya está en formato DD/MM/YYYY o similar
+                                elif '/' in fecha_primer_pago_resegmentado or '-' in fecha_primer_pago_resegmentado:
+                                    fecha_display = fecha_primer_pago_resegmentado
+                            except:
+                                fecha_display = fecha_primer_pago_resegmentado
+                            
+                            item = QTableWidgetItem(f"📅 {fecha_display}")
+                            item.setToolTip(f"Primer pago resegmentado: {fecha_display}\nHaz clic para ver detalles de resegmentación")
+                        else:
+                            item = QTableWidgetItem("✅ Resegmentada")
+                            item.setToolTip("Haz clic para ver detalles de resegmentación")
+                        
+                        item.setBackground(QColor(80, 80, 80))  # Gris oscuro para resegmentadas
+                        item.setForeground(QColor(255, 255, 255))  # Texto blanco
+                    except Exception as e:
+                        print(f"[ERROR] Error formateando fecha resegmentación: {e}")
+                        item = QTableWidgetItem("✅ Resegmentada")
+                        item.setBackground(QColor(80, 80, 80))
+                        item.setForeground(QColor(255, 255, 255))
+                else:
+                    item = QTableWidgetItem("")
+                
+                self.table.setItem(row_idx, col_idx, item)
+            
+            else:
+                value = row_data.get(column, '')
+                item = QTableWidgetItem(str(value))
+                
+                # Aplicar sombreado base si la fila tiene resegmentación
+                if tiene_resegmentacion:
+                    item.setBackground(QColor(64, 64, 64))  # Gris oscuro para toda la fila
+                    item.setForeground(QColor(255, 255, 255))  # Texto blanco
+                    print(f"[DEBUG] 🎨 APLICANDO gris oscuro a {num_poliza} columna {column}")
+                
+                # Marcar pólizas nuevas o modificadas desde la consulta anterior
+                if column == 'Núm. Póliza' and self.cambios:
+                    tipo_cambio = self.cambios.get(self.claves_pagina[row_idx])
+                    if tipo_cambio:
+                        # El texto no se altera: on_cell_clicked lee las celdas para ubicar la póliza
+                        fuente = item.font()
+                        fuente.setBold(True)
+                        item.setFont(fuente)
+                        item.setToolTip(self.diferencias.descripcion(self.claves_pagina[row_idx]))
+                        if not tiene_resegmentacion:
+                            # Azul claro para nuevas, ámbar claro para modificadas
+                            item.setBackground(QColor(219, 234, 254) if tipo_cambio == CAMBIO_AGREGADA
+                                               else QColor(254, 243, 199))
+                
+                # Colorear celdas especiales (pueden sobrescribir el color base)
+                if 'diferencia' in column.lower():
+                    try:
+                        # Extraer valor numérico de strings como "$-123.45"
+                        numeric_value = float(str(value).replace('$', '').replace(',', '').replace('+', ''))
+                        if numeric_value > 0:
+                            if tiene_resegmentacion:
+                                item.setBackground(QColor(34, 139, 34))  # Verde oscuro para resegmentadas
+                                item.setForeground(QColor(255, 255, 255))  # Texto blanco
+                            else:
+                                item.setBackground(QColor(220, 252, 231))  # Verde claro para normales
+                        elif numeric_value < 0:
+                            if tiene_resegmentacion:
+                                item.setBackground(QColor(139, 34, 34))  # Rojo oscuro para resegmentadas
+                                item.setForeground(QColor(255, 255, 255))  # Texto blanco
+                            else:
+                                item.setBackground(QColor(254, 226, 226))  # Rojo claro para normales
+                    except (ValueError, TypeError):
+                        pass
+                
+                # Hacer clickeable la columna Detalles Pagos si tiene pagos
+                elif column == 'Detalles Pagos' and value and str(value).isdigit() and int(value) > 0:
+                    if tiene_resegmentacion:
+                        item.setBackground(QColor(30, 144, 255))  # Azul oscuro para resegmentadas
+                        item.setForeground(QColor(255, 255, 255))  # Texto blanco
+                    else:
+                        item.setBackground(QColor(173, 216, 230))  # Azul claro para normales
+                    item.setToolTip("Haz clic para ver detalles de pagos")
+                        
+                self.table.setItem(row_idx, col_idx, item)
+
     def update_pagination_controls(self):
         """Actualiza los controles de paginación"""
         # Verificar que los controles existen
@@ -1072,24 +1231,14 @@ class DataTableWidget(QWidget):
         self.calculate_pagination()
         self.display_current_page()
     
+    def marcar_aclaracion(self, clave: tuple, checked: bool):
+        """Registra en la selección el estado del checkbox de aclaración"""
+        self.seleccion_aclaracion.alternar(clave, checked)
+        self.check_aclaracion_buttons()
+    
     def check_aclaracion_buttons(self):
-        """Verifica si hay checkboxes seleccionados y muestra/oculta el botón de aclaración"""
-        selected_count = 0
-        
-        for row in range(self.table.rowCount()):
-            # Buscar la columna de Aclaración
-            aclaracion_col = -1
-            for col in range(self.table.columnCount()):
-                if self.table.horizontalHeaderItem(col).text() == 'Aclaración':
-                    aclaracion_col = col
-                    break
-            
-            if aclaracion_col >= 0:
-                widget = self.table.cellWidget(row, aclaracion_col)
-                if widget:
-                    checkbox = widget.findChild(QCheckBox)
-                    if checkbox and checkbox.isChecked():
-                        selected_count += 1
+        """Muestra/oculta el botón de aclaración según el tamaño de la selección"""
+        selected_count = len(self.seleccion_aclaracion)
         
         # Mostrar/ocultar botón según si hay selecciones
         self.aclaracion_btn.setVisible(selected_count > 0)
@@ -1100,61 +1249,54 @@ class DataTableWidget(QWidget):
         else:
             self.aclaracion_btn.setText("📋 Reporte Aclaración")
     
+    def refrescar_checkboxes_aclaracion(self):
+        """Sincroniza los checkboxes de la página actual con la selección sin redibujar la tabla"""
+        if 'Aclaración' not in getattr(self, 'columns', []):
+            return
+        aclaracion_col = self.columns.index('Aclaración')
+        
+        for row_idx, clave in enumerate(self.claves_pagina):
+            widget = self.table.cellWidget(row_idx, aclaracion_col)
+            checkbox = widget.findChild(QCheckBox) if widget else None
+            if checkbox:
+                checkbox.blockSignals(True)
+                checkbox.setChecked(self.seleccion_aclaracion.contiene(clave))
+                checkbox.blockSignals(False)
+        
+        self.check_aclaracion_buttons()
+    
+    def seleccionar_filtrados_aclaracion(self):
+        """Marca para aclaración todos los registros de la vista actual (todas las páginas)"""
+        agregadas = self.seleccion_aclaracion.seleccionar_filas(self.filtered_data)
+        print(f"[DEBUG] Aclaración: {agregadas} registros filtrados agregados a la selección")
+        self.refrescar_checkboxes_aclaracion()
+    
+    def seleccionar_diferencia_aclaracion(self):
+        """Marca para aclaración los registros filtrados con diferencia mayor a $50"""
+        agregadas = self.seleccion_aclaracion.seleccionar_filas(self.filtered_data, diferencia_mayor_a(50))
+        print(f"[DEBUG] Aclaración: {agregadas} registros con diferencia > $50 agregados a la selección")
+        self.refrescar_checkboxes_aclaracion()
+    
+    def limpiar_seleccion_aclaracion(self):
+        """Quita todas las marcas de aclaración"""
+        self.seleccion_aclaracion.limpiar()
+        self.refrescar_checkboxes_aclaracion()
+    
     def export_aclaracion(self):
-        """Exporta solo los registros marcados para aclaración"""
-        try:
-            selected_data = []
-            
-            for row in range(self.table.rowCount()):
-                # Buscar la columna de Aclaración
-                aclaracion_col = -1
-                for col in range(self.table.columnCount()):
-                    if self.table.horizontalHeaderItem(col).text() == 'Aclaración':
-                        aclaracion_col = col
-                        break
-                
-                if aclaracion_col >= 0:
-                    widget = self.table.cellWidget(row, aclaracion_col)
-                    if widget:
-                        checkbox = widget.findChild(QCheckBox)
-                        if checkbox and checkbox.isChecked():
-                            # Obtener datos de la fila
-                            row_data = {}
-                            for col in range(self.table.columnCount()):
-                                header = self.table.horizontalHeaderItem(col).text()
-                                if header != 'Aclaración':  # Excluir la columna de checkbox
-                                    item = self.table.item(row, col)
-                                    if item:
-                                        row_data[header] = item.text()
-                                    else:
-                                        row_data[header] = ''
-                            selected_data.append(row_data)
-            
-            if not selected_data:
-                QMessageBox.warning(self, "Advertencia", "No hay registros seleccionados para aclaración")
-                return
-            
-            # Diálogo para guardar archivo
-            filename, _ = QFileDialog.getSaveFileName(
-                self, "Exportar Reporte de Aclaración", 
-                f"reporte_aclaracion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                "CSV files (*.csv)"
-            )
-            
-            if filename:
-                # Escribir CSV
-                with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                    if selected_data:
-                        fieldnames = list(selected_data[0].keys())
-                        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                        writer.writeheader()
-                        writer.writerows(selected_data)
-                
-                QMessageBox.information(self, "Éxito", 
-                                      f"Reporte de aclaración exportado exitosamente.\nArchivo: {filename}\nRegistros: {len(selected_data)}")
+        """Exporta todos los registros marcados para aclaración, en el orden de la vista actual"""
+        if not len(self.seleccion_aclaracion):
+            QMessageBox.warning(self, "Advertencia", "No hay registros seleccionados para aclaración")
+            return
         
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error al exportar reporte de aclaración: {str(e)}")
+        # Primero los marcados visibles en el orden actual, luego los que el filtro oculta
+        selected_data = self.seleccion_aclaracion.filas_seleccionadas(self.filtered_data)
+        if len(selected_data) < len(self.seleccion_aclaracion):
+            visibles = {clave_fila(row_data) for row_data in selected_data}
+            selected_data += [row_data for row_data in self.seleccion_aclaracion.filas_seleccionadas(self.current_data)
+                              if clave_fila(row_data) not in visibles]
+        
+        self.iniciar_exportacion(selected_data, "Exportar Reporte de Aclaración",
+                                 f"reporte_aclaracion_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
     
     def clear_filters(self):
         """Limpia todos los filtros de la tabla con paginación - Corregido para sorting"""
@@ -1165,16 +1307,14 @@ class DataTableWidget(QWidget):
             print(f"[DEBUG] Datos antes de limpiar - current_data: {len(self.current_data) if hasattr(self, 'current_data') else 0}")
             print(f"[DEBUG] Datos antes de limpiar - filtered_data: {len(self.filtered_data) if hasattr(self, 'filtered_data') else 0}")
             
-            # Limpiar campo de búsqueda
+            # Limpiar campo de búsqueda y filtro de cambios
             self.search_input.clear()
+            self.solo_cambios_check.blockSignals(True)
+            self.solo_cambios_check.setChecked(False)
+            self.solo_cambios_check.blockSignals(False)
             
-            # IMPORTANTE: Desactivar temporalmente el sorting para evitar conflictos
-            sorting_was_enabled = self.table.isSortingEnabled()
-            if sorting_was_enabled:
-                self.table.setSortingEnabled(False)
-                print("[DEBUG] Sorting desactivado temporalmente")
-            
-            # Limpiar estado de sorting visual
+            # Limpiar criterios de orden y estado de sorting visual
+            self.ordenador.limpiar_criterios()
             horizontal_header = self.table.horizontalHeader()
             horizontal_header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
             
@@ -1189,21 +1329,14 @@ class DataTableWidget(QWidget):
                 QMessageBox.warning(self, "Advertencia", "No hay datos para restaurar.")
                 return
             
-            # Limpiar checkboxes de aclaración en todos los datos originales
-            for item in self.current_data:
-                if 'Aclaración' in item:
-                    item['Aclaración'] = False
+            # Limpiar selección de aclaración
+            self.seleccion_aclaracion.limpiar()
             
             # Usar función auxiliar para restaurar tabla completamente
             if not self.restore_table_to_original_state():
                 print("[ERROR] Falló la restauración de la tabla")
                 return
             
-            # Reactivar sorting si estaba activado
-            if sorting_was_enabled:
-                self.table.setSortingEnabled(True)
-                print("[DEBUG] Sorting reactivado")
-            
             # Actualizar botones de aclaración
             if hasattr(self, 'check_aclaracion_buttons'):
                 self.check_aclaracion_buttons()
@@ -1221,9 +1354,104 @@ class DataTableWidget(QWidget):
             traceback.print_exc()
             QMessageBox.critical(self, "Error", f"Error al limpiar filtros: {str(e)}")
     
+    def set_usuario_local(self, usuario_info):
+        """Usuario que queda registrado al revertir desde el detalle"""
+        self.usuario_local = usuario_info
+    
     def set_original_data(self, original_data: List[Dict]):
         """Configura los datos originales con detalles de pagos"""
         self.original_data = original_data
+        self.indice_pagos = IndicePagos(original_data)
+    
+    def limpiar_cambios(self):
+        """Olvida los cambios de la consulta anterior y oculta su filtro"""
+        self.diferencias = None
+        self.cambios = {}
+        self.solo_cambios_check.blockSignals(True)
+        self.solo_cambios_check.setChecked(False)
+        self.solo_cambios_check.blockSignals(False)
+        self.solo_cambios_check.setVisible(False)
+    
+    def aplicar_diferencias(self, data: List[Dict], original_data: List[Dict], diferencias: DiferenciasDetalle,
+                            indice_pagos=None):
+        """
+        Actualiza la tabla con una nueva consulta del mismo periodo tocando solo las filas que cambiaron.
+        Las filas modificadas se actualizan en su lugar, por lo que la selección, el orden y la página se conservan.
+        Con almacén SQLite las filas no se editan una a una: se recargan en el orden de la consulta nueva.
+        """
+        usar_almacen = self.almacen is not None or len(data) > UMBRAL_FILAS_SQLITE
+        if not usar_almacen:
+            self.original_data = original_data
+            self.indice_pagos = indice_pagos if indice_pagos is not None else IndicePagos(original_data)
+        
+        if len(diferencias) and usar_almacen:
+            self.guardar_filas(data, original_data, indice_pagos)
+            self.seleccion_aclaracion.conservar(self.current_data)
+            self.check_aclaracion_buttons()
+        elif len(diferencias):
+            nuevas = {clave_fila(row_data): row_data for row_data in data}
+            
+            # Quitar eliminadas y actualizar modificadas en su lugar
+            filas = []
+            for row_data in self.current_data:
+                clave = clave_fila(row_data)
+                if clave in diferencias.eliminadas:
+                    continue
+                if clave in diferencias.modificadas and clave in nuevas:
+                    row_data.update(nuevas[clave])
+                filas.append(row_data)
+            
+            # Las agregadas van al final, en el orden de la consulta
+            filas.extend(nuevas[clave] for clave in diferencias.agregadas if clave in nuevas)
+            self.current_data = filas
+            
+            # Los valores cambiaron: invalidar rangos de orden y limpiar selección de filas eliminadas
+            self.ordenador.cargar(self.current_data)
+            self.seleccion_aclaracion.conservar(self.current_data)
+            self.check_aclaracion_buttons()
+        
+        # Filas marcadas por la consulta anterior: hay que quitarles la marca aunque ya no cambien
+        anteriores = self.cambios
+        self.diferencias = diferencias
+        self.cambios = diferencias.cambios_por_clave()
+        self.solo_cambios_check.setVisible(bool(self.cambios))
+        filtrando_cambios = self.solo_cambios_check.isChecked()
+        if not self.cambios and filtrando_cambios:
+            self.solo_cambios_check.blockSignals(True)
+            self.solo_cambios_check.setChecked(False)
+            self.solo_cambios_check.blockSignals(False)
+        
+        if not len(diferencias) and not filtrando_cambios:
+            # Nada cambió: solo se repintan las filas visibles que seguían marcadas
+            for row_idx, clave in enumerate(self.claves_pagina):
+                if clave in anteriores:
+                    self.pintar_fila(row_idx, self.filas_pagina[row_idx], con_controles=False)
+            return
+        
+        # Reaplicar filtros conservando la página actual cuando sigue existiendo
+        self.aplicar_filtros()
+        self.total_records = len(self.filtered_data)
+        self.calculate_pagination()
+        self.current_page = min(self.current_page, max(1, self.total_pages))
+        
+        if self.page_size_combo.currentText() == "Todos":
+            inicio, fin = 0, len(self.filtered_data)
+        else:
+            inicio = (self.current_page - 1) * self.page_size
+            fin = min(inicio + self.page_size, len(self.filtered_data))
+        pagina = self.filtered_data[inicio:fin]
+        if [clave_fila(row_data) for row_data in pagina] != self.claves_pagina:
+            # Entraron o salieron filas de la página: se redibuja completa
+            self.display_current_page()
+            return
+        
+        # Mismas filas en el mismo lugar: repintar solo las que cambiaron o tenían marca
+        self.filas_pagina = pagina
+        for row_idx, clave in enumerate(self.claves_pagina):
+            if clave in anteriores or clave in self.cambios:
+                self.pintar_fila(row_idx, pagina[row_idx], con_controles=False)
+        self.update_info()
+        self.update_pagination_controls()
     
     def restore_table_to_original_state(self):
         """Restaura la tabla completamente a su estado original sin filtros ni sorting"""
@@ -1234,15 +1462,15 @@ class DataTableWidget(QWidget):
             return False
         
         try:
-            # Desactivar sorting temporalmente
-            self.table.setSortingEnabled(False)
-            
             # Limpiar completamente la tabla
             self.table.clearContents()
             self.table.setRowCount(0)
             
             # Restaurar datos filtrados
-            self.filtered_data = self.current_data.copy()
+            if self.almacen is not None:
+                self.aplicar_filtros()  # Búsqueda y orden ya limpios: la vista vuelve al orden de carga
+            else:
+                self.filtered_data = self.current_data.copy()
             self.total_records = len(self.filtered_data)
             
             # Resetear paginación
@@ -1252,9 +1480,6 @@ class DataTableWidget(QWidget):
             # Recargar tabla completamente
             self.display_current_page()
             
-            # Reactivar sorting
-            self.table.setSortingEnabled(True)
-            
             print(f"[DEBUG] Tabla restaurada exitosamente con {len(self.filtered_data)} registros")
             return True
             
@@ -1300,10 +1525,10 @@ class DataTableWidget(QWidget):
         
         # Si la fila tiene resegmentación, mostrar detalles de resegmentación
         if tiene_resegmentacion and resegmentacion_data:
-            dialog = ResegmentacionDetailsDialog(resegmentacion_data, self)
-            if dialog.exec() == QDialog.DialogCode.Accepted:
-                # Refrescar la tabla después de posibles cambios
-                self.display_current_page()
+            # Si se revierte, la base de datos lo publica en el bus y se repinta solo esta fila
+            usuario = self.usuario_local.get('email', '') if self.usuario_local else ''
+            dialog = ResegmentacionDetailsDialog(resegmentacion_data, self, self.resegmentacion_db, usuario)
+            dialog.exec()
             return
         
         # Si no tiene resegmentación, procesar clicks normales
@@ -1321,43 +1546,11 @@ class DataTableWidget(QWidget):
     
     def find_payment_details_specific(self, agente_buscado: str, subramo_buscado: str, num_poliza: str) -> List[Dict]:
         """Busca los detalles de pagos para una póliza específica usando agente, subramo y número de póliza"""
-        for item in self.original_data:
-            agente = item.get('agente', '')
-            subramos = item.get('subramos', [])
-            
-            # Verificar que coincida el agente
-            if agente != agente_buscado:
-                continue
-                
-            for subramo_data in subramos:
-                subramo_nombre = subramo_data.get('subramo', '')
-                
-                # Verificar que coincida el subramo
-                if subramo_nombre != subramo_buscado:
-                    continue
-                    
-                polizas = subramo_data.get('polizas', [])
-                for poliza in polizas:
-                    if poliza.get('numPoliza') == num_poliza:
-                        prima_proyectada = poliza.get('primaProyectada', {})
-                        return prima_proyectada.get('detallePagos', [])
-        
-        return []
+        return self.indice_pagos.pagos_de(agente_buscado, subramo_buscado, num_poliza)
 
     def find_payment_details(self, num_poliza: str) -> List[Dict]:
         """Busca los detalles de pagos para una póliza específica (método original mantenido para compatibilidad)"""
-        for item in self.original_data:
-            agente = item.get('agente', '')
-            subramos = item.get('subramos', [])
-            
-            for subramo in subramos:
-                polizas = subramo.get('polizas', [])
-                for poliza in polizas:
-                    if poliza.get('numPoliza') == num_poliza:
-                        prima_proyectada = poliza.get('primaProyectada', {})
-                        return prima_proyectada.get('detallePagos', [])
-        
-        return []
+        return self.indice_pagos.pagos_de_poliza(num_poliza)
     
 
     def verificar_resegmentacion_dinamica(self, agente: str, subramo: str, num_poliza: str) -> Optional[Dict]:
@@ -1367,32 +1560,23 @@ class DataTableWidget(QWidget):
         Retorna los datos de la resegmentación si existe, None si no existe.
         """
         try:
+            # Solo columnas de estado y fechas: los JSON se leen al abrir el diálogo de detalles
             # Método 1: Búsqueda directa por póliza
-            reseg_data = self.resegmentacion_db.obtener_resegmentacion(agente, subramo, num_poliza)
+            reseg_data = self.resegmentacion_db.obtener_resegmentacion(agente, subramo, num_poliza, COLUMNAS_ESTADO)
             if reseg_data and reseg_data.get('estado', 'ACTIVO').upper() == 'ACTIVO':
                 return reseg_data
             
             # Método 2: Búsqueda por número de póliza exacto (para casos de nuevo negocio)
-            all_resegmentaciones = self.resegmentacion_db.obtener_todas_resegmentaciones()
-            for reseg in all_resegmentaciones:
-                if reseg.get('estado', 'ACTIVO').upper() == 'ACTIVO':
-                    # Comparación EXACTA de números de póliza
-                    poliza_db = str(reseg.get('num_poliza', '')).strip().upper()
-                    poliza_actual = str(num_poliza).strip().upper()
-                    
-                    # Verificar póliza de nuevo negocio registrada
-                    poliza_nuevo_negocio = str(reseg.get('num_poliza_nuevo_negocio', '')).strip().upper()
-                    
-                    # SOLO comparaciones exactas
-                    if poliza_db == poliza_actual or (poliza_nuevo_negocio and poliza_nuevo_negocio == poliza_actual):
-                        return reseg
+            reseg_data = self.resegmentacion_db.obtener_resegmentacion_por_poliza(num_poliza)
+            if reseg_data:
+                return reseg_data
             
             # Método 3: Búsqueda por pago_id (solo para resegmentaciones Prima)
             payment_details = self.find_payment_details(num_poliza)
             for pago in payment_details:
                 pago_id = pago.get('idPago', '')
                 if pago_id:
-                    reseg_data = self.resegmentacion_db.obtener_resegmentacion_por_pago_id(pago_id)
+                    reseg_data = self.resegmentacion_db.obtener_resegmentacion_por_pago_id(pago_id, COLUMNAS_ESTADO)
                     if reseg_data and reseg_data.get('estado', 'ACTIVO').upper() == 'ACTIVO':
                         return reseg_data
             
@@ -1403,7 +1587,10 @@ class DataTableWidget(QWidget):
             return None
 
     def handle_column_sort(self, logical_index):
-        """Maneja el ordenamiento personalizado de columnas preservando todos los datos"""
+        """
+        Ordena todos los datos filtrados por la columna clickeada.
+        Shift+clic agrega la columna como criterio secundario; Ctrl+clic ordena por valor absoluto.
+        """
         try:
             if not hasattr(self, 'filtered_data') or not self.filtered_data:
                 return
@@ -1412,43 +1599,23 @@ class DataTableWidget(QWidget):
                 return
                 
             column_name = self.columns[logical_index]
+            if column_name in ('Aclaración', 'Resegmentación'):
+                return
             
-            # Determinar el orden de ordenamiento
-            header = self.table.horizontalHeader()
-            current_sort_order = header.sortIndicatorOrder()
+            modifiers = QApplication.keyboardModifiers()
+            agregar = bool(modifiers & Qt.KeyboardModifier.ShiftModifier)
+            if modifiers & Qt.KeyboardModifier.ControlModifier:
+                column_name = OrdenadorColumnas.nombre_absoluto(column_name)
             
-            # Alternar entre ascendente y descendente
-            if current_sort_order == Qt.SortOrder.AscendingOrder:
-                sort_order = Qt.SortOrder.DescendingOrder
-                reverse = True
-            else:
-                sort_order = Qt.SortOrder.AscendingOrder
-                reverse = False
-            
-            print(f"[DEBUG] Ordenando por columna: {column_name}, orden: {'DESC' if reverse else 'ASC'}")
-            
-            # Desactivar temporalmente el ordenamiento automático para evitar conflictos
-            self.table.setSortingEnabled(False)
-            
-            # Ordenar todos los datos filtrados
-            def sort_key(item):
-                value = item.get(column_name, '')
-                # Manejar diferentes tipos de datos
-                if isinstance(value, str):
-                    # Intentar convertir a número si parece numérico
-                    if value.replace('.', '').replace(',', '').replace('-', '').replace('+', '').replace('$', '').isdigit():
-                        try:
-                            return float(value.replace('$', '').replace(',', '').replace('+', ''))
-                        except:
-                            return value.lower()
-                    return value.lower()
-                elif isinstance(value, (int, float)):
-                    return value
-                else:
-                    return str(value).lower()
+            criterios = self.ordenador.establecer_criterio(column_name, agregar)
+            descripcion = ', '.join(f"{c} {'DESC' if d else 'ASC'}" for c, d in criterios)
+            print(f"[DEBUG] Ordenando por: {descripcion}")
             
-            # Ordenar los datos
-            self.filtered_data.sort(key=sort_key, reverse=reverse)
+            # Ordenar todos los datos filtrados con los rangos cacheados (o en SQL con almacén)
+            if self.almacen is not None:
+                self.aplicar_filtros()
+            else:
+                self.filtered_data = self.ordenador.ordenar(self.filtered_data)
             
             # Resetear a la primera página después del ordenamiento
             self.current_page = 1
@@ -1457,17 +1624,48 @@ class DataTableWidget(QWidget):
             # Mostrar los datos ordenados
             self.display_current_page()
             
-            # Reactivar el ordenamiento y establecer el indicador visual
-            self.table.setSortingEnabled(True)
-            header.setSortIndicator(logical_index, sort_order)
+            # El indicador visual muestra el criterio principal
+            columna_principal, descendente = criterios[0]
+            if columna_principal not in self.columns:
+                columna_principal = columna_principal[1:-1]  # "|Diferencia|" -> "Diferencia"
+            header = self.table.horizontalHeader()
+            header.setSortIndicator(self.columns.index(columna_principal),
+                                    Qt.SortOrder.DescendingOrder if descendente else Qt.SortOrder.AscendingOrder)
             
             print(f"[DEBUG] Ordenamiento completado. Mostrando página 1 de {self.total_pages}")
             
         except Exception as e:
             print(f"[ERROR] Error en ordenamiento personalizado: {e}")
-            # Reactivar el ordenamiento en caso de error
-            self.table.setSortingEnabled(True)
 
+    def on_evento_resegmentacion(self, evento: Dict):
+        """Recibe el evento del bus y lo pasa al hilo de la interfaz"""
+        self.resegmentacion_cambiada.emit(evento)
+    
+    def filas_afectadas(self, evento: Dict) -> List[int]:
+        """Índices de la página actual que corresponden a la póliza o pago del evento"""
+        polizas = {p.strip().upper() for p in (evento.get('num_poliza', ''), evento.get('num_poliza_nuevo_negocio', '')) if p}
+        pago_id = evento.get('pago_id', '')
+        
+        afectadas = []
+        for row_idx, (agente, subramo, num_poliza) in enumerate(self.claves_pagina):
+            if num_poliza.strip().upper() in polizas:
+                afectadas.append(row_idx)
+            elif pago_id and any(str(p.get('idPago', '')) == pago_id
+                                 for p in self.indice_pagos.pagos_de(agente, subramo, num_poliza)):
+                afectadas.append(row_idx)
+        return afectadas
+    
+    def actualizar_filas_resegmentacion(self, evento: Dict):
+        """Vuelve a consultar y pintar solo las filas visibles afectadas por el evento"""
+        try:
+            filas = self.filas_afectadas(evento)
+            for row_idx in filas:
+                if row_idx < len(self.filas_pagina) and row_idx < self.table.rowCount():
+                    self.pintar_fila(row_idx, self.filas_pagina[row_idx], con_controles=False)
+            print(f"[DEBUG] Resegmentación {evento.get('accion', '')}: {len(filas)} fila(s) repintada(s)")
+        except Exception as e:
+            print(f"[ERROR] Error actualizando filas de resegmentación: {e}")
+    
     def actualizar_visualizacion_resegmentaciones(self):
         """
         Actualiza la visualización de la tabla para reflejar nuevas resegmentaciones.
@@ -1489,31 +1687,10 @@ class DataTableWidget(QWidget):
     def buscar_poliza_por_pago_id(self, pago_id: str) -> Optional[Dict]:
         """Busca la póliza que contiene un pago_id específico en los datos originales"""
         try:
-            for item in self.original_data:
-                agente = item.get('agente', '')
-                subramos = item.get('subramos', [])
-                
-                for subramo_data in subramos:
-                    subramo = subramo_data.get('subramo', '')
-                    polizas = subramo_data.get('polizas', [])
-                    
-                    for poliza in polizas:
-                        num_poliza = poliza.get('numPoliza', '')
-                        prima_proyectada = poliza.get('primaProyectada', {})
-                        detalle_pagos = prima_proyectada.get('detallePagos', [])
-                        
-                        # Buscar el pago_id en los detalles de pagos
-                        for pago in detalle_pagos:
-                            if pago.get('idPago', '') == pago_id:
-                                return {
-                                    'agente': agente,
-                                    'subramo': subramo,
-                                    'num_poliza': num_poliza,
-                                    'pago_details': pago
-                                }
-            
-            print(f"[DEBUG] No se encontró póliza para pago_id: {pago_id}")
-            return None
+            poliza = self.indice_pagos.poliza_de_pago(pago_id)
+            if not poliza:
+                print(f"[DEBUG] No se encontró póliza para pago_id: {pago_id}")
+            return poliza
             
         except Exception as e:
             print(f"[ERROR] Error buscando póliza por pago_id {pago_id}: {str(e)}")
@@ -1574,10 +1751,9 @@ class DataTableWidget(QWidget):
     def agregar_resegmentacion(self, resegmentacion_data: Dict) -> bool:
         """Agrega una nueva resegmentación a la base de datos"""
         try:
+            # La base de datos publica el cambio en el bus y solo se repinta la fila afectada
             success = self.resegmentacion_db.guardar_resegmentacion(resegmentacion_data)
             if success:
-                # Refrescar la tabla para mostrar los cambios
-                self.display_current_page()
                 print(f"[DEBUG] Resegmentación agregada: {resegmentacion_data.get('num_poliza', '')}")
             return success
         except Exception as e:
@@ -1596,9 +1772,31 @@ class DataTableWidget(QWidget):
         """Filtra la tabla basado en la búsqueda con paginación - Optimizado para memoria"""
         import gc  # Garbage collector para liberar memoria
         
+        if not hasattr(self, 'current_data'):
+            return
+        
+        self.aplicar_filtros()
+        
+        # Recalcular paginación y mostrar primera página
+        self.current_page = 1
+        self.total_records = len(self.filtered_data)
+        self.calculate_pagination()
+        self.display_current_page()
+        
+        # Forzar liberación de memoria después del filtrado
+        gc.collect()
+        
+    def aplicar_filtros(self):
+        """Recalcula filtered_data con la búsqueda, el filtro de cambios y el orden activo"""
+        import gc
+        
         search_text = self.search_input.text().lower()
         
-        if not hasattr(self, 'current_data'):
+        # Con almacén, búsqueda, filtro de cambios y orden se resuelven en una sola consulta
+        if self.almacen is not None:
+            claves = self.cambios.keys() if self.solo_cambios_check.isChecked() and self.cambios else None
+            self.almacen.filtrar(search_text, claves, self.ordenador.criterios)
+            self.filtered_data = self.almacen.vista()
             return
         
         # Liberar memoria de filtros anteriores explícitamente
@@ -1635,14 +1833,13 @@ class DataTableWidget(QWidget):
             del columns_to_search
             del row_matches_filter
         
-        # Recalcular paginación y mostrar primera página
-        self.current_page = 1
-        self.total_records = len(self.filtered_data)
-        self.calculate_pagination()
-        self.display_current_page()
+        # Solo filas nuevas o modificadas desde la consulta anterior
+        if self.solo_cambios_check.isChecked() and self.cambios:
+            self.filtered_data = [row for row in self.filtered_data if clave_fila(row) in self.cambios]
         
-        # Forzar liberación de memoria después del filtrado
-        gc.collect()
+        # Mantener el orden activo sobre el nuevo resultado
+        if self.ordenador.criterios:
+            self.filtered_data = self.ordenador.ordenar(self.filtered_data)
         
     def update_info(self):
         """Actualiza la información de registros con paginación"""
@@ -1676,38 +1873,119 @@ class DataTableWidget(QWidget):
                     end_record = min(self.current_page * self.page_size, self.total_records)
                     self.info_label.setText(f"Mostrando {start_record}-{end_record} de {self.total_records} registros")
             
+            # Con almacén el conteo de resegmentadas de toda la vista sale de un cruce en SQL
+            if self.almacen is not None and self.almacen.resegmentaciones_adjuntas:
+                self.info_label.setText(f"{self.info_label.text()} · {self.almacen.contar_resegmentadas():,} resegmentadas")
+            
     def export_to_csv(self):
-        """Exporta los datos visibles a CSV"""
-        if not self.current_data:
+        """Exporta todos los registros de la vista actual (filtro y orden incluidos) a CSV o XLSX"""
+        data_to_show = self.filtered_data if hasattr(self, 'filtered_data') else []
+        if not data_to_show:
             QMessageBox.warning(self, "Advertencia", "No hay datos para exportar")
             return
-            
-        filename, _ = QFileDialog.getSaveFileName(
-            self, "Exportar CSV", f"datos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            "CSV files (*.csv)"
+        
+        self.iniciar_exportacion(data_to_show, "Exportar",
+                                 f"datos_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    
+    def iniciar_exportacion(self, filas: List[Dict], titulo: str, nombre_base: str):
+        """Pide el archivo destino y lanza la exportación por bloques en background"""
+        if self.export_worker and self.export_worker.isRunning():
+            QMessageBox.information(self, "Exportación en curso", "Espera a que termine la exportación actual.")
+            return
+        
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self, titulo, f"{nombre_base}.xlsx",
+            "Excel files (*.xlsx);;CSV files (*.csv)"
         )
+        if not filename:
+            return
         
-        if filename:
-            try:
-                df = pd.DataFrame(self.current_data)
-                df.to_csv(filename, index=False, encoding='utf-8-sig')
-                QMessageBox.information(self, "Éxito", f"Datos exportados a {filename}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error al exportar: {str(e)}")
+        # Completar extensión según el filtro elegido
+        if not filename.lower().endswith(('.xlsx', '.csv')):
+            filename += '.csv' if 'csv' in selected_filter.lower() else '.xlsx'
+        
+        # Preguntar si se incluye el detalle de pagos (hoja adicional o CSV complementario)
+        incluir_pagos = False
+        if len(self.indice_pagos) > 0:
+            respuesta = QMessageBox.question(
+                self, "Detalle de pagos",
+                "¿Incluir el detalle de pagos de cada póliza?\n\n"
+                "En Excel se agrega como segunda hoja; en CSV como archivo *_pagos.csv.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            incluir_pagos = respuesta == QMessageBox.StandardButton.Yes
+        
+        # Copia superficial de la lista (o instantánea del almacén): ordenar o filtrar durante la exportación no la afecta
+        filas = filas.instantanea() if isinstance(filas, VistaAlmacen) else list(filas)
+        self.export_worker = ExportWorker(filename, filas, list(self.columns),
+                                          self.indice_pagos, incluir_pagos)
+        
+        self.export_progress = QProgressDialog("Preparando exportación...", "Cancelar", 0, 100, self)
+        self.export_progress.setWindowTitle(titulo)
+        self.export_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.export_progress.setMinimumDuration(0)
+        self.export_progress.canceled.connect(self.export_worker.cancelar)
+        
+        self.export_worker.progress_updated.connect(self.on_export_progress)
+        self.export_worker.export_completed.connect(self.on_export_completed)
+        self.export_worker.error_occurred.connect(self.on_export_error)
+        self.export_worker.start()
+    
+    def on_export_progress(self, porcentaje: int, mensaje: str):
+        """Actualiza el diálogo de progreso de la exportación"""
+        if hasattr(self, 'export_progress') and self.export_progress:
+            self.export_progress.setValue(porcentaje)
+            self.export_progress.setLabelText(mensaje)
+    
+    def on_export_completed(self, resultado: dict):
+        """Cierra el progreso y reporta el resultado de la exportación"""
+        self.export_progress.close()
+        mensaje = f"Registros exportados: {resultado.get('filas', 0):,}"
+        if resultado.get('pagos'):
+            mensaje += f"\nPagos exportados: {resultado['pagos']:,}"
+        mensaje += "\n\nArchivos:\n" + "\n".join(resultado.get('archivos', []))
+        QMessageBox.information(self, "Éxito", mensaje)
+    
+    def on_export_error(self, error: str):
+        """Cierra el progreso y muestra el error de la exportación"""
+        self.export_progress.close()
+        if error == "Exportación cancelada":
+            print("[DEBUG] Exportación cancelada por el usuario")
+            return
+        QMessageBox.critical(self, "Error", error)
 
 class CotejamientoTab(QWidget):
     """Tab de cotejamiento con funcionalidad completa"""
     
     token_updated = pyqtSignal(str)
     user_updated = pyqtSignal(dict)
+    token_renovado = pyqtSignal(dict)  # Renovación en segundo plano, re-emitida en el hilo de la UI
     
     def __init__(self):
         super().__init__()
         self.api_token = None
         self.current_data = None
         self.user_info = {}
+        self.token_renovado.connect(self.on_token_renovado)
+        gestor_token.suscribir(self.token_renovado.emit)
+        # Último periodo procesado, necesario para guardar la sesión
+        self.periodo_actual = ''
+        self.ultimo_resumen = {}
+        self.ultimo_detalle = []
+        self.periodo_datos = ''  # Periodo de los datos mostrados (para comparar re-consultas)
+        self.sesion_abierta = None  # Sesión de disco mostrada en la tabla, si la hay
+        self.historial = HistorialCotejamiento()
+        self.historial_workers = []
+        self.journal_reconciliado = False  # Reconciliación de ajustes pendientes, una vez por ejecución
+        self.vigilante = None  # Vigilante de la carpeta de ADM (BONOS_CARPETA_ADM), tras el login
+        self.monitor_tareas = None
         self.setup_ui()
         
+    def set_usuario_local(self, usuario_info):
+        """Establece la información del usuario logueado localmente"""
+        self.data_table.set_usuario_local(usuario_info)
+        
     def setup_ui(self):
         """Configura la interfaz del tab de cotejamiento"""
         layout = QVBoxLayout()
@@ -1773,7 +2051,11 @@ class CotejamientoTab(QWidget):
         
         # Botón Cargar ADM - prerequisito para consultar datos
         self.load_adm_btn = QPushButton("💾 Cargar ADM")
-        self.load_adm_btn.clicked.connect(self.load_adm_data)
+        # Un archivo por región: se eligen varios o la carpeta que los contiene
+        adm_menu = QMenu(self.load_adm_btn)
+        adm_menu.addAction("Archivos ADM...", self.load_adm_data)
+        adm_menu.addAction("Carpeta con ADM regionales...", self.load_adm_folder)
+        self.load_adm_btn.setMenu(adm_menu)
         self.load_adm_btn.setMinimumSize(250, 60)  # Botón más conservador
         self.load_adm_btn.setStyleSheet("""
             QPushButton {
@@ -1839,6 +2121,42 @@ class CotejamientoTab(QWidget):
         controls_layout.addWidget(self.query_btn)
         controls_layout.addStretch()
         
+        # Sesiones guardadas: reabrir un periodo ya consultado sin login ni API
+        estilo_sesion = """
+            QPushButton {
+                font-size: 13px;
+                padding: 8px 16px;
+                border-radius: 6px;
+                background-color: #f3f4f6;
+                color: #1f2937;
+                border: 1px solid #d1d5db;
+            }
+            QPushButton:hover {
+                background-color: #e5e7eb;
+            }
+            QPushButton:disabled {
+                color: #9ca3af;
+            }
+        """
+        self.guardar_sesion_btn = QPushButton("💾 Guardar Sesión")
+        self.guardar_sesion_btn.clicked.connect(self.guardar_sesion_actual)
+        self.guardar_sesion_btn.setEnabled(False)  # Hasta que haya datos procesados
+        self.guardar_sesion_btn.setStyleSheet(estilo_sesion)
+        
+        self.abrir_sesion_btn = QPushButton("📂 Abrir Sesión")
+        self.abrir_sesion_btn.clicked.connect(self.abrir_sesion_guardada)
+        self.abrir_sesion_btn.setStyleSheet(estilo_sesion)
+        
+        controls_layout.addWidget(self.guardar_sesion_btn)
+        controls_layout.addWidget(self.abrir_sesion_btn)
+        
+        # Monitor del planificador: tareas en curso, en cola y recientes
+        self.tareas_btn = QPushButton("🧵 Tareas")
+        self.tareas_btn.setToolTip("Ver y cancelar las tareas en segundo plano")
+        self.tareas_btn.clicked.connect(self.mostrar_monitor_tareas)
+        self.tareas_btn.setStyleSheet(estilo_sesion)
+        controls_layout.addWidget(self.tareas_btn)
+        
         controls_group.setLayout(controls_layout)
         layout.addWidget(controls_group)
         
@@ -1867,6 +2185,14 @@ class CotejamientoTab(QWidget):
     def auto_api_login(self):
         """Ejecuta el login API automáticamente al iniciar la aplicación"""
         print("[DEBUG] Ejecutando login API automático...")
+        
+        # Reutilizar el token del último inicio si sigue vigente (sin petición de login)
+        gestor_token.configurar(self.login_url_input.text(), self.username_input.text(), self.password_input.text())
+        datos_cache = gestor_token.cargar_cache()
+        if datos_cache:
+            self.on_login_success(datos_cache)
+            return
+        
         self.status_label.setText("🔐 Conectando automáticamente con la API...")
         
         # Mostrar modal de carga simple
@@ -1905,42 +2231,32 @@ class CotejamientoTab(QWidget):
         self.status_label.setText("Conectando con API...")
         self.login_btn.setEnabled(False)
         
-        # Crear worker para login
-        self.api_worker = APIWorker(
-            "login",
-            url=self.login_url_input.text(),
-            username=self.username_input.text(),
-            password=self.password_input.text()
-        )
-        
-        self.api_worker.data_received.connect(self.on_login_success)
-        self.api_worker.error_occurred.connect(self.on_login_error)
-        self.api_worker.progress_updated.connect(self.update_status_with_modal)
-        self.api_worker.start()
+        # Un login nuevo reemplaza (cancela) al que estuviera en curso
+        url, username, password = self.login_url_input.text(), self.username_input.text(), self.password_input.text()
+        tarea = planificador.enviar("login", lambda t: tarea_login(t, url, username, password), f"Login {username}")
+        tarea.completada.connect(self.on_login_success)
+        tarea.error.connect(self.on_login_error)
+        tarea.cancelada.connect(self.on_login_cancelado)
+        tarea.progreso.connect(self.update_status_with_modal)
+        
+    def on_login_cancelado(self):
+        """Login cancelado; si fue reemplazado por otro, ese se encarga de la interfaz"""
+        if planificador.activas("login"):
+            return
+        if hasattr(self, 'loading_modal'):
+            self.loading_modal.hide_progress()
+        self.status_label.setText("⛔ Inicio de sesión cancelado")
+        self.login_btn.setEnabled(True)
         
     def decode_jwt_payload(self, token):
         """Decodifica el payload de un JWT token sin verificar la firma"""
-        try:
-            # Los JWT tienen 3 partes separadas por puntos: header.payload.signature
-            parts = token.split('.')
-            if len(parts) != 3:
-                return {}
-                
-            # Decodificar el payload (segunda parte)
-            payload = parts[1]
-            
-            # Agregar padding si es necesario
-            padding = 4 - len(payload) % 4
-            if padding != 4:
-                payload += '=' * padding
-                
-            # Decodificar base64
-            decoded = base64.b64decode(payload)
-            return json.loads(decoded.decode('utf-8'))
-            
-        except Exception as e:
-            print(f"[DEBUG] Error decodificando JWT: {e}")
-            return {}
+        return decodificar_jwt(token)
+    
+    def on_token_renovado(self, data: dict):
+        """El gestor renovó el token en segundo plano: compartirlo con las demás tabs"""
+        self.api_token = data['token']
+        self.token_updated.emit(self.api_token)
+        print(f"[DEBUG] Token renovado compartido con otras tabs: {self.api_token[:20]}...")
     
     def on_login_success(self, data: dict):
         """Maneja login exitoso"""
@@ -1987,6 +2303,11 @@ class CotejamientoTab(QWidget):
         print(f"[DEBUG] Token compartido con otras tabs: {self.api_token[:20]}...")
         print(f"[DEBUG] Usuario compartido con otras tabs: {user_name}")
         
+        # Con sesión activa se pueden reenviar los ajustes que quedaron sin confirmar
+        self.reconciliar_journal()
+        # Y precargar los periodos de los ADM que vayan llegando
+        self.iniciar_vigilante()
+        
         # Solo mostrar mensaje si el botón es visible (no automático)
         if self.login_btn.isVisible():
             QMessageBox.information(self, "Éxito", "Login exitoso. Ahora cargue los datos ADM.")
@@ -1994,129 +2315,110 @@ class CotejamientoTab(QWidget):
             print("[DEBUG] ✅ Login API automático exitoso")
     
     def load_adm_data(self):
-        """Carga archivo ADM y extrae año/mes del nombre"""
-        try:
-            if not self.api_token:
-                QMessageBox.warning(self, "Advertencia", "Debe iniciar sesión API primero")
-                return
-            
-            # Diálogo para seleccionar archivo ADM
-            filename, _ = QFileDialog.getOpenFileName(
-                self, 
-                "Seleccionar Archivo ADM", 
-                "", 
-                "Archivos ADM (*.csv *.xlsx *.xls);;Todos los archivos (*)"
-            )
-            
-            if not filename:
-                return  # Usuario canceló
-            
-            # Extraer nombre del archivo sin ruta
-            import os
-            file_basename = os.path.basename(filename)
-            
-            # Extraer año y mes del formato: pb_2025_01_cca_77293_DIR_NOROESTE
-            year, month = self.extract_year_month_from_filename(file_basename)
-            
-            if not year or not month:
-                QMessageBox.warning(self, "Formato Inválido", 
-                                  f"El archivo no tiene el formato esperado.\n"
-                                  f"Formato esperado: pb_YYYY_MM_cca_xxxxx_DIR_xxxxx\n"
-                                  f"Archivo seleccionado: {file_basename}")
-                return
-            
-            # Deshabilitar botón durante la carga
-            self.load_adm_btn.setEnabled(False)
-            self.load_adm_btn.setText("💾 Cargando ADM...")
-            self.status_label.setText(f"🔄 Cargando ADM {year}/{month}...")
-            
-            # Mostrar modal de carga para ADM
-            self.adm_loading_modal = SimpleProgressDialog(self, "Cargando Archivo ADM")
-            self.adm_loading_modal.update_message(f"Procesando: {file_basename}")
-            self.adm_loading_modal.show_progress()
-            
-            # Almacenar información del archivo
-            self.adm_file_info = {
-                'filename': filename,
-                'year': year,
-                'month': month,
-                'basename': file_basename
-            }
-            
-            # Simular proceso de carga con QTimer y actualizar progreso
-            self.adm_timer = QTimer()
-            self.adm_timer.timeout.connect(self.update_adm_progress)
-            self.adm_progress = 0
-            self.adm_timer.start(200)  # Actualizar cada 200ms
-            
-        except Exception as e:
-            if hasattr(self, 'adm_loading_modal'):
-                self.adm_loading_modal.hide_progress()
-            QMessageBox.critical(self, "Error", f"Error al cargar datos ADM: {str(e)}")
-            self.load_adm_btn.setEnabled(True)
-            self.load_adm_btn.setText("💾 Cargar ADM")
+        """Carga uno o varios archivos ADM regionales del mismo periodo"""
+        if not self.api_token:
+            QMessageBox.warning(self, "Advertencia", "Debe iniciar sesión API primero")
+            return
+        
+        # Diálogo para seleccionar los archivos ADM (uno por región)
+        filenames, _ = QFileDialog.getOpenFileNames(
+            self, 
+            "Seleccionar Archivos ADM", 
+            "", 
+            "Archivos ADM (*.csv *.xlsx *.xls);;Todos los archivos (*)"
+        )
+        
+        if filenames:
+            self.iniciar_ingesta_adm(filenames)
     
-    def update_adm_progress(self):
-        """Actualiza el progreso de carga del ADM"""
-        self.adm_progress += 10
+    def load_adm_folder(self):
+        """Carga todos los archivos ADM regionales de una carpeta"""
+        if not self.api_token:
+            QMessageBox.warning(self, "Advertencia", "Debe iniciar sesión API primero")
+            return
         
-        if hasattr(self, 'adm_loading_modal'):
-            if self.adm_progress <= 30:
-                self.adm_loading_modal.update_message("Leyendo archivo...")
-            elif self.adm_progress <= 60:
-                self.adm_loading_modal.update_message("Validando formato...")
-            elif self.adm_progress <= 90:
-                self.adm_loading_modal.update_message("Procesando datos...")
-            else:
-                self.adm_loading_modal.update_message("Finalizando carga...")
-                
-        if self.adm_progress >= 100:
-            self.adm_timer.stop()
-            QTimer.singleShot(500, self.on_adm_loaded)  # Pequeña pausa antes de finalizar
+        carpeta = QFileDialog.getExistingDirectory(self, "Seleccionar Carpeta con Archivos ADM", "")
+        if carpeta:
+            self.iniciar_ingesta_adm([carpeta])
     
-    def extract_year_month_from_filename(self, filename):
-        """Extrae año y mes del nombre del archivo ADM"""
+    def iniciar_ingesta_adm(self, rutas: List[str]):
+        """Valida el periodo por nombre y lee los archivos en un worker"""
         try:
-            import re
-            
-            # Patrón para: pb_YYYY_MM_cca_xxxxx_DIR_xxxxx
-            pattern = r'pb_(\d{4})_(\d{2})_cca_.*_DIR_.*'
-            match = re.match(pattern, filename)
-            
-            if match:
-                year = match.group(1)
-                month = match.group(2)
-                
-                # Validar que el mes esté en rango válido
-                if 1 <= int(month) <= 12:
-                    return year, month
-                else:
-                    print(f"[DEBUG] Mes inválido: {month}")
-                    return None, None
-            else:
-                print(f"[DEBUG] Patrón no coincide para: {filename}")
-                return None, None
-                
-        except Exception as e:
-            print(f"[DEBUG] Error extrayendo año/mes: {e}")
-            return None, None
+            archivos = archivos_adm(rutas)
+            year, month = validar_periodo(archivos)
+        except ErrorIngestaADM as e:
+            QMessageBox.warning(self, "Archivos ADM Inválidos", str(e))
+            return
+        
+        # Deshabilitar botón durante la carga
+        self.load_adm_btn.setEnabled(False)
+        self.load_adm_btn.setText("💾 Cargando ADM...")
+        self.status_label.setText(f"🔄 Cargando ADM {year}/{month} ({len(archivos)} archivo(s))...")
+        
+        # Mostrar modal de carga para ADM (el de una carga reemplazada se cierra)
+        if hasattr(self, 'adm_loading_modal'):
+            self.adm_loading_modal.hide_progress()
+        self.adm_loading_modal = SimpleProgressDialog(self, "Cargando Archivos ADM")
+        self.adm_loading_modal.update_message(f"Leyendo {len(archivos)} archivo(s) ADM...")
+        self.adm_loading_modal.show_progress()
+        
+        def leer(tarea: Tarea) -> IngestaADM:
+            # Progreso agregado de todos los archivos
+            return ingerir_adm(archivos, progreso=lambda leidos, total, nombre: tarea.reportar(
+                int(leidos * 100 / total), f"Leído {nombre} ({leidos} de {total})"))
+        
+        tarea = planificador.enviar("ingesta_adm", leer, f"ADM {year}/{month} ({len(archivos)} archivo(s))")
+        tarea.progreso.connect(self.update_adm_progress)
+        tarea.completada.connect(self.on_adm_loaded)
+        tarea.error.connect(self.on_adm_error)
+        tarea.cancelada.connect(self.on_adm_cancelado)
+    
+    def on_adm_cancelado(self):
+        """Carga ADM cancelada; si fue reemplazada por otra, esa se encarga de la interfaz"""
+        if planificador.activas("ingesta_adm"):
+            return
+        if hasattr(self, 'adm_loading_modal'):
+            self.adm_loading_modal.hide_progress()
+        self.load_adm_btn.setEnabled(True)
+        self.load_adm_btn.setText("💾 Cargar ADM")
+        self.status_label.setText("⛔ Carga ADM cancelada")
+    
+    def update_adm_progress(self, porcentaje: int, mensaje: str):
+        """Actualiza el progreso agregado de la carga ADM"""
+        if hasattr(self, 'adm_loading_modal'):
+            self.adm_loading_modal.update_message(mensaje)
+        self.status_label.setText(f"🔄 {mensaje} ({porcentaje}%)")
+    
+    def on_adm_error(self, error: str):
+        """Maneja un error al leer o combinar los archivos ADM"""
+        if hasattr(self, 'adm_loading_modal'):
+            self.adm_loading_modal.hide_progress()
+        self.load_adm_btn.setEnabled(True)
+        self.load_adm_btn.setText("💾 Cargar ADM")
+        self.status_label.setText("❌ Error al cargar ADM")
+        QMessageBox.critical(self, "Error", f"Error al cargar datos ADM: {error}")
     
-    def on_adm_loaded(self):
+    def on_adm_loaded(self, ingesta: IngestaADM):
         """Maneja la finalización de la carga ADM"""
         try:
             # Cerrar modal de carga ADM
             if hasattr(self, 'adm_loading_modal'):
                 self.adm_loading_modal.hide_progress()
                 
-            # Obtener información del archivo cargado
-            file_info = getattr(self, 'adm_file_info', {})
-            year = file_info.get('year', 'N/A')
-            month = file_info.get('month', 'N/A')
-            basename = file_info.get('basename', 'N/A')
+            # El periodo de la consulta sale de los archivos; el conjunto combinado queda disponible
+            year, month = ingesta.year, ingesta.month
+            self.adm_datos = ingesta
+            self.adm_file_info = {
+                'filenames': ingesta.archivos,
+                'year': year,
+                'month': month,
+                'basename': ", ".join(ingesta.archivos),
+                'regiones': ingesta.regiones
+            }
             
-            # Actualizar interfaz
+            # Actualizar interfaz; se puede volver a cargar para reemplazar los archivos
             self.load_adm_btn.setText(f"✅ ADM {year}/{month}")
-            self.load_adm_btn.setEnabled(False)  # Mantener deshabilitado una vez cargado
+            self.load_adm_btn.setEnabled(True)
             self.load_adm_btn.setStyleSheet("""
                 QPushButton {
                     font-size: 22px;
@@ -2131,14 +2433,18 @@ class CotejamientoTab(QWidget):
             
             # Habilitar botón de consultar datos
             self.query_btn.setEnabled(True)
-            self.status_label.setText(f"✅ ADM {year}/{month} cargado - Listo para consultar datos")
+            self.status_label.setText(f"✅ ADM {year}/{month} cargado ({len(ingesta.regiones)} región(es), "
+                                      f"{len(ingesta.datos):,} filas) - Listo para consultar datos")
             
-            # Mostrar información detallada del archivo cargado
+            # Mostrar resumen por región
+            regiones = "\n".join(f"   • {region}: {filas:,} filas" for region, filas in ingesta.filas_por_region.items())
             QMessageBox.information(self, "ADM Cargado Exitosamente", 
-                                  f"Archivo ADM cargado correctamente:\n\n"
-                                  f"📁 Archivo: {basename}\n"
+                                  f"Archivos ADM cargados correctamente:\n\n"
                                   f"📅 Año: {year}\n"
-                                  f"📆 Mes: {month}\n\n"
+                                  f"📆 Mes: {month}\n"
+                                  f"📁 Regiones ({len(ingesta.regiones)}):\n{regiones}\n\n"
+                                  f"Total: {len(ingesta.datos):,} filas, "
+                                  f"{ingesta.duplicados:,} repetidas descartadas\n\n"
                                   f"Ahora puede consultar datos.")
             
         except Exception as e:
@@ -2184,6 +2490,18 @@ class CotejamientoTab(QWidget):
             
         # Construir fecha dinámica: YYYY-MM-01
         dynamic_period = f"{year}-{month}-01"
+        self.periodo_actual = dynamic_period
+        
+        # Primera consulta del periodo: si el vigilante ya lo precargó, abrir esa sesión;
+        # consultar de nuevo el mismo periodo va a la API y muestra los cambios
+        precarga = precarga_vigente(dynamic_period) if self.periodo_datos != dynamic_period else None
+        sesion = abrir_sesion(precarga) if precarga else None
+        if sesion is not None:
+            self.mostrar_sesion(sesion)
+            hora = datetime.fromtimestamp(os.path.getmtime(precarga)).strftime("%d/%m %H:%M")
+            self.status_label.setText(f"⚡ {dynamic_period[:7]} precargado ({hora}): "
+                                      f"{len(sesion.filas):,} registros - Consultar de nuevo para actualizar")
+            return
         
         print(f"[DEBUG] Construyendo consulta API con fecha dinámica: {dynamic_period}")
         print(f"[DEBUG] Basado en ADM: año={year}, mes={month}")
@@ -2191,31 +2509,23 @@ class CotejamientoTab(QWidget):
         self.status_label.setText(f"Consultando datos para {dynamic_period}...")
         self.query_btn.setEnabled(False)
         
-        # Mostrar modal de carga para consulta de datos
+        # Mostrar modal de carga para consulta de datos (el de una consulta reemplazada se cierra)
+        if hasattr(self, 'query_loading_modal'):
+            self.query_loading_modal.hide_progress()
         self.query_loading_modal = SimpleProgressDialog(self, "Consultando Datos")
         self.query_loading_modal.update_message(f"Obteniendo información para {dynamic_period}...")
         self.query_loading_modal.show_progress()
         
-        headers = {
-            'x-token': self.api_token,
-            'Content-Type': 'application/json'
-        }
-        
-        url = f"{self.query_url_input.text()}?periodo[]={dynamic_period}"
-        
-        print(f"[DEBUG] URL completa de la API: {url}")
+        print(f"[DEBUG] URL completa de la API: {self.query_url_input.text()}?periodo[]={dynamic_period}")
         
-        # Crear worker para consulta
-        self.api_worker = APIWorker(
-            "fetch_data",
-            url=url,
-            headers=headers
-        )
-        
-        self.api_worker.data_received.connect(self.on_data_received)
-        self.api_worker.error_occurred.connect(self.on_query_error)
-        self.api_worker.progress_updated.connect(self.update_query_status_with_modal)
-        self.api_worker.start()
+        # Una consulta nueva cancela la anterior: su resultado ya no se muestra
+        url, token = self.query_url_input.text(), self.api_token
+        tarea = planificador.enviar("consulta_periodo", lambda t: tarea_consulta_periodo(t, url, token, dynamic_period),
+                                    f"Periodo {dynamic_period[:7]}")
+        tarea.completada.connect(self.on_data_received)
+        tarea.error.connect(self.on_query_error)
+        tarea.cancelada.connect(self.on_query_cancelada)
+        tarea.progreso.connect(self.update_query_status_with_modal)
         
     def on_data_received(self, data: dict):
         """Procesa datos recibidos de la API"""
@@ -2225,9 +2535,91 @@ class CotejamientoTab(QWidget):
             
         self.current_data = data
         self.process_api_data(data)
-        self.status_label.setText("✅ Datos cargados exitosamente")
+        diferencias = self.data_table.diferencias
+        if diferencias is not None:
+            self.status_label.setText(
+                f"✅ Datos actualizados: {len(diferencias.agregadas)} nuevas, "
+                f"{len(diferencias.modificadas)} modificadas, {len(diferencias.eliminadas)} eliminadas"
+            )
+        else:
+            self.status_label.setText("✅ Datos cargados exitosamente")
         self.query_btn.setEnabled(True)
         
+        # Guardar el periodo en el historial local sin bloquear la interfaz
+        if self.periodo_actual and self.ultimo_detalle:
+            self.registrar_en_historial(self.periodo_actual, self.ultimo_resumen, self.ultimo_detalle)
+        
+    def registrar_en_historial(self, periodo: str, resumen: dict, detalle: list):
+        """Agrega el periodo al historial en un hilo aparte"""
+        worker = HistorialWorker(self.historial, periodo, resumen, detalle)
+        worker.registro_completado.connect(self.on_historial_registrado)
+        worker.error_occurred.connect(lambda error: print(f"[ERROR] {error}"))
+        worker.finished.connect(lambda: self.historial_workers.remove(worker))
+        self.historial_workers.append(worker)
+        worker.start()
+        
+    def reconciliar_journal(self):
+        """Reconcilia el journal de ajustes la primera vez que hay sesión API"""
+        if self.journal_reconciliado:
+            return
+        self.journal_reconciliado = True
+        token = self.api_token
+        tarea = planificador.enviar("journal", lambda t: reconciliar_ajustes(ResegmentacionDB(), token),
+                                    "Reconciliar ajustes pendientes")
+        tarea.completada.connect(self.on_journal_reconciliado)
+        
+    def iniciar_vigilante(self):
+        """Vigila la carpeta de ADM configurada; una revisión al iniciar y otra por cada cambio"""
+        carpeta = os.environ.get('BONOS_CARPETA_ADM', '')
+        if not carpeta or self.vigilante is not None:
+            return
+        if not os.path.isdir(carpeta):
+            print(f"[VIGILANTE] ⚠️ Carpeta de ADM no disponible: {carpeta}")
+            return
+        
+        self.vigilante = VigilanteADM(carpeta)
+        # Varios eventos seguidos (una copia en curso) se agrupan en una sola revisión
+        self.vigilante_retardo = QTimer(self)
+        self.vigilante_retardo.setSingleShot(True)
+        self.vigilante_retardo.timeout.connect(self.revisar_carpeta_adm)
+        self.vigilante_watcher = QFileSystemWatcher([carpeta], self)
+        self.vigilante_watcher.directoryChanged.connect(lambda _: self.vigilante_retardo.start(5000))
+        # En carpetas de red los eventos no son confiables: también se revisa periódicamente
+        self.vigilante_timer = QTimer(self)
+        self.vigilante_timer.timeout.connect(self.revisar_carpeta_adm)
+        self.vigilante_timer.start(INTERVALO_VIGILANTE * 1000)
+        self.revisar_carpeta_adm()
+        
+    def revisar_carpeta_adm(self):
+        """Lanza una revisión con prioridad de precarga (una a la vez)"""
+        if planificador.activas("precarga"):
+            self.vigilante_retardo.start(5000)
+            return
+        vigilante, token = self.vigilante, self.api_token
+        tarea = planificador.enviar("precarga", lambda t: vigilante.revisar(token), f"Carpeta ADM {vigilante.carpeta}")
+        tarea.completada.connect(self.on_revision_adm)
+        
+    def on_revision_adm(self, periodos: list):
+        """Avisa los periodos precargados; si hay archivos copiándose, revisa de nuevo en breve"""
+        if periodos:
+            meses = ", ".join(periodo[:7] for periodo in periodos)
+            self.status_label.setText(f"⚡ Periodo(s) precargado(s) desde la carpeta de ADM: {meses}")
+        if self.vigilante.pendientes:
+            self.vigilante_retardo.start(5000)
+        
+    def on_journal_reconciliado(self, resultado: dict):
+        """Informa los ajustes completados o que siguen pendientes tras la reconciliación"""
+        print(f"[JOURNAL] Reconciliación al iniciar: {resultado}")
+        if resultado.get('completados') or resultado.get('pendientes'):
+            self.status_label.setText(
+                f"✅ Sesión API iniciada - Ajustes reconciliados: {resultado.get('completados', 0)} "
+                f"completados, {resultado.get('pendientes', 0)} pendientes"
+            )
+        
+    def on_historial_registrado(self, periodo: str, cantidad: int):
+        """Confirma el registro del periodo en el historial"""
+        print(f"[DEBUG] Historial actualizado: {periodo} ({cantidad} pólizas)")
+        
     def on_query_error(self, error: str):
         """Maneja error de consulta"""
         # Cerrar modal de carga de consulta
@@ -2248,6 +2640,15 @@ class CotejamientoTab(QWidget):
         if hasattr(self, 'loading_modal') and self.loading_modal.isVisible():
             self.loading_modal.update_message(message)
             
+    def on_query_cancelada(self):
+        """Consulta cancelada; si fue reemplazada por otra, esa se encarga de la interfaz"""
+        if planificador.activas("consulta_periodo"):
+            return
+        if hasattr(self, 'query_loading_modal'):
+            self.query_loading_modal.hide_progress()
+        self.status_label.setText("⛔ Consulta cancelada")
+        self.query_btn.setEnabled(True)
+        
     def update_query_status_with_modal(self, progress: int, message: str):
         """Actualiza el estado del progreso para consulta de datos incluyendo el modal de carga"""
         self.status_label.setText(message)
@@ -2290,36 +2691,33 @@ class CotejamientoTab(QWidget):
             
             process_modal.update_message("Procesando datos de la tabla...")
             
-            # Procesar datos para la tabla
-            table_data = self.process_table_data(detalle)
-            
-            # Cambiar los nombres de las claves directamente en los datos
-            display_table_data = []
-            for row in table_data:
-                new_row = {
-                    'Agente': row.get('agente', ''),
-                    'Subramo': row.get('subramo', ''),
-                    'Núm. Póliza': row.get('numPoliza', ''),
-                    'Prima ADM': row.get('primaADM', ''),
-                    'Total Prima': row.get('totalPrima', ''),
-                    'Cantidad Pagos': row.get('cantidadPagos', ''),
-                    'Detalles Pagos': row.get('detallePagos', ''),
-                    'Diferencia': row.get('diferencia', ''),
-                    'Resegmentación': '',  # Se llenará dinámicamente según la base de datos
-                    'Aclaración': False  # Checkbox inicialmente no seleccionado
-                }
-                display_table_data.append(new_row)
+            # Procesar datos para la tabla con los nombres de columna ya definitivos
+            # (la columna Resegmentación se llena dinámicamente según la base de datos);
+            # con detalles grandes el formateo se reparte entre procesos mientras se indexan los pagos
+            display_table_data, indice_pagos = filas_e_indice(detalle)
             
             process_modal.update_message("Configurando tabla de resultados...")
             
-            # Configurar columnas con nombres descriptivos (agregada columna Resegmentación)
-            columns = [
-                'Agente', 'Subramo', 'Núm. Póliza', 'Prima ADM', 'Total Prima', 
-                'Cantidad Pagos', 'Detalles Pagos', 'Diferencia', 'Resegmentación', 'Aclaración'
-            ]
+            columns = list(COLUMNAS_TABLA)
+            
+            # Re-consulta del mismo periodo: comparar contra la anterior y actualizar solo lo que cambió
+            anterior = self.detalle_anterior(self.periodo_actual)
+            if anterior is not None:
+                process_modal.update_message("Comparando con la consulta anterior...")
+                diferencias = comparar_detalles(anterior, detalle)
+                self.data_table.aplicar_diferencias(display_table_data, detalle, diferencias, indice_pagos)
+                print(f"[DEBUG] Cambios vs consulta anterior: {len(diferencias.agregadas)} nuevas, "
+                      f"{len(diferencias.modificadas)} modificadas, {len(diferencias.eliminadas)} eliminadas")
+            else:
+                # Cargar datos en tabla (sin mapeo ya que los datos tienen las claves correctas)
+                self.data_table.load_data_simple(display_table_data, columns, detalle, indice_pagos=indice_pagos)
             
-            # Cargar datos en tabla (sin mapeo ya que los datos tienen las claves correctas)
-            self.data_table.load_data_simple(display_table_data, columns, detalle)
+            # Conservar lo necesario para guardar la sesión y comparar la siguiente consulta
+            self.ultimo_resumen = resumen
+            self.ultimo_detalle = detalle
+            self.periodo_datos = self.periodo_actual
+            self.sesion_abierta = None
+            self.guardar_sesion_btn.setEnabled(bool(display_table_data))
             
             process_modal.update_message("Procesamiento completado")
             
@@ -2331,10 +2729,97 @@ class CotejamientoTab(QWidget):
                 process_modal.hide_progress()
             QMessageBox.critical(self, "Error", f"Error procesando datos: {str(e)}")
             
+    def detalle_anterior(self, periodo: str) -> Optional[List[Dict]]:
+        """detalleComparacion mostrado actualmente si corresponde al mismo periodo, None en otro caso"""
+        if not periodo or periodo != self.periodo_datos:
+            return None
+        if self.sesion_abierta is not None:
+            return self.sesion_abierta.detalle  # Se descomprime solo en este caso
+        return self.ultimo_detalle or None
+    
+    def guardar_sesion_actual(self):
+        """Guarda el periodo cargado en un archivo de sesión para reabrirlo sin consultar la API"""
+        filas = getattr(self.data_table, 'current_data', None)
+        if not filas:
+            QMessageBox.warning(self, "Advertencia", "No hay datos cargados para guardar")
+            return
+        
+        periodo = self.periodo_actual or datetime.now().strftime('%Y-%m-01')
+        nombre_sugerido = f"cotejamiento_{periodo[:7]}{EXTENSION_SESION}"
+        ruta, _ = QFileDialog.getSaveFileName(
+            self, "Guardar Sesión", nombre_sugerido,
+            f"Sesión de cotejamiento (*{EXTENSION_SESION})"
+        )
+        if not ruta:
+            return
+        if not ruta.lower().endswith(EXTENSION_SESION):
+            ruta += EXTENSION_SESION
+        
+        modal = SimpleProgressDialog(self, "Guardando Sesión")
+        modal.update_message(f"Guardando {len(filas):,} registros...")
+        modal.show_progress()
+        try:
+            guardado = guardar_sesion(ruta, filas, self.ultimo_detalle, self.ultimo_resumen,
+                                      periodo, self.data_table.columns)
+        finally:
+            modal.hide_progress()
+        
+        if guardado:
+            self.status_label.setText(f"💾 Sesión guardada: {os.path.basename(ruta)}")
+        else:
+            QMessageBox.critical(self, "Error", "No se pudo guardar la sesión")
+    
+    def abrir_sesion_guardada(self):
+        """Abre una sesión guardada y la muestra en la tabla"""
+        ruta, _ = QFileDialog.getOpenFileName(
+            self, "Abrir Sesión", "",
+            f"Sesión de cotejamiento (*{EXTENSION_SESION})"
+        )
+        if not ruta:
+            return
+        
+        sesion = abrir_sesion(ruta)
+        if sesion is None:
+            QMessageBox.critical(self, "Error", "El archivo no es una sesión válida")
+            return
+        
+        self.mostrar_sesion(sesion)
+        self.status_label.setText(f"📂 Sesión {sesion.periodo} abierta: {len(sesion.filas):,} registros")
+    
+    def mostrar_sesion(self, sesion):
+        """Muestra en la tabla una sesión abierta desde disco"""
+        self.clear_stats()
+        self.show_statistics(sesion.resumen)
+        
+        # El detalle crudo queda en el archivo; la tabla usa el índice mapeado para los pagos
+        self.data_table.load_data_simple(sesion.filas, sesion.columnas, [], indice_pagos=sesion.indice_pagos)
+        
+        self.current_data = None
+        self.sesion_abierta = sesion
+        self.periodo_actual = sesion.periodo
+        self.periodo_datos = sesion.periodo
+        self.ultimo_resumen = sesion.resumen
+        self.ultimo_detalle = []
+        self.guardar_sesion_btn.setEnabled(False)  # Ya está en disco
+    
+    def mostrar_monitor_tareas(self):
+        """Abre (sin bloquear la ventana) el monitor de tareas en segundo plano"""
+        if self.monitor_tareas is None:
+            self.monitor_tareas = QDialog(self)
+            self.monitor_tareas.setWindowTitle("Tareas en segundo plano")
+            self.monitor_tareas.resize(820, 360)
+            monitor_layout = QVBoxLayout(self.monitor_tareas)
+            monitor_layout.addWidget(MonitorTareasWidget(planificador, self.monitor_tareas))
+        self.monitor_tareas.show()
+        self.monitor_tareas.raise_()
+    
     def clear_stats(self):
         """Limpia las estadísticas anteriores"""
-        for i in reversed(range(self.stats_layout.count())):
-            self.stats_layout.itemAt(i).widget().setParent(None)
+        # takeAt también retira el stretch final, que no tiene widget
+        while self.stats_layout.count():
+            item = self.stats_layout.takeAt(0)
+            if item.widget() is not None:
+                item.widget().setParent(None)
             
     def show_statistics(self, resumen: dict):
         """Muestra estadísticas en tarjetas simples"""
@@ -2409,60 +2894,7 @@ class CotejamientoTab(QWidget):
         
     def process_table_data(self, detalle: List[dict]) -> List[dict]:
         """Procesa los datos de detalle para la tabla"""
-        table_data = []
-        
-        for agente_item in detalle:
-            agente_id = agente_item.get('agente', 'N/A')
-            subramos = agente_item.get('subramos', [])
-            
-            # Procesar cada subramo del agente
-            for subramo_data in subramos:
-                subramo_nombre = subramo_data.get('subramo', 'N/A')
-                polizas = subramo_data.get('polizas', [])
-                
-                # Procesar cada póliza del subramo
-                for poliza in polizas:
-                    num_poliza = poliza.get('numPoliza', 'N/A')
-                    prima_adm = poliza.get('primaADM', 0)
-                    prima_proyectada = poliza.get('primaProyectada', {})
-                    diferencia = poliza.get('diferencia', 0)
-                    
-                    # Extraer datos de prima proyectada
-                    total_prima = prima_proyectada.get('totalPrima', 0) if isinstance(prima_proyectada, dict) else 0
-                    cantidad_pagos = prima_proyectada.get('cantidadPagos', 0) if isinstance(prima_proyectada, dict) else 0
-                    detalle_pagos = prima_proyectada.get('detallePagos', []) if isinstance(prima_proyectada, dict) else []
-                    
-                    # Formatear valores
-                    try:
-                        prima_adm_formatted = f"${float(prima_adm):,.2f}" if prima_adm != "N/A" and prima_adm is not None else "N/A"
-                    except (ValueError, TypeError):
-                        prima_adm_formatted = "N/A"
-                    
-                    try:
-                        total_prima_formatted = f"${float(total_prima):,.2f}" if total_prima else "$0.00"
-                    except (ValueError, TypeError):
-                        total_prima_formatted = "$0.00"
-                    
-                    try:
-                        diferencia_formatted = f"${float(diferencia):+,.2f}" if diferencia else "$0.00"
-                    except (ValueError, TypeError):
-                        diferencia_formatted = "$0.00"
-                    
-                    table_data.append({
-                        'agente': agente_id,
-                        'subramo': subramo_nombre,
-                        'numPoliza': num_poliza,
-                        'primaADM': prima_adm_formatted,
-                        'totalPrima': total_prima_formatted,
-                        'cantidadPagos': cantidad_pagos,
-                        'detallePagos': len(detalle_pagos),  # Número de detalles de pago
-                        'diferencia': diferencia_formatted
-                    })
-        
-        # Ordenar por diferencia absoluta
-        table_data.sort(key=lambda x: abs(float(x['diferencia'].replace('$', '').replace(',', '').replace('+', ''))), reverse=True)
-        
-        return table_data
+        return aplanar_detalle(detalle, PROCESOS_APLANADO)
 
 class ResegmentacionPrimaTab(QWidget):
     """Tab de resegmentación prima"""
@@ -2844,29 +3276,24 @@ class ResegmentacionPrimaTab(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error al mostrar calendario: {str(e)}")
             
-    def llamar_api_ajuste(self, pago_id, fecha_primer_pago, motivo):
-        """Realiza la llamada a la API de ajuste manual"""
+    def email_ajustador(self) -> str:
+        """Correo del usuario local, usado como identificador del ajustador"""
+        if self.usuario_local:
+            return self.usuario_local.get('email', AJUSTADOR_DEFECTO)
+        return AJUSTADOR_DEFECTO  # Fallback
+    
+    def llamar_api_ajuste(self, pago_id, fecha_primer_pago, motivo, entrada=None):
+        """Realiza la llamada a la API de ajuste manual (entrada: registro del journal, si lo hay)"""
         try:
-            url = f"https://condicionesrino.com/api/ajuste-manual/prima-pagada/{pago_id}"
-            headers = {
-                'x-token': self.api_token,
-                'Content-Type': 'application/json'
-            }
-            # Usar el correo del usuario local como identificador del ajustador
-            if self.usuario_local:
-                user_email = self.usuario_local.get('email', 'desarrollo-general@rinorisk.com')
+            if entrada:
+                # El journal guarda la petición exacta y actualiza su estado según la respuesta
+                response = enviar_ajuste_registrado(ResegmentacionDB(), entrada, self.api_token)
             else:
-                user_email = 'desarrollo-general@rinorisk.com'  # Fallback
-                
-            body = {
-                "ajuste": {
-                    "fechaPago": fecha_primer_pago
-                },
-                "motivoAjuste": f"{motivo} - pagoId: {pago_id}",
-                "nombreAjustador": user_email
-            }
-            
-            response = requests.post(url, headers=headers, json=body, timeout=30)
+                url, body = peticion_ajuste('PRIMA', pago_id, fecha_primer_pago, motivo, self.email_ajustador())
+                # Si el token expiró (401) el gestor lo renueva y se reintenta una vez
+                response = gestor_token.ejecutar_con_reintento(
+                    lambda token: enviar_ajuste(url, body, token), self.api_token
+                )
             
             if response.status_code == 200:
                 result = response.json()
@@ -2876,6 +3303,8 @@ class ResegmentacionPrimaTab(QWidget):
                 
         except requests.exceptions.RequestException as e:
             return False, f"Error de conexión: {str(e)}"
+        except AjusteAnteriorPendiente as e:
+            return False, str(e)
         except Exception as e:
             return False, f"Error inesperado: {str(e)}"
         
@@ -2954,7 +3383,47 @@ class ResegmentacionPrimaTab(QWidget):
         try:
             # Actualizar progreso del modal
             self.reseg_loading_modal.update_message("Preparando solicitud API...")
-            success, response = self.llamar_api_ajuste(pago_id, fecha_primer_pago, motivo)
+            
+            # Registrar el ajuste en el journal antes de enviarlo: si la app se cae
+            # a medio camino, se reconcilia al iniciar con la misma clave de idempotencia
+            db = ResegmentacionDB()
+            usuario_responsable = getattr(self, 'usuario_info', {}).get('nombre', 'Usuario Desconocido')
+            resegmentacion_data = {
+                'agente': '',  # Se puede obtener del contexto si está disponible
+                'subramo': '',  # Se puede obtener del contexto si está disponible  
+                'num_poliza': '',  # Se puede obtener del contexto si está disponible
+                'tipo_resegmentacion': 'PRIMA',
+                'fecha_resegmentacion': datetime.now().isoformat(),
+                'usuario_responsable': usuario_responsable,
+                'pago_id': pago_id,
+                'fecha_primer_pago': fecha_primer_pago,
+                'motivo_resegmentacion': motivo,
+                'num_poliza_nuevo_negocio': '',
+                'datos_originales': {
+                    'pago_id': pago_id,
+                    'fecha_primer_pago': fecha_primer_pago,
+                    'motivo': motivo,
+                    'timestamp': datetime.now().isoformat()
+                }
+            }
+            # Si tenemos contexto de la tabla de cotejamiento, ubicar la póliza del pago
+            # antes de registrar el ajuste, para que el journal ya la lleve
+            if hasattr(self.parent(), 'data_table'):
+                poliza_encontrada = self.parent().data_table.buscar_poliza_por_pago_id(pago_id)
+                if poliza_encontrada:
+                    resegmentacion_data['agente'] = poliza_encontrada.get('agente', '')
+                    resegmentacion_data['subramo'] = poliza_encontrada.get('subramo', '')
+                    resegmentacion_data['num_poliza'] = poliza_encontrada.get('num_poliza', '')
+                    print(f"[DB] Póliza encontrada para pago_id {pago_id}: {poliza_encontrada.get('num_poliza', '')}")
+            
+            url_ajuste, cuerpo_ajuste = peticion_ajuste('PRIMA', pago_id, fecha_primer_pago, motivo, self.email_ajustador())
+            entrada = db.registrar_ajuste('PRIMA', pago_id, url_ajuste, cuerpo_ajuste, resegmentacion_data)
+            
+            if entrada and entrada['estado'] == AJUSTE_ENVIADO:
+                # Un intento anterior ya se aplicó en la API: no se reenvía, solo se guarda
+                success, response = True, entrada['respuesta_api']
+            else:
+                success, response = self.llamar_api_ajuste(pago_id, fecha_primer_pago, motivo, entrada)
             
             if success:
                 # Actualizar progreso del modal
@@ -2987,58 +3456,25 @@ class ResegmentacionPrimaTab(QWidget):
                 
                 # Guardar resegmentación en la base de datos
                 try:
-                    # Obtener información del usuario responsable
-                    usuario_responsable = getattr(self, 'usuario_info', {}).get('nombre', 'Usuario Desconocido')
-                    
-                    # Crear datos de resegmentación
-                    resegmentacion_data = {
-                        'agente': '',  # Se puede obtener del contexto si está disponible
-                        'subramo': '',  # Se puede obtener del contexto si está disponible  
-                        'num_poliza': '',  # Se puede obtener del contexto si está disponible
-                        'tipo_resegmentacion': 'PRIMA',
-                        'fecha_resegmentacion': datetime.now().isoformat(),
-                        'usuario_responsable': usuario_responsable,
-                        'pago_id': pago_id,
-                        'fecha_primer_pago': fecha_primer_pago,
-                        'motivo_resegmentacion': motivo,
-                        'num_poliza_nuevo_negocio': '',
-                        'datos_originales': {
-                            'pago_id': pago_id,
-                            'fecha_primer_pago': fecha_primer_pago,
-                            'motivo': motivo,
-                            'timestamp': datetime.now().isoformat()
-                        },
-                        'respuesta_api': response
-                    }
-                    
-                    # Intentar guardar en la base de datos
-                    from resegmentacion_db import ResegmentacionDB
-                    db = ResegmentacionDB()
+                    resegmentacion_data['respuesta_api'] = response
                     
-                    # Si tenemos contexto de la tabla de cotejamiento, buscar los datos
-                    if hasattr(self.parent(), 'data_table'):
-                        # Usar la nueva función de asociación mejorada
+                    # Fallback: si el pago no estaba en la tabla, asociar con la póliza de la respuesta
+                    if not resegmentacion_data['num_poliza'] and hasattr(self.parent(), 'data_table'):
                         poliza_encontrada = self.parent().data_table.asociar_poliza_con_respuesta_api(response, pago_id)
                         if poliza_encontrada:
                             resegmentacion_data['agente'] = poliza_encontrada.get('agente', '')
                             resegmentacion_data['subramo'] = poliza_encontrada.get('subramo', '')
                             resegmentacion_data['num_poliza'] = poliza_encontrada.get('num_poliza', '')
                             print(f"[DB] Póliza asociada para pago_id {pago_id}: {poliza_encontrada.get('num_poliza', '')}")
-                        else:
-                            # Fallback: intentar la búsqueda original
-                            poliza_encontrada = self.parent().data_table.buscar_poliza_por_pago_id(pago_id)
-                            if poliza_encontrada:
-                                resegmentacion_data['agente'] = poliza_encontrada.get('agente', '')
-                                resegmentacion_data['subramo'] = poliza_encontrada.get('subramo', '')
-                                resegmentacion_data['num_poliza'] = poliza_encontrada.get('num_poliza', '')
-                                print(f"[DB] Póliza encontrada (fallback) para pago_id {pago_id}: {poliza_encontrada.get('num_poliza', '')}")
                     
-                    success = db.guardar_resegmentacion(resegmentacion_data)
+                    # Guardar y cerrar la entrada del journal en la misma transacción
+                    if entrada:
+                        success = db.completar_ajuste(entrada['clave'], resegmentacion_data)
+                    else:
+                        success = db.guardar_resegmentacion(resegmentacion_data)
                     if success:
+                        # La tabla de cotejamiento se entera por el bus de resegmentaciones
                         print(f"[DB] ✅ Resegmentación Prima guardada en base de datos")
-                        # Actualizar la tabla de cotejamiento si está disponible
-                        if hasattr(self.parent(), 'data_table'):
-                            self.parent().data_table.actualizar_resegmentaciones()
                     else:
                         print(f"[DB] ❌ Error guardando resegmentación Prima en base de datos")
                         
@@ -3488,31 +3924,26 @@ class ResegmentacionNuevoNegocioTab(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error al mostrar calendario: {str(e)}")
             
-    def llamar_api_ajuste(self, numero_poliza, fecha_primer_pago, motivo):
-        """Realiza la llamada a la API de ajuste manual para nuevo negocio"""
+    def email_ajustador(self) -> str:
+        """Correo del usuario local, usado como identificador del ajustador"""
+        if self.usuario_local:
+            return self.usuario_local.get('email', AJUSTADOR_DEFECTO)
+        return AJUSTADOR_DEFECTO  # Fallback
+    
+    def llamar_api_ajuste(self, numero_poliza, fecha_primer_pago, motivo, entrada=None):
+        """Realiza la llamada a la API de ajuste manual para nuevo negocio (entrada: registro del journal)"""
         print(f"\n{'='*80}")
         print(f"[RESEGMENTACIÓN NUEVO NEGOCIO] INICIANDO PETICIÓN API")
         print(f"{'='*80}")
         
         try:
-            url = f"https://condicionesrino.com/api/ajuste-manual/nuevo-negocio/{numero_poliza}"
+            url, body = peticion_ajuste('NUEVO_NEGOCIO', numero_poliza, fecha_primer_pago, motivo, self.email_ajustador())
             headers = {
                 'x-token': self.api_token,
                 'Content-Type': 'application/json'
             }
-            # Usar el correo del usuario local como identificador del ajustador
-            if self.usuario_local:
-                user_email = self.usuario_local.get('email', 'desarrollo-general@rinorisk.com')
-            else:
-                user_email = 'desarrollo-general@rinorisk.com'  # Fallback
-                
-            body = {
-                "ajuste": {
-                    "fechaPrimerPago": fecha_primer_pago
-                },
-                "motivoAjuste": f"{motivo}",
-                "nombreAjustador": user_email
-            }
+            if entrada:
+                headers['Idempotency-Key'] = entrada['clave']
             
             # LOGS DETALLADOS DE LA PETICIÓN
             print(f"[REQUEST] URL: {url}")
@@ -3529,7 +3960,14 @@ class ResegmentacionNuevoNegocioTab(QWidget):
             print(json.dumps(body, indent=2, ensure_ascii=False))
             
             print(f"\n[API] Enviando petición...")
-            response = requests.post(url, headers=headers, json=body, timeout=30)
+            if entrada:
+                # El journal guarda la petición exacta y actualiza su estado según la respuesta
+                response = enviar_ajuste_registrado(ResegmentacionDB(), entrada, self.api_token)
+            else:
+                # Si el token expiró (401) el gestor lo renueva y se reintenta una vez
+                response = gestor_token.ejecutar_con_reintento(
+                    lambda token: enviar_ajuste(url, body, token), self.api_token
+                )
             
             # LOGS DE LA RESPUESTA
             print(f"[RESPONSE] Status Code: {response.status_code}")
@@ -3564,6 +4002,9 @@ class ResegmentacionNuevoNegocioTab(QWidget):
         except requests.exceptions.RequestException as req_error:
             print(f"[ERROR] ❌ Error de petición: {req_error}")
             return False, f"Error de petición: {str(req_error)}"
+        except AjusteAnteriorPendiente as e:
+            print(f"[ERROR] ❌ {e}")
+            return False, str(e)
         except Exception as e:
             print(f"[ERROR] ❌ Error inesperado: {e}")
             import traceback
@@ -3674,7 +4115,47 @@ class ResegmentacionNuevoNegocioTab(QWidget):
             self.reseg_loading_modal.update_message("Preparando solicitud API...")
             print(f"[PROCESS] Progreso modal: 30% - Preparando solicitud API")
             
-            success, response = self.llamar_api_ajuste(numero_poliza, fecha_primer_pago, motivo)
+            # Registrar el ajuste en el journal antes de enviarlo: si la app se cae
+            # a medio camino, se reconcilia al iniciar con la misma clave de idempotencia
+            db = ResegmentacionDB()
+            usuario_responsable = getattr(self, 'user_info', {}).get('name', 'Usuario Desconocido')
+            resegmentacion_data = {
+                'agente': '',  # Se puede obtener del contexto si está disponible
+                'subramo': '',  # Se puede obtener del contexto si está disponible  
+                'num_poliza': numero_poliza,  # Tenemos el número de póliza directamente
+                'tipo_resegmentacion': 'NUEVO_NEGOCIO',
+                'fecha_resegmentacion': datetime.now().isoformat(),
+                'usuario_responsable': usuario_responsable,
+                'pago_id': '',
+                'fecha_primer_pago': fecha_primer_pago,
+                'motivo_resegmentacion': motivo,
+                'num_poliza_nuevo_negocio': numero_poliza,
+                'datos_originales': {
+                    'numero_poliza': numero_poliza,
+                    'fecha_primer_pago': fecha_primer_pago,
+                    'motivo': motivo,
+                    'timestamp': datetime.now().isoformat()
+                }
+            }
+            # Si tenemos contexto de la tabla de cotejamiento, buscar los datos
+            if hasattr(self.parent(), 'data_table') and hasattr(self.parent().data_table, 'current_data'):
+                # Buscar la póliza en los datos actuales
+                for row in self.parent().data_table.current_data:
+                    if row.get('Núm. Póliza', '') == numero_poliza:
+                        resegmentacion_data['agente'] = row.get('Agente', '')
+                        resegmentacion_data['subramo'] = row.get('Subramo', '')
+                        break
+            
+            url_ajuste, cuerpo_ajuste = peticion_ajuste('NUEVO_NEGOCIO', numero_poliza, fecha_primer_pago,
+                                                        motivo, self.email_ajustador())
+            entrada = db.registrar_ajuste('NUEVO_NEGOCIO', numero_poliza, url_ajuste, cuerpo_ajuste, resegmentacion_data)
+            
+            if entrada and entrada['estado'] == AJUSTE_ENVIADO:
+                # Un intento anterior ya se aplicó en la API: no se reenvía, solo se guarda
+                print(f"[JOURNAL] Ajuste ya aplicado en un intento anterior ({entrada['clave']})")
+                success, response = True, entrada['respuesta_api']
+            else:
+                success, response = self.llamar_api_ajuste(numero_poliza, fecha_primer_pago, motivo, entrada)
             print(f"[PROCESS] Llamada API completada - Success: {success}")
             
             if success:
@@ -3708,49 +4189,16 @@ class ResegmentacionNuevoNegocioTab(QWidget):
                 
                 # Guardar resegmentación en la base de datos
                 try:
-                    # Obtener información del usuario responsable
-                    usuario_responsable = getattr(self, 'user_info', {}).get('name', 'Usuario Desconocido')
-                    
-                    # Crear datos de resegmentación
-                    resegmentacion_data = {
-                        'agente': '',  # Se puede obtener del contexto si está disponible
-                        'subramo': '',  # Se puede obtener del contexto si está disponible  
-                        'num_poliza': numero_poliza,  # Tenemos el número de póliza directamente
-                        'tipo_resegmentacion': 'NUEVO_NEGOCIO',
-                        'fecha_resegmentacion': datetime.now().isoformat(),
-                        'usuario_responsable': usuario_responsable,
-                        'pago_id': '',
-                        'fecha_primer_pago': fecha_primer_pago,
-                        'motivo_resegmentacion': motivo,
-                        'num_poliza_nuevo_negocio': numero_poliza,
-                        'datos_originales': {
-                            'numero_poliza': numero_poliza,
-                            'fecha_primer_pago': fecha_primer_pago,
-                            'motivo': motivo,
-                            'timestamp': datetime.now().isoformat()
-                        },
-                        'respuesta_api': response
-                    }
-                    
-                    # Intentar guardar en la base de datos
-                    from resegmentacion_db import ResegmentacionDB
-                    db = ResegmentacionDB()
+                    resegmentacion_data['respuesta_api'] = response
                     
-                    # Si tenemos contexto de la tabla de cotejamiento, buscar los datos
-                    if hasattr(self.parent(), 'data_table') and hasattr(self.parent().data_table, 'current_data'):
-                        # Buscar la póliza en los datos actuales
-                        for row in self.parent().data_table.current_data:
-                            if row.get('Núm. Póliza', '') == numero_poliza:
-                                resegmentacion_data['agente'] = row.get('Agente', '')
-                                resegmentacion_data['subramo'] = row.get('Subramo', '')
-                                break
-                    
-                    success = db.guardar_resegmentacion(resegmentacion_data)
+                    # Guardar y cerrar la entrada del journal en la misma transacción
+                    if entrada:
+                        success = db.completar_ajuste(entrada['clave'], resegmentacion_data)
+                    else:
+                        success = db.guardar_resegmentacion(resegmentacion_data)
                     if success:
+                        # La tabla de cotejamiento se entera por el bus de resegmentaciones
                         print(f"[DB] ✅ Resegmentación Nuevo Negocio guardada en base de datos")
-                        # Actualizar la tabla de cotejamiento si está disponible
-                        if hasattr(self.parent(), 'data_table'):
-                            self.parent().data_table.actualizar_resegmentaciones()
                     else:
                         print(f"[DB] ❌ Error guardando resegmentación Nuevo Negocio en base de datos")
                         
@@ -3866,6 +4314,8 @@ class ResegmentacionTab(QWidget):
             self.resegmentacion_prima_tab.set_usuario_local(usuario_info)
         if hasattr(self, 'resegmentacion_nuevo_negocio_tab'):
             self.resegmentacion_nuevo_negocio_tab.set_usuario_local(usuario_info)
+        if hasattr(self, 'historial_tab'):
+            self.historial_tab.set_usuario_local(usuario_info)
         
     def setup_ui(self):
         """Configura la interfaz del tab de resegmentación con sub-tabs"""
@@ -3880,6 +4330,7 @@ class ResegmentacionTab(QWidget):
         # Crear sub-tabs
         self.resegmentacion_prima_tab = ResegmentacionPrimaTab()
         self.resegmentacion_nuevo_negocio_tab = ResegmentacionNuevoNegocioTab()
+        self.historial_tab = HistorialResegmentacionesWidget()
         
         # Conectar señales de resegmentación completada
         self.resegmentacion_prima_tab.resegmentacion_completada.connect(self.on_resegmentacion_completada)
@@ -3888,6 +4339,7 @@ class ResegmentacionTab(QWidget):
         # Agregar sub-tabs
         self.sub_tab_widget.addTab(self.resegmentacion_prima_tab, "💰 Resegmentación Prima")
         self.sub_tab_widget.addTab(self.resegmentacion_nuevo_negocio_tab, "🚀 Resegmentación Nuevo Negocio")
+        self.sub_tab_widget.addTab(self.historial_tab, "🗂️ Historial")
         
         layout.addWidget(self.sub_tab_widget)
         self.setLayout(layout)
@@ -3896,30 +4348,13 @@ class ResegmentacionTab(QWidget):
         if self.usuario_local:
             self.resegmentacion_prima_tab.set_usuario_local(self.usuario_local)
             self.resegmentacion_nuevo_negocio_tab.set_usuario_local(self.usuario_local)
+            self.historial_tab.set_usuario_local(self.usuario_local)
     
     def on_resegmentacion_completada(self):
         """Manejador para cuando se completa una resegmentación en cualquier sub-tab"""
-        try:
-            print("[DEBUG] 🔄 Resegmentación completada, actualizando visualización...")
-            
-            # Buscar la tabla principal (CotejamientoTab)
-            parent_window = self.parent()
-            while parent_window and not hasattr(parent_window, 'cotejamiento_tab'):
-                parent_window = parent_window.parent()
-            
-            if parent_window and hasattr(parent_window, 'cotejamiento_tab'):
-                cotejamiento_tab = parent_window.cotejamiento_tab
-                if hasattr(cotejamiento_tab, 'data_table'):
-                    print("[DEBUG] 📊 Actualizando tabla de cotejamiento...")
-                    cotejamiento_tab.data_table.actualizar_visualizacion_resegmentaciones()
-                    print("[DEBUG] ✅ Tabla actualizada exitosamente")
-                else:
-                    print("[DEBUG] ⚠️ No se encontró data_table en cotejamiento_tab")
-            else:
-                print("[DEBUG] ⚠️ No se encontró cotejamiento_tab para actualizar")
-                
-        except Exception as e:
-            print(f"[ERROR] Error actualizando visualización tras resegmentación: {e}")
+        # La tabla de cotejamiento ya recibió el cambio por el bus de resegmentaciones
+        # y repintó solo las filas afectadas; no hace falta buscarla ni recargar la página
+        print("[DEBUG] 🔄 Resegmentación completada")
         
     def set_api_token(self, token):
         """Establece el token de API para todos los sub-tabs de resegmentación"""
@@ -3942,6 +4377,9 @@ class PrincipalWindow(QWidget):
         super().__init__()
         self.usuario_local = None  # Información del usuario logueado localmente
         self.setup_ui()
+        self.iniciar_sincronizacion()
+        # Al salir no deben quedar hilos del planificador escribiendo en la base o en la red
+        QApplication.instance().aboutToQuit.connect(self.detener_tareas)
         
     def set_usuario_autenticado(self, usuario_info):
         """Establece la información del usuario autenticado localmente"""
@@ -3949,6 +4387,8 @@ class PrincipalWindow(QWidget):
         print(f"[DEBUG] Usuario local establecido: {usuario_info}")
         
         # Pasar la información del usuario local a los tabs que la necesiten
+        if hasattr(self, 'cotejamiento_tab'):
+            self.cotejamiento_tab.set_usuario_local(usuario_info)
         if hasattr(self, 'resegmentacion_tab'):
             self.resegmentacion_tab.set_usuario_local(usuario_info)
         
@@ -3964,8 +4404,11 @@ class PrincipalWindow(QWidget):
         tab_layout.setContentsMargins(0, 0, 0, 0)
         tab_layout.setSpacing(0)
         
-        # Header con botón cerrar sesión
+        # Header con estado de sincronización y botón cerrar sesión
         top_bar = QHBoxLayout()
+        self.sync_label = QLabel("")
+        self.sync_label.setStyleSheet("color: #6b7280; font-size: 12px; margin-left: 12px;")
+        top_bar.addWidget(self.sync_label)
         top_bar.addStretch()
         
         # Botón cerrar sesión
@@ -4017,9 +4460,50 @@ class PrincipalWindow(QWidget):
         
         # Si ya tenemos información del usuario local, pasarla a los tabs
         if self.usuario_local:
+            self.cotejamiento_tab.set_usuario_local(self.usuario_local)
             self.resegmentacion_tab.set_usuario_local(self.usuario_local)
         
-
+    def iniciar_sincronizacion(self):
+        """Sincroniza resegmentaciones con las demás estaciones si hay destino configurado"""
+        self.sync_destino = os.environ.get('BONOS_SYNC_DESTINO', '')
+        if not self.sync_destino:
+            return
+        
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sincronizar_resegmentaciones)
+        self.sync_timer.start(INTERVALO_SYNC * 1000)
+        # Primera ronda al abrir, sin retrasar la carga de la ventana
+        QTimer.singleShot(2000, self.sincronizar_resegmentaciones)
+        
+    def sincronizar_resegmentaciones(self):
+        """Lanza una ronda de sincronización en segundo plano (una a la vez)"""
+        if planificador.activas("sync"):
+            return
+        self.sync_label.setText("🔄 Sincronizando resegmentaciones...")
+        destino = self.sync_destino
+        tarea = planificador.enviar(
+            "sync",
+            lambda t: SincronizadorResegmentaciones(ResegmentacionDB(), backend_desde_destino(destino)).sincronizar(),
+            "Sincronizar resegmentaciones"
+        )
+        tarea.completada.connect(self.on_sincronizacion_completada)
+        tarea.error.connect(self.on_sincronizacion_error)
+        
+    def detener_tareas(self):
+        """Cancela las tareas en cola y espera un momento a las que están en curso"""
+        planificador.cancelar_todas()
+        if not planificador.esperar(ESPERA_CIERRE_MS):
+            print(f"[TAREAS] ⚠️ Quedaron tareas en curso tras {ESPERA_CIERRE_MS} ms")
+        
+    def on_sincronizacion_completada(self, resultado: dict):
+        # Las filas afectadas ya se repintaron por el bus de resegmentaciones
+        hora = datetime.now().strftime("%H:%M")
+        recibidas = f", {resultado['aplicados']} recibida(s)" if resultado.get('aplicados') else ""
+        self.sync_label.setText(f"✅ Resegmentaciones sincronizadas {hora}{recibidas}")
+        
+    def on_sincronizacion_error(self, error: str):
+        print(f"[SYNC] ❌ Error sincronizando: {error}")
+        self.sync_label.setText("⚠️ Sin sincronizar (se reintentará)")
         
     def setup_styles(self):
         """Configura los estilos de la ventana principal"""
@@ -5,9 +5,79 @@ Base de datos SQLite para gestionar resegmentaciones
 
 import sqlite3
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
 import os
+import re
+import uuid
+import zlib
+
+from bus_resegmentaciones import bus_resegmentaciones, evento_resegmentacion, ACCION_GUARDADA, ACCION_REVERTIDA
+
+# Estados del journal de ajustes enviados a la API
+AJUSTE_PENDIENTE = 'PENDIENTE'      # Registrado antes de enviar; resultado desconocido si la app se cae
+AJUSTE_ENVIADO = 'ENVIADO'          # La API respondió 200; falta guardarlo en resegmentaciones
+AJUSTE_COMPLETADO = 'COMPLETADO'    # Aplicado en la API y guardado localmente
+AJUSTE_FALLIDO = 'FALLIDO'          # La API lo rechazó
+AJUSTE_REEMPLAZADO = 'REEMPLAZADO'  # Journals anteriores: sustituido sin resolverse (ya no se asigna)
+
+def marca_modificacion() -> str:
+    """
+    Valor de modificado_en: hora UTC en ISO 8601 con microsegundos (2025-04-01T16:05:09.123456+00:00).
+    La sincronización compara estas marcas como texto entre estaciones que pueden estar en
+    zonas horarias distintas; con UTC y formato fijo el orden del texto es el orden real.
+    """
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+# Columnas sin los JSON pesados (datos_originales, respuesta_api): para verificaciones frecuentes
+COLUMNAS_LIGERAS = (
+    'id, agente, subramo, num_poliza, tipo_resegmentacion, fecha_resegmentacion, usuario_responsable, '
+    'pago_id, fecha_primer_pago, motivo_resegmentacion, num_poliza_nuevo_negocio, estado, fecha_creacion'
+)
+
+# Columnas mínimas para saber si hay resegmentación y con qué fecha
+COLUMNAS_ESTADO = 'id, tipo_resegmentacion, estado, fecha_resegmentacion, fecha_primer_pago'
+
+# Columnas con JSON comprimido
+COLUMNAS_PAYLOAD = ('datos_originales', 'respuesta_api')
+
+def comprimir_json(valor) -> bytes:
+    """JSON comprimido con zlib, guardado como BLOB"""
+    return zlib.compress(json.dumps(valor if valor is not None else {}, ensure_ascii=False).encode('utf-8'), 6)
+
+def decodificar_json(valor):
+    """Inverso de comprimir_json; acepta también el JSON en texto de registros anteriores"""
+    if valor is None or valor == '':
+        return {}
+    if isinstance(valor, (bytes, memoryview)):
+        return json.loads(zlib.decompress(bytes(valor)).decode('utf-8'))
+    if isinstance(valor, str):
+        return json.loads(valor)
+    return valor
+
+# Largo máximo del texto de la respuesta API que se indexa para búsqueda
+MAX_TEXTO_RESPUESTA = 4000
+
+def texto_respuesta(respuesta_api) -> str:
+    """Valores de la respuesta de la API (mensajes, pólizas, montos...) como texto plano buscable"""
+    valores = []
+    pendientes = [respuesta_api]
+    while pendientes:
+        valor = pendientes.pop(0)
+        if isinstance(valor, dict):
+            pendientes.extend(valor.values())
+        elif isinstance(valor, list):
+            pendientes.extend(valor)
+        elif isinstance(valor, (str, int, float)) and not isinstance(valor, bool) and str(valor).strip():
+            valores.append(str(valor).strip())
+    return ' '.join(dict.fromkeys(valores))[:MAX_TEXTO_RESPUESTA]
+
+def consulta_fts(texto: str) -> str:
+    """
+    Convierte lo escrito en el buscador a una consulta FTS5 segura: cada palabra entre comillas
+    (sin operadores ni sintaxis de FTS) y como prefijo, todas requeridas
+    """
+    return ' '.join(f'"{palabra}"*' for palabra in re.findall(r'\w+', texto or ''))
 
 class ResegmentacionDB:
     """Clase para manejar la base de datos de resegmentaciones"""
@@ -15,6 +85,8 @@ class ResegmentacionDB:
     def __init__(self, db_path: str = "resegmentaciones.db"):
         """Inicializa la conexión a la base de datos"""
         self.db_path = db_path
+        self.fts_disponible = False  # SQLite compilado con FTS5 (se verifica al inicializar)
+        self.origen = ''  # Identificador de esta estación para la sincronización
         self.init_database()
     
     def init_database(self):
@@ -41,6 +113,9 @@ class ResegmentacionDB:
                         respuesta_api TEXT,     -- JSON con respuesta de la API
                         estado TEXT DEFAULT 'ACTIVO',  -- 'ACTIVO', 'REVERTIDO'
                         fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        texto_respuesta TEXT,   -- valores de respuesta_api en texto plano (búsqueda)
+                        modificado_en DATETIME, -- último cambio en UTC (marca_modificacion): gana el más reciente al sincronizar
+                        origen TEXT,            -- estación que hizo el último cambio
                         UNIQUE(agente, subramo, num_poliza, tipo_resegmentacion)
                     )
                 ''')
@@ -66,12 +141,277 @@ class ResegmentacionDB:
                     ON resegmentaciones(pago_id)
                 ''')
                 
+                # Journal de ajustes: cada ajuste se registra antes de enviarlo a la API
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS journal_ajustes (
+                        clave TEXT PRIMARY KEY,          -- clave de idempotencia (header Idempotency-Key)
+                        tipo TEXT NOT NULL,              -- 'PRIMA' o 'NUEVO_NEGOCIO'
+                        objetivo TEXT NOT NULL,          -- pago_id o número de póliza
+                        url TEXT NOT NULL,
+                        cuerpo TEXT NOT NULL,            -- JSON enviado
+                        resegmentacion TEXT NOT NULL,    -- JSON a guardar en resegmentaciones al confirmar
+                        estado TEXT NOT NULL,
+                        intentos INTEGER DEFAULT 0,
+                        respuesta_api TEXT,
+                        error TEXT,
+                        fecha_creacion DATETIME NOT NULL,
+                        fecha_actualizacion DATETIME NOT NULL
+                    )
+                ''')
+                
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_journal_objetivo
+                    ON journal_ajustes(tipo, objetivo, estado)
+                ''')
+                
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_journal_estado
+                    ON journal_ajustes(estado)
+                ''')
+                
+                # WAL: lectores y el journal no se bloquean entre sí con envíos concurrentes
+                cursor.execute('PRAGMA journal_mode=WAL')
+                
+                # Historial append-only: cada aplicación o reversión agrega un evento;
+                # resegmentaciones es el estado actual materializado que leen las consultas
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS eventos_resegmentacion (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        accion TEXT NOT NULL,            -- 'GUARDADA' o 'REVERTIDA'
+                        agente TEXT NOT NULL,
+                        subramo TEXT NOT NULL,
+                        num_poliza TEXT NOT NULL,
+                        tipo_resegmentacion TEXT,        -- NULL en reversiones (aplican a todos los tipos)
+                        fecha_evento DATETIME NOT NULL,
+                        usuario TEXT,
+                        datos BLOB,                      -- JSON comprimido con la resegmentación guardada
+                        origen TEXT                      -- NULL si es local; estación de origen si llegó por sincronización
+                    )
+                ''')
+                
+                # Estado de la sincronización entre estaciones (identificador local y cursores)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS sync_estado (
+                        clave TEXT PRIMARY KEY,
+                        valor TEXT
+                    )
+                ''')
+                cursor.execute("INSERT OR IGNORE INTO sync_estado (clave, valor) VALUES ('origen', ?)",
+                               (uuid.uuid4().hex,))
+                cursor.execute("SELECT valor FROM sync_estado WHERE clave = 'origen'")
+                self.origen = cursor.fetchone()[0]
+                
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_eventos_poliza
+                    ON eventos_resegmentacion(num_poliza)
+                ''')
+                
+                cursor.execute('PRAGMA user_version')
+                version = cursor.fetchone()[0]
+                
+                # Versión 3: historial de eventos. Las resegmentaciones existentes se registran como
+                # un evento GUARDADA (más uno REVERTIDA si ya estaban revertidas), sin datos
+                # porque solo se conserva su último estado
+                if version < 3:
+                    cursor.execute('DELETE FROM eventos_resegmentacion')
+                    cursor.execute('''
+                        INSERT INTO eventos_resegmentacion
+                        (accion, agente, subramo, num_poliza, tipo_resegmentacion, fecha_evento, usuario)
+                        SELECT ?, agente, subramo, num_poliza, tipo_resegmentacion, fecha_resegmentacion,
+                               usuario_responsable
+                        FROM resegmentaciones ORDER BY id
+                    ''', (ACCION_GUARDADA,))
+                    cursor.execute('''
+                        INSERT INTO eventos_resegmentacion
+                        (accion, agente, subramo, num_poliza, tipo_resegmentacion, fecha_evento, usuario)
+                        SELECT ?, agente, subramo, num_poliza, tipo_resegmentacion, ?, ''
+                        FROM resegmentaciones WHERE estado = 'REVERTIDO' ORDER BY id
+                    ''', (ACCION_REVERTIDA, datetime.now().isoformat()))
+                
+                self._crear_resumen(cursor)
+                
+                # Versión 2: resumen diario. Se llena con lo que ya existía, en la misma transacción
+                # que crea los triggers para que ningún registro quede contado dos veces o sin contar
+                if version < 2:
+                    cursor.execute('DELETE FROM resumen_diario')
+                    cursor.execute('''
+                        INSERT INTO resumen_diario (dia, tipo_resegmentacion, activas)
+                        SELECT DATE(fecha_resegmentacion), tipo_resegmentacion, COUNT(*)
+                        FROM resegmentaciones
+                        WHERE estado = 'ACTIVO'
+                        GROUP BY DATE(fecha_resegmentacion), tipo_resegmentacion
+                    ''')
+                
+                # Versión 4: búsqueda de texto completo sobre motivo, usuario y respuesta de la API
+                if version < 4:
+                    self._agregar_texto_respuesta(cursor)
+                self.fts_disponible = self._crear_busqueda(cursor, reconstruir=version < 4)
+                
+                # Versión 5: sincronización entre estaciones
+                if version < 5:
+                    self._agregar_columna(cursor, 'resegmentaciones', 'modificado_en', 'DATETIME')
+                    self._agregar_columna(cursor, 'resegmentaciones', 'origen', 'TEXT')
+                    self._agregar_columna(cursor, 'eventos_resegmentacion', 'origen', 'TEXT')
+                    # fecha_resegmentacion es hora local: se pasa a UTC con el formato de marca_modificacion
+                    cursor.execute('''
+                        UPDATE resegmentaciones
+                        SET modificado_en = COALESCE(
+                                strftime('%Y-%m-%dT%H:%M:%f', fecha_resegmentacion, 'utc') || '000+00:00',
+                                fecha_resegmentacion),
+                            origen = ?
+                        WHERE modificado_en IS NULL
+                    ''', (self.origen,))
+                
+                # Versión 6: las bases que ya tenían la versión 5 antes de marca_modificacion guardaron
+                # hora local sin zona; se pasan a UTC suponiendo la zona de esta estación
+                if version < 6:
+                    cursor.execute('''
+                        UPDATE resegmentaciones
+                        SET modificado_en = strftime('%Y-%m-%dT%H:%M:%f', modificado_en, 'utc') || '000+00:00'
+                        WHERE modificado_en NOT LIKE '%+00:00'
+                          AND strftime('%Y-%m-%dT%H:%M:%f', modificado_en, 'utc') IS NOT NULL
+                    ''')
+                
                 conn.commit()
                 print("[DEBUG] Base de datos de resegmentaciones inicializada correctamente")
-                
+            
+            # Versión 1: JSON comprimidos. Se migra una sola vez por base de datos
+            if version < 1:
+                self.compactar_payloads()
+            if version < 6:
+                with sqlite3.connect(self.db_path) as conn:
+                    conn.execute('PRAGMA user_version = 6')
+        
         except Exception as e:
             print(f"[ERROR] Error inicializando base de datos: {str(e)}")
             raise
+
+    def _agregar_columna(self, cursor, tabla: str, columna: str, tipo: str):
+        """ALTER TABLE ADD COLUMN si la columna no existe (bases creadas por versiones anteriores)"""
+        cursor.execute(f'PRAGMA table_info({tabla})')
+        if columna not in [fila[1] for fila in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}')
+    
+    def _agregar_texto_respuesta(self, cursor):
+        """Agrega (si falta) y llena texto_respuesta en bases creadas antes de la búsqueda"""
+        self._agregar_columna(cursor, 'resegmentaciones', 'texto_respuesta', 'TEXT')
+        
+        cursor.execute('SELECT id, respuesta_api FROM resegmentaciones WHERE texto_respuesta IS NULL')
+        filas = [(texto_respuesta(decodificar_json(respuesta)), id_) for id_, respuesta in cursor.fetchall()]
+        cursor.executemany('UPDATE resegmentaciones SET texto_respuesta = ? WHERE id = ?', filas)
+    
+    def _crear_busqueda(self, cursor, reconstruir: bool = False) -> bool:
+        """
+        Índice FTS5 sobre resegmentaciones (tabla de contenido externo: no duplica el texto),
+        mantenido por triggers. Retorna False si este SQLite no tiene FTS5; la búsqueda
+        usa entonces LIKE.
+        """
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_resegmentaciones USING fts5(
+                    motivo_resegmentacion, usuario_responsable, texto_respuesta,
+                    content='resegmentaciones', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"[WARNING] Búsqueda de texto completo no disponible (FTS5): {e}")
+            return False
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_busqueda_insercion
+            AFTER INSERT ON resegmentaciones
+            BEGIN
+                INSERT INTO busqueda_resegmentaciones (rowid, motivo_resegmentacion, usuario_responsable, texto_respuesta)
+                VALUES (NEW.id, NEW.motivo_resegmentacion, NEW.usuario_responsable, NEW.texto_respuesta);
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_busqueda_borrado
+            AFTER DELETE ON resegmentaciones
+            BEGIN
+                INSERT INTO busqueda_resegmentaciones
+                (busqueda_resegmentaciones, rowid, motivo_resegmentacion, usuario_responsable, texto_respuesta)
+                VALUES ('delete', OLD.id, OLD.motivo_resegmentacion, OLD.usuario_responsable, OLD.texto_respuesta);
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_busqueda_actualizacion
+            AFTER UPDATE OF motivo_resegmentacion, usuario_responsable, texto_respuesta ON resegmentaciones
+            BEGIN
+                INSERT INTO busqueda_resegmentaciones
+                (busqueda_resegmentaciones, rowid, motivo_resegmentacion, usuario_responsable, texto_respuesta)
+                VALUES ('delete', OLD.id, OLD.motivo_resegmentacion, OLD.usuario_responsable, OLD.texto_respuesta);
+                INSERT INTO busqueda_resegmentaciones (rowid, motivo_resegmentacion, usuario_responsable, texto_respuesta)
+                VALUES (NEW.id, NEW.motivo_resegmentacion, NEW.usuario_responsable, NEW.texto_respuesta);
+            END
+        ''')
+        
+        # Primera vez: indexar las resegmentaciones que ya existían
+        if reconstruir:
+            cursor.execute("INSERT INTO busqueda_resegmentaciones (busqueda_resegmentaciones) VALUES ('rebuild')")
+        return True
+    
+    def _crear_resumen(self, cursor):
+        """
+        Conteo de resegmentaciones ACTIVAS por día y tipo, mantenido por triggers.
+        obtener_estadisticas lee esta tabla (una fila por día y tipo) en lugar de recorrer
+        todas las resegmentaciones.
+
+        Las escrituras usan upsert (ON CONFLICT DO UPDATE): volver a guardar una resegmentación
+        dispara el trigger de UPDATE, no un DELETE + INSERT.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resumen_diario (
+                dia TEXT NOT NULL,
+                tipo_resegmentacion TEXT NOT NULL,
+                activas INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, tipo_resegmentacion)
+            ) WITHOUT ROWID
+        ''')
+
+        # Versiones anteriores usaban INSERT OR REPLACE y descontaban la fila reemplazada aquí;
+        # con upsert descontaría dos veces
+        cursor.execute('DROP TRIGGER IF EXISTS trg_resumen_reemplazo')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_resumen_insercion
+            AFTER INSERT ON resegmentaciones
+            WHEN NEW.estado = 'ACTIVO'
+            BEGIN
+                INSERT INTO resumen_diario (dia, tipo_resegmentacion, activas)
+                VALUES (DATE(NEW.fecha_resegmentacion), NEW.tipo_resegmentacion, 1)
+                ON CONFLICT (dia, tipo_resegmentacion) DO UPDATE SET activas = activas + 1;
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_resumen_borrado
+            AFTER DELETE ON resegmentaciones
+            WHEN OLD.estado = 'ACTIVO'
+            BEGIN
+                UPDATE resumen_diario SET activas = activas - 1
+                WHERE dia = DATE(OLD.fecha_resegmentacion) AND tipo_resegmentacion = OLD.tipo_resegmentacion;
+            END
+        ''')
+
+        # Reversión (ACTIVO -> REVERTIDO) o cambio de fecha/tipo de un registro
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_resumen_actualizacion
+            AFTER UPDATE OF estado, fecha_resegmentacion, tipo_resegmentacion ON resegmentaciones
+            BEGIN
+                UPDATE resumen_diario SET activas = activas - 1
+                WHERE OLD.estado = 'ACTIVO'
+                AND dia = DATE(OLD.fecha_resegmentacion) AND tipo_resegmentacion = OLD.tipo_resegmentacion;
+
+                INSERT INTO resumen_diario (dia, tipo_resegmentacion, activas)
+                SELECT DATE(NEW.fecha_resegmentacion), NEW.tipo_resegmentacion, 1
+                WHERE NEW.estado = 'ACTIVO'
+                ON CONFLICT (dia, tipo_resegmentacion) DO UPDATE SET activas = activas + 1;
+            END
+        ''')
     
     def guardar_resegmentacion(self, resegmentacion_data: Dict) -> bool:
         """
@@ -84,48 +424,86 @@ class ResegmentacionDB:
             bool: True si se guardó exitosamente, False en caso contrario
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Preparar datos
-                agente = resegmentacion_data.get('agente', '')
-                subramo = resegmentacion_data.get('subramo', '')
-                num_poliza = resegmentacion_data.get('num_poliza', '')
-                tipo_resegmentacion = resegmentacion_data.get('tipo_resegmentacion', '')
-                fecha_resegmentacion = resegmentacion_data.get('fecha_resegmentacion', datetime.now().isoformat())
-                usuario_responsable = resegmentacion_data.get('usuario_responsable', '')
-                pago_id = resegmentacion_data.get('pago_id', '')
-                fecha_primer_pago = resegmentacion_data.get('fecha_primer_pago', '')
-                motivo_resegmentacion = resegmentacion_data.get('motivo_resegmentacion', '')
-                num_poliza_nuevo_negocio = resegmentacion_data.get('num_poliza_nuevo_negocio', '')
-                datos_originales = json.dumps(resegmentacion_data.get('datos_originales', {}))
-                respuesta_api = json.dumps(resegmentacion_data.get('respuesta_api', {}))
-                
-                # Insertar o actualizar
-                cursor.execute('''
-                    INSERT OR REPLACE INTO resegmentaciones 
-                    (agente, subramo, num_poliza, tipo_resegmentacion, fecha_resegmentacion,
-                     usuario_responsable, pago_id, fecha_primer_pago, motivo_resegmentacion,
-                     num_poliza_nuevo_negocio, datos_originales, respuesta_api)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    agente, subramo, num_poliza, tipo_resegmentacion, fecha_resegmentacion,
-                    usuario_responsable, pago_id, fecha_primer_pago, motivo_resegmentacion,
-                    num_poliza_nuevo_negocio, datos_originales, respuesta_api
-                ))
-                
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                evento = self._insertar_resegmentacion(conn.cursor(), resegmentacion_data)
                 conn.commit()
-                print(f"[DEBUG] Resegmentación guardada: {agente} - {subramo} - {num_poliza}")
-                return True
+                print(f"[DEBUG] Resegmentación guardada: {evento['agente']} - {evento['subramo']} - {evento['num_poliza']}")
+            
+            # Notificar fuera de la transacción para que las vistas lean el estado ya confirmado
+            bus_resegmentaciones.publicar(evento)
+            return True
                 
         except Exception as e:
             print(f"[ERROR] Error guardando resegmentación: {str(e)}")
             return False
     
-    def obtener_resegmentacion(self, agente: str, subramo: str, num_poliza: str) -> Optional[Dict]:
+    def _insertar_resegmentacion(self, cursor: sqlite3.Cursor, resegmentacion_data: Dict) -> Dict:
+        """Registra el evento y aplica la resegmentación al estado actual dentro de la transacción del cursor; retorna su evento del bus"""
+        # Preparar datos
+        agente = resegmentacion_data.get('agente', '')
+        subramo = resegmentacion_data.get('subramo', '')
+        num_poliza = resegmentacion_data.get('num_poliza', '')
+        tipo_resegmentacion = resegmentacion_data.get('tipo_resegmentacion', '')
+        fecha_resegmentacion = resegmentacion_data.get('fecha_resegmentacion', datetime.now().isoformat())
+        usuario_responsable = resegmentacion_data.get('usuario_responsable', '')
+        pago_id = resegmentacion_data.get('pago_id', '')
+        fecha_primer_pago = resegmentacion_data.get('fecha_primer_pago', '')
+        motivo_resegmentacion = resegmentacion_data.get('motivo_resegmentacion', '')
+        num_poliza_nuevo_negocio = resegmentacion_data.get('num_poliza_nuevo_negocio', '')
+        datos_originales = comprimir_json(resegmentacion_data.get('datos_originales', {}))
+        respuesta_api = comprimir_json(resegmentacion_data.get('respuesta_api', {}))
+        texto = texto_respuesta(resegmentacion_data.get('respuesta_api', {}))
+        ahora = datetime.now().isoformat()
+        modificado = marca_modificacion()
+        
+        # Evento append-only con la resegmentación completa
+        cursor.execute('''
+            INSERT INTO eventos_resegmentacion
+            (accion, agente, subramo, num_poliza, tipo_resegmentacion, fecha_evento, usuario, datos)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            ACCION_GUARDADA, agente, subramo, num_poliza, tipo_resegmentacion, ahora,
+            usuario_responsable, comprimir_json(resegmentacion_data)
+        ))
+        
+        # Estado actual: se actualiza en su lugar (mismo id) en lugar de borrar y reinsertar
+        cursor.execute('''
+            INSERT INTO resegmentaciones 
+            (agente, subramo, num_poliza, tipo_resegmentacion, fecha_resegmentacion,
+             usuario_responsable, pago_id, fecha_primer_pago, motivo_resegmentacion,
+             num_poliza_nuevo_negocio, datos_originales, respuesta_api, texto_respuesta, modificado_en, origen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (agente, subramo, num_poliza, tipo_resegmentacion) DO UPDATE SET
+                fecha_resegmentacion = excluded.fecha_resegmentacion,
+                usuario_responsable = excluded.usuario_responsable,
+                pago_id = excluded.pago_id,
+                fecha_primer_pago = excluded.fecha_primer_pago,
+                motivo_resegmentacion = excluded.motivo_resegmentacion,
+                num_poliza_nuevo_negocio = excluded.num_poliza_nuevo_negocio,
+                datos_originales = excluded.datos_originales,
+                respuesta_api = excluded.respuesta_api,
+                texto_respuesta = excluded.texto_respuesta,
+                modificado_en = excluded.modificado_en,
+                origen = excluded.origen,
+                estado = 'ACTIVO'
+        ''', (
+            agente, subramo, num_poliza, tipo_resegmentacion, fecha_resegmentacion,
+            usuario_responsable, pago_id, fecha_primer_pago, motivo_resegmentacion,
+            num_poliza_nuevo_negocio, datos_originales, respuesta_api, texto, modificado, self.origen
+        ))
+        
+        return evento_resegmentacion(
+            ACCION_GUARDADA, agente, subramo, num_poliza, pago_id, num_poliza_nuevo_negocio
+        )
+    
+    def obtener_resegmentacion(self, agente: str, subramo: str, num_poliza: str,
+                               columnas: str = COLUMNAS_LIGERAS) -> Optional[Dict]:
         """
         Obtiene una resegmentación específica por agente, subramo y número de póliza
         
+        Args:
+            columnas: proyección a leer; por defecto sin los JSON (ver obtener_payloads)
+        
         Returns:
             Dict con los datos de la resegmentación o None si no existe
         """
@@ -135,8 +513,8 @@ class ResegmentacionDB:
                 cursor = conn.cursor()
                 
                 # Búsqueda exacta primero
-                cursor.execute('''
-                    SELECT * FROM resegmentaciones 
+                cursor.execute(f'''
+                    SELECT {columnas} FROM resegmentaciones 
                     WHERE agente = ? AND subramo = ? AND num_poliza = ? 
                     AND estado = 'ACTIVO'
                     ORDER BY fecha_resegmentacion DESC
@@ -148,8 +526,8 @@ class ResegmentacionDB:
                     return dict(row)
                 
                 # Si no encuentra, búsqueda flexible (limpiar espacios y comparar)
-                cursor.execute('''
-                    SELECT * FROM resegmentaciones 
+                cursor.execute(f'''
+                    SELECT {columnas} FROM resegmentaciones 
                     WHERE TRIM(UPPER(agente)) = TRIM(UPPER(?)) 
                     AND TRIM(UPPER(subramo)) = TRIM(UPPER(?)) 
                     AND TRIM(UPPER(num_poliza)) = TRIM(UPPER(?))
@@ -169,15 +547,15 @@ class ResegmentacionDB:
             print(f"[ERROR] Error obteniendo resegmentación: {str(e)}")
             return None
     
-    def obtener_todas_resegmentaciones(self) -> List[Dict]:
-        """Obtiene todas las resegmentaciones activas"""
+    def obtener_todas_resegmentaciones(self, columnas: str = COLUMNAS_LIGERAS) -> List[Dict]:
+        """Obtiene todas las resegmentaciones activas (sin los JSON salvo que se pidan en columnas)"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
-                cursor.execute('''
-                    SELECT * FROM resegmentaciones 
+                cursor.execute(f'''
+                    SELECT {columnas} FROM resegmentaciones 
                     WHERE estado = 'ACTIVO'
                     ORDER BY fecha_resegmentacion DESC
                 ''')
@@ -188,27 +566,154 @@ class ResegmentacionDB:
             print(f"[ERROR] Error obteniendo resegmentaciones: {str(e)}")
             return []
     
+    def _condiciones_filtros(self, filtros: Optional[Dict]) -> Tuple[List[str], List]:
+        """
+        Condiciones SQL (sobre el alias r) para los filtros del historial:
+        tipo, estado, usuario (prefijo), desde y hasta (YYYY-MM-DD, inclusivos)
+        """
+        filtros = filtros or {}
+        condiciones, parametros = [], []
+        if filtros.get('tipo'):
+            condiciones.append('r.tipo_resegmentacion = ?')
+            parametros.append(filtros['tipo'])
+        if filtros.get('estado'):
+            condiciones.append('r.estado = ?')
+            parametros.append(filtros['estado'])
+        if filtros.get('usuario'):
+            condiciones.append('r.usuario_responsable LIKE ?')
+            parametros.append(f"{filtros['usuario']}%")
+        # Rango sobre la columna sin funciones para que use idx_reseg_fecha
+        if filtros.get('desde'):
+            condiciones.append('r.fecha_resegmentacion >= ?')
+            parametros.append(filtros['desde'])
+        if filtros.get('hasta'):
+            condiciones.append("r.fecha_resegmentacion < DATE(?, '+1 day')")
+            parametros.append(filtros['hasta'])
+        return condiciones, parametros
+    
+    def listar_resegmentaciones(self, filtros: Optional[Dict] = None, despues: Optional[Tuple[str, int]] = None,
+                                limite: int = 100) -> List[Dict]:
+        """
+        Página del historial (activas y revertidas), de la más reciente a la más antigua.
+        
+        Paginación por llave: despues = (fecha_resegmentacion, id) de la última fila de la página
+        anterior. Recorre idx_reseg_fecha (que incluye el id) sin OFFSET, así que cualquier página
+        cuesta lo mismo sin importar cuántos registros haya antes.
+        """
+        condiciones, parametros = self._condiciones_filtros(filtros)
+        if despues:
+            condiciones.append('r.fecha_resegmentacion <= ? AND (r.fecha_resegmentacion < ? OR r.id < ?)')
+            parametros.extend([despues[0], despues[0], despues[1]])
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {COLUMNAS_LIGERAS}, '' AS coincidencia FROM resegmentaciones r
+                    {where}
+                    ORDER BY r.fecha_resegmentacion DESC, r.id DESC
+                    LIMIT ?
+                ''', (*parametros, limite))
+                return [dict(row) for row in cursor.fetchall()]
+                
+        except Exception as e:
+            print(f"[ERROR] Error listando resegmentaciones: {str(e)}")
+            return []
+    
+    def buscar_resegmentaciones(self, texto: str, filtros: Optional[Dict] = None, limite: int = 200) -> List[Dict]:
+        """
+        Búsqueda de texto completo en motivo, usuario y respuesta de la API (activas y revertidas).
+        Resultados ordenados por relevancia (bm25) con un fragmento de la coincidencia en 'coincidencia';
+        sin texto retorna las más recientes (listar_resegmentaciones).
+        """
+        consulta = consulta_fts(texto)
+        if not consulta:
+            return self.listar_resegmentaciones(filtros, limite=limite)
+        
+        columnas = ', '.join(f'r.{columna}' for columna in COLUMNAS_LIGERAS.split(', '))
+        condiciones, parametros = self._condiciones_filtros(filtros)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                if self.fts_disponible:
+                    filtro_sql = ''.join(f' AND {condicion}' for condicion in condiciones)
+                    cursor.execute(f'''
+                        SELECT {columnas},
+                               snippet(busqueda_resegmentaciones, -1, '[', ']', '…', 12) AS coincidencia
+                        FROM busqueda_resegmentaciones
+                        JOIN resegmentaciones r ON r.id = busqueda_resegmentaciones.rowid
+                        WHERE busqueda_resegmentaciones MATCH ?{filtro_sql}
+                        ORDER BY rank
+                        LIMIT ?
+                    ''', (consulta, *parametros, limite))
+                else:
+                    # Sin FTS5: cada palabra debe aparecer en alguno de los campos
+                    palabras = re.findall(r'\w+', texto)
+                    condiciones = [
+                        "(r.motivo_resegmentacion LIKE ? OR r.usuario_responsable LIKE ? OR r.texto_respuesta LIKE ?)"
+                        for _ in palabras
+                    ] + condiciones
+                    parametros = [f'%{palabra}%' for palabra in palabras for _ in range(3)] + parametros
+                    cursor.execute(f'''
+                        SELECT {columnas}, '' AS coincidencia FROM resegmentaciones r
+                        WHERE {' AND '.join(condiciones)}
+                        ORDER BY r.fecha_resegmentacion DESC
+                        LIMIT ?
+                    ''', (*parametros, limite))
+                
+                return [dict(row) for row in cursor.fetchall()]
+                
+        except Exception as e:
+            print(f"[ERROR] Error buscando resegmentaciones: {str(e)}")
+            return []
+    
+    def obtener_resegmentacion_por_poliza(self, num_poliza: str, columnas: str = COLUMNAS_ESTADO) -> Optional[Dict]:
+        """Resegmentación activa cuyo número de póliza o de nuevo negocio coincide exactamente"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                poliza = str(num_poliza).strip().upper()
+                cursor.execute(f'''
+                    SELECT {columnas} FROM resegmentaciones
+                    WHERE estado = 'ACTIVO'
+                    AND (TRIM(UPPER(num_poliza)) = ?
+                         OR (num_poliza_nuevo_negocio != '' AND TRIM(UPPER(num_poliza_nuevo_negocio)) = ?))
+                    ORDER BY fecha_resegmentacion DESC
+                    LIMIT 1
+                ''', (poliza, poliza))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+                
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo resegmentación por póliza: {str(e)}")
+            return None
+    
     def verificar_resegmentacion_existe(self, agente: str, subramo: str, num_poliza: str) -> bool:
         """Verifica si existe una resegmentación para los datos dados"""
-        resegmentacion = self.obtener_resegmentacion(agente, subramo, num_poliza)
+        resegmentacion = self.obtener_resegmentacion(agente, subramo, num_poliza, COLUMNAS_ESTADO)
         return resegmentacion is not None
     
     def obtener_fecha_resegmentacion(self, agente: str, subramo: str, num_poliza: str) -> Optional[str]:
         """Obtiene la fecha de resegmentación si existe"""
-        resegmentacion = self.obtener_resegmentacion(agente, subramo, num_poliza)
+        resegmentacion = self.obtener_resegmentacion(agente, subramo, num_poliza, COLUMNAS_ESTADO)
         if resegmentacion:
             return resegmentacion.get('fecha_resegmentacion', '')
         return None
     
-    def obtener_resegmentacion_por_pago_id(self, pago_id: str) -> Optional[Dict]:
-        """Obtiene una resegmentación específica por pago_id"""
+    def obtener_resegmentacion_por_pago_id(self, pago_id: str, columnas: str = COLUMNAS_LIGERAS) -> Optional[Dict]:
+        """Obtiene una resegmentación específica por pago_id (sin los JSON salvo que se pidan en columnas)"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
-                cursor.execute('''
-                    SELECT * FROM resegmentaciones 
+                cursor.execute(f'''
+                    SELECT {columnas} FROM resegmentaciones 
                     WHERE pago_id = ? AND estado = 'ACTIVO'
                     ORDER BY fecha_resegmentacion DESC
                     LIMIT 1
@@ -225,62 +730,487 @@ class ResegmentacionDB:
     
     def verificar_resegmentacion_por_pago_id(self, pago_id: str) -> bool:
         """Verifica si existe una resegmentación para un pago_id dado"""
-        resegmentacion = self.obtener_resegmentacion_por_pago_id(pago_id)
+        resegmentacion = self.obtener_resegmentacion_por_pago_id(pago_id, COLUMNAS_ESTADO)
         return resegmentacion is not None
     
     def obtener_fecha_primer_pago_resegmentado(self, pago_id: str) -> Optional[str]:
         """Obtiene la fecha de primer pago resegmentado si existe"""
-        resegmentacion = self.obtener_resegmentacion_por_pago_id(pago_id)
+        resegmentacion = self.obtener_resegmentacion_por_pago_id(pago_id, COLUMNAS_ESTADO)
         if resegmentacion:
             return resegmentacion.get('fecha_primer_pago', '')
         return None
     
-    def revertir_resegmentacion(self, agente: str, subramo: str, num_poliza: str) -> bool:
-        """Marca una resegmentación como revertida"""
+    def obtener_payloads(self, resegmentacion_id: int) -> Dict:
+        """datos_originales y respuesta_api ya decodificados; solo cuando se muestran los detalles"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {', '.join(COLUMNAS_PAYLOAD)} FROM resegmentaciones WHERE id = ?
+                ''', (resegmentacion_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    return {}
+                return {columna: decodificar_json(valor) for columna, valor in zip(COLUMNAS_PAYLOAD, row)}
+                
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo datos de la resegmentación {resegmentacion_id}: {str(e)}")
+            return {}
+    
+    def compactar_payloads(self) -> int:
+        """Comprime los JSON guardados en texto por versiones anteriores; retorna filas convertidas"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, datos_originales, respuesta_api FROM resegmentaciones
+                    WHERE typeof(datos_originales) = 'text' OR typeof(respuesta_api) = 'text'
+                ''')
+                filas = [(comprimir_json(decodificar_json(datos)), comprimir_json(decodificar_json(respuesta)), id_)
+                         for id_, datos, respuesta in cursor.fetchall()]
+                cursor.executemany(
+                    'UPDATE resegmentaciones SET datos_originales = ?, respuesta_api = ? WHERE id = ?', filas
+                )
+                conn.commit()
+                if filas:
+                    print(f"[DEBUG] {len(filas)} resegmentaciones compactadas")
+                return len(filas)
                 
+        except Exception as e:
+            print(f"[ERROR] Error compactando resegmentaciones: {str(e)}")
+            return 0
+    
+    def revertir_resegmentacion(self, agente: str, subramo: str, num_poliza: str, usuario: str = '') -> bool:
+        """Marca una resegmentación como revertida y lo registra en el historial"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                
+                ahora = datetime.now().isoformat()
                 cursor.execute('''
                     UPDATE resegmentaciones 
-                    SET estado = 'REVERTIDO' 
+                    SET estado = 'REVERTIDO', modificado_en = ?, origen = ?
                     WHERE agente = ? AND subramo = ? AND num_poliza = ? AND estado = 'ACTIVO'
-                ''', (agente, subramo, num_poliza))
+                ''', (marca_modificacion(), self.origen, agente, subramo, num_poliza))
+                revertidas = cursor.rowcount
+                
+                if revertidas > 0:
+                    cursor.execute('''
+                        INSERT INTO eventos_resegmentacion
+                        (accion, agente, subramo, num_poliza, tipo_resegmentacion, fecha_evento, usuario)
+                        VALUES (?, ?, ?, ?, NULL, ?, ?)
+                    ''', (ACCION_REVERTIDA, agente, subramo, num_poliza, ahora, usuario))
                 
                 conn.commit()
-                return cursor.rowcount > 0
+            
+            if revertidas > 0:
+                bus_resegmentaciones.publicar(evento_resegmentacion(
+                    ACCION_REVERTIDA, agente, subramo, num_poliza
+                ))
+            return revertidas > 0
                 
         except Exception as e:
             print(f"[ERROR] Error revirtiendo resegmentación: {str(e)}")
             return False
     
-    def obtener_estadisticas(self) -> Dict:
-        """Obtiene estadísticas de resegmentaciones"""
+    def revertir_resegmentaciones(self, ids: List[int], usuario: str = '') -> int:
+        """
+        Revierte varias resegmentaciones (por id) en una sola transacción, con un evento
+        REVERTIDA por registro. Las que ya estaban revertidas se ignoran.
+        
+        Returns:
+            Cantidad de resegmentaciones revertidas (-1 si hubo error; en ese caso no se revierte ninguna)
+        """
+        ids = list(dict.fromkeys(int(id_) for id_ in ids))
+        if not ids:
+            return 0
+        
+        try:
+            ahora = datetime.now().isoformat()
+            modificado = marca_modificacion()
+            revertidas = []
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                # Por bloques para no exceder el límite de parámetros de SQLite
+                for inicio in range(0, len(ids), 500):
+                    bloque = ids[inicio:inicio + 500]
+                    marcadores = ', '.join('?' * len(bloque))
+                    cursor.execute(f'''
+                        SELECT id, agente, subramo, num_poliza, tipo_resegmentacion, pago_id, num_poliza_nuevo_negocio
+                        FROM resegmentaciones WHERE id IN ({marcadores}) AND estado = 'ACTIVO'
+                    ''', bloque)
+                    revertidas.extend(dict(row) for row in cursor.fetchall())
+                    cursor.execute(f'''
+                        UPDATE resegmentaciones SET estado = 'REVERTIDO', modificado_en = ?, origen = ?
+                        WHERE id IN ({marcadores}) AND estado = 'ACTIVO'
+                    ''', (modificado, self.origen, *bloque))
+                
+                cursor.executemany('''
+                    INSERT INTO eventos_resegmentacion
+                    (accion, agente, subramo, num_poliza, tipo_resegmentacion, fecha_evento, usuario)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', [(ACCION_REVERTIDA, r['agente'], r['subramo'], r['num_poliza'], r['tipo_resegmentacion'],
+                       ahora, usuario) for r in revertidas])
+                conn.commit()
+            
+            for r in revertidas:
+                bus_resegmentaciones.publicar(evento_resegmentacion(
+                    ACCION_REVERTIDA, r['agente'], r['subramo'], r['num_poliza'],
+                    r['pago_id'], r['num_poliza_nuevo_negocio']
+                ))
+            print(f"[DEBUG] {len(revertidas)} resegmentaciones revertidas")
+            return len(revertidas)
+            
+        except Exception as e:
+            print(f"[ERROR] Error revirtiendo resegmentaciones: {str(e)}")
+            return -1
+    
+    def obtener_historial(self, agente: str, subramo: str, num_poliza: str) -> List[Dict]:
+        """
+        Eventos de una póliza, del más antiguo al más reciente.
+        'datos' trae la resegmentación guardada (vacío en reversiones y eventos migrados).
+        """
         try:
             with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM eventos_resegmentacion
+                    WHERE num_poliza = ? AND agente = ? AND subramo = ?
+                    ORDER BY seq
+                ''', (num_poliza, agente, subramo))
+                
+                eventos = []
+                for row in cursor.fetchall():
+                    evento = dict(row)
+                    evento['datos'] = decodificar_json(evento['datos'])
+                    eventos.append(evento)
+                return eventos
+                
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo historial de resegmentación: {str(e)}")
+            return []
+    
+    # ------------------------------------------------------------------
+    # Sincronización entre estaciones
+    # ------------------------------------------------------------------
+    
+    # Columnas que viajan en un cambio (sin id local ni texto derivado)
+    COLUMNAS_CAMBIO = (
+        'agente', 'subramo', 'num_poliza', 'tipo_resegmentacion', 'fecha_resegmentacion', 'usuario_responsable',
+        'pago_id', 'fecha_primer_pago', 'motivo_resegmentacion', 'num_poliza_nuevo_negocio',
+        'datos_originales', 'respuesta_api', 'estado', 'fecha_creacion', 'modificado_en', 'origen'
+    )
+    
+    def obtener_estado_sync(self, clave: str, defecto: str = '') -> str:
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                row = conn.execute('SELECT valor FROM sync_estado WHERE clave = ?', (clave,)).fetchone()
+                return row[0] if row else defecto
+        except Exception as e:
+            print(f"[ERROR] Error leyendo estado de sincronización: {str(e)}")
+            return defecto
+    
+    def guardar_estado_sync(self, clave: str, valor: str):
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            conn.execute('INSERT OR REPLACE INTO sync_estado (clave, valor) VALUES (?, ?)', (clave, str(valor)))
+            conn.commit()
+    
+    def cambios_locales(self, desde_seq: int, limite: int = 500) -> Tuple[List[Dict], int]:
+        """
+        Resegmentaciones modificadas en esta estación después del evento desde_seq.
+        Se envía el estado actual completo de cada póliza afectada (serializable a JSON).
+        
+        Returns:
+            (cambios, seq del último evento considerado) — el seq es el nuevo cursor de envío
+        """
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT seq, agente, subramo, num_poliza FROM eventos_resegmentacion
+                WHERE seq > ? AND origen IS NULL
+                ORDER BY seq
+                LIMIT ?
+            ''', (desde_seq, limite))
+            eventos = cursor.fetchall()
+            if not eventos:
+                return [], desde_seq
+            
+            cambios = []
+            for agente, subramo, num_poliza in dict.fromkeys((e['agente'], e['subramo'], e['num_poliza']) for e in eventos):
+                cursor.execute(f'''
+                    SELECT {', '.join(self.COLUMNAS_CAMBIO)} FROM resegmentaciones
+                    WHERE agente = ? AND subramo = ? AND num_poliza = ?
+                ''', (agente, subramo, num_poliza))
+                for row in cursor.fetchall():
+                    cambio = dict(row)
+                    for columna in COLUMNAS_PAYLOAD:
+                        cambio[columna] = decodificar_json(cambio[columna])
+                    cambio['origen'] = cambio['origen'] or self.origen
+                    cambios.append(cambio)
+            return cambios, eventos[-1]['seq']
+    
+    def aplicar_cambios_remotos(self, cambios: List[Dict]) -> int:
+        """
+        Aplica cambios recibidos de otras estaciones en una sola transacción.
+        Último en escribir gana sobre la llave única (agente, subramo, num_poliza, tipo):
+        se compara (modificado_en, origen) y se ignoran los que no son más recientes que lo local.
+        La comparación es de texto: un destino central escrito antes de que modificado_en fuera
+        UTC puede entregar horas locales sin zona; se aceptan tal cual (el desfase es a lo más la
+        diferencia horaria) y dejan de llegar en cuanto la estación que las generó vuelve a escribir.
+        
+        Returns:
+            Cantidad de cambios aplicados
+        """
+        aplicados = []
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            for cambio in cambios:
+                llave = (cambio['agente'], cambio['subramo'], cambio['num_poliza'], cambio['tipo_resegmentacion'])
+                cursor.execute('''
+                    SELECT modificado_en, origen FROM resegmentaciones
+                    WHERE agente = ? AND subramo = ? AND num_poliza = ? AND tipo_resegmentacion = ?
+                ''', llave)
+                local = cursor.fetchone()
+                remoto = (cambio.get('modificado_en') or '', cambio.get('origen') or '')
+                if local is not None and (local['modificado_en'] or '', local['origen'] or '') >= remoto:
+                    continue
+                
+                valores = dict(cambio)
+                for columna in COLUMNAS_PAYLOAD:
+                    valores[columna] = comprimir_json(cambio.get(columna))
+                valores['texto_respuesta'] = texto_respuesta(cambio.get('respuesta_api'))
+                columnas = list(self.COLUMNAS_CAMBIO) + ['texto_respuesta']
+                actualizaciones = ', '.join(f'{c} = excluded.{c}' for c in columnas if c not in
+                                            ('agente', 'subramo', 'num_poliza', 'tipo_resegmentacion'))
+                cursor.execute(f'''
+                    INSERT INTO resegmentaciones ({', '.join(columnas)})
+                    VALUES ({', '.join('?' * len(columnas))})
+                    ON CONFLICT (agente, subramo, num_poliza, tipo_resegmentacion) DO UPDATE SET {actualizaciones}
+                ''', [valores.get(c) for c in columnas])
+                
+                activo = cambio.get('estado') == 'ACTIVO'
+                cursor.execute('''
+                    INSERT INTO eventos_resegmentacion
+                    (accion, agente, subramo, num_poliza, tipo_resegmentacion, fecha_evento, usuario, datos, origen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    ACCION_GUARDADA if activo else ACCION_REVERTIDA, *llave, remoto[0],
+                    cambio.get('usuario_responsable', ''), comprimir_json(cambio) if activo else None, remoto[1]
+                ))
+                aplicados.append(evento_resegmentacion(
+                    ACCION_GUARDADA if activo else ACCION_REVERTIDA, cambio['agente'], cambio['subramo'],
+                    cambio['num_poliza'], cambio.get('pago_id'), cambio.get('num_poliza_nuevo_negocio')
+                ))
+            conn.commit()
+        
+        for evento in aplicados:
+            bus_resegmentaciones.publicar(evento)
+        return len(aplicados)
+    
+    # ------------------------------------------------------------------
+    # Journal de ajustes
+    # ------------------------------------------------------------------
+    
+    def registrar_ajuste(self, tipo: str, objetivo: str, url: str, cuerpo: Dict,
+                         resegmentacion_data: Dict) -> Optional[Dict]:
+        """
+        Registra un ajuste antes de enviarlo a la API.
+        
+        Si el mismo objetivo tiene un ajuste sin resolver con el mismo cuerpo, se reutiliza
+        (misma clave de idempotencia): así un reenvío nunca cuenta como un ajuste nuevo.
+        Uno ya aplicado en la API se completa. Uno PENDIENTE con otro cuerpo se conserva: pudo
+        aplicarse en la API, así que se resuelve con su propia clave antes de enviar el nuevo
+        (journal_ajustes.enviar_ajuste_registrado).
+        
+        Returns:
+            Dict con la entrada del journal ('clave', 'estado', 'respuesta_api'...), None si hubo error
+        """
+        try:
+            cuerpo_json = json.dumps(cuerpo, sort_keys=True, ensure_ascii=False)
+            ahora = datetime.now().isoformat()
+            eventos = []
+            
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
+                # Bloqueo de escritura desde la lectura: dos envíos simultáneos no crean dos entradas
+                cursor.execute('BEGIN IMMEDIATE')
                 
-                # Total de resegmentaciones activas
-                cursor.execute('SELECT COUNT(*) FROM resegmentaciones WHERE estado = "ACTIVO"')
-                total_activas = cursor.fetchone()[0]
+                cursor.execute('''
+                    SELECT * FROM journal_ajustes
+                    WHERE tipo = ? AND objetivo = ? AND estado IN (?, ?)
+                    ORDER BY fecha_creacion
+                ''', (tipo, str(objetivo), AJUSTE_PENDIENTE, AJUSTE_ENVIADO))
+                
+                for entrada in [self._entrada_journal(row) for row in cursor.fetchall()]:
+                    if entrada['cuerpo'] == cuerpo_json:
+                        conn.commit()
+                        print(f"[JOURNAL] Reutilizando ajuste sin resolver {entrada['clave']} ({entrada['estado']})")
+                        return entrada
+                    if entrada['estado'] == AJUSTE_ENVIADO:
+                        eventos.append(self._completar_en_cursor(cursor, entrada, None))
+                
+                clave = uuid.uuid4().hex
+                cursor.execute('''
+                    INSERT INTO journal_ajustes
+                    (clave, tipo, objetivo, url, cuerpo, resegmentacion, estado, fecha_creacion, fecha_actualizacion)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (clave, tipo, str(objetivo), url, cuerpo_json,
+                      json.dumps(resegmentacion_data, ensure_ascii=False, default=str),
+                      AJUSTE_PENDIENTE, ahora, ahora))
+                conn.commit()
+            
+            for evento in eventos:
+                bus_resegmentaciones.publicar(evento)
+            print(f"[JOURNAL] Ajuste {tipo} {objetivo} registrado con clave {clave}")
+            return self.obtener_ajuste(clave)
+            
+        except Exception as e:
+            print(f"[ERROR] Error registrando ajuste en journal: {str(e)}")
+            return None
+    
+    def _entrada_journal(self, row: sqlite3.Row) -> Dict:
+        entrada = dict(row)
+        entrada['respuesta_api'] = json.loads(entrada['respuesta_api']) if entrada.get('respuesta_api') else None
+        return entrada
+    
+    def _cambiar_estado(self, cursor: sqlite3.Cursor, clave: str, estado: str, **campos):
+        asignaciones = ''.join(f", {campo} = ?" for campo in campos)
+        cursor.execute(f'''
+            UPDATE journal_ajustes
+            SET estado = ?, fecha_actualizacion = ?{asignaciones}
+            WHERE clave = ?
+        ''', (estado, datetime.now().isoformat(), *campos.values(), clave))
+    
+    def obtener_ajuste(self, clave: str) -> Optional[Dict]:
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM journal_ajustes WHERE clave = ?', (clave,))
+                row = cursor.fetchone()
+                return self._entrada_journal(row) if row else None
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo ajuste del journal: {str(e)}")
+            return None
+    
+    def marcar_ajuste_enviado(self, clave: str, respuesta_api) -> bool:
+        """La API confirmó el ajuste: se guarda su respuesta antes de cualquier otro paso"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE journal_ajustes
+                    SET estado = ?, respuesta_api = ?, intentos = intentos + 1, fecha_actualizacion = ?
+                    WHERE clave = ? AND estado = ?
+                ''', (AJUSTE_ENVIADO, json.dumps(respuesta_api, ensure_ascii=False),
+                      datetime.now().isoformat(), clave, AJUSTE_PENDIENTE))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            print(f"[ERROR] Error marcando ajuste enviado: {str(e)}")
+            return False
+    
+    def marcar_ajuste_fallido(self, clave: str, error: str) -> bool:
+        """La API rechazó el ajuste: no se reintentará en la reconciliación"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE journal_ajustes
+                    SET estado = ?, error = ?, intentos = intentos + 1, fecha_actualizacion = ?
+                    WHERE clave = ? AND estado = ?
+                ''', (AJUSTE_FALLIDO, error, datetime.now().isoformat(), clave, AJUSTE_PENDIENTE))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            print(f"[ERROR] Error marcando ajuste fallido: {str(e)}")
+            return False
+    
+    def _completar_en_cursor(self, cursor: sqlite3.Cursor, entrada: Dict, resegmentacion_data: Optional[Dict]) -> Dict:
+        datos = dict(resegmentacion_data) if resegmentacion_data else json.loads(entrada['resegmentacion'])
+        if entrada.get('respuesta_api') is not None:
+            datos['respuesta_api'] = entrada['respuesta_api']
+        evento = self._insertar_resegmentacion(cursor, datos)
+        self._cambiar_estado(cursor, entrada['clave'], AJUSTE_COMPLETADO)
+        return evento
+    
+    def completar_ajuste(self, clave: str, resegmentacion_data: Optional[Dict] = None) -> bool:
+        """
+        Guarda la resegmentación y marca el ajuste COMPLETADO en una sola transacción.
+        Sin resegmentacion_data se usan los datos registrados en el journal.
+        """
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('SELECT * FROM journal_ajustes WHERE clave = ?', (clave,))
+                row = cursor.fetchone()
+                if row is None or row['estado'] != AJUSTE_ENVIADO:
+                    conn.rollback()
+                    print(f"[JOURNAL] Ajuste {clave} no está pendiente de completar")
+                    return False
+                evento = self._completar_en_cursor(cursor, self._entrada_journal(row), resegmentacion_data)
+                conn.commit()
+            
+            bus_resegmentaciones.publicar(evento)
+            print(f"[JOURNAL] ✅ Ajuste {clave} completado")
+            return True
+            
+        except Exception as e:
+            print(f"[ERROR] Error completando ajuste {clave}: {str(e)}")
+            return False
+    
+    def ajustes_pendientes(self, tipo: Optional[str] = None, objetivo: Optional[str] = None) -> List[Dict]:
+        """Ajustes sin resolver (PENDIENTE o ENVIADO), del más antiguo al más reciente; opcionalmente de un objetivo"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                condicion = ' AND tipo = ? AND objetivo = ?' if tipo is not None else ''
+                cursor.execute(f'''
+                    SELECT * FROM journal_ajustes
+                    WHERE estado IN (?, ?){condicion}
+                    ORDER BY fecha_creacion
+                ''', (AJUSTE_PENDIENTE, AJUSTE_ENVIADO) + ((tipo, str(objetivo)) if tipo is not None else ()))
+                return [self._entrada_journal(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"[ERROR] Error obteniendo ajustes pendientes: {str(e)}")
+            return []
+    
+    def obtener_estadisticas(self) -> Dict:
+        """Obtiene estadísticas de resegmentaciones (desde el resumen diario mantenido por triggers)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
                 
-                # Resegmentaciones por tipo
+                # Resegmentaciones activas por tipo; el total es su suma
                 cursor.execute('''
-                    SELECT tipo_resegmentacion, COUNT(*) 
-                    FROM resegmentaciones 
-                    WHERE estado = "ACTIVO" 
+                    SELECT tipo_resegmentacion, SUM(activas)
+                    FROM resumen_diario
                     GROUP BY tipo_resegmentacion
+                    HAVING SUM(activas) > 0
                 ''')
                 por_tipo = dict(cursor.fetchall())
+                total_activas = sum(por_tipo.values())
                 
                 # Resegmentaciones por fecha (últimos 30 días)
                 cursor.execute('''
-                    SELECT DATE(fecha_resegmentacion) as fecha, COUNT(*) 
-                    FROM resegmentaciones 
-                    WHERE estado = "ACTIVO" 
-                    AND fecha_resegmentacion >= datetime('now', '-30 days')
-                    GROUP BY DATE(fecha_resegmentacion)
-                    ORDER BY fecha DESC
+                    SELECT dia, SUM(activas)
+                    FROM resumen_diario
+                    WHERE dia >= DATE('now', '-30 days')
+                    GROUP BY dia
+                    HAVING SUM(activas) > 0
+                    ORDER BY dia DESC
                 ''')
                 por_fecha = dict(cursor.fetchall())
                 
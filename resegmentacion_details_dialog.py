@@ -27,9 +27,12 @@ except ImportError:
 class ResegmentacionDetailsDialog(QDialog):
     """Diálogo para mostrar detalles completos de una resegmentación"""
     
-    def __init__(self, resegmentacion_data: Dict, parent=None):
+    def __init__(self, resegmentacion_data: Dict, parent=None, db=None, usuario: str = ''):
         super().__init__(parent)
         self.resegmentacion_data = resegmentacion_data
+        self.db = db  # ResegmentacionDB de donde salió el registro (por defecto la local)
+        self.usuario = usuario  # Correo que queda registrado si se revierte
+        self._payloads = None
         self.setup_ui()
         self.setup_styles()
         
@@ -232,12 +235,26 @@ class ResegmentacionDetailsDialog(QDialog):
         group.setLayout(layout)
         return group
     
+    def payload(self, columna: str):
+        """
+        datos_originales / respuesta_api. Las consultas de la tabla no los traen:
+        se leen y descomprimen aquí, solo al abrir el diálogo
+        """
+        if columna in self.resegmentacion_data:
+            return self.resegmentacion_data[columna]
+        if self._payloads is None:
+            from resegmentacion_db import ResegmentacionDB
+            reseg_id = self.resegmentacion_data.get('id')
+            db = self.db or ResegmentacionDB()
+            self._payloads = db.obtener_payloads(reseg_id) if reseg_id is not None else {}
+        return self._payloads.get(columna, {})
+    
     def create_original_data_group(self) -> QGroupBox:
         """Crea el grupo de datos originales"""
         group = QGroupBox("📊 Datos Originales")
         layout = QVBoxLayout()
         
-        datos_originales_str = self.resegmentacion_data.get('datos_originales', '{}')
+        datos_originales_str = self.payload('datos_originales')
         try:
             datos_originales = json.loads(datos_originales_str) if isinstance(datos_originales_str, str) else datos_originales_str
             formatted_data = json.dumps(datos_originales, indent=2, ensure_ascii=False)
@@ -268,7 +285,7 @@ class ResegmentacionDetailsDialog(QDialog):
         group = QGroupBox("🌐 Respuesta de la API")
         layout = QVBoxLayout()
         
-        respuesta_api_str = self.resegmentacion_data.get('respuesta_api', '{}')
+        respuesta_api_str = self.payload('respuesta_api')
         try:
             respuesta_api = json.loads(respuesta_api_str) if isinstance(respuesta_api_str, str) else respuesta_api_str
             formatted_response = json.dumps(respuesta_api, indent=2, ensure_ascii=False)
@@ -308,11 +325,12 @@ class ResegmentacionDetailsDialog(QDialog):
             try:
                 from resegmentacion_db import ResegmentacionDB
                 
-                db = ResegmentacionDB()
+                db = self.db or ResegmentacionDB()
                 success = db.revertir_resegmentacion(
                     self.resegmentacion_data.get('agente', ''),
                     self.resegmentacion_data.get('subramo', ''),
-                    self.resegmentacion_data.get('num_poliza', '')
+                    self.resegmentacion_data.get('num_poliza', ''),
+                    self.usuario
                 )
                 
                 if success:
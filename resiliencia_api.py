@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Capa de resiliencia para las llamadas a la API
+Reintentos con backoff exponencial y jitter según la política de cada endpoint,
+circuito por host para dejar de insistir contra un servidor caído y métricas de reintentos
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+# Estados del circuito
+CIRCUITO_CERRADO = 'CERRADO'
+CIRCUITO_ABIERTO = 'ABIERTO'
+CIRCUITO_SEMIABIERTO = 'SEMIABIERTO'
+
+# Respuestas transitorias: el servidor no pudo atender, vale la pena reintentar
+ESTADOS_TRANSITORIOS = (500, 502, 503, 504)
+# Respuestas que garantizan que la petición no se procesó
+ESTADOS_NO_PROCESADOS = (429,)
+
+class CircuitoAbierto(requests.exceptions.RequestException):
+    """El host acumuló demasiados fallos seguidos; no se envían peticiones hasta que se enfríe"""
+
+class PoliticaReintentos:
+    """
+    Reglas de reintento de un endpoint.
+
+    idempotente: repetir la petición no tiene efectos adicionales (GET, login). Si no lo es,
+    solo se reintenta cuando hay certeza de que el servidor no la recibió o no la procesó
+    (fallo al conectar, 429).
+    """
+
+    def __init__(self, max_intentos: int = 3, espera_base: float = 0.5, espera_maxima: float = 8.0,
+                 idempotente: bool = True):
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.idempotente = idempotente
+
+    def espera(self, intento: int) -> float:
+        """Backoff exponencial con jitter completo: uniforme entre 0 y base * 2^intento"""
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * (2 ** intento)))
+
+    def reintentar_respuesta(self, status_code: int) -> bool:
+        if status_code in ESTADOS_NO_PROCESADOS:
+            return True
+        return self.idempotente and status_code in ESTADOS_TRANSITORIOS
+
+    def reintentar_excepcion(self, error: Exception) -> bool:
+        # ConnectTimeout/ConnectionError al conectar: la petición nunca llegó al servidor
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and _fallo_al_conectar(error):
+            return True
+        # ReadTimeout o conexión cortada a media respuesta: el servidor pudo haberla procesado
+        return self.idempotente and isinstance(error, (requests.exceptions.Timeout,
+                                                       requests.exceptions.ConnectionError))
+
+def _fallo_al_conectar(error: Exception) -> bool:
+    """Distingue 'no se pudo conectar' de 'se cortó la conexión después de enviar'"""
+    texto = str(error)
+    return any(motivo in texto for motivo in (
+        'Failed to establish a new connection', 'Name or service not known',
+        'nodename nor servname', 'getaddrinfo failed', 'Connection refused'
+    ))
+
+# Políticas por endpoint; registrar_politica permite agregar o sustituir
+POLITICAS = {
+    'login': PoliticaReintentos(max_intentos=3, idempotente=True),
+    'comparacion-adm': PoliticaReintentos(max_intentos=4, idempotente=True),
+    # Un ajuste duplicado modifica datos: solo se reintenta si es seguro que no se aplicó
+    'ajuste-manual': PoliticaReintentos(max_intentos=3, idempotente=False),
+}
+POLITICA_DEFECTO = PoliticaReintentos(max_intentos=1)
+
+def registrar_politica(endpoint: str, politica: PoliticaReintentos):
+    POLITICAS[endpoint] = politica
+
+class CircuitoHost:
+    """Circuito de un host: se abre tras `umbral` fallos transitorios seguidos"""
+
+    def __init__(self, umbral: int = 5, enfriamiento: float = 30.0, reloj: Callable[[], float] = time.monotonic):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.reloj = reloj
+        self.estado = CIRCUITO_CERRADO
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        """Con el circuito abierto, pasado el enfriamiento se deja pasar una petición de prueba"""
+        with self._lock:
+            if self.estado == CIRCUITO_ABIERTO:
+                if self.reloj() - self.abierto_desde < self.enfriamiento:
+                    return False
+                self.estado = CIRCUITO_SEMIABIERTO
+                return True
+            if self.estado == CIRCUITO_SEMIABIERTO:
+                # Ya hay una petición de prueba en curso
+                return False
+            return True
+
+    def registrar_exito(self):
+        with self._lock:
+            self.estado = CIRCUITO_CERRADO
+            self.fallos = 0
+
+    def registrar_fallo(self) -> bool:
+        """Retorna True si este fallo abrió el circuito"""
+        with self._lock:
+            self.fallos += 1
+            if self.estado == CIRCUITO_SEMIABIERTO or self.fallos >= self.umbral:
+                abierto_ahora = self.estado != CIRCUITO_ABIERTO
+                self.estado = CIRCUITO_ABIERTO
+                self.abierto_desde = self.reloj()
+                return abierto_ahora
+            return False
+
+class MetricasAPI:
+    """Contadores por endpoint: llamadas, intentos, reintentos, fallos y cortes de circuito"""
+
+    CAMPOS = ('llamadas', 'intentos', 'reintentos', 'exitos', 'fallos', 'rechazadas_circuito', 'circuitos_abiertos')
+
+    def __init__(self):
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, endpoint: str, campo: str, cantidad: int = 1):
+        with self._lock:
+            contadores = self._contadores.setdefault(endpoint, dict.fromkeys(self.CAMPOS, 0))
+            contadores[campo] += cantidad
+
+    def obtener(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {endpoint: dict(valores) for endpoint, valores in self._contadores.items()}
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+
+    def resumen(self) -> str:
+        return "; ".join(
+            f"{endpoint}: {v['llamadas']} llamadas, {v['reintentos']} reintentos, {v['fallos']} fallos"
+            for endpoint, v in self.obtener().items()
+        )
+
+class ClienteResiliente:
+    """Ejecuta peticiones HTTP aplicando la política del endpoint y el circuito del host"""
+
+    def __init__(self, umbral_circuito: int = 5, enfriamiento_circuito: float = 30.0,
+                 dormir: Callable[[float], None] = time.sleep, reloj: Callable[[], float] = time.monotonic):
+        self.umbral_circuito = umbral_circuito
+        self.enfriamiento_circuito = enfriamiento_circuito
+        self.dormir = dormir
+        self.reloj = reloj
+        self.metricas = MetricasAPI()
+        self._circuitos = {}
+        self._lock = threading.Lock()
+
+    def circuito(self, url: str) -> CircuitoHost:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._circuitos:
+                self._circuitos[host] = CircuitoHost(self.umbral_circuito, self.enfriamiento_circuito, self.reloj)
+            return self._circuitos[host]
+
+    def _espera_retry_after(self, response: requests.Response, politica: PoliticaReintentos) -> Optional[float]:
+        valor = response.headers.get('Retry-After', '')
+        try:
+            return min(float(valor), politica.espera_maxima)
+        except ValueError:
+            return None
+
+    def peticion(self, endpoint: str, metodo: str, url: str, **kwargs) -> requests.Response:
+        """
+        requests.request con reintentos. Retorna la última respuesta (aunque no sea 200)
+        o propaga la última excepción de requests; CircuitoAbierto si el host está cortado.
+        """
+        politica = POLITICAS.get(endpoint, POLITICA_DEFECTO)
+        circuito = self.circuito(url)
+        self.metricas.sumar(endpoint, 'llamadas')
+
+        for intento in range(politica.max_intentos):
+            if not circuito.permitir():
+                self.metricas.sumar(endpoint, 'rechazadas_circuito')
+                raise CircuitoAbierto(f"Servicio no disponible ({urlparse(url).netloc}), reintente en unos segundos")
+
+            if intento:
+                self.metricas.sumar(endpoint, 'reintentos')
+            self.metricas.sumar(endpoint, 'intentos')
+            ultimo = intento == politica.max_intentos - 1
+
+            try:
+                response = requests.request(metodo, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                # Si este fallo abrió el circuito no tiene caso esperar para reintentar
+                if self._registrar_fallo(endpoint, circuito):
+                    ultimo = True
+                if ultimo or not politica.reintentar_excepcion(e):
+                    self.metricas.sumar(endpoint, 'fallos')
+                    raise
+                espera = politica.espera(intento)
+                print(f"[API] ⚠️ {endpoint}: {type(e).__name__}, reintento {intento + 1} en {espera:.2f}s")
+                self.dormir(espera)
+                continue
+
+            if response.status_code in ESTADOS_TRANSITORIOS:
+                if self._registrar_fallo(endpoint, circuito):
+                    ultimo = True
+            else:
+                # 2xx y 4xx: el host responde, el circuito sigue cerrado
+                circuito.registrar_exito()
+
+            if ultimo or not politica.reintentar_respuesta(response.status_code):
+                self.metricas.sumar(endpoint, 'exitos' if response.status_code < 400 else 'fallos')
+                return response
+
+            espera = self._espera_retry_after(response, politica)
+            if espera is None:
+                espera = politica.espera(intento)
+            print(f"[API] ⚠️ {endpoint}: HTTP {response.status_code}, reintento {intento + 1} en {espera:.2f}s")
+            self.dormir(espera)
+
+    def _registrar_fallo(self, endpoint: str, circuito: CircuitoHost) -> bool:
+        """Retorna True si el fallo dejó el circuito abierto"""
+        if circuito.registrar_fallo():
+            self.metricas.sumar(endpoint, 'circuitos_abiertos')
+            print(f"[API] ❌ Circuito abierto tras {circuito.fallos} fallos seguidos ({endpoint})")
+        return circuito.estado == CIRCUITO_ABIERTO
+
+# Instancia global compartida por la interfaz, el núcleo y la línea de comandos
+cliente_api = ClienteResiliente()
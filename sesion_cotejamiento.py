@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Sesiones de cotejamiento guardadas en disco
+Un archivo .bonos es un zip sin compresión con un arreglo .npy por columna; al abrirlo
+cada arreglo se mapea en memoria directamente desde el zip, sin copiarlo ni descomprimirlo
+"""
+
+import json
+import struct
+import zipfile
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from datos_cotejamiento import clave_fila
+
+EXTENSION_SESION = ".bonos"
+VERSION_FORMATO = 1
+
+# Separador de textos dentro de una columna (caracter de control que no aparece en los datos)
+SEPARADOR = '\x1f'
+
+# Tamaño fijo del encabezado local de cada miembro zip antes del nombre y el campo extra
+_ENCABEZADO_LOCAL_ZIP = 30
+
+def _texto_a_arreglo(valores: List[str]) -> np.ndarray:
+    """Une una lista de textos en un solo bloque UTF-8"""
+    return np.frombuffer(SEPARADOR.join(valores).encode('utf-8'), dtype=np.uint8)
+
+def _arreglo_a_texto(arreglo: np.ndarray, cantidad: int) -> List[str]:
+    """Inverso de _texto_a_arreglo: un solo decode y split en C"""
+    if cantidad == 0:
+        return []
+    return arreglo.tobytes().decode('utf-8').split(SEPARADOR)
+
+def _es_columna_entera(valores: List) -> bool:
+    return all(isinstance(v, int) and not isinstance(v, bool) for v in valores)
+
+def _escribir_arreglo(zf: zipfile.ZipFile, nombre: str, arreglo: np.ndarray):
+    """Escribe un arreglo como miembro .npy sin compresión para poder mapearlo después"""
+    with zf.open(f"{nombre}.npy", 'w', force_zip64=True) as destino:
+        np.lib.format.write_array(destino, np.ascontiguousarray(arreglo), allow_pickle=False)
+
+def guardar_sesion(ruta: str, filas: List[Dict], detalle: List[Dict], resumen: Dict,
+                   periodo: str = '', columnas: Optional[List[str]] = None) -> bool:
+    """
+    Guarda las filas procesadas, el índice de pagos y el detalle crudo de la API.
+    Las filas se guardan por columna; los pagos como JSON por póliza con offsets.
+    """
+    try:
+        from datos_cotejamiento import IndicePagos
+        indice = IndicePagos(detalle)
+
+        campos = list(filas[0].keys()) if filas else []
+        meta = {
+            'version': VERSION_FORMATO,
+            'periodo': periodo,
+            'guardado': datetime.now().isoformat(),
+            'filas': len(filas),
+            'columnas_tabla': columnas or campos,
+            'campos': [],
+            'resumen': resumen or {},
+        }
+
+        with zipfile.ZipFile(ruta, 'w', compression=zipfile.ZIP_STORED) as zf:
+            # Una entrada por campo de la fila
+            for i, campo in enumerate(campos):
+                valores = [row_data.get(campo, '') for row_data in filas]
+                nombre = f"col_{i}"
+                if _es_columna_entera(valores):
+                    tipo = 'int'
+                    arreglo = np.array(valores, dtype=np.int64)
+                elif all(isinstance(v, str) for v in valores):
+                    tipo = 'texto'
+                    arreglo = _texto_a_arreglo(valores)
+                else:
+                    # Columna con tipos mezclados: se conserva cada valor tal cual vía JSON
+                    tipo = 'json'
+                    arreglo = np.frombuffer(json.dumps(valores, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+                _escribir_arreglo(zf, nombre, arreglo)
+                meta['campos'].append({'nombre': campo, 'miembro': nombre, 'tipo': tipo})
+
+            # Pagos por fila: bloque JSON + offsets, en el mismo orden que las filas
+            bloques = []
+            offsets = np.zeros(len(filas) + 1, dtype=np.int64)
+            ids_pago = []
+            fila_de_pago = []
+            for idx, row_data in enumerate(filas):
+                pagos = indice.pagos_de(*clave_fila(row_data))
+                bloque = json.dumps(pagos, ensure_ascii=False, separators=(',', ':')).encode('utf-8') if pagos else b''
+                bloques.append(bloque)
+                offsets[idx + 1] = offsets[idx] + len(bloque)
+                for pago in pagos:
+                    pago_id = pago.get('idPago', '')
+                    if pago_id:
+                        ids_pago.append(str(pago_id))
+                        fila_de_pago.append(idx)
+
+            _escribir_arreglo(zf, 'pagos_datos', np.frombuffer(b''.join(bloques), dtype=np.uint8))
+            _escribir_arreglo(zf, 'pagos_offsets', offsets)
+            _escribir_arreglo(zf, 'pagos_ids', _texto_a_arreglo(ids_pago))
+            _escribir_arreglo(zf, 'pagos_ids_fila', np.array(fila_de_pago, dtype=np.int32))
+            meta['pagos_ids'] = len(ids_pago)
+
+            # El detalle crudo solo se lee bajo demanda: se guarda comprimido
+            zf.writestr('detalle.json.zz', zlib.compress(json.dumps(detalle, ensure_ascii=False).encode('utf-8'), 6))
+            zf.writestr('meta.json', json.dumps(meta, ensure_ascii=False, indent=1))
+
+        print(f"[SESION] ✅ Sesión guardada en {ruta} ({len(filas)} filas)")
+        return True
+
+    except Exception as e:
+        print(f"[SESION] ❌ Error guardando sesión: {e}")
+        return False
+
+def _mapear_miembros(ruta: str, zf: zipfile.ZipFile) -> Dict[str, np.ndarray]:
+    """Mapea en memoria cada miembro .npy sin compresión del zip"""
+    arreglos = {}
+    with open(ruta, 'rb') as archivo:
+        for info in zf.infolist():
+            if not info.filename.endswith('.npy') or info.compress_type != zipfile.ZIP_STORED:
+                continue
+
+            # Saltar el encabezado local (su campo extra puede diferir del directorio central)
+            archivo.seek(info.header_offset)
+            encabezado = archivo.read(_ENCABEZADO_LOCAL_ZIP)
+            largo_nombre, largo_extra = struct.unpack('<HH', encabezado[26:30])
+            inicio = info.header_offset + _ENCABEZADO_LOCAL_ZIP + largo_nombre + largo_extra
+
+            archivo.seek(inicio)
+            version = np.lib.format.read_magic(archivo)
+            if version == (1, 0):
+                forma, fortran, dtype = np.lib.format.read_array_header_1_0(archivo)
+            else:
+                forma, fortran, dtype = np.lib.format.read_array_header_2_0(archivo)
+            inicio_datos = archivo.tell()
+
+            nombre = info.filename[:-4]
+            if int(np.prod(forma)) == 0:
+                arreglos[nombre] = np.zeros(forma, dtype=dtype)
+            else:
+                arreglos[nombre] = np.memmap(ruta, dtype=dtype, mode='r', offset=inicio_datos,
+                                             shape=forma, order='F' if fortran else 'C')
+    return arreglos
+
+class IndicePagosMapeado:
+    """
+    Misma interfaz que IndicePagos, pero leyendo los pagos del archivo mapeado.
+    El JSON de una póliza solo se decodifica cuando se consulta.
+    """
+
+    def __init__(self, filas: List[Dict], arreglos: Dict[str, np.ndarray], total_ids: int):
+        self.datos = arreglos['pagos_datos']
+        self.offsets = arreglos['pagos_offsets']
+        self.arreglo_ids = arreglos['pagos_ids']
+        self.ids_fila = arreglos['pagos_ids_fila']
+        self.total_ids = total_ids
+        self.filas = filas
+        self.fila_por_clave = {}
+        self.fila_por_poliza = {}
+        for idx, row_data in enumerate(filas):
+            clave = clave_fila(row_data)
+            self.fila_por_clave[clave] = idx
+            self.fila_por_poliza.setdefault(clave[2], idx)
+        self.fila_por_pago = None  # Se construye la primera vez que se busca un idPago
+        self.cache = {}
+
+    def _pagos_fila(self, idx: Optional[int]) -> List[Dict]:
+        if idx is None:
+            return []
+        if idx not in self.cache:
+            inicio, fin = int(self.offsets[idx]), int(self.offsets[idx + 1])
+            self.cache[idx] = json.loads(self.datos[inicio:fin].tobytes()) if fin > inicio else []
+        return self.cache[idx]
+
+    def pagos_de(self, agente: str, subramo: str, num_poliza: str) -> List[Dict]:
+        return self._pagos_fila(self.fila_por_clave.get((str(agente), str(subramo), str(num_poliza))))
+
+    def pagos_de_poliza(self, num_poliza: str) -> List[Dict]:
+        return self._pagos_fila(self.fila_por_poliza.get(str(num_poliza)))
+
+    def poliza_de_pago(self, pago_id: str) -> Optional[Dict]:
+        if self.fila_por_pago is None:
+            ids = _arreglo_a_texto(self.arreglo_ids, self.total_ids)
+            self.fila_por_pago = {}
+            for pago, fila in zip(ids, self.ids_fila.tolist()):
+                self.fila_por_pago.setdefault(pago, fila)
+
+        idx = self.fila_por_pago.get(str(pago_id))
+        if idx is None:
+            return None
+        agente, subramo, num_poliza = clave_fila(self.filas[idx])
+        pago = next((p for p in self._pagos_fila(idx) if str(p.get('idPago', '')) == str(pago_id)), {})
+        return {
+            'agente': agente,
+            'subramo': subramo,
+            'num_poliza': num_poliza,
+            'pago_details': pago
+        }
+
+    def __len__(self):
+        return len(self.fila_por_clave)
+
+class SesionCotejamiento:
+    """Sesión abierta desde disco: filas reconstruidas, pagos mapeados y detalle bajo demanda"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._detalle = None
+
+        with zipfile.ZipFile(ruta, 'r') as zf:
+            self.meta = json.loads(zf.read('meta.json'))
+            if self.meta.get('version') != VERSION_FORMATO:
+                raise ValueError(f"Versión de sesión no soportada: {self.meta.get('version')}")
+            arreglos = _mapear_miembros(ruta, zf)
+
+        self.periodo = self.meta.get('periodo', '')
+        self.resumen = self.meta.get('resumen', {})
+        self.columnas = self.meta.get('columnas_tabla', [])
+
+        # Reconstruir filas columna por columna (cada columna se decodifica de una sola vez)
+        total = self.meta.get('filas', 0)
+        nombres = []
+        valores = []
+        for campo in self.meta.get('campos', []):
+            arreglo = arreglos[campo['miembro']]
+            nombres.append(campo['nombre'])
+            if campo['tipo'] == 'int':
+                valores.append(arreglo.tolist())
+            elif campo['tipo'] == 'json':
+                valores.append(json.loads(arreglo.tobytes()))
+            else:
+                valores.append(_arreglo_a_texto(arreglo, total))
+        self.filas = [dict(zip(nombres, fila)) for fila in zip(*valores)] if nombres else []
+
+        self.indice_pagos = IndicePagosMapeado(self.filas, arreglos, self.meta.get('pagos_ids', 0))
+
+    @property
+    def detalle(self) -> List[Dict]:
+        """detalleComparacion original, descomprimido solo si alguien lo pide"""
+        if self._detalle is None:
+            with zipfile.ZipFile(self.ruta, 'r') as zf:
+                self._detalle = json.loads(zlib.decompress(zf.read('detalle.json.zz')))
+        return self._detalle
+
+def abrir_sesion(ruta: str) -> Optional[SesionCotejamiento]:
+    """Abre una sesión guardada; retorna None si el archivo no es válido"""
+    try:
+        sesion = SesionCotejamiento(ruta)
+        print(f"[SESION] ✅ Sesión abierta: {ruta} ({len(sesion.filas)} filas, periodo {sesion.periodo})")
+        return sesion
+    except Exception as e:
+        print(f"[SESION] ❌ Error abriendo sesión {ruta}: {e}")
+        return None
@@ -159,6 +159,12 @@ echo "🏗️ Creando configuración de PyInstaller..."
 cat > "Admin Bonos.spec" << 'EOF'
 # -*- mode: python ; coding: utf-8 -*-
 
+import sys
+
+# Perfil de empaquetado compartido (one-dir, exclusiones de Qt/pandas): build_perfil.py
+sys.path.insert(0, SPECPATH)
+from build_perfil import NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones
+
 block_cipher = None
 
 # Lista completa de imports ocultos
@@ -257,18 +263,12 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[
-        'tkinter',
-        'matplotlib',
-        'IPython',
-        'notebook',
-        'pytest',
-        'sphinx',
-    ],
+    excludes=obtener_exclusiones() + ['notebook', 'sphinx'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=NIVEL_OPTIMIZACION_BYTECODE,
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
@@ -282,7 +282,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -297,7 +297,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,  # UPX obliga a descomprimir las librerías Qt en cada arranque
     upx_exclude=[],
     name='Admin Bonos',
 )
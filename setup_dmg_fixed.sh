@@ -93,6 +93,12 @@ echo "🏗️ Construyendo aplicación..."
 cat > "Admin Bonos.spec" << EOF
 # -*- mode: python ; coding: utf-8 -*-
 
+import sys
+
+# Perfil de empaquetado compartido (one-dir, exclusiones de Qt/pandas): build_perfil.py
+sys.path.insert(0, SPECPATH)
+from build_perfil import NIVEL_OPTIMIZACION_BYTECODE, obtener_exclusiones
+
 block_cipher = None
 
 a = Analysis(
@@ -119,11 +125,12 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=obtener_exclusiones(),
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
+    optimize=NIVEL_OPTIMIZACION_BYTECODE,
 )
 
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
@@ -137,7 +144,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -152,7 +159,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,  # UPX obliga a descomprimir las librerías Qt en cada arranque
     upx_exclude=[],
     name='Admin Bonos',
 )
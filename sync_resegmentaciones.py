@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Sincronización de resegmentaciones entre estaciones
+Cada estación envía los cambios hechos localmente desde su último cursor y recibe los de
+las demás desde el suyo; el último en escribir gana sobre la llave (agente, subramo, póliza, tipo).
+Las marcas modificado_en están en UTC (ver resegmentacion_db.marca_modificacion).
+
+Destinos soportados (BONOS_SYNC_DESTINO):
+    \\\\servidor\\compartida\\bonos          carpeta compartida (archivo SQLite central)
+    http://servidor:8765                  servicio de sincronización (ver 'servir')
+
+Ejemplos:
+    python sync_resegmentaciones.py servir --puerto 8765 --db sync_central.db
+    python sync_resegmentaciones.py sincronizar --destino http://servidor:8765
+"""
+
+import abc
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from resegmentacion_db import ResegmentacionDB
+
+# Archivo central dentro de una carpeta compartida
+ARCHIVO_CENTRAL = "resegmentaciones_sync.db"
+
+# Cambios por petición
+LOTE_SYNC = 500
+
+# Segundos entre sincronizaciones en segundo plano
+INTERVALO_SYNC = int(os.environ.get('BONOS_SYNC_INTERVALO', '300'))
+
+class AlmacenSync:
+    """
+    Almacén central: la última versión de cada resegmentación con un número de secuencia
+    global. Cada cambio aceptado recibe una secuencia nueva; recibir(cursor) entrega
+    lo que cambió después de ese cursor.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        with self._conectar() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cambios (
+                    clave TEXT PRIMARY KEY,          -- agente|subramo|num_poliza|tipo
+                    seq INTEGER NOT NULL UNIQUE,
+                    modificado_en TEXT NOT NULL,
+                    origen TEXT NOT NULL,
+                    datos TEXT NOT NULL              -- JSON con la resegmentación completa
+                )
+            ''')
+            conn.commit()
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.ruta, timeout=60)
+        # Sin WAL: en carpetas de red el archivo -shm no es confiable entre equipos
+        conn.execute('PRAGMA journal_mode=DELETE')
+        return conn
+
+    def enviar(self, cambios: List[Dict]) -> int:
+        """Guarda los cambios más recientes que lo almacenado; retorna cuántos se aceptaron"""
+        aceptados = 0
+        with self._lock, self._conectar() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM cambios')
+            seq = cursor.fetchone()[0]
+            for cambio in cambios:
+                clave = '|'.join(str(cambio.get(c, '')) for c in
+                                 ('agente', 'subramo', 'num_poliza', 'tipo_resegmentacion'))
+                remoto = (cambio.get('modificado_en') or '', cambio.get('origen') or '')
+                cursor.execute('SELECT modificado_en, origen FROM cambios WHERE clave = ?', (clave,))
+                actual = cursor.fetchone()
+                if actual is not None and tuple(actual) >= remoto:
+                    continue
+                seq += 1
+                cursor.execute('INSERT OR REPLACE INTO cambios (clave, seq, modificado_en, origen, datos) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               (clave, seq, remoto[0], remoto[1], json.dumps(cambio, ensure_ascii=False)))
+                aceptados += 1
+            conn.commit()
+        return aceptados
+
+    def recibir(self, cursor_desde: int, limite: int = LOTE_SYNC) -> Tuple[List[Dict], int]:
+        """Cambios con secuencia mayor a cursor_desde; retorna (cambios, nuevo cursor)"""
+        with self._conectar() as conn:
+            filas = conn.execute('SELECT seq, datos FROM cambios WHERE seq > ? ORDER BY seq LIMIT ?',
+                                 (cursor_desde, limite)).fetchall()
+        if not filas:
+            return [], cursor_desde
+        return [json.loads(datos) for _, datos in filas], filas[-1][0]
+
+class BackendSync(abc.ABC):
+    """Interfaz de un destino de sincronización"""
+
+    identificador = ''
+
+    @abc.abstractmethod
+    def enviar(self, cambios: List[Dict]) -> int:
+        """Publica cambios locales; retorna cuántos aceptó el destino"""
+
+    @abc.abstractmethod
+    def recibir(self, cursor_desde: int, limite: int = LOTE_SYNC) -> Tuple[List[Dict], int]:
+        """Cambios posteriores a cursor_desde y el cursor hasta donde se leyó"""
+
+class BackendCarpetaCompartida(BackendSync):
+    """Archivo SQLite central en una carpeta compartida por las estaciones"""
+
+    def __init__(self, carpeta: str):
+        ruta = carpeta if carpeta.endswith('.db') else os.path.join(carpeta, ARCHIVO_CENTRAL)
+        self.identificador = os.path.abspath(ruta)
+        self.almacen = AlmacenSync(ruta)
+
+    def enviar(self, cambios: List[Dict]) -> int:
+        return self.almacen.enviar(cambios)
+
+    def recibir(self, cursor_desde: int, limite: int = LOTE_SYNC) -> Tuple[List[Dict], int]:
+        return self.almacen.recibir(cursor_desde, limite)
+
+class BackendHTTP(BackendSync):
+    """Servicio de sincronización por HTTP (ver ServidorSync)"""
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url.rstrip('/')
+        self.identificador = self.url
+        self.timeout = timeout
+
+    def enviar(self, cambios: List[Dict]) -> int:
+        response = requests.post(f"{self.url}/cambios", json={'cambios': cambios}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('aceptados', 0)
+
+    def recibir(self, cursor_desde: int, limite: int = LOTE_SYNC) -> Tuple[List[Dict], int]:
+        response = requests.get(f"{self.url}/cambios", params={'desde': cursor_desde, 'limite': limite},
+                                timeout=self.timeout)
+        response.raise_for_status()
+        datos = response.json()
+        return datos.get('cambios', []), int(datos.get('cursor', cursor_desde))
+
+def backend_desde_destino(destino: str) -> BackendSync:
+    """URL http(s) -> servicio; cualquier otra cosa -> carpeta compartida"""
+    if urlparse(destino).scheme in ('http', 'https'):
+        return BackendHTTP(destino)
+    return BackendCarpetaCompartida(destino)
+
+class SincronizadorResegmentaciones:
+    """Envía los cambios locales y aplica los remotos, avanzando un cursor por sentido y destino"""
+
+    def __init__(self, db: ResegmentacionDB, backend: BackendSync, lote: int = LOTE_SYNC):
+        self.db = db
+        self.backend = backend
+        self.lote = lote
+        self.clave_envio = f"cursor_envio:{backend.identificador}"
+        self.clave_recepcion = f"cursor_recepcion:{backend.identificador}"
+
+    def sincronizar(self) -> Dict[str, int]:
+        """
+        Una ronda completa. Los cursores solo avanzan después de que el lote se envió o
+        se aplicó, así que una ronda interrumpida se retoma sin perder cambios.
+        """
+        resultado = {'enviados': 0, 'recibidos': 0, 'aplicados': 0}
+
+        cursor_envio = int(self.db.obtener_estado_sync(self.clave_envio, '0'))
+        while True:
+            cambios, nuevo_cursor = self.db.cambios_locales(cursor_envio, self.lote)
+            if nuevo_cursor == cursor_envio:
+                break
+            if cambios:
+                self.backend.enviar(cambios)
+                resultado['enviados'] += len(cambios)
+            cursor_envio = nuevo_cursor
+            self.db.guardar_estado_sync(self.clave_envio, cursor_envio)
+
+        cursor_recepcion = int(self.db.obtener_estado_sync(self.clave_recepcion, '0'))
+        while True:
+            cambios, nuevo_cursor = self.backend.recibir(cursor_recepcion, self.lote)
+            if not cambios:
+                break
+            # Los propios vuelven del destino: se descartan sin tocar la base
+            ajenos = [c for c in cambios if c.get('origen') != self.db.origen]
+            resultado['recibidos'] += len(ajenos)
+            resultado['aplicados'] += self.db.aplicar_cambios_remotos(ajenos) if ajenos else 0
+            cursor_recepcion = nuevo_cursor
+            self.db.guardar_estado_sync(self.clave_recepcion, cursor_recepcion)
+
+        if any(resultado.values()):
+            print(f"[SYNC] {self.backend.identificador}: {resultado}")
+        return resultado
+
+class ServidorSync:
+    """Servicio HTTP mínimo sobre un AlmacenSync: POST /cambios y GET /cambios?desde=N"""
+
+    def __init__(self, ruta_db: str, host: str = '0.0.0.0', puerto: int = 8765):
+        self.almacen = AlmacenSync(ruta_db)
+        almacen = self.almacen
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status: int, datos: Dict):
+                cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/cambios':
+                    return self._responder(404, {'error': 'ruta no encontrada'})
+                params = parse_qs(url.query)
+                try:
+                    desde = int(params.get('desde', ['0'])[0])
+                    limite = min(int(params.get('limite', [str(LOTE_SYNC)])[0]), LOTE_SYNC)
+                except ValueError:
+                    return self._responder(400, {'error': 'desde/limite inválidos'})
+                cambios, cursor = almacen.recibir(desde, limite)
+                self._responder(200, {'cambios': cambios, 'cursor': cursor})
+
+            def do_POST(self):
+                if urlparse(self.path).path != '/cambios':
+                    return self._responder(404, {'error': 'ruta no encontrada'})
+                try:
+                    largo = int(self.headers.get('Content-Length', 0))
+                    cambios = json.loads(self.rfile.read(largo) or b'{}').get('cambios', [])
+                except ValueError:
+                    return self._responder(400, {'error': 'JSON inválido'})
+                self._responder(200, {'aceptados': almacen.enviar(cambios)})
+
+        self.httpd = ThreadingHTTPServer((host, puerto), Handler)
+
+    @property
+    def url(self) -> str:
+        host, puerto = self.httpd.server_address[:2]
+        return f"http://{'127.0.0.1' if host == '0.0.0.0' else host}:{puerto}"
+
+    def iniciar(self) -> threading.Thread:
+        """Atiende en un hilo (para pruebas); servir_siempre() bloquea"""
+        hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        hilo.start()
+        return hilo
+
+    def servir_siempre(self):
+        print(f"[SYNC] Servicio de sincronización en {self.url}")
+        self.httpd.serve_forever()
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sincronización de resegmentaciones entre estaciones")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    servir = subparsers.add_parser('servir', help="Levantar el servicio de sincronización")
+    servir.add_argument('--puerto', type=int, default=8765)
+    servir.add_argument('--host', default='0.0.0.0')
+    servir.add_argument('--db', default="sync_central.db")
+
+    sincronizar = subparsers.add_parser('sincronizar', help="Una ronda de sincronización de esta estación")
+    sincronizar.add_argument('--destino', default=os.environ.get('BONOS_SYNC_DESTINO', ''))
+    sincronizar.add_argument('--db', default="resegmentaciones.db")
+
+    args = parser.parse_args(argv)
+    if args.comando == 'servir':
+        ServidorSync(args.db, args.host, args.puerto).servir_siempre()
+        return 0
+
+    if not args.destino:
+        print("[SYNC] ❌ Indique --destino o BONOS_SYNC_DESTINO")
+        return 2
+    try:
+        resultado = SincronizadorResegmentaciones(ResegmentacionDB(args.db), backend_desde_destino(args.destino)).sincronizar()
+    except Exception as e:
+        print(f"[SYNC] ❌ Error sincronizando: {e}")
+        return 1
+    print(json.dumps(resultado))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
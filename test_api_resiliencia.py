@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Script de prueba de la capa de resiliencia (resiliencia_api.py)
+Levanta un servidor local que imita login, comparacion-adm y ajuste-manual
+e inyecta fallos (5xx, 429, 400, respuestas lentas) para verificar reintentos,
+reglas de idempotencia por endpoint y el circuito por host
+"""
+
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+import resiliencia_api
+from resiliencia_api import ClienteResiliente, CircuitoAbierto
+
+class ServidorFallas:
+    """Servidor local: cada ruta consume una cola de fallos antes de responder 200"""
+
+    def __init__(self):
+        self.fallas = {}
+        self.peticiones = {}
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _responder(self):
+                ruta = self.path.split('?')[0]
+                servidor.peticiones[ruta] = servidor.peticiones.get(ruta, 0) + 1
+                largo = int(self.headers.get('Content-Length', 0))
+                if largo:
+                    self.rfile.read(largo)
+
+                cola = servidor.fallas.get(ruta, [])
+                falla = cola.pop(0) if cola else 200
+                if falla == 'lento':
+                    time.sleep(0.5)
+                    falla = 200
+
+                cuerpo = json.dumps({'token': 'abc'} if falla == 200 else {'error': falla}).encode()
+                try:
+                    self.send_response(falla)
+                    if falla == 429:
+                        self.send_header('Retry-After', '0')
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                    self.end_headers()
+                    self.wfile.write(cuerpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente ya se fue por timeout (falla 'lento')
+                    pass
+
+            do_GET = _responder
+            do_POST = _responder
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def inyectar(self, ruta: str, fallas: list):
+        self.fallas[ruta] = list(fallas)
+        self.peticiones[ruta] = 0
+
+def nuevo_cliente(**kwargs) -> ClienteResiliente:
+    # Sin esperas reales entre reintentos
+    return ClienteResiliente(dormir=lambda segundos: None, **kwargs)
+
+@pytest.fixture(scope="module")
+def servidor():
+    servidor = ServidorFallas()
+    yield servidor
+    servidor.detener()
+
+def verificar(nombre: str, condicion: bool, detalle: str = ''):
+    print(f"{'✅' if condicion else '❌'} [TEST] {nombre} {detalle}")
+    assert condicion, f"{nombre} {detalle}"
+
+def test_reintento_5xx(servidor):
+    cliente = nuevo_cliente()
+    servidor.inyectar('/api/comparacion-adm', [503, 502])
+    response = cliente.peticion('comparacion-adm', 'GET', f"{servidor.url}/api/comparacion-adm?periodo[]=2025-04-01")
+    metricas = cliente.metricas.obtener()['comparacion-adm']
+    verificar("GET reintenta 5xx hasta obtener 200",
+                     response.status_code == 200 and metricas['reintentos'] == 2,
+                     f"(status {response.status_code}, reintentos {metricas['reintentos']})")
+
+def test_4xx_no_reintenta(servidor):
+    cliente = nuevo_cliente()
+    servidor.inyectar('/api/comparacion-adm', [400])
+    response = cliente.peticion('comparacion-adm', 'GET', f"{servidor.url}/api/comparacion-adm")
+    verificar("4xx se considera permanente",
+                     response.status_code == 400 and servidor.peticiones['/api/comparacion-adm'] == 1,
+                     f"(peticiones {servidor.peticiones['/api/comparacion-adm']})")
+
+def test_ajuste_no_idempotente(servidor):
+    cliente = nuevo_cliente()
+    ruta = '/api/ajuste-manual/prima-pagada/1'
+
+    servidor.inyectar(ruta, [500])
+    response = cliente.peticion('ajuste-manual', 'POST', f"{servidor.url}{ruta}", json={})
+    verificar("POST de ajuste no se repite tras 500",
+              response.status_code == 500 and servidor.peticiones[ruta] == 1,
+              f"(peticiones {servidor.peticiones[ruta]})")
+
+    servidor.inyectar(ruta, [429])
+    response = cliente.peticion('ajuste-manual', 'POST', f"{servidor.url}{ruta}", json={})
+    verificar("POST de ajuste se repite tras 429 (no procesado)",
+              response.status_code == 200 and servidor.peticiones[ruta] == 2,
+              f"(peticiones {servidor.peticiones[ruta]})")
+
+def test_timeout(servidor):
+    cliente = nuevo_cliente()
+    ruta = '/api/core/auth/login'
+    servidor.inyectar(ruta, ['lento'])
+    response = cliente.peticion('login', 'POST', f"{servidor.url}{ruta}", json={}, timeout=0.2)
+    verificar("Login reintenta tras timeout de lectura", response.status_code == 200)
+
+    servidor.inyectar('/api/ajuste-manual/nuevo-negocio/1', ['lento'])
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        cliente.peticion('ajuste-manual', 'POST', f"{servidor.url}/api/ajuste-manual/nuevo-negocio/1",
+                         json={}, timeout=0.2)
+    verificar("Ajuste no reintenta timeout de lectura", True)
+
+def test_conexion_rechazada():
+    cliente = nuevo_cliente()
+    # Puerto cerrado: la petición nunca llega, incluso un ajuste se puede reintentar
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cliente.peticion('ajuste-manual', 'POST', "http://127.0.0.1:9/api/ajuste-manual/x", json={}, timeout=1)
+    metricas = cliente.metricas.obtener()['ajuste-manual']
+    verificar("Conexión rechazada se reintenta en cualquier endpoint",
+                     metricas['intentos'] == 3, f"(intentos {metricas['intentos']})")
+
+def test_circuito(servidor):
+    reloj = [0.0]
+    cliente = nuevo_cliente(umbral_circuito=3, enfriamiento_circuito=10, reloj=lambda: reloj[0])
+    ruta = '/api/comparacion-adm'
+    servidor.inyectar(ruta, [503] * 20)
+
+    # 4 intentos permitidos, pero al abrirse el circuito en el tercer fallo se deja de reintentar
+    response = cliente.peticion('comparacion-adm', 'GET', f"{servidor.url}{ruta}")
+    abierto = cliente.circuito(servidor.url).estado == resiliencia_api.CIRCUITO_ABIERTO
+    verificar("Circuito se abre tras 3 fallos seguidos",
+              abierto and response.status_code == 503 and servidor.peticiones[ruta] == 3,
+              f"(peticiones {servidor.peticiones[ruta]})")
+
+    with pytest.raises(CircuitoAbierto):
+        cliente.peticion('comparacion-adm', 'GET', f"{servidor.url}{ruta}")
+    verificar("Con el circuito abierto no se envían peticiones", servidor.peticiones[ruta] == 3)
+
+    # Pasado el enfriamiento, una petición de prueba exitosa cierra el circuito
+    reloj[0] = 11
+    servidor.inyectar(ruta, [])
+    response = cliente.peticion('comparacion-adm', 'GET', f"{servidor.url}{ruta}")
+    circuito = cliente.circuito(servidor.url)
+    print(f"📊 [TEST] Métricas: {cliente.metricas.resumen()}")
+    verificar("Circuito se cierra tras la petición de prueba",
+              response.status_code == 200 and circuito.estado == resiliencia_api.CIRCUITO_CERRADO)
+
+def main():
+    """Función principal"""
+    print("🚀 [TEST] Probando capa de resiliencia de la API...")
+    print("=" * 60)
+
+    servidor = ServidorFallas()
+    pruebas = [
+        lambda: test_reintento_5xx(servidor),
+        lambda: test_4xx_no_reintenta(servidor),
+        lambda: test_ajuste_no_idempotente(servidor),
+        lambda: test_timeout(servidor),
+        test_conexion_rechazada,
+        lambda: test_circuito(servidor),
+    ]
+    fallidas = 0
+    for prueba in pruebas:
+        try:
+            prueba()
+        except (AssertionError, pytest.fail.Exception):
+            fallidas += 1
+    servidor.detener()
+
+    print("\n" + "=" * 60)
+    if not fallidas:
+        print("🎉 [TEST] ¡TODAS LAS PRUEBAS PASARON!")
+    else:
+        print(f"❌ [TEST] {fallidas} prueba(s) fallaron")
+
+if __name__ == "__main__":
+    main()
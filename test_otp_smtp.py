@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Script de prueba del envío de OTP contra un servidor SMTP local
+Verifica el envío en segundo plano, la reutilización de la sesión y la reconexión
+No requiere conexión a Gmail: usa aiosmtpd si está instalado o el módulo smtpd de Python
+(retirado en Python 3.12; sin ninguno de los dos las pruebas se omiten)
+"""
+
+import importlib.util
+import threading
+import time
+import socket
+
+import pytest
+
+from otp_service import OTPService
+
+HOST = "127.0.0.1"
+
+def puerto_libre():
+    """Obtiene un puerto TCP libre para el servidor local"""
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+class ServidorSMTPLocal:
+    """Servidor SMTP de prueba que guarda los mensajes y cuenta las conexiones"""
+
+    def __init__(self, puerto):
+        self.puerto = puerto
+        self.mensajes = []
+        self.conexiones = 0
+        self._detener = None
+
+    def iniciar(self):
+        try:
+            self._iniciar_aiosmtpd()
+            print("🧪 [TEST] Servidor local con aiosmtpd")
+        except ImportError:
+            self._iniciar_smtpd()
+            print("🧪 [TEST] Servidor local con smtpd")
+        time.sleep(0.3)
+
+    def _iniciar_aiosmtpd(self):
+        from aiosmtpd.controller import Controller
+
+        servidor = self
+
+        class Manejador:
+            async def handle_EHLO(self, server, session, envelope, hostname, responses):
+                servidor.conexiones += 1
+                session.host_name = hostname
+                return responses
+
+            async def handle_DATA(self, server, session, envelope):
+                servidor.mensajes.append(envelope.content)
+                return '250 OK'
+
+        controller = Controller(Manejador(), hostname=HOST, port=self.puerto)
+        controller.start()
+        self._detener = controller.stop
+
+    def _iniciar_smtpd(self):
+        import asyncore
+        import smtpd
+
+        servidor = self
+
+        class Servidor(smtpd.SMTPServer):
+            def handle_accepted(self, conn, addr):
+                servidor.conexiones += 1
+                super().handle_accepted(conn, addr)
+
+            def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+                servidor.mensajes.append(data)
+
+        instancia = Servidor((HOST, self.puerto), None)
+        hilo = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.1}, daemon=True)
+        hilo.start()
+
+        def detener():
+            instancia.close()
+            asyncore.close_all()
+        self._detener = detener
+
+    def detener(self):
+        if self._detener:
+            self._detener()
+            self._detener = None
+
+def servidor_disponible():
+    """Omite la prueba si no hay aiosmtpd ni smtpd con qué levantar el servidor local"""
+    if importlib.util.find_spec('aiosmtpd') is None:
+        pytest.importorskip('smtpd', reason="Se requiere aiosmtpd (smtpd ya no existe en Python 3.12+)")
+
+def nuevo_servidor():
+    servidor = ServidorSMTPLocal(puerto_libre())
+    servidor.iniciar()
+    return servidor
+
+@pytest.fixture
+def servidor():
+    servidor_disponible()
+    servidor = nuevo_servidor()
+    yield servidor
+    servidor.detener()
+
+def crear_servicio(puerto):
+    """Crea un OTPService apuntando al servidor local sin TLS ni autenticación"""
+    return OTPService(email_config={
+        'smtp_server': HOST,
+        'smtp_port': puerto,
+        'use_tls': False,
+        'username': None,
+        'password': None,
+        'from_email': 'pruebas@localhost',
+        'timeout': 5
+    })
+
+def esperar_envios(servicio, cantidad, timeout=15):
+    """Solicita varios OTP en segundo plano y espera todos los callbacks"""
+    resultados = []
+    terminado = threading.Event()
+
+    def al_terminar(success, message):
+        resultados.append((success, message))
+        if len(resultados) == cantidad:
+            terminado.set()
+
+    inicio = time.perf_counter()
+    for i in range(cantidad):
+        encolado = servicio.request_otp_async(f"usuario{i}@localhost", al_terminar)
+        print(f"📨 [TEST] Solicitud {i + 1} encolada: {encolado}")
+    encolar_ms = (time.perf_counter() - inicio) * 1000
+    print(f"⏱️  [TEST] Encolar {cantidad} solicitudes tomó {encolar_ms:.1f} ms (no bloquea)")
+
+    terminado.wait(timeout)
+    return resultados
+
+def test_sesion_reutilizada(servidor):
+    """Varios envíos deben usar una sola conexión SMTP"""
+    print("\n🔐 [TEST] Envío en segundo plano con sesión persistente...")
+    servicio = crear_servicio(servidor.puerto)
+    resultados = esperar_envios(servicio, 3)
+
+    exitos = sum(1 for success, _ in resultados if success)
+    print(f"📈 [TEST] Resultados: {exitos}/3 exitosos")
+    print(f"📬 [TEST] Mensajes recibidos por el servidor: {len(servidor.mensajes)}")
+    print(f"🔌 [TEST] Conexiones abiertas: {servidor.conexiones}")
+
+    assert exitos == 3, f"Solo {exitos}/3 envíos exitosos: {resultados}"
+    assert len(servidor.mensajes) == 3
+    assert servidor.conexiones == 1, f"Se abrieron {servidor.conexiones} conexiones"
+    print("✅ [TEST] Sesión reutilizada correctamente")
+
+def test_reconexion(servidor):
+    """Si el servidor cae y vuelve, el enviador debe reconectar y reintentar"""
+    print("\n🔁 [TEST] Reconexión tras caída del servidor...")
+    servicio = crear_servicio(servidor.puerto)
+    resultados = esperar_envios(servicio, 1)
+    assert resultados and resultados[0][0], f"Falló el envío inicial: {resultados}"
+    assert len(servidor.mensajes) == 1
+    servidor.detener()
+
+    # Levantar un servidor nuevo: la sesión anterior quedó muerta y hay que reconectar
+    nuevo = nuevo_servidor()
+    servicio.email_config['smtp_port'] = nuevo.puerto
+    try:
+        # Forzar la verificación con NOOP en el siguiente envío
+        servicio.enviador.ultimo_uso = 0
+        resultados = esperar_envios(servicio, 1)
+
+        assert resultados and resultados[0][0], f"Falló el envío tras la caída: {resultados}"
+        assert len(nuevo.mensajes) == 1
+        assert nuevo.conexiones == 1, f"Se abrieron {nuevo.conexiones} conexiones"
+        print("✅ [TEST] Reconexión exitosa")
+    finally:
+        nuevo.detener()
+
+def main():
+    print("🚀 PRUEBAS DE ENVÍO OTP CON SMTP LOCAL")
+    print("=" * 50)
+
+    resultados = {}
+    for nombre, prueba in (('sesion_reutilizada', test_sesion_reutilizada), ('reconexion', test_reconexion)):
+        servidor = nuevo_servidor()
+        try:
+            prueba(servidor)
+            resultados[nombre] = True
+        except AssertionError as e:
+            print(f"❌ [TEST] {nombre}: {e}")
+            resultados[nombre] = False
+        finally:
+            servidor.detener()
+
+    print("\n📋 RESUMEN")
+    print("=" * 50)
+    for nombre, ok in resultados.items():
+        print(f"   {'✅' if ok else '❌'} {nombre}")
+
+if __name__ == "__main__":
+    main()
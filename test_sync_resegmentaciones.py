@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la sincronización de resegmentaciones (sync_resegmentaciones.py)
+Dos estaciones con bases temporales se sincronizan contra una carpeta compartida y contra
+el servicio HTTP local; se verifica el avance de cursores, que los cambios propios no se
+vuelvan a aplicar, el último-en-escribir-gana y la propagación de reversiones
+"""
+
+import sqlite3
+
+import pytest
+
+from resegmentacion_db import ResegmentacionDB
+from sync_resegmentaciones import (BackendCarpetaCompartida, BackendHTTP, ServidorSync,
+                                   SincronizadorResegmentaciones)
+
+POLIZA = {'agente': 'AG01', 'subramo': 'AUTOS', 'num_poliza': 'P-100',
+          'tipo_resegmentacion': 'NUEVO_NEGOCIO', 'fecha_resegmentacion': '2025-04-01T10:00:00',
+          'usuario_responsable': 'ana@example.com', 'motivo_resegmentacion': 'inicial'}
+
+@pytest.fixture(params=['carpeta', 'http'])
+def destino(request, tmp_path):
+    """Fábrica de backends hacia un mismo destino central (uno por estación)"""
+    if request.param == 'carpeta':
+        carpeta = tmp_path / "compartida"
+        carpeta.mkdir()
+        yield lambda: BackendCarpetaCompartida(str(carpeta))
+    else:
+        servidor = ServidorSync(str(tmp_path / "sync_central.db"), '127.0.0.1', 0)
+        servidor.iniciar()
+        yield lambda: BackendHTTP(servidor.url, timeout=5)
+        servidor.detener()
+
+@pytest.fixture
+def estaciones(tmp_path, destino):
+    """Dos estaciones (A y B) con su propia base y su sincronizador"""
+    a = ResegmentacionDB(str(tmp_path / "estacion_a.db"))
+    b = ResegmentacionDB(str(tmp_path / "estacion_b.db"))
+    return (a, SincronizadorResegmentaciones(a, destino())), (b, SincronizadorResegmentaciones(b, destino()))
+
+def fila(db: ResegmentacionDB, poliza: dict = POLIZA) -> dict:
+    """Estado actual (activo o revertido) de la resegmentación de la póliza"""
+    with sqlite3.connect(db.db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT * FROM resegmentaciones WHERE agente = ? AND subramo = ? AND num_poliza = ?',
+                           (poliza['agente'], poliza['subramo'], poliza['num_poliza'])).fetchone()
+    return dict(row) if row else None
+
+def fijar_modificacion(db: ResegmentacionDB, modificado_en: str):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('UPDATE resegmentaciones SET modificado_en = ?', (modificado_en,))
+        conn.commit()
+
+def test_cursor_avanza(estaciones):
+    (a, sync_a), _ = estaciones
+    a.guardar_resegmentacion(POLIZA)
+
+    primera = sync_a.sincronizar()
+    assert primera['enviados'] == 1
+    assert int(a.obtener_estado_sync(sync_a.clave_envio, '0')) > 0
+    assert int(a.obtener_estado_sync(sync_a.clave_recepcion, '0')) > 0
+
+    # Sin cambios nuevos no se reenvía ni se recibe nada
+    assert sync_a.sincronizar() == {'enviados': 0, 'recibidos': 0, 'aplicados': 0}
+
+def test_cambios_propios_se_descartan(estaciones):
+    (a, sync_a), _ = estaciones
+    a.guardar_resegmentacion(POLIZA)
+    antes = fila(a)
+
+    resultado = sync_a.sincronizar()
+    assert resultado['recibidos'] == 0
+    assert resultado['aplicados'] == 0
+    assert fila(a) == antes
+
+def test_cambio_llega_a_otra_estacion(estaciones):
+    (a, sync_a), (b, sync_b) = estaciones
+    a.guardar_resegmentacion(POLIZA)
+    sync_a.sincronizar()
+
+    resultado = sync_b.sincronizar()
+    assert resultado['aplicados'] == 1
+    recibida = fila(b)
+    assert recibida['estado'] == 'ACTIVO'
+    assert recibida['origen'] == a.origen
+    assert recibida['modificado_en'] == fila(a)['modificado_en']
+
+    # Lo recibido no se reenvía como cambio local de B
+    assert sync_b.sincronizar()['enviados'] == 0
+
+def test_ultimo_en_escribir_gana(estaciones):
+    (a, sync_a), (b, sync_b) = estaciones
+    a.guardar_resegmentacion(POLIZA)
+    b.guardar_resegmentacion({**POLIZA, 'motivo_resegmentacion': 'corregido en B'})
+    fijar_modificacion(a, '2025-04-01T10:00:00.000000+00:00')
+    fijar_modificacion(b, '2025-04-01T11:00:00.000000+00:00')
+
+    sync_a.sincronizar()
+    # B es más reciente: no aplica lo de A y su cambio reemplaza el central
+    assert sync_b.sincronizar()['aplicados'] == 0
+    assert sync_a.sincronizar()['aplicados'] == 1
+
+    assert fila(a)['motivo_resegmentacion'] == 'corregido en B'
+    assert fila(b)['motivo_resegmentacion'] == 'corregido en B'
+
+def test_empate_por_origen(tmp_path):
+    db = ResegmentacionDB(str(tmp_path / "estacion.db"))
+    db.guardar_resegmentacion(POLIZA)
+    local = fila(db)
+    mismo_instante = {**POLIZA, 'estado': 'ACTIVO', 'modificado_en': local['modificado_en'],
+                      'motivo_resegmentacion': 'remoto'}
+
+    # Misma marca: decide el origen mayor, igual en todas las estaciones ('0' < uuid hex < 'g')
+    assert db.aplicar_cambios_remotos([{**mismo_instante, 'origen': '0'}]) == 0
+    assert fila(db)['motivo_resegmentacion'] == 'inicial'
+    assert db.aplicar_cambios_remotos([{**mismo_instante, 'origen': 'g'}]) == 1
+    assert fila(db)['motivo_resegmentacion'] == 'remoto'
+    assert fila(db)['origen'] == 'g'
+
+def test_reversion_se_propaga(estaciones):
+    (a, sync_a), (b, sync_b) = estaciones
+    a.guardar_resegmentacion(POLIZA)
+    sync_a.sincronizar()
+    sync_b.sincronizar()
+    assert fila(b)['estado'] == 'ACTIVO'
+
+    assert a.revertir_resegmentacion(POLIZA['agente'], POLIZA['subramo'], POLIZA['num_poliza'], 'ana@example.com')
+    assert sync_a.sincronizar()['enviados'] == 1
+    assert sync_b.sincronizar()['aplicados'] == 1
+    assert fila(b)['estado'] == 'REVERTIDO'
+    assert b.obtener_historial(POLIZA['agente'], POLIZA['subramo'], POLIZA['num_poliza'])
+
+def test_migracion_convierte_hora_local(tmp_path):
+    ruta = str(tmp_path / "legada.db")
+    db = ResegmentacionDB(ruta)
+    db.guardar_resegmentacion(POLIZA)
+    # Base en versión 5 escrita antes de que modificado_en fuera UTC
+    with sqlite3.connect(ruta) as conn:
+        conn.execute("UPDATE resegmentaciones SET modificado_en = '2025-04-01T10:00:00.250000'")
+        conn.execute('PRAGMA user_version = 5')
+        conn.commit()
+
+    ResegmentacionDB(ruta)
+    marca = fila(db)['modificado_en']
+    assert marca.endswith('+00:00')
+    assert len(marca) == len('2025-04-01T10:00:00.250000+00:00')
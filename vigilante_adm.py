@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Vigilante de la carpeta de exportaciones ADM
+Detecta archivos ADM nuevos (pb_YYYY_MM_cca_*_DIR_*), los lee en segundo plano (quedan en
+cache_adm) y precarga la comparación de su periodo como sesión .bonos; la primera consulta
+de ese mes en la interfaz abre la sesión precargada en lugar de esperar a la API.
+
+Corre dentro de la interfaz (BONOS_CARPETA_ADM) o como proceso aparte en la estación:
+    python vigilante_adm.py --carpeta \\\\servidor\\exportaciones\\adm
+    python vigilante_adm.py --carpeta /mnt/adm --una-vez
+
+Las credenciales se toman de BONOS_API_USUARIO/BONOS_API_PASSWORD o del token en caché
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from adm_ingesta import EXTENSIONES_ADM, ingerir_adm
+from cotejamiento_core import (URL_LOGIN, URL_COMPARACION, COLUMNAS_TABLA, PATRON_ADM, consultar_periodo,
+                               extraer_comparacion, filas_e_indice, periodo_desde_adm)
+from gestor_token import gestor_token
+from sesion_cotejamiento import guardar_sesion, EXTENSION_SESION
+
+DIRECTORIO_PRECARGAS = os.environ.get(
+    'BONOS_PRECARGAS', os.path.join(os.path.expanduser("~"), ".herramientas_bonos", "precargas"))
+
+# Horas que una precarga se considera al día
+VIGENCIA_PRECARGA_HORAS = float(os.environ.get('BONOS_PRECARGA_HORAS', '12'))
+
+# Segundos entre revisiones de la carpeta
+INTERVALO_VIGILANTE = int(os.environ.get('BONOS_VIGILANTE_INTERVALO', '60'))
+
+# Un archivo sin cambios desde hace estos segundos ya terminó de copiarse
+ESPERA_ESTABLE = 30
+
+ARCHIVO_ESTADO = "vigilante_adm.json"
+
+def ruta_precarga(periodo: str, directorio: str = DIRECTORIO_PRECARGAS) -> str:
+    return os.path.join(directorio, f"cotejamiento_{periodo[:7]}{EXTENSION_SESION}")
+
+def precarga_vigente(periodo: str, directorio: str = DIRECTORIO_PRECARGAS,
+                     vigencia_horas: float = VIGENCIA_PRECARGA_HORAS) -> Optional[str]:
+    """Ruta de la sesión precargada del periodo si existe y no ha vencido"""
+    ruta = ruta_precarga(periodo, directorio)
+    try:
+        if time.time() - os.path.getmtime(ruta) <= vigencia_horas * 3600:
+            return ruta
+    except OSError:
+        pass
+    return None
+
+def precargar_periodo(periodo: str, token: Optional[str] = None, url: str = URL_COMPARACION,
+                      directorio: str = DIRECTORIO_PRECARGAS) -> str:
+    """Consulta la comparación del periodo y la deja como sesión .bonos; retorna la ruta"""
+    data = gestor_token.ejecutar_con_reintento(lambda t: consultar_periodo(url, t, periodo), token)
+    resumen, detalle = extraer_comparacion(data)
+    # Un solo proceso: es trabajo de fondo y no debe competir con la interfaz
+    filas, _ = filas_e_indice(detalle, procesos=1, indice=False)
+
+    os.makedirs(directorio, exist_ok=True)
+    destino = ruta_precarga(periodo, directorio)
+    temporal = f"{destino}.tmp"
+    if not guardar_sesion(temporal, filas, detalle, resumen, periodo, list(COLUMNAS_TABLA)):
+        raise OSError(f"No se pudo escribir la precarga {temporal}")
+    # La interfaz nunca ve una sesión a medio escribir
+    os.replace(temporal, destino)
+    print(f"[VIGILANTE] ⚡ {periodo} precargado: {len(filas):,} pólizas -> {destino}")
+    return destino
+
+class VigilanteADM:
+    """
+    Revisa una carpeta de ADM. Lo que ya había la primera vez que se vigila queda como
+    línea base; después, cada archivo nuevo o modificado (una vez que terminó de copiarse)
+    se lee y su periodo se precarga. Los archivos procesados se recuerdan entre ejecuciones.
+    """
+
+    def __init__(self, carpeta: str, directorio_precargas: str = DIRECTORIO_PRECARGAS,
+                 url: str = URL_COMPARACION):
+        self.carpeta = carpeta
+        self.directorio_precargas = directorio_precargas
+        self.url = url
+        self.ruta_estado = os.path.join(directorio_precargas, ARCHIVO_ESTADO)
+        self.procesados: Dict[str, List[float]] = {}
+        self._vistos: Dict[str, Tuple[int, float]] = {}
+        self.pendientes = 0  # Archivos que aún se están copiando
+
+        try:
+            with open(self.ruta_estado, 'r', encoding='utf-8') as archivo:
+                estado = json.load(archivo)
+        except (OSError, ValueError):
+            estado = {}
+        # Carpeta nunca vigilada: lo que ya tiene no se considera nuevo
+        self._linea_base = os.path.abspath(carpeta) not in estado
+        self.procesados = estado.get(os.path.abspath(carpeta), {})
+
+    def _firmas(self) -> Dict[str, Tuple[int, float]]:
+        """(tamaño, mtime) de cada archivo ADM de la carpeta"""
+        firmas = {}
+        for entrada in os.scandir(self.carpeta):
+            if entrada.is_file() and entrada.name.lower().endswith(EXTENSIONES_ADM) and PATRON_ADM.match(entrada.name):
+                info = entrada.stat()
+                firmas[entrada.name] = (info.st_size, info.st_mtime)
+        return firmas
+
+    def _guardar_estado(self):
+        try:
+            with open(self.ruta_estado, 'r', encoding='utf-8') as archivo:
+                estado = json.load(archivo)
+        except (OSError, ValueError):
+            estado = {}
+        estado[os.path.abspath(self.carpeta)] = self.procesados
+        try:
+            os.makedirs(self.directorio_precargas, exist_ok=True)
+            with open(self.ruta_estado, 'w', encoding='utf-8') as archivo:
+                json.dump(estado, archivo, ensure_ascii=False)
+        except OSError as e:
+            print(f"[VIGILANTE] ⚠️ No se pudo guardar el estado: {e}")
+
+    def nuevos(self) -> List[str]:
+        """Nombres de archivos nuevos o modificados que ya no están cambiando"""
+        firmas = self._firmas()
+        if self._linea_base:
+            self.procesados = {nombre: list(firma) for nombre, firma in firmas.items()}
+            self._linea_base = False
+            self._guardar_estado()
+            print(f"[VIGILANTE] Línea base de {self.carpeta}: {len(firmas)} archivo(s) existentes")
+            return []
+
+        ahora = time.time()
+        listos = []
+        self.pendientes = 0
+        for nombre, firma in firmas.items():
+            if self.procesados.get(nombre) == list(firma):
+                continue
+            # Estable: igual que en la revisión anterior o sin tocar desde hace un rato
+            if self._vistos.get(nombre) == firma or ahora - firma[1] >= ESPERA_ESTABLE:
+                listos.append(nombre)
+            else:
+                self.pendientes += 1
+            self._vistos[nombre] = firma
+        return sorted(listos)
+
+    def revisar(self, token: Optional[str] = None, precargar: bool = True) -> List[str]:
+        """
+        Una revisión: lee los ADM nuevos agrupados por periodo y precarga cada periodo cuya
+        sesión no esté al día. Retorna los periodos precargados. Si la precarga falla, los
+        archivos no se marcan y se reintentan en la siguiente revisión.
+        """
+        por_periodo: Dict[str, List[str]] = {}
+        nuevos = self.nuevos()
+        for nombre in nuevos:
+            year, month = periodo_desde_adm(nombre)
+            if year:
+                por_periodo.setdefault(f"{year}-{month}-01", []).append(nombre)
+            else:
+                self.procesados[nombre] = list(self._vistos[nombre])
+
+        precargados = []
+        for periodo, nombres in sorted(por_periodo.items()):
+            rutas = [os.path.join(self.carpeta, nombre) for nombre in nombres]
+            try:
+                ingerir_adm(rutas, procesos=1)
+                if precargar:
+                    vigente = precarga_vigente(periodo, self.directorio_precargas)
+                    mas_nuevo = max(os.path.getmtime(ruta) for ruta in rutas)
+                    if vigente is None or os.path.getmtime(vigente) < mas_nuevo:
+                        precargar_periodo(periodo, token, self.url, self.directorio_precargas)
+                        precargados.append(periodo)
+            except Exception as e:
+                print(f"[VIGILANTE] ❌ {periodo}: {e}")
+                continue
+            for nombre in nombres:
+                self.procesados[nombre] = list(self._vistos[nombre])
+
+        if nuevos:
+            self._guardar_estado()
+        return precargados
+
+    def vigilar(self, intervalo: int = INTERVALO_VIGILANTE, precargar: bool = True):
+        """Revisa la carpeta indefinidamente"""
+        print(f"[VIGILANTE] Vigilando {self.carpeta} cada {intervalo}s")
+        while True:
+            self.revisar(precargar=precargar)
+            time.sleep(intervalo)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Vigila una carpeta de ADM y precarga sus periodos")
+    parser.add_argument('--carpeta', default=os.environ.get('BONOS_CARPETA_ADM', ''))
+    parser.add_argument('--intervalo', type=int, default=INTERVALO_VIGILANTE)
+    parser.add_argument('--una-vez', action='store_true', help="Una sola revisión y terminar")
+    parser.add_argument('--sin-precarga', action='store_true', help="Solo leer los ADM, sin consultar la API")
+    args = parser.parse_args(argv)
+
+    if not args.carpeta or not os.path.isdir(args.carpeta):
+        print("[VIGILANTE] ❌ Indique una carpeta existente con --carpeta o BONOS_CARPETA_ADM")
+        return 2
+
+    usuario = os.environ.get('BONOS_API_USUARIO', '')
+    password = os.environ.get('BONOS_API_PASSWORD', '')
+    if usuario and password:
+        gestor_token.configurar(URL_LOGIN, usuario, password)
+    if not args.sin_precarga:
+        try:
+            token = gestor_token.cargar_cache() or gestor_token.obtener_token()
+        except Exception as e:
+            print(f"[VIGILANTE] ❌ Error en login: {e}")
+            return 1
+        if not token:
+            print("[VIGILANTE] ❌ Sin token en caché ni credenciales BONOS_API_USUARIO/BONOS_API_PASSWORD")
+            return 2
+
+    vigilante = VigilanteADM(args.carpeta)
+    try:
+        if args.una_vez:
+            print(json.dumps(vigilante.revisar(precargar=not args.sin_precarga)))
+        else:
+            vigilante.vigilar(args.intervalo, precargar=not args.sin_precarga)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gestor_token.detener()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())